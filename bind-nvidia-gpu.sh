@@ -1,3 +1,3 @@
 #! /bin/sh
 
-echo "10de 1c20" > /sys/bus/pci/drivers/vfio-pci/new_id
+exec python3 -m passthrough.vfio 01:00.0 "$@"
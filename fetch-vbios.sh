@@ -0,0 +1,3 @@
+#! /bin/sh
+
+exec python3 -m passthrough.vbios "$@"
@@ -1,3 +1,3 @@
 #! /bin/sh
 
-mkisofs -V win-drivers -o resources/win-drivers.iso drivers/windows
+exec python3 -m passthrough.isoimage drivers/windows resources/win-drivers.iso -label win-drivers "$@"
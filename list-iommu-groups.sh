@@ -1,8 +1,3 @@
 #! /bin/sh
 
-shopt -s nullglob
-for d in /sys/kernel/iommu_groups/*/devices/*; do
-	n=${d#*/iommu_groups/*}; n=${n%%/*}
-	printf 'IOMMU Group %s ' "$n"
-	lspci -nns "${d##*/}"
-done;
+exec python3 -m passthrough.iommu "$@"
@@ -0,0 +1,3 @@
+## Host side of the passthrough setup: VBIOS acquisition, the VM launcher and the sysfs/procfs tuning around it.
+##
+## Every module takes the root of the sysfs and procfs trees it works on, so it can be run against a fake tree.
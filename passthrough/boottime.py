@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+## Times the steps of a VM launch, on the host and from the QMP events of QEMU, and keeps a log of the launches.
+##
+## Usage: python3 -m passthrough.boottime [-LOG file] [-LAST n] [-QMP socket]
+##
+##   -LOG        launch log, resources/boot-times.jsonl by default
+##   -LAST       number of launches to print, 10 by default
+##   -QMP        print the events of a running QEMU, or of a QMP stand-in, with their times until it closes the socket
+##
+## The launcher times its host steps: the romfile check, the Hyper-V probe, the driver ISO, the NVRAM copy, the
+## hugepage reservation, QEMU until its QMP socket answers, and the thread pinning. QEMU starts paused (-S),
+## cont starts the guest and gives the RESUME event. From there the times come from the events, counted from the
+## start of the launcher:
+##
+##   resume       RESUME, the vCPUs run, OVMF and the GOP of the romfile start
+##   vfio_irq     the guest driver of the GPU enabled its interrupts (seen in /proc/interrupts, every second)
+##   net_driver   NIC_RX_FILTER_CHANGED, the guest network driver set up the virtio-net device
+##   guest_agent  VSERPORT_CHANGE, a guest agent opened its virtio-serial port
+##   reset        RESET, the guest rebooted
+##   panic        GUEST_PANICKED, hv-crash (Windows) or a pvpanic device (Linux) reported a crash
+##   shutdown     SHUTDOWN, with the reason
+##
+## QEMU has no event for the end of the firmware, resume to vfio_irq is OVMF, the GOP and the guest OS up to
+## its GPU driver. Every launch is a line of JSON in the log, with the SHA-1 of the romfile (and of the VBIOS it
+## was made from, for a ROM of the fetch-vbios.sh cache) and the last vfio bind of the GPU, so launches with
+## other ROM or GOP versions can be compared.
+
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+
+from passthrough import qmp
+from passthrough import vbios
+from passthrough import vfio
+from passthrough.cli import Arg_List
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+log_path = os.path.join(base_dir, "resources", "boot-times.jsonl")
+
+## {QMP event : timeline event}
+qmp_events = {
+	"RESUME"                : "resume",
+	"NIC_RX_FILTER_CHANGED" : "net_driver",
+	"VSERPORT_CHANGE"       : "guest_agent",
+	"RESET"                 : "reset",
+	"GUEST_PANICKED"        : "panic",
+	"SHUTDOWN"              : "shutdown",
+}
+
+## The columns of the printed log, the times of the guest from resume.
+log_columns = ["vfio_irq", "net_driver", "guest_agent", "shutdown"]
+
+def event_info(qmp_msg) :
+	
+	## (timeline event, detail) of a QMP event, None for the event name when it doesn't count.
+	ev_name = qmp_events.get(qmp_msg["event"])
+	ev_data = qmp_msg.get("data", {})
+	
+	if ev_name == "guest_agent" and not ev_data.get("open") :
+		return None, None
+	
+	if ev_name == "panic" :
+		return ev_name, " ".join(str(ev_part) for ev_part in [ev_data.get("action"), ev_data.get("info", {}).get("type")] if ev_part)
+	
+	return ev_name, ev_data.get("reason") or ev_data.get("id") or ev_data.get("name")
+
+def event_time(qmp_msg, wall_start) :
+	
+	## Seconds from wall_start to the timestamp QEMU put on the event, None without one.
+	ev_stamp = qmp_msg.get("timestamp", {})
+	
+	return ev_stamp["seconds"] + ev_stamp["microseconds"] / 1e6 - wall_start if "seconds" in ev_stamp else None
+
+class Boot_Timeline :
+	
+	def __init__(self) :
+		self.wall_start = time.time()
+		self.mono_start = time.monotonic()
+		self.host_steps = {} # step : seconds
+		self.events     = [] # [seconds from the start, event, detail]
+		self.qemu_ver   = None
+	
+	def now(self) :
+		return time.monotonic() - self.mono_start
+	
+	@contextlib.contextmanager
+	def step(self, step_name) :
+		step_start = time.monotonic()
+		
+		try :
+			yield
+		
+		finally :
+			self.host_steps[step_name] = self.host_steps.get(step_name, 0) + time.monotonic() - step_start
+	
+	def timed(self, step_name, step_func, *step_args) :
+		with self.step(step_name) :
+			return step_func(*step_args)
+	
+	def mark(self, ev_name, ev_detail=None, ev_time=None) :
+		
+		## The watcher threads mark too, list.append doesn't need a lock.
+		self.events.append([round(ev_time if ev_time is not None else self.now(), 3), ev_name, ev_detail])
+	
+	def qmp_event(self, qmp_msg) :
+		
+		## At the time QEMU put on the event, not the one it was read at.
+		ev_name, ev_detail = event_info(qmp_msg)
+		
+		if ev_name is not None :
+			self.mark(ev_name, ev_detail, event_time(qmp_msg, self.wall_start))
+	
+	def first(self, ev_name) :
+		return min((ev_time for ev_time, event, ev_detail in self.events if event == ev_name), default=None)
+	
+	def entry(self, **launch_info) :
+		log_entry = {"time" : datetime.datetime.fromtimestamp(self.wall_start).isoformat(timespec="seconds"), "qemu" : self.qemu_ver}
+		log_entry.update(launch_info)
+		log_entry["host"]   = {step_name : round(step_time, 3) for step_name, step_time in self.host_steps.items()}
+		log_entry["events"] = sorted(self.events, key=lambda event : event[0])
+		
+		return log_entry
+
+def watch_events(qmp_client, boot_timeline) :
+	
+	## Until QEMU exits and closes the socket.
+	while True :
+		try :
+			boot_timeline.qmp_event(qmp_client.read_event())
+		except (OSError, ValueError, qmp.QMP_Error) :
+			return
+
+def rom_info(romfile) :
+	
+	## {romfile, rom_sha1, source_sha1, gop_updated}, the last two for a ROM of the VBIOS cache.
+	if romfile is None :
+		return {"romfile" : None}
+	
+	with open(romfile, 'rb') as rom_file :
+		rom_data = {"romfile" : romfile, "rom_sha1" : hashlib.sha1(rom_file.read()).hexdigest()}
+	
+	try :
+		rom_meta = vbios.cache_meta(romfile)
+		rom_data.update({"source_sha1" : rom_meta.get("source_sha1"), "gop_updated" : rom_meta.get("gop_updated")})
+	except (OSError, ValueError) :
+		pass
+	
+	return rom_data
+
+def last_bind(state_root, bdf) :
+	
+	## {total, age} of the vfio bind passthrough.vfio saved for the GPU, None without one.
+	try :
+		with open(vfio.bind_path(state_root, bdf), 'r') as bind_file :
+			group_switch = json.load(bind_file)
+	except (OSError, ValueError) :
+		return None
+	
+	return {"total" : round(group_switch["total"], 3), "age" : round(time.time() - group_switch["time"])}
+
+def append_log(log_entry, log_file_path=log_path) :
+	os.makedirs(os.path.dirname(os.path.abspath(log_file_path)), exist_ok=True)
+	
+	with open(log_file_path, 'a') as log_file :
+		log_file.write(json.dumps(log_entry) + "\n")
+
+def read_log(log_file_path=log_path) :
+	
+	## A line cut short by a crash is skipped.
+	log_entries = []
+	
+	with open(log_file_path, 'r') as log_file :
+		for log_line in log_file :
+			try :
+				log_entries.append(json.loads(log_line))
+			except ValueError :
+				pass
+	
+	return log_entries
+
+def guest_times(log_entry) :
+	
+	## {event : seconds from the first resume} of the first of every event.
+	ev_first = {}
+	
+	for ev_time, ev_name, ev_detail in log_entry["events"] :
+		ev_first.setdefault(ev_name, ev_time)
+	
+	if "resume" not in ev_first :
+		return {}
+	
+	return {ev_name : round(ev_time - ev_first["resume"], 3) for ev_name, ev_time in ev_first.items()}
+
+def print_entry(log_entry) :
+	print("Host:  %s" % ", ".join("%s %.2f s" % (step_name, step_time) for step_name, step_time in log_entry["host"].items()))
+	
+	for ev_time, ev_name, ev_detail in log_entry["events"] :
+		print("  %8.3f s  %-12s %s" % (ev_time, ev_name, ev_detail or ""))
+
+def print_log(log_entries) :
+	print("%-19s  %-10s %-8s %-8s %7s %7s  %s" % ("time", "vm", "rom", "qemu", "host", "resume", "  ".join("%10s" % column for column in log_columns)))
+	
+	for log_entry in log_entries :
+		ev_times = guest_times(log_entry)
+		resume   = next((ev_time for ev_time, ev_name, ev_detail in log_entry["events"] if ev_name == "resume"), None)
+		
+		print("%-19s  %-10s %-8s %-8s %6.2fs %7s  %s" % (log_entry["time"], log_entry.get("vm"), (log_entry.get("rom_sha1") or "-")[:8],
+			log_entry.get("qemu") or "-", sum(log_entry["host"].values()), "%.2fs" % resume if resume is not None else "-",
+			"  ".join("%10s" % ("+%.2fs" % ev_times[column] if column in ev_times else "-") for column in log_columns)))
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list      = Arg_List(sys.argv[1:])
+	log_file_path = arg_list.value("-LOG", log_path)
+	nr_last       = arg_list.number("-LAST", 10, 1)
+	qmp_path      = arg_list.value("-QMP", None)
+	
+	try :
+		if qmp_path is not None :
+			wall_start = time.time()
+			qmp_client = qmp.QMP_Client(qmp_path)
+			
+			while True :
+				try :
+					qmp_msg = qmp_client.read_event()
+				except qmp.QMP_Error :
+					break
+				
+				ev_time = event_time(qmp_msg, wall_start)
+				print("  %8.3f s  %-24s %s" % (ev_time if ev_time is not None else time.time() - wall_start, qmp_msg["event"], json.dumps(qmp_msg.get("data", {}))))
+			
+			sys.exit(0)
+		
+		print_log(read_log(log_file_path)[-nr_last:])
+	
+	except (OSError, qmp.QMP_Error) as log_err :
+		print("No boot times: %s" % log_err)
+		sys.exit(1)
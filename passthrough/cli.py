@@ -0,0 +1,56 @@
+## Command line parsing shared by the passthrough scripts, in the style of the GOPUpd scripts: case-insensitive
+## options with one or two dashes (-JOBS 4, --jobs 4), everything else is positional.
+
+import sys
+
+class Arg_List :
+	
+	def __init__(self, arg_list) :
+		self.arg_list  = list(arg_list)
+		self.arg_names = [arg_val.lstrip("-").upper() if arg_val[:1] == "-" and len(arg_val) > 1 else None for arg_val in self.arg_list]
+		self.arg_used  = set()
+	
+	def index(self, arg_name) :
+		arg_name = arg_name.lstrip("-").upper()
+		
+		if arg_name not in self.arg_names :
+			return None
+		
+		arg_idx = self.arg_names.index(arg_name)
+		self.arg_used.add(arg_idx)
+		
+		return arg_idx
+	
+	def flag(self, arg_name) :
+		return self.index(arg_name) is not None
+	
+	def value(self, arg_name, default) :
+		arg_idx = self.index(arg_name)
+		
+		if arg_idx is None :
+			return default
+		
+		if arg_idx + 1 >= len(self.arg_list) :
+			print("%s needs a value!" % arg_name)
+			sys.exit(1)
+		
+		self.arg_used.add(arg_idx + 1)
+		
+		return self.arg_list[arg_idx + 1]
+	
+	def number(self, arg_name, default, min_value=0) :
+		arg_val = self.value(arg_name, None)
+		
+		if arg_val is None :
+			return default
+		
+		try :
+			return max(min_value, int(arg_val, 0))
+		except ValueError :
+			print("%s needs a number!" % arg_name)
+			sys.exit(1)
+	
+	def positional(self) :
+		
+		## Only meaningful after all the options were looked up, their values are not positional.
+		return [arg_val for arg_idx, arg_val in enumerate(self.arg_list) if arg_idx not in self.arg_used and self.arg_names[arg_idx] is None]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+## Runs the CPUs of a VM with the performance governor and without the deep C-states, and puts the host
+## settings back afterwards.
+##
+## Usage: python3 -m passthrough.cpufreq -CPUS list [-GOVERNOR name] [-IDLE-LATENCY us] [-SYSFS dir]
+##
+##   -CPUS          host CPUs of the vCPUs, 1,5,2,6,3,7 for the Windows guest (core 0, CPUs 0 and 4, stays with the host)
+##   -GOVERNOR      scaling_governor for the CPUs, performance by default
+##   -IDLE-LATENCY  highest exit latency in µs of the cpuidle states left on, all of them stay on by default
+##   -SYSFS         root of the sysfs tree, /sys by default
+##
+## Prints what the launcher would change, and the current frequency of the CPUs. The launcher writes the
+## cpufreq/scaling_governor and cpuidle/state<n>/disable files of every vCPU CPU before QEMU starts, reads
+## cpufreq/scaling_cur_freq while QEMU runs, and writes the files back the way it found them when QEMU exits.
+
+import os
+import sys
+
+from passthrough import sysfs
+from passthrough import topology
+from passthrough.cli import Arg_List
+
+def cpu_dir(sys_root, cpu) :
+	return os.path.join(sys_root, "devices", "system", "cpu", "cpu%d" % cpu)
+
+def idle_states(sys_root, cpu) :
+	
+	## [(state dir, name, exit latency in µs, disabled)], the ones of the cpuidle driver of the CPU.
+	idle_dir   = os.path.join(cpu_dir(sys_root, cpu), "cpuidle")
+	state_list = []
+	
+	if not os.path.isdir(idle_dir) :
+		return state_list
+	
+	for state_name in sorted((state_name for state_name in os.listdir(idle_dir) if state_name.startswith("state")), key=lambda state_name : int(state_name[5:])) :
+		state_dir = os.path.join(idle_dir, state_name)
+		state_list.append((state_dir, sysfs.read_attr(os.path.join(state_dir, "name"), state_name), int(sysfs.read_attr(os.path.join(state_dir, "latency"), "0")),
+						sysfs.read_attr(os.path.join(state_dir, "disable"), "0") == "1"))
+	
+	return state_list
+
+def tuning_plan(sys_root, cpus, governor="performance", idle_latency=None) :
+	
+	## [(file, old value, new value)] of what has to change, ValueError when the governor isn't there.
+	tune_plan = []
+	
+	for cpu in cpus :
+		freq_dir = os.path.join(cpu_dir(sys_root, cpu), "cpufreq")
+		
+		if governor is not None and os.path.isdir(freq_dir) :
+			gov_path = os.path.join(freq_dir, "scaling_governor")
+			gov_list = sysfs.read_attr(os.path.join(freq_dir, "scaling_available_governors"), governor).split()
+			
+			if governor not in gov_list :
+				raise ValueError("CPU %d has no %s governor, only %s" % (cpu, governor, ", ".join(gov_list)))
+			
+			gov_old = sysfs.read_attr(gov_path)
+			
+			if gov_old != governor :
+				tune_plan.append((gov_path, gov_old, governor))
+		
+		if idle_latency is not None :
+			for state_dir, state_name, state_latency, state_off in idle_states(sys_root, cpu) :
+				## state0 is polling, it can't be turned off.
+				if state_latency > idle_latency and not state_off and not state_dir.endswith("state0") :
+					tune_plan.append((os.path.join(state_dir, "disable"), "0", "1"))
+	
+	return tune_plan
+
+class CPU_Tuning :
+	
+	def __init__(self, sys_root, cpus, governor="performance", idle_latency=None) :
+		self.sys_root   = sys_root
+		self.cpus       = list(cpus)
+		self.tune_plan  = tuning_plan(sys_root, cpus, governor, idle_latency)
+		self.written    = []
+		self.freq_stats = {} # cpu : [min, max, sum, samples] in kHz
+	
+	def apply(self) :
+		
+		## Stops at the first file that can't be written, restore() puts back what was written until then.
+		for tune_path, old_value, new_value in self.tune_plan :
+			sysfs.write_attr(tune_path, new_value)
+			self.written.append((tune_path, old_value))
+	
+	def restore(self) :
+		for tune_path, old_value in reversed(self.written) :
+			try :
+				sysfs.write_attr(tune_path, old_value)
+			except OSError as tune_err :
+				print("%s not restored: %s" % (tune_path, tune_err))
+		
+		self.written = []
+	
+	def sample(self) :
+		for cpu in self.cpus :
+			try :
+				cur_freq = int(sysfs.read_attr(os.path.join(cpu_dir(self.sys_root, cpu), "cpufreq", "scaling_cur_freq")))
+			except (OSError, ValueError) :
+				continue
+			
+			cpu_stats = self.freq_stats.setdefault(cpu, [cur_freq, cur_freq, 0, 0])
+			cpu_stats[0] = min(cpu_stats[0], cur_freq)
+			cpu_stats[1] = max(cpu_stats[1], cur_freq)
+			cpu_stats[2] += cur_freq
+			cpu_stats[3] += 1
+	
+	def stats(self) :
+		
+		## {cpu : {"min", "avg", "max" in MHz, "samples"}}
+		return {cpu : {"min" : cpu_stats[0] // 1000, "avg" : cpu_stats[2] // cpu_stats[3] // 1000, "max" : cpu_stats[1] // 1000, "samples" : cpu_stats[3]}
+				for cpu, cpu_stats in sorted(self.freq_stats.items())}
+
+def print_stats(freq_stats) :
+	for cpu, cpu_stats in freq_stats.items() :
+		print("  CPU %-3d %5d MHz avg, %d-%d MHz in %d samples" % (cpu, cpu_stats["avg"], cpu_stats["min"], cpu_stats["max"], cpu_stats["samples"]))
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list     = Arg_List(sys.argv[1:])
+	tune_cpus    = topology.cpu_list(arg_list.value("-CPUS", ""))
+	governor     = arg_list.value("-GOVERNOR", "performance")
+	idle_latency = arg_list.number("-IDLE-LATENCY", None)
+	sys_root     = arg_list.value("-SYSFS", "/sys")
+	
+	if not tune_cpus :
+		print("Usage: python3 -m passthrough.cpufreq -CPUS list [-GOVERNOR name] [-IDLE-LATENCY us] [-SYSFS dir]")
+		sys.exit(1)
+	
+	try :
+		cpu_tuning = CPU_Tuning(sys_root, tune_cpus, governor, idle_latency)
+		cpu_tuning.sample()
+	except (OSError, ValueError) as tune_err :
+		print("No CPU tuning: %s" % tune_err)
+		sys.exit(1)
+	
+	for tune_path, old_value, new_value in cpu_tuning.tune_plan :
+		print("  %-60s %s -> %s" % (os.path.relpath(tune_path, sys_root), old_value, new_value))
+	
+	if not cpu_tuning.tune_plan :
+		print("  nothing to change")
+	
+	print_stats(cpu_tuning.stats())
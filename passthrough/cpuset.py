@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+## Hands out exclusive sets of host cores to the VMs that run at the same time.
+##
+## Usage: python3 -m passthrough.cpuset [-RELEASE name] [-STATE dir] [-SYSFS dir]
+##
+##   -RELEASE    drop the cores of a VM, for a launcher that was killed before it could do it
+##   -STATE      folder of the allocation state, $XDG_RUNTIME_DIR/passthrough by default
+##   -SYSFS      root of the sysfs tree, /sys by default
+##
+## Without options, the allocations of the running VMs are listed. The state is cpusets.json, changed under an
+## flock of cpusets.lock. Every entry has the PID of its launcher, the entries of launchers that are gone are
+## dropped, so a crash doesn't keep the cores. The first host core is never given to a VM unless the launch
+## allows oversubscription, and neither is a core of another running VM.
+
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import tempfile
+
+from passthrough import topology
+from passthrough.cli import Arg_List
+
+def state_dir() :
+	
+	## Shared with the QMP sockets of the launcher.
+	runtime_dir = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "passthrough")
+	os.makedirs(runtime_dir, mode=0o700, exist_ok=True)
+	
+	return runtime_dir
+
+def pid_alive(pid) :
+	try :
+		os.kill(pid, 0)
+	except ProcessLookupError :
+		return False
+	except PermissionError :
+		pass
+	
+	return True
+
+@contextlib.contextmanager
+def locked_state(state_root) :
+	
+	## The allocations of the live launchers, written back when the block ends without an error. A -STATE folder
+	## is made on first use like the default one.
+	os.makedirs(state_root, exist_ok=True)
+	
+	with open(os.path.join(state_root, "cpusets.lock"), 'a') as lock_file :
+		fcntl.flock(lock_file, fcntl.LOCK_EX)
+		state_path = os.path.join(state_root, "cpusets.json")
+		
+		try :
+			with open(state_path, 'r') as state_file :
+				cpu_sets = json.load(state_file)
+		except (FileNotFoundError, ValueError) :
+			cpu_sets = {}
+		
+		cpu_sets = {vm_name : vm_set for vm_name, vm_set in cpu_sets.items() if pid_alive(vm_set["pid"])}
+		
+		yield cpu_sets
+		
+		with open(state_path + ".new", 'w') as state_file :
+			json.dump(cpu_sets, state_file, indent=2)
+		
+		os.replace(state_path + ".new", state_path)
+
+def pick_cores(core_list, nr_cores, taken_cores, host_reserve, core_picks=None, oversubscribe=False) :
+	
+	## Core numbers for a VM. Free cores are taken from the last one down, the first host_reserve cores stay with
+	## the host. Other cores only with oversubscription, the cores of other VMs before the host ones.
+	host_cores = set(range(min(host_reserve, len(core_list) - 1)))
+	
+	if core_picks is not None :
+		shared = sorted(set(core_picks) & (taken_cores | host_cores))
+		
+		if shared and not oversubscribe :
+			raise ValueError("Cores %s are in use by the host or another VM" % ", ".join("%d" % core_nr for core_nr in shared))
+		
+		return list(core_picks)
+	
+	free_cores = [core_nr for core_nr in reversed(range(len(core_list))) if core_nr not in taken_cores | host_cores]
+	
+	if oversubscribe :
+		free_cores += [core_nr for core_nr in reversed(range(len(core_list))) if core_nr in taken_cores - host_cores]
+		free_cores += sorted(host_cores, reverse=True)
+	
+	if len(free_cores) < nr_cores :
+		raise ValueError("%d cores needed, %d free (the host keeps %d, the running VMs have %d), allow oversubscription to share"
+						% (nr_cores, len(free_cores), len(host_cores), len(taken_cores - host_cores)))
+	
+	return sorted(free_cores[:nr_cores])
+
+def allocate(state_root, vm_name, core_list, nr_cores, core_picks=None, oversubscribe=False, host_reserve=1, dry_run=False) :
+	with locked_state(state_root) as cpu_sets :
+		if vm_name in cpu_sets :
+			raise ValueError("%s is running already, launcher PID %d" % (vm_name, cpu_sets[vm_name]["pid"]))
+		
+		taken_cores = set(core_nr for vm_set in cpu_sets.values() for core_nr in vm_set["cores"])
+		core_picks  = pick_cores(core_list, nr_cores, taken_cores, host_reserve, core_picks, oversubscribe)
+		
+		if not dry_run :
+			cpu_sets[vm_name] = {"pid" : os.getpid(), "cores" : core_picks,
+								"cpus" : sorted(cpu for core_nr in core_picks for cpu in core_list[core_nr])}
+	
+	return core_picks
+
+def release(state_root, vm_name) :
+	with locked_state(state_root) as cpu_sets :
+		return cpu_sets.pop(vm_name, None) is not None
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list   = Arg_List(sys.argv[1:])
+	vm_release = arg_list.value("-RELEASE", None)
+	state_root = arg_list.value("-STATE", None) or state_dir()
+	sys_root   = arg_list.value("-SYSFS", "/sys")
+	
+	if vm_release is not None :
+		print("%s %s" % (vm_release, "released" if release(state_root, vm_release) else "has no cores"))
+		sys.exit(0)
+	
+	with locked_state(state_root) as cpu_sets :
+		core_list = topology.host_cores(sys_root)
+		
+		for vm_name, vm_set in sorted(cpu_sets.items()) :
+			print("  %-16s launcher %-8d cores %-12s CPUs %s" % (vm_name, vm_set["pid"], ",".join("%d" % core_nr for core_nr in vm_set["cores"]),
+				topology.cpu_list_str(vm_set["cpus"])))
+		
+		taken_cores = set(core_nr for vm_set in cpu_sets.values() for core_nr in vm_set["cores"])
+		free_cores  = [core_nr for core_nr in range(len(core_list)) if core_nr not in taken_cores]
+		
+		print("  %-16s %-17s cores %s" % ("free", "", ",".join("%d" % core_nr for core_nr in free_cores) or "none"))
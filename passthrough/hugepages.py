@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+## Plans and reserves the hugepages that back the guest memory.
+##
+## Usage: python3 -m passthrough.hugepages <size> [-PAGE 2M|1G|auto] [-PROC dir] [-SYSFS dir]
+##
+##   <size>      guest memory, 8G for example
+##   -PAGE       hugepage size, auto by default (1G when the pool already has them, 2M otherwise)
+##   -PROC       root of the procfs tree, /proc by default
+##   -SYSFS      root of the sysfs tree, /sys by default
+##
+## Prints the plan without reserving anything. The launcher reserves the pages before QEMU starts: the pool
+## of the page size in /sys/kernel/mm/hugepages grows by what is missing, and shrinks by the same number of
+## pages when QEMU exits. /proc/buddyinfo tells whether there are enough free blocks for 2M pages, memory is
+## compacted first when there are not. The guest memory is then a memory-backend-file on hugetlbfs with
+## prealloc=on, so all of it is touched once at start-up instead of page by page while VFIO maps it.
+
+import os
+import sys
+
+from passthrough import sysfs
+from passthrough.cli import Arg_List
+
+size_units = {"K" : 1 << 10, "M" : 1 << 20, "G" : 1 << 30, "T" : 1 << 40}
+
+def mem_size(size_str) :
+	
+	## QEMU sizes, a number without unit is in MiB like for -m.
+	size_str = str(size_str).strip().upper().rstrip("B")
+	
+	if size_str[-1:] in size_units :
+		return int(float(size_str[:-1]) * size_units[size_str[-1]])
+	
+	return int(size_str) << 20
+
+def meminfo(proc_root) :
+	mem_info = {}
+	
+	for info_line in sysfs.read_attr(os.path.join(proc_root, "meminfo")).splitlines() :
+		info_name, info_value = info_line.split(":", 1)
+		mem_info[info_name] = int(info_value.split()[0])
+	
+	return mem_info
+
+def page_pools(sys_root) :
+	
+	## Hugepage pools by page size in kB.
+	pool_dir   = os.path.join(sys_root, "kernel", "mm", "hugepages")
+	pool_stats = {}
+	
+	for pool_name in os.listdir(pool_dir) :
+		if not pool_name.startswith("hugepages-") :
+			continue
+		
+		pool_stats[int(pool_name[10:-2])] = {stat_name : int(sysfs.read_attr(os.path.join(pool_dir, pool_name, stat_name + "_hugepages"), "0"))
+											for stat_name in ["nr", "free", "resv", "surplus"]}
+	
+	return pool_stats
+
+def buddy_pages(proc_root, page_kb, base_kb=4) :
+	
+	## Number of pages of page_kb that the free blocks in /proc/buddyinfo could give without compaction. None when
+	## the page is larger than the largest block, the kernel has to find those with alloc_contig_range.
+	page_order = (page_kb // base_kb).bit_length() - 1
+	nr_pages   = 0
+	max_order  = 0
+	
+	for buddy_line in sysfs.read_attr(os.path.join(proc_root, "buddyinfo")).splitlines() :
+		free_counts = [int(free_count) for free_count in buddy_line.split(",", 1)[1].split()[2:]]
+		max_order   = max(max_order, len(free_counts) - 1)
+		nr_pages   += sum(free_count << (block_order - page_order) for block_order, free_count in enumerate(free_counts) if block_order >= page_order)
+	
+	return nr_pages if page_order <= max_order else None
+
+def hugetlbfs_mount(proc_root, page_kb, default_kb) :
+	
+	## A hugetlbfs mount with this page size, /dev/hugepages for the default one on most systems.
+	for mount_line in sysfs.read_attr(os.path.join(proc_root, "mounts")).splitlines() :
+		mount_parts = mount_line.split()
+		
+		if len(mount_parts) < 4 or mount_parts[2] != "hugetlbfs" :
+			continue
+		
+		mount_opts = dict(mount_opt.split("=", 1) for mount_opt in mount_parts[3].split(",") if "=" in mount_opt)
+		mount_kb   = mem_size(mount_opts["pagesize"]) >> 10 if "pagesize" in mount_opts else default_kb
+		
+		if mount_kb == page_kb :
+			return mount_parts[1]
+	
+	return None
+
+def plan(proc_root, sys_root, size_bytes, page_pref="auto") :
+	mem_info   = meminfo(proc_root)
+	pool_stats = page_pools(sys_root)
+	default_kb = mem_info.get("Hugepagesize", 2048)
+	
+	if page_pref == "auto" :
+		## 1G pages only from a pool filled at boot, they can rarely be found later.
+		pool_1g = pool_stats.get(1 << 20)
+		page_kb = 1 << 20 if pool_1g and not size_bytes % (1 << 30) and pool_1g["free"] - pool_1g["resv"] >= size_bytes >> 30 else 2048
+	else :
+		page_kb = mem_size(page_pref) >> 10
+	
+	if page_kb not in pool_stats :
+		raise ValueError("The kernel has no %s hugepages" % page_name(page_kb))
+	
+	if size_bytes % (page_kb << 10) :
+		raise ValueError("%d MiB is not a multiple of %s pages" % (size_bytes >> 20, page_name(page_kb)))
+	
+	mount_path = hugetlbfs_mount(proc_root, page_kb, default_kb)
+	
+	if mount_path is None :
+		raise ValueError("No hugetlbfs mount for %s pages" % page_name(page_kb))
+	
+	nr_pages  = size_bytes // (page_kb << 10)
+	pool      = pool_stats[page_kb]
+	shortfall = max(0, nr_pages - (pool["free"] - pool["resv"]))
+	
+	if shortfall * page_kb > mem_info.get("MemAvailable", mem_info.get("MemFree", 0)) :
+		raise ValueError("%d more %s pages don't fit in the available memory" % (shortfall, page_name(page_kb)))
+	
+	buddy_free = buddy_pages(proc_root, page_kb) if shortfall else None
+	
+	return {"page_kb" : page_kb, "pages" : nr_pages, "shortfall" : shortfall, "mount" : mount_path, "pool_nr" : pool["nr"],
+			"fragmented" : buddy_free is not None and buddy_free < shortfall}
+
+def page_name(page_kb) :
+	return "%dG" % (page_kb >> 20) if page_kb >= 1 << 20 else "%dM" % (page_kb >> 10)
+
+def pool_path(sys_root, page_kb, stat_name) :
+	return os.path.join(sys_root, "kernel", "mm", "hugepages", "hugepages-%dkB" % page_kb, stat_name + "_hugepages")
+
+def reserve(proc_root, sys_root, mem_plan) :
+	
+	## Grows the pool by the shortfall and returns how many pages were added. The kernel allocates what it can,
+	## so the pool is read back, and put back the way it was when it came up short.
+	if not mem_plan["shortfall"] :
+		return 0
+	
+	if mem_plan["fragmented"] :
+		sysfs.write_attr(os.path.join(proc_root, "sys", "vm", "compact_memory"), 1)
+	
+	nr_path = pool_path(sys_root, mem_plan["page_kb"], "nr")
+	nr_old  = int(sysfs.read_attr(nr_path))
+	
+	sysfs.write_attr(nr_path, nr_old + mem_plan["shortfall"])
+	
+	nr_added = int(sysfs.read_attr(nr_path)) - nr_old
+	
+	if nr_added < mem_plan["shortfall"] :
+		sysfs.write_attr(nr_path, nr_old)
+		raise ValueError("Only %d of %d %s pages could be reserved, memory is too fragmented" % (nr_added, mem_plan["shortfall"],
+						page_name(mem_plan["page_kb"])))
+	
+	return nr_added
+
+def release(sys_root, mem_plan, nr_added) :
+	
+	## Shrinks the pool by the pages reserve() added, the pages of another VM stay in use either way.
+	if not nr_added :
+		return
+	
+	nr_path = pool_path(sys_root, mem_plan["page_kb"], "nr")
+	sysfs.write_attr(nr_path, max(0, int(sysfs.read_attr(nr_path)) - nr_added))
+
+def backend_args(mem_plan, size_bytes) :
+	return ["-object", "memory-backend-file,id=ram,size=%dM,mem-path=%s,prealloc=on,share=off" % (size_bytes >> 20, mem_plan["mount"])]
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = Arg_List(sys.argv[1:])
+	page_pref = arg_list.value("-PAGE", "auto")
+	proc_root = arg_list.value("-PROC", "/proc")
+	sys_root  = arg_list.value("-SYSFS", "/sys")
+	pos_args  = arg_list.positional()
+	
+	if len(pos_args) != 1 :
+		print("Usage: python3 -m passthrough.hugepages <size> [-PAGE 2M|1G|auto] [-PROC dir] [-SYSFS dir]")
+		sys.exit(1)
+	
+	try :
+		size_bytes = mem_size(pos_args[0])
+		mem_plan   = plan(proc_root, sys_root, size_bytes, page_pref)
+	except (OSError, ValueError) as plan_err :
+		print("No hugepage plan: %s" % plan_err)
+		sys.exit(1)
+	
+	print("%d %s pages on %s, pool has %d, %d to reserve%s" % (mem_plan["pages"], page_name(mem_plan["page_kb"]), mem_plan["mount"],
+		mem_plan["pool_nr"], mem_plan["shortfall"], ", memory is fragmented and will be compacted first" if mem_plan["fragmented"] else ""))
+	print(" ".join(backend_args(mem_plan, size_bytes)))
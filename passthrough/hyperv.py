@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+## Picks the Hyper-V enlightenments for the Windows guest that both QEMU and KVM support.
+##
+## Usage: python3 -m passthrough.hyperv [-PROPS file] [-FEATURES list] [-QEMU binary]
+##
+##   -PROPS      query-cpu-model-expansion answer saved as JSON, instead of asking QEMU
+##   -FEATURES   features to pick from, without the hv- prefix (relaxed,vapic,...), the default set otherwise
+##   -QEMU       QEMU binary, qemu-system-x86_64 by default
+##
+## QEMU is started with -machine none,accel=kvm and asked over QMP to expand the host CPU model with
+## hv-passthrough=on, which turns on every enlightenment KVM has (QEMU 6.2 and newer). A feature is only picked
+## when the ones it depends on are picked too, stimer needs synic and time for example. An older QEMU expands
+## nothing, the guest gets the base set then, the one the profiles had before. The vendor ID and kvm=off stay
+## as the profile sets them, the Nvidia driver before 465 stops with code 43 when it finds KVM.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from passthrough import qmp
+from passthrough.cli import Arg_List
+
+props_file = "cpu-model-expansion-host.json"
+
+## In the order of the QEMU docs, with the features each one needs.
+hv_features = [
+	("relaxed",       []),
+	("vapic",         []),
+	("spinlocks",     []),
+	("vpindex",       []),
+	("runtime",       []),
+	("crash",         []),
+	("time",          []),
+	("synic",         ["vpindex"]),
+	("stimer",        ["synic", "time"]),
+	("stimer-direct", ["stimer"]),
+	("tlbflush",      ["vpindex"]),
+	("ipi",           ["vpindex"]),
+	("frequencies",   []),
+	("reset",         []),
+]
+
+base_features = ["relaxed", "vapic", "spinlocks", "time"]
+
+def probe(qemu_bin, sock_dir=None) :
+	
+	## The props of the host CPU model with every enlightenment KVM supports turned on.
+	sock_dir  = sock_dir or tempfile.gettempdir()
+	qmp_path  = os.path.join(sock_dir, "hv-probe-%d.qmp" % os.getpid())
+	qemu_proc = subprocess.Popen([qemu_bin, "-machine", "none,accel=kvm", "-nodefaults", "-display", "none", "-S",
+								"-qmp", "unix:%s,server=on,wait=off" % qmp_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	
+	try :
+		qmp_client = qmp.QMP_Client(qmp_path, 10, lambda : qemu_proc.poll() is None)
+		expansion  = qmp_client.execute("query-cpu-model-expansion", {"type" : "full", "model" : {"name" : "host", "props" : {"hv-passthrough" : True}}})
+		qmp_client.execute("quit")
+		qmp_client.close()
+	
+	finally :
+		if qemu_proc.poll() is None :
+			qemu_proc.kill()
+		
+		qemu_proc.wait()
+		
+		if os.path.exists(qmp_path) :
+			os.remove(qmp_path)
+	
+	return expansion["model"]["props"]
+
+def load_props(props_path) :
+	with open(props_path, 'r') as props_file :
+		return json.load(props_file)["model"]["props"]
+
+def supported(cpu_props) :
+	
+	## The features that are on, None when QEMU didn't expand them (all off).
+	hv_on = [feature for feature, feature_deps in hv_features if cpu_props.get("hv-" + feature) is True]
+	
+	if "hv-spinlocks" in cpu_props and hv_on :
+		hv_on.append("spinlocks")
+	
+	return hv_on or None
+
+def pick(hv_supported, hv_wanted=None) :
+	
+	## (picked, {feature : why not}) in the order of hv_features. hv_supported None means unknown, all of them.
+	hv_wanted = hv_wanted if hv_wanted is not None else [feature for feature, feature_deps in hv_features]
+	hv_picked = []
+	hv_left   = {}
+	
+	hv_unknown = [feature for feature in hv_wanted if feature not in dict(hv_features)]
+	
+	if hv_unknown :
+		raise ValueError("Unknown Hyper-V features: %s" % ", ".join(hv_unknown))
+	
+	for feature, feature_deps in hv_features :
+		if feature not in hv_wanted :
+			continue
+		
+		if hv_supported is not None and feature not in hv_supported :
+			hv_left[feature] = "not supported"
+		elif any(dep not in hv_picked for dep in feature_deps) :
+			hv_left[feature] = "needs %s" % ", ".join(dep for dep in feature_deps if dep not in hv_picked)
+		else :
+			hv_picked.append(feature)
+	
+	return hv_picked, hv_left
+
+def cpu_flags(hv_picked, spinlocks="0x1fff", vendor_id=None) :
+	hv_flags = ["hv-spinlocks=%s" % spinlocks if feature == "spinlocks" else "hv-" + feature for feature in hv_picked]
+	
+	if vendor_id is not None :
+		hv_flags.append("hv-vendor-id=%s" % vendor_id)
+	
+	return hv_flags
+
+def plan(hyperv, cpu_props) :
+	
+	## (flags, left, note) for the "hyperv" map of a profile. cpu_props None when QEMU couldn't be asked.
+	hv_wanted = hyperv.get("features", "auto")
+	hv_wanted = None if hv_wanted == "auto" else hv_wanted
+	hv_found  = supported(cpu_props) if cpu_props is not None else None
+	hv_note   = None
+	
+	if cpu_props is None :
+		hv_note = "not checked against KVM"
+	elif hv_found is None :
+		hv_found = base_features
+		hv_note  = "not found in QEMU (6.2 and newer expand hv-passthrough), the base set"
+	
+	hv_picked, hv_left = pick(hv_found, hv_wanted)
+	
+	return cpu_flags(hv_picked, hyperv.get("spinlocks", "0x1fff"), hyperv.get("vendor_id")), hv_left, hv_note
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list   = Arg_List(sys.argv[1:])
+	props_path = arg_list.value("-PROPS", None)
+	hv_wanted  = arg_list.value("-FEATURES", None)
+	qemu_bin   = arg_list.value("-QEMU", "qemu-system-x86_64")
+	
+	try :
+		cpu_props = load_props(props_path) if props_path is not None else probe(qemu_bin)
+		hv_flags, hv_left, hv_note = plan({"features" : hv_wanted.split(",") if hv_wanted else "auto"}, cpu_props)
+	
+	except (OSError, ValueError, KeyError, qmp.QMP_Error) as probe_err :
+		print("No Hyper-V features: %s" % probe_err)
+		sys.exit(1)
+	
+	print(",".join(hv_flags))
+	
+	for feature, why_not in hv_left.items() :
+		print("  hv-%-14s %s" % (feature, why_not))
+	
+	if hv_note is not None :
+		print("  %s" % hv_note)
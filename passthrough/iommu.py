@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+## Lists the IOMMU groups and their devices from sysfs, without running lspci for every device.
+##
+## Usage: python3 -m passthrough.iommu [-JSON] [-PASSTHROUGH-CHECK bdf] [-IDS pci.ids] [-SYSFS dir]
+##
+##   -JSON               print JSON instead of the lines of list-iommu-groups.sh
+##   -PASSTHROUGH-CHECK  report whether the whole IOMMU group of a device can be given to vfio-pci
+##   -IDS                pci.ids file for the vendor, device and class names, the one of hwdata by default
+##   -SYSFS              root of the sysfs tree, /sys by default
+##
+## IDs, class, revision, driver and reset method are read from /sys/bus/pci/devices, and the names come from one
+## pass over pci.ids, so a host with hundreds of devices is listed in one process. The text output has the
+## "IOMMU Group n" prefix followed by what lspci -nns prints for the device.
+
+import json
+import os
+import sys
+
+from passthrough import sysfs
+from passthrough.cli import Arg_List
+
+ids_paths = ["/usr/share/hwdata/pci.ids", "/usr/share/misc/pci.ids", "/usr/share/pci.ids"]
+ids_cache = {} # path : ((mtime_ns, size), index)
+
+## Drivers that don't keep a group from being assigned: vfio-pci and pci-stub claim the device, and bridges stay
+## with the host on pcieport.
+vfio_drivers   = ["vfio-pci", "pci-stub"]
+bridge_drivers = ["pcieport", "shpchp"]
+
+def pci_ids_index(ids_path) :
+	
+	## Vendor, device, class and subclass names by ID, parsed once per pci.ids version.
+	ids_stat = os.stat(ids_path)
+	ids_key  = (ids_stat.st_mtime_ns, ids_stat.st_size)
+	
+	if ids_path in ids_cache and ids_cache[ids_path][0] == ids_key :
+		return ids_cache[ids_path][1]
+	
+	ids_index = {"vendors" : {}, "devices" : {}, "classes" : {}, "subclasses" : {}}
+	vendor_id = None
+	class_id  = None
+	
+	with open(ids_path, 'r', encoding='utf-8', errors='replace') as ids_file :
+		for ids_line in ids_file :
+			if not ids_line.strip() or ids_line[0] == "#" :
+				continue
+			
+			if ids_line[0] != "\t" :
+				if ids_line.startswith("C ") :
+					vendor_id = None
+					class_id  = ids_line[2:4].lower()
+					ids_index["classes"][class_id] = ids_line[4:].strip()
+				else :
+					class_id  = None
+					vendor_id = ids_line[:4].lower()
+					ids_index["vendors"][vendor_id] = ids_line[4:].strip()
+			
+			elif ids_line[1] != "\t" :
+				if vendor_id is not None :
+					ids_index["devices"][(vendor_id, ids_line[1:5].lower())] = ids_line[5:].strip()
+				elif class_id is not None :
+					ids_index["subclasses"][(class_id, ids_line[1:3].lower())] = ids_line[3:].strip()
+	
+	ids_cache[ids_path] = (ids_key, ids_index)
+	
+	return ids_index
+
+def pci_device(sys_root, bdf) :
+	dev_dir  = sysfs.pci_dev_dir(sys_root, bdf)
+	dev_info = sysfs.pci_ids(sys_root, bdf)
+	drv_link = os.path.join(dev_dir, "driver")
+	
+	dev_info["bdf"]          = sysfs.pci_bdf(bdf)
+	dev_info["class"]        = "%06x" % int(sysfs.read_attr(os.path.join(dev_dir, "class")), 16)
+	dev_info["revision"]     = "%02x" % int(sysfs.read_attr(os.path.join(dev_dir, "revision"), "0"), 16)
+	dev_info["driver"]       = os.path.basename(os.readlink(drv_link)) if os.path.islink(drv_link) else None
+	dev_info["reset_method"] = sysfs.read_attr(os.path.join(dev_dir, "reset_method"), "").split() \
+								if os.path.exists(os.path.join(dev_dir, "reset_method")) else None
+	
+	return dev_info
+
+def iommu_groups(sys_root) :
+	
+	## {group : [bdf, ...]}, in group and address order.
+	groups_dir = os.path.join(sys_root, "kernel", "iommu_groups")
+	group_devs = {}
+	
+	for group_name in sorted(os.listdir(groups_dir), key=int) :
+		group_devs[int(group_name)] = sorted(os.listdir(os.path.join(groups_dir, group_name, "devices")))
+	
+	return group_devs
+
+def device_group(sys_root, bdf) :
+	group_link = os.path.join(sysfs.pci_dev_dir(sys_root, bdf), "iommu_group")
+	
+	if not os.path.islink(group_link) :
+		raise ValueError("%s has no IOMMU group, is the IOMMU on?" % bdf)
+	
+	return int(os.path.basename(os.readlink(group_link)))
+
+def add_names(dev_info, ids_index) :
+	
+	## The names lspci would print, with its fallbacks for IDs missing in pci.ids.
+	class_id, subclass_id = dev_info["class"][:2], dev_info["class"][2:4]
+	
+	dev_info["vendor_name"] = ids_index["vendors"].get(dev_info["vendor"], "Vendor %s" % dev_info["vendor"])
+	dev_info["device_name"] = ids_index["devices"].get((dev_info["vendor"], dev_info["device"]), "Device %s" % dev_info["device"])
+	dev_info["class_name"]  = ids_index["subclasses"].get((class_id, subclass_id), ids_index["classes"].get(class_id, "Class %s%s" % (class_id, subclass_id)))
+	
+	return dev_info
+
+def lspci_line(dev_info) :
+	
+	## lspci -nns, the domain is left out when it is 0000 like lspci does.
+	bdf = dev_info["bdf"][5:] if dev_info["bdf"].startswith("0000:") else dev_info["bdf"]
+	rev = " (rev %s)" % dev_info["revision"] if dev_info["revision"] != "00" else ""
+	
+	return "%s %s [%s]: %s %s [%s:%s]%s" % (bdf, dev_info["class_name"], dev_info["class"][:4], dev_info["vendor_name"],
+		dev_info["device_name"], dev_info["vendor"], dev_info["device"], rev)
+
+def passthrough_check(sys_root, bdf) :
+	
+	## Every device of the group with what has to happen to it, and whether the group can be assigned as it is.
+	group_nr    = device_group(sys_root, bdf)
+	group_devs  = [pci_device(sys_root, group_bdf) for group_bdf in iommu_groups(sys_root)[group_nr]]
+	group_ready = True
+	
+	for dev_info in group_devs :
+		if dev_info["class"][:4] == "0604" and dev_info["driver"] in bridge_drivers + [None] :
+			dev_info["action"] = "bridge, stays with the host"
+		elif dev_info["driver"] in vfio_drivers :
+			dev_info["action"] = "bound to %s" % dev_info["driver"]
+		elif dev_info["driver"] is None :
+			dev_info["action"] = "no driver, can be bound"
+		else :
+			dev_info["action"] = "unbind from %s first" % dev_info["driver"]
+			group_ready        = False
+		
+		if dev_info["reset_method"] == [] :
+			dev_info["action"] += ", no reset method"
+	
+	return {"group" : group_nr, "ready" : group_ready, "devices" : group_devs}
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = Arg_List(sys.argv[1:])
+	json_out  = arg_list.flag("-JSON")
+	check_bdf = arg_list.value("-PASSTHROUGH-CHECK", None)
+	sys_root  = arg_list.value("-SYSFS", "/sys")
+	ids_path  = arg_list.value("-IDS", None) or next((ids_path for ids_path in ids_paths if os.path.isfile(ids_path)), None)
+	ids_index = pci_ids_index(ids_path) if ids_path is not None else {"vendors" : {}, "devices" : {}, "classes" : {}, "subclasses" : {}}
+	
+	try :
+		if check_bdf is not None :
+			group_check = passthrough_check(sys_root, check_bdf)
+			
+			for dev_info in group_check["devices"] :
+				add_names(dev_info, ids_index)
+			
+			if json_out :
+				print(json.dumps(group_check, indent=2))
+			else :
+				for dev_info in group_check["devices"] :
+					print("IOMMU Group %d %s\n    %s" % (group_check["group"], lspci_line(dev_info), dev_info["action"]))
+				
+				print("\nIOMMU Group %d %s" % (group_check["group"], "can be passed through" if group_check["ready"] else "is not ready for vfio-pci"))
+			
+			sys.exit(0 if group_check["ready"] else 1)
+		
+		group_devs = iommu_groups(sys_root)
+		dev_list   = [dict(add_names(pci_device(sys_root, bdf), ids_index), group=group_nr) for group_nr, bdf_list in group_devs.items() for bdf in bdf_list]
+	
+	except (OSError, ValueError) as iommu_err :
+		print("IOMMU groups: %s" % iommu_err)
+		sys.exit(2)
+	
+	if json_out :
+		print(json.dumps(dev_list, indent=2))
+	else :
+		for dev_info in dev_list :
+			print("IOMMU Group %d %s" % (dev_info["group"], lspci_line(dev_info)))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+## Steers the vfio interrupts of a passed through device to the CPUs of its VM.
+##
+## Usage: python3 -m passthrough.irq <bdf> [-CPUS list] [-PROC dir] [-SYSFS dir]
+##
+##   <bdf>       PCI address of the device, the other functions of its IOMMU group are included
+##   -CPUS       set the affinity of the vfio IRQs to these CPUs, they are only listed otherwise
+##   -PROC       root of the procfs tree, /proc by default
+##   -SYSFS      root of the sysfs tree, /sys by default
+##
+## The vfio-msi, vfio-msix and vfio-intx lines of /proc/interrupts name the device. Their IRQs only exist once
+## the guest driver enabled the interrupts, so the launcher looks for new ones every few seconds while QEMU runs.
+## It writes /proc/irq/<n>/smp_affinity_list, and writes the old lists back when QEMU exits.
+
+import os
+import re
+import sys
+
+from passthrough import iommu
+from passthrough import sysfs
+from passthrough import topology
+from passthrough.cli import Arg_List
+
+vfio_irq_pat = re.compile(r'(vfio-(?:msix?|intx)(?:\[\d+\])?)\(([0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7])\)')
+
+def vfio_irqs(proc_root, bdf_list) :
+	
+	## {irq : "vfio-msi[0](0000:01:00.0)"} of the devices.
+	irq_names = {}
+	
+	for irq_line in sysfs.read_attr(os.path.join(proc_root, "interrupts")).splitlines()[1:] :
+		irq_nr, irq_info = irq_line.split(":", 1)
+		irq_match        = vfio_irq_pat.search(irq_info)
+		
+		if irq_nr.strip().isdigit() and irq_match is not None and irq_match.group(2) in bdf_list :
+			irq_names[int(irq_nr)] = irq_match.group(0)
+	
+	return irq_names
+
+def group_bdfs(sys_root, bdf) :
+	
+	## The functions of the IOMMU group, the device alone when sysfs has no groups.
+	try :
+		return iommu.iommu_groups(sys_root)[iommu.device_group(sys_root, bdf)]
+	except (OSError, ValueError) :
+		return [sysfs.pci_bdf(bdf)]
+
+def affinity_path(proc_root, irq_nr) :
+	return os.path.join(proc_root, "irq", str(irq_nr), "smp_affinity_list")
+
+class IRQ_Steering :
+	
+	def __init__(self, proc_root, bdf_list, cpus) :
+		self.proc_root = proc_root
+		self.bdf_list  = bdf_list
+		self.cpus      = cpus
+		self.saved     = {} # irq : affinity list before
+		self.failed    = {} # irq : error
+	
+	def update(self) :
+		
+		## Steers the IRQs that appeared, or lost their affinity, since the last call. Returns [(irq, name, affinity
+		## before)].
+		irq_new = []
+		
+		for irq_nr, irq_name in sorted(vfio_irqs(self.proc_root, self.bdf_list).items()) :
+			if irq_nr in self.failed :
+				continue
+			
+			try :
+				## A guest reboot frees the IRQs and requests them again, with the default affinity.
+				old_affinity = sysfs.read_attr(affinity_path(self.proc_root, irq_nr))
+				
+				if irq_nr in self.saved and topology.cpu_list(old_affinity) == sorted(self.cpus) :
+					continue
+				
+				sysfs.write_attr(affinity_path(self.proc_root, irq_nr), topology.cpu_list_str(self.cpus))
+				self.saved.setdefault(irq_nr, old_affinity)
+				irq_new.append((irq_nr, irq_name, old_affinity))
+			
+			except OSError as irq_err :
+				## Interrupts the kernel manages itself refuse with EIO, they are left alone.
+				self.failed[irq_nr] = irq_err
+		
+		return irq_new
+	
+	def restore(self) :
+		
+		## The IRQs of vfio are freed when QEMU exits, the ones that are gone have nothing to restore.
+		for irq_nr, old_affinity in sorted(self.saved.items()) :
+			try :
+				sysfs.write_attr(affinity_path(self.proc_root, irq_nr), old_affinity)
+			except OSError :
+				pass
+		
+		restored   = dict(self.saved)
+		self.saved = {}
+		
+		return restored
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = Arg_List(sys.argv[1:])
+	irq_cpus  = arg_list.value("-CPUS", None)
+	proc_root = arg_list.value("-PROC", "/proc")
+	sys_root  = arg_list.value("-SYSFS", "/sys")
+	pos_args  = arg_list.positional()
+	
+	if len(pos_args) != 1 :
+		print("Usage: python3 -m passthrough.irq <bdf> [-CPUS list] [-PROC dir] [-SYSFS dir]")
+		sys.exit(1)
+	
+	try :
+		bdf_list = group_bdfs(sys_root, pos_args[0])
+		
+		if irq_cpus is not None :
+			irq_steer = IRQ_Steering(proc_root, bdf_list, topology.cpu_list(irq_cpus))
+			
+			for irq_nr, irq_name, old_affinity in irq_steer.update() :
+				print("  IRQ %-5d %-30s CPUs %s (was %s)" % (irq_nr, irq_name, irq_cpus, old_affinity))
+			
+			for irq_nr, irq_err in sorted(irq_steer.failed.items()) :
+				print("  IRQ %-5d not steered: %s" % (irq_nr, irq_err))
+		else :
+			for irq_nr, irq_name in sorted(vfio_irqs(proc_root, bdf_list).items()) :
+				print("  IRQ %-5d %-30s CPUs %s" % (irq_nr, irq_name, sysfs.read_attr(affinity_path(proc_root, irq_nr), "?")))
+	
+	except (OSError, ValueError) as irq_err :
+		print("No vfio IRQs: %s" % irq_err)
+		sys.exit(1)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+
+## Builds an ISO 9660 image with Joliet names from a folder, only when the files in it changed.
+##
+## Usage: python3 -m passthrough.isoimage <folder> <iso> [-LABEL name] [-MANIFEST file] [-FORCE] [-CHECK]
+##
+##   <folder>    files to put on the image, drivers/windows for the driver CD of the Windows guest
+##   <iso>       image to write, resources/win-drivers.iso
+##   -LABEL      volume label, the name of the folder by default
+##   -MANIFEST   file hashes of the last build, <iso>.json by default
+##   -FORCE      build even when nothing changed
+##   -CHECK      only say whether the image is up to date
+##
+## The manifest has the size, mtime and SHA-256 of every file of the last build. A file whose size and mtime
+## didn't change keeps its hash, the others are hashed again, and the image is only rebuilt when a name, a size
+## or a hash is different. The files are read straight into the image, there is no staging copy, and hashed
+## on the way. The image is written next to the old one and renamed, a running VM keeps the old one.
+##
+## The output only depends on the names and contents of the files and the label: the entries are sorted, every
+## date is SOURCE_DATE_EPOCH (1970-01-01 without it) and nothing else of the host ends up in the image. The same
+## driver set gives the same bytes, whichever host built it. Windows reads the Joliet names (up to 103
+## characters, like mkisofs -joliet-long), the ISO 9660 ones are uppercase level 2 names with ;1.
+
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+
+from passthrough import nvram
+from passthrough.cli import Arg_List
+
+## Bumped when the layout changes, the next build doesn't take the old image as up to date.
+iso_format  = 1
+sector_size = 2048
+copy_size   = 1 << 20
+joliet_max  = 103
+hierarchies = ["iso", "joliet"]
+app_id      = "PASSTHROUGH ISOIMAGE"
+
+def both16(value) :
+	return struct.pack("<H", value) + struct.pack(">H", value)
+
+def both32(value) :
+	return struct.pack("<I", value) + struct.pack(">I", value)
+
+def sectors(size) :
+	return (size + sector_size - 1) // sector_size
+
+def iso_name(name, is_dir, suffix="") :
+	
+	## A-Z, 0-9 and _, 31 characters for a folder, 30 with the dot and ;1 after it for a file.
+	name = re.sub(r'[^A-Z0-9_.]', "_", name.upper())
+	
+	if is_dir :
+		return (name.replace(".", "_")[:31 - len(suffix)] + suffix).encode("ascii")
+	
+	file_base, file_dot, file_ext = name.rpartition(".")
+	
+	if not file_dot :
+		file_base, file_ext = file_ext, ""
+	
+	file_ext  = file_ext[:8]
+	file_base = file_base.replace(".", "_")[:29 - len(file_ext) - len(suffix)] + suffix
+	
+	return ("%s.%s;1" % (file_base, file_ext)).encode("ascii")
+
+def joliet_name(name, is_dir, suffix="") :
+	
+	## UCS-2 big endian without * / : ; ? \, a name too long for Windows is an error and not cut.
+	name = re.sub(r'[*/:;?\\]', "_", name)
+	
+	if len(name) > joliet_max :
+		raise ValueError("%s is longer than the %d characters of a Joliet name" % (name, joliet_max))
+	
+	if suffix :
+		file_base, file_dot, file_ext = name.rpartition(".")
+		name = file_base + suffix + file_dot + file_ext if file_dot and not is_dir else name + suffix
+	
+	return name.encode("utf-16-be")
+
+name_funcs = {"iso" : iso_name, "joliet" : joliet_name}
+
+def scan_tree(src_dir) :
+	
+	## {name, rel, dirs, files} of src_dir, files as {name, rel, path, size, mtime_ns}, all sorted by name. Hidden
+	## files (.gitkeep) are left out.
+	dir_node = {"name" : "", "rel" : "", "dirs" : [], "files" : []}
+	dir_list = [(src_dir, dir_node)]
+	
+	while dir_list :
+		dir_path, dir_node_now = dir_list.pop(0)
+		
+		for entry in sorted(os.scandir(dir_path), key=lambda entry : entry.name) :
+			if entry.name.startswith(".") :
+				continue
+			
+			entry_rel = os.path.join(dir_node_now["rel"], entry.name)
+			
+			if entry.is_dir() :
+				sub_node = {"name" : entry.name, "rel" : entry_rel, "dirs" : [], "files" : []}
+				dir_node_now["dirs"].append(sub_node)
+				dir_list.append((entry.path, sub_node))
+			
+			elif entry.is_file() :
+				entry_stat = entry.stat()
+				
+				if entry_stat.st_size >= 1 << 32 :
+					raise ValueError("%s is too large for ISO 9660, 4G at most" % entry_rel)
+				
+				dir_node_now["files"].append({"name" : entry.name, "rel" : entry_rel, "path" : entry.path, "size" : entry_stat.st_size,
+											"mtime_ns" : entry_stat.st_mtime_ns})
+	
+	return dir_node
+
+def walk_dirs(dir_node) :
+	yield dir_node
+	
+	for sub_node in dir_node["dirs"] :
+		yield from walk_dirs(sub_node)
+
+def all_files(root_node) :
+	return sorted((file_info for dir_node in walk_dirs(root_node) for file_info in dir_node["files"]), key=lambda file_info : file_info["rel"])
+
+def name_entries(dir_node) :
+	
+	## Gives every entry of the folder its two names, a name taken by an entry before gets _1, _2...
+	for hier in hierarchies :
+		taken = set()
+		
+		for entry, is_dir in [(sub_node, True) for sub_node in dir_node["dirs"]] + [(file_info, False) for file_info in dir_node["files"]] :
+			entry_ident = name_funcs[hier](entry["name"], is_dir)
+			entry_nr    = 0
+			
+			while entry_ident in taken :
+				entry_nr   += 1
+				entry_ident = name_funcs[hier](entry["name"], is_dir, "_%d" % entry_nr)
+			
+			taken.add(entry_ident)
+			entry.setdefault("ident", {})[hier] = entry_ident
+
+def dir_order(root_node, hier) :
+	
+	## The folders as in the path table: by level, then by the number of the parent, then by name.
+	dir_list = [root_node]
+	root_node.setdefault("parent", {})[hier] = root_node
+	
+	for dir_node in dir_list :
+		for sub_node in sorted(dir_node["dirs"], key=lambda sub_node : sub_node["ident"][hier]) :
+			sub_node.setdefault("parent", {})[hier] = dir_node
+			dir_list.append(sub_node)
+	
+	for dir_nr, dir_node in enumerate(dir_list, 1) :
+		dir_node.setdefault("number", {})[hier] = dir_nr
+	
+	return dir_list
+
+def rec_date(epoch) :
+	date_tm = time.gmtime(epoch)
+	
+	return bytes([date_tm.tm_year - 1900, date_tm.tm_mon, date_tm.tm_mday, date_tm.tm_hour, date_tm.tm_min, date_tm.tm_sec, 0])
+
+def vol_date(epoch) :
+	return time.strftime("%Y%m%d%H%M%S", time.gmtime(epoch)).encode("ascii") + b"00\x00"
+
+def dir_record(ident, extent, size, is_dir, epoch) :
+	rec_len = 33 + len(ident) + (1 - len(ident) % 2)
+	
+	return (bytes([rec_len, 0]) + both32(extent) + both32(size) + rec_date(epoch) + bytes([2 if is_dir else 0, 0, 0]) + both16(1) +
+			bytes([len(ident)]) + ident + bytes(1 - len(ident) % 2))
+
+def dir_records(dir_node, hier, epoch) :
+	
+	## ".", ".." and the entries sorted by name, with the extents known so far (0 before the layout).
+	parent_node = dir_node["parent"][hier]
+	dir_recs    = [dir_record(b"\x00", dir_node.get("extent", {}).get(hier, 0), dir_node.get("size", {}).get(hier, 0), True, epoch),
+				dir_record(b"\x01", parent_node.get("extent", {}).get(hier, 0), parent_node.get("size", {}).get(hier, 0), True, epoch)]
+	
+	entries = [(sub_node["ident"][hier], sub_node.get("extent", {}).get(hier, 0), sub_node.get("size", {}).get(hier, 0), True) for sub_node in dir_node["dirs"]]
+	entries += [(file_info["ident"][hier], file_info.get("extent", 0), file_info["size"], False) for file_info in dir_node["files"]]
+	
+	return dir_recs + [dir_record(ident, extent, size, is_dir, epoch) for ident, extent, size, is_dir in sorted(entries)]
+
+def dir_bytes(dir_recs) :
+	
+	## A record never crosses a sector, the rest of the sector is left zero.
+	dir_data = bytearray()
+	
+	for dir_rec in dir_recs :
+		if len(dir_data) % sector_size + len(dir_rec) > sector_size :
+			dir_data += bytes(sector_size - len(dir_data) % sector_size)
+		
+		dir_data += dir_rec
+	
+	return bytes(dir_data) + bytes(-len(dir_data) % sector_size)
+
+def path_table(dir_list, hier, big_endian) :
+	pt_fmt  = ">IH" if big_endian else "<IH"
+	pt_data = bytearray()
+	
+	for dir_node in dir_list :
+		ident = dir_node["ident"][hier] if dir_node["rel"] else b"\x00"
+		pt_data += bytes([len(ident), 0]) + struct.pack(pt_fmt, dir_node.get("extent", {}).get(hier, 0), dir_node["parent"][hier]["number"][hier])
+		pt_data += ident + bytes(len(ident) % 2)
+	
+	return bytes(pt_data)
+
+def text_field(text, field_size, joliet) :
+	if joliet :
+		return (text + " " * field_size).encode("utf-16-be")[:field_size]
+	
+	return text.upper().ljust(field_size)[:field_size].encode("ascii")
+
+def vol_descriptor(hier, label, vol_sectors, pt_size, pt_l, pt_m, root_rec, epoch) :
+	joliet   = hier == "joliet"
+	vol_desc = bytearray(sector_size)
+	
+	vol_desc[0:7]     = bytes([2 if joliet else 1]) + b"CD001\x01"
+	vol_desc[8:40]    = text_field("", 32, joliet)
+	vol_desc[40:72]   = text_field(label if joliet else re.sub(r'[^A-Z0-9_]', "_", label.upper()), 32, joliet)
+	vol_desc[80:88]   = both32(vol_sectors)
+	vol_desc[88:91]   = b"%/E" if joliet else bytes(3)
+	vol_desc[120:132] = both16(1) + both16(1) + both16(sector_size)
+	vol_desc[132:140] = both32(pt_size)
+	vol_desc[140:144] = struct.pack("<I", pt_l)
+	vol_desc[148:152] = struct.pack(">I", pt_m)
+	vol_desc[156:190] = root_rec
+	vol_desc[190:574] = text_field("", 384, joliet)
+	vol_desc[574:702] = text_field(app_id, 128, joliet)
+	vol_desc[702:813] = text_field("", 111, joliet)
+	vol_desc[813:881] = vol_date(epoch) * 2 + b"0" * 16 + b"\x00" + b"0" * 16 + b"\x00"
+	vol_desc[881]     = 1
+	
+	return bytes(vol_desc)
+
+def layout(root_node, epoch) :
+	
+	## Extents of the path tables, folders and files. Returns ({hier : [folders]}, {hier : (size, L, M)}, sectors).
+	dir_lists = {}
+	pt_info   = {}
+	next_free = 16 + len(hierarchies) + 1
+	
+	for dir_node in walk_dirs(root_node) :
+		name_entries(dir_node)
+	
+	for hier in hierarchies :
+		dir_lists[hier] = dir_order(root_node, hier)
+		pt_size         = len(path_table(dir_lists[hier], hier, False))
+		pt_info[hier]   = (pt_size, next_free, next_free + sectors(pt_size))
+		next_free      += 2 * sectors(pt_size)
+	
+	## The sizes of the records don't depend on the extents, the folders can be placed before they are known.
+	for hier in hierarchies :
+		for dir_node in dir_lists[hier] :
+			dir_node.setdefault("size", {})[hier] = len(dir_bytes(dir_records(dir_node, hier, epoch)))
+		
+		for dir_node in dir_lists[hier] :
+			dir_node.setdefault("extent", {})[hier] = next_free
+			next_free += sectors(dir_node["size"][hier])
+	
+	for file_info in all_files(root_node) :
+		file_info["extent"] = next_free if file_info["size"] else 0
+		next_free += sectors(file_info["size"])
+	
+	return dir_lists, pt_info, next_free
+
+class Hashed_Writer :
+	
+	## Writes to the image file and hashes what was written, the hash of the image costs no second read.
+	def __init__(self, iso_file) :
+		self.iso_file = iso_file
+		self.iso_sha  = hashlib.sha256()
+		self.written  = 0
+	
+	def write(self, data) :
+		self.iso_file.write(data)
+		self.iso_sha.update(data)
+		self.written += len(data)
+
+def write_image(root_node, iso_file, label, epoch) :
+	
+	## Streams the image into iso_file. Returns its SHA-256, and the SHA-256 of every file in file_info["sha256"].
+	dir_lists, pt_info, vol_sectors = layout(root_node, epoch)
+	iso_out = Hashed_Writer(iso_file)
+	
+	iso_out.write(bytes(16 * sector_size))
+	
+	for hier in hierarchies :
+		pt_size, pt_l, pt_m = pt_info[hier]
+		iso_out.write(vol_descriptor(hier, label, vol_sectors, pt_size, pt_l, pt_m, dir_records(root_node, hier, epoch)[0], epoch))
+	
+	iso_out.write(b"\xffCD001\x01" + bytes(sector_size - 7))
+	
+	for hier in hierarchies :
+		for big_endian in [False, True] :
+			pt_data = path_table(dir_lists[hier], hier, big_endian)
+			iso_out.write(pt_data + bytes(-len(pt_data) % sector_size))
+	
+	for hier in hierarchies :
+		for dir_node in dir_lists[hier] :
+			iso_out.write(dir_bytes(dir_records(dir_node, hier, epoch)))
+	
+	for file_info in all_files(root_node) :
+		file_sha  = hashlib.sha256()
+		file_read = 0
+		
+		with open(file_info["path"], 'rb') as src_file :
+			for file_block in iter(lambda : src_file.read(copy_size), b"") :
+				file_sha.update(file_block)
+				file_read += len(file_block)
+				iso_out.write(file_block)
+		
+		if file_read != file_info["size"] :
+			raise ValueError("%s changed while the image was built" % file_info["rel"])
+		
+		file_info["sha256"] = file_sha.hexdigest()
+		iso_out.write(bytes(-file_read % sector_size))
+	
+	if iso_out.written != vol_sectors * sector_size :
+		raise ValueError("Image is %d bytes, the layout has %d" % (iso_out.written, vol_sectors * sector_size))
+	
+	return iso_out.iso_sha.hexdigest()
+
+def load_manifest(manifest_path) :
+	try :
+		with open(manifest_path, 'r') as manifest_file :
+			return json.load(manifest_file)
+	except (OSError, ValueError) :
+		return {}
+
+def up_to_date(root_node, iso_path, label, epoch, manifest) :
+	
+	## Whether the image of the manifest is still there and has these files. Only the files whose size or mtime
+	## changed are read.
+	old_files = manifest.get("files", {})
+	iso_info  = manifest.get("iso", {})
+	file_list = all_files(root_node)
+	
+	if [manifest.get("format"), manifest.get("label"), manifest.get("epoch")] != [iso_format, label, epoch] :
+		return False
+	
+	try :
+		iso_stat = os.stat(iso_path)
+	except OSError :
+		return False
+	
+	if [iso_stat.st_size, iso_stat.st_mtime_ns] != [iso_info.get("size"), iso_info.get("mtime_ns")] :
+		return False
+	
+	if sorted(old_files) != [file_info["rel"] for file_info in file_list] :
+		return False
+	
+	for file_info in file_list :
+		old_size, old_mtime, old_sha = old_files[file_info["rel"]]
+		
+		if old_size != file_info["size"] :
+			return False
+		
+		file_info["sha256"] = old_sha if old_mtime == file_info["mtime_ns"] else nvram.file_hash(file_info["path"])
+		
+		if file_info["sha256"] != old_sha :
+			return False
+	
+	return True
+
+def write_manifest(manifest_path, label, epoch, iso_info, file_list) :
+	manifest = {"format" : iso_format, "label" : label, "epoch" : epoch, "iso" : iso_info,
+				"files" : {file_info["rel"] : [file_info["size"], file_info["mtime_ns"], file_info["sha256"]] for file_info in file_list}}
+	
+	with open(manifest_path, 'w') as manifest_file :
+		json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+		manifest_file.write("\n")
+
+def build(src_dir, iso_path, label=None, manifest_path=None, force=False, check_only=False) :
+	
+	## ("unchanged", "outdated" or "built", {files, size, sha256}). check_only never writes.
+	label         = label or os.path.basename(os.path.normpath(src_dir))
+	manifest_path = manifest_path or iso_path + ".json"
+	epoch         = int(os.environ.get("SOURCE_DATE_EPOCH", "0"))
+	root_node     = scan_tree(src_dir)
+	manifest      = load_manifest(manifest_path)
+	file_list     = all_files(root_node)
+	
+	if not force and up_to_date(root_node, iso_path, label, epoch, manifest) :
+		
+		## Touched files that kept their contents aren't hashed again next time.
+		if any(manifest["files"][file_info["rel"]][1] != file_info["mtime_ns"] for file_info in file_list) and not check_only :
+			write_manifest(manifest_path, label, epoch, manifest["iso"], file_list)
+		
+		return "unchanged", {"files" : len(file_list), "size" : manifest["iso"]["size"], "sha256" : manifest["iso"]["sha256"]}
+	
+	if check_only :
+		return "outdated", {"files" : len(file_list), "size" : None, "sha256" : None}
+	
+	iso_dir = os.path.dirname(os.path.abspath(iso_path))
+	os.makedirs(iso_dir, exist_ok=True)
+	
+	with tempfile.NamedTemporaryFile(dir=iso_dir, delete=False) as iso_file :
+		try :
+			iso_sha = write_image(root_node, iso_file, label, epoch)
+		except BaseException :
+			os.remove(iso_file.name)
+			raise
+	
+	os.chmod(iso_file.name, 0o644)
+	os.replace(iso_file.name, iso_path)
+	iso_stat = os.stat(iso_path)
+	
+	write_manifest(manifest_path, label, epoch, {"size" : iso_stat.st_size, "mtime_ns" : iso_stat.st_mtime_ns, "sha256" : iso_sha}, file_list)
+	
+	return "built", {"files" : len(file_list), "size" : iso_stat.st_size, "sha256" : iso_sha}
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list      = Arg_List(sys.argv[1:])
+	label         = arg_list.value("-LABEL", None)
+	manifest_path = arg_list.value("-MANIFEST", None)
+	force         = arg_list.flag("-FORCE")
+	check_only    = arg_list.flag("-CHECK")
+	pos_args      = arg_list.positional()
+	
+	if len(pos_args) != 2 :
+		print("Usage: python3 -m passthrough.isoimage <folder> <iso> [-LABEL name] [-MANIFEST file] [-FORCE] [-CHECK]")
+		sys.exit(1)
+	
+	try :
+		build_how, iso_info = build(pos_args[0], pos_args[1], label, manifest_path, force, check_only)
+	except (OSError, ValueError) as iso_err :
+		print("No image of %s: %s" % (pos_args[0], iso_err))
+		sys.exit(1)
+	
+	if build_how == "outdated" :
+		print("%s is out of date with %s" % (pos_args[1], pos_args[0]))
+		sys.exit(2)
+	
+	print("%s %s, %d files, %d bytes, sha256 %s" % (pos_args[1], build_how, iso_info["files"], iso_info["size"], iso_info["sha256"]))
@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+
+## Builds the QEMU command line of a VM from a profile and starts it.
+##
+## Usage: python3 -m passthrough.launcher <profile> [mode] [-DRY-RUN] [-OVERSUBSCRIBE] [-SYSFS dir] [-PROC dir] [-STATE dir]
+##                                        [-QEMU binary] [-QEMU-HELP dir] [-BOOT-LOG file]
+##
+##   <profile>   VM profile, profiles/windows.json for example (JSON, or TOML with Python 3.11+)
+##   mode        one of the modes of the profile, test or install for the Windows guest
+##   -DRY-RUN    print the command instead of running it, neither KVM nor the GPU are needed
+##   -OVERSUBSCRIBE  allow cores of the host or of another running VM, when there are not enough free ones
+##   -SYSFS      root of the sysfs tree for the CPU topology and the GPU, /sys by default
+##   -PROC       root of the procfs tree for the QEMU threads, /proc by default
+##   -STATE      folder of the QMP sockets and the core allocations, $XDG_RUNTIME_DIR/passthrough by default
+##   -QEMU       QEMU binary, qemu-system-x86_64 by default
+##   -QEMU-HELP  check the generated devices and Hyper-V features against QEMU output saved in this folder, not the binary
+##   -BOOT-LOG   launch log the boot times are added to, resources/boot-times.jsonl by default
+##
+## Profile keys, paths are relative to the folder the launcher runs in and can use $HOME:
+##
+##   name        VM name
+##   machine     -machine, type=q35,accel=kvm by default
+##   cpu         -cpu
+##   hyperv      {"features" : "auto" or list, "spinlocks" : "0x1fff", "vendor_id" : id}, Hyper-V flags added to cpu
+##   vcpus       number of vCPUs, -smp sockets/cores/threads follow the SMT siblings of the host
+##   host_cores  host cores for the vCPUs (core n is core_id n on a single package host), free ones by default
+##   housekeeping  host cores for the other QEMU threads, the first core (kept for the host) by default
+##   oversubscribe  same as -OVERSUBSCRIBE
+##   pin_threads   pin every vCPU thread to its own host CPU once QEMU is up, true by default
+##   irq_affinity  CPUs of the vfio interrupts of the GPU, "vcpus" (by default) or "housekeeping", false to leave them
+##   governor    scaling_governor of the vCPU CPUs while QEMU runs, "performance" by default, false to leave it
+##   cpuidle_latency  turn off the cpuidle states of the vCPU CPUs with a longer exit latency (µs) while QEMU runs
+##   memory      -m
+##   hugepages   back the memory with hugepages, "2M", "1G" or "auto" (ordinary memory when there are none)
+##   rtc         -rtc
+##   ovmf        {"code" : OVMF_CODE.fd, "vars" : OVMF_VARS.fd template, "copies" : folder, "seed" : old vars file},
+##               the two pflash drives, the first copy of the vars is made from the seed when it exists
+##   nvram       "fresh" for a new copy of the vars template on every run, the VM keeps its copy by default
+##   drives      list of -drive option maps, "if" : "virtio" ones get an iothread (see below)
+##   cdroms      list of images, attached from index 1, or {"file" : image, "source" : folder, "label" : name} for an
+##               image passthrough.isoimage builds from the folder when its files changed (left out when it is empty)
+##   display     raw display arguments
+##   gpu         {"host" : bdf, "root_port" : -device of the port, "device" : vfio-pci options, "romfile" : file}
+##   network     {"backend" : "tap" or "vde", "ifname" : tap, "queues" : n, "device" : virtio-net-pci option map,
+##                "fallback" : "vde", "nic" : -net nic option map for vde}
+##   args        any other raw arguments
+##   modes       {mode : keys to replace}, a key ending with "+" extends a list, null or false removes a key (false
+##               turns off pin_threads, irq_affinity and governor, which are on by default)
+##
+## romfile "cache" takes the newest ROM of the GPU from the fetch-vbios.sh cache. The romfile is checked with the
+## GOPupd.py parser before QEMU starts, and the CPUs of the vCPUs become the taskset mask.
+##
+## The host cores come from passthrough.cpuset, so two VMs running at the same time never share a core and the
+## first core stays with the host. The cores are given back when QEMU exits, and so are the hugepages that
+## passthrough.hugepages reserved for the guest memory.
+##
+## The vars template is never written, passthrough.nvram gives the VM its own copy in resources/nvram (a
+## reflink where the file system can), kept until the template changes. A fresh copy lives in the state folder
+## and is removed when QEMU exits.
+##
+## A virtio drive becomes a virtio-blk-pci device with a queue per vCPU and an iothread of its own, so disk I/O
+## doesn't wait for the main loop. aio is native with cache=none and threads otherwise, unless the drive sets it
+## (io_uring needs QEMU 5.0). "iothread" : false keeps the plain -drive, "queues" sets the number of queues. The
+## device options are checked against the help output of QEMU before it starts.
+##
+## The Hyper-V features are the ones passthrough.hyperv finds in QEMU and KVM, with what each depends on. A dry
+## run without QEMU takes them unchecked, a launch whose probe fails the base set (relaxed, vapic, spinlocks,
+## time). With -QEMU-HELP the saved query-cpu-model-expansion answer is used.
+##
+## The tap backend is -netdev tap with vhost=on and a virtio-net-pci device, so the guest traffic is moved by
+## the vhost kernel thread and not by QEMU. A tap made with multi_queue gets a queue pair per vCPU (mq=on and
+## 2 vectors per pair, plus config and control). The tap is not created by the launcher, when it is missing or
+## there is no /dev/vhost-net the fallback backend is used, -net nic -net vde like before.
+##
+## QEMU gets a QMP socket in the state folder and starts paused. Once it is up, every vCPU thread is pinned to
+## its own host CPU (the guest threads of a core on the SMT siblings of a host core) and the iothreads, main loop
+## and workers to the housekeeping cores, then cont starts the guest. The launcher stays until QEMU exits. Until
+## then it looks for the vfio interrupts of the GPU group in /proc/interrupts every few seconds, steers them to
+## the CPUs of the VM and gives them their old affinity back at the end. The frequency of the vCPU CPUs is
+## sampled every second and printed when QEMU exits, and their governor and cpuidle states are put back.
+##
+## The host steps of the launch and the QMP events of the guest (RESUME, the guest drivers, RESET, GUEST_PANICKED,
+## SHUTDOWN) are timed by passthrough.boottime, printed when QEMU exits and added to the boot log.
+
+import contextlib
+import io
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+
+from passthrough import boottime
+from passthrough import cpufreq
+from passthrough import cpuset
+from passthrough import hugepages
+from passthrough import hyperv
+from passthrough import irq
+from passthrough import isoimage
+from passthrough import nvram
+from passthrough import pinning
+from passthrough import qemu_help
+from passthrough import qmp
+from passthrough import sysfs
+from passthrough import topology
+from passthrough import vbios
+from passthrough.cli import Arg_List
+
+vhost_dev       = "/dev/vhost-net"
+iff_multi_queue = 0x0100
+
+## Keys that are on by default, false turns them off instead of removing them.
+default_on = ["pin_threads", "irq_affinity", "governor"]
+
+try :
+	import tomllib
+except ImportError :
+	tomllib = None
+
+def load_profile(profile_path, mode=None) :
+	
+	with open(profile_path, 'rb') as profile_file :
+		if profile_path.endswith(".toml") :
+			if tomllib is None :
+				raise ValueError("TOML profiles need Python 3.11 or newer, use a JSON profile")
+			
+			profile = tomllib.load(profile_file)
+		else :
+			profile = json.load(profile_file)
+	
+	modes = profile.pop("modes", {})
+	
+	if mode is not None :
+		if mode not in modes :
+			raise ValueError("No mode %s, the modes are: %s" % (mode, ", ".join(sorted(modes)) or "none"))
+		
+		for mode_key, mode_value in modes[mode].items() :
+			if mode_key.endswith("+") :
+				profile[mode_key[:-1]] = profile.get(mode_key[:-1], []) + mode_value
+			else :
+				profile[mode_key] = mode_value
+	
+	return {profile_key : profile_value for profile_key, profile_value in profile.items()
+			if profile_value is not None and (profile_value is not False or profile_key in default_on)}
+
+def file_path(path) :
+	return os.path.expandvars(os.path.expanduser(path))
+
+def opt_str(options) :
+	
+	## {"file" : "x", "readonly" : true} as file=x,readonly=on
+	opt_parts = []
+	
+	for opt_name, opt_value in options.items() :
+		if opt_value is True :
+			opt_value = "on"
+		elif opt_value is False :
+			opt_value = "off"
+		elif opt_name == "file" :
+			opt_value = file_path(opt_value)
+		
+		opt_parts.append("%s=%s" % (opt_name, opt_value))
+	
+	return ",".join(opt_parts)
+
+def gpu_romfile(sys_root, gpu) :
+	
+	## The IDs are only compared when the GPU is in sysfs, a dry run works on any host.
+	try :
+		gpu_ids = sysfs.pci_ids(sys_root, gpu["host"])
+	except OSError :
+		gpu_ids = None
+	
+	if gpu["romfile"] == "cache" :
+		rom_path = vbios.cached_rom(vbios.cache_dir, gpu_ids) if gpu_ids is not None else None
+		
+		if rom_path is None :
+			raise ValueError("No cached VBIOS for %s, run fetch-vbios.sh %s first" % (gpu["host"], gpu["host"]))
+	else :
+		rom_path = file_path(gpu["romfile"])
+	
+	with open(rom_path, 'rb') as rom_file :
+		rom_data = rom_file.read()
+	
+	try :
+		vbios.check_rom(rom_data, gpu_ids)
+	except ValueError as rom_err :
+		raise ValueError("%s: %s" % (rom_path, rom_err))
+	
+	with contextlib.redirect_stdout(io.StringIO()) :
+		efi_found = vbios.GOPupd.rom_info(rom_data, 0, "mini")[0]
+	
+	if not efi_found :
+		print("Warning: %s has no EFI image, OVMF has no GOP for the GPU (fetch-vbios.sh adds one)" % rom_path)
+	
+	return rom_path
+
+def memory_plan(proc_root, sys_root, profile) :
+	
+	## Hugepages for the guest memory, None for ordinary memory. "auto" only warns when there are none.
+	if "hugepages" not in profile :
+		return None
+	
+	try :
+		return hugepages.plan(proc_root, sys_root, hugepages.mem_size(profile.get("memory", "2G")), profile["hugepages"])
+	
+	except (OSError, ValueError) as mem_err :
+		if profile["hugepages"] != "auto" :
+			raise
+		
+		print("No hugepages, the guest gets ordinary memory: %s" % mem_err)
+		
+		return None
+
+def cdrom_plan(cdroms, dry_run) :
+	
+	## The image of every cdrom, None for a built one whose folder is empty, the others keep their index.
+	cdrom_list = []
+	
+	for cdrom in cdroms :
+		if not isinstance(cdrom, dict) :
+			cdrom_list.append(file_path(cdrom))
+			continue
+		
+		if not isoimage.all_files(isoimage.scan_tree(file_path(cdrom["source"]))) :
+			print("%s is empty, %s is not attached" % (cdrom["source"], cdrom["file"]))
+			cdrom_list.append(None)
+			continue
+		
+		build_how, iso_info = isoimage.build(file_path(cdrom["source"]), file_path(cdrom["file"]), cdrom.get("label"), check_only=dry_run)
+		
+		if build_how != "unchanged" :
+			print("%s %s from %s, %d files" % (cdrom["file"], "is out of date, built at launch" if dry_run else "built", cdrom["source"], iso_info["files"]))
+		
+		cdrom_list.append(file_path(cdrom["file"]))
+	
+	return cdrom_list
+
+def drive_args(drive, drive_nr, nr_vcpus) :
+	
+	## -drive, or an iothread, the drive as a backend and its virtio-blk-pci device.
+	if drive.get("if") != "virtio" or drive.get("iothread") is False :
+		return ["-drive", opt_str({drive_opt : opt_value for drive_opt, opt_value in drive.items() if drive_opt != "iothread"})]
+	
+	drive_id   = "disk.%d" % drive_nr
+	drive_opts = {drive_opt : opt_value for drive_opt, opt_value in drive.items() if drive_opt not in ["if", "iothread", "queues"]}
+	
+	drive_opts.setdefault("aio", "native" if drive_opts.get("cache") in ["none", "directsync"] else "threads")
+	drive_opts.update({"if" : "none", "id" : drive_id})
+	
+	return ["-object", "iothread,id=io.%s" % drive_id, "-drive", opt_str(drive_opts),
+			"-device", "virtio-blk-pci,drive=%s,iothread=io.%s,num-queues=%d" % (drive_id, drive_id, drive.get("queues", nr_vcpus))]
+
+def hyperv_plan(hyperv_opts, qemu_bin, help_dir, sock_dir, dry_run) :
+	
+	## (flags, {feature : why not}, note)
+	try :
+		cpu_props = hyperv.load_props(os.path.join(help_dir, hyperv.props_file)) if help_dir is not None else hyperv.probe(qemu_bin, sock_dir)
+	
+	except (OSError, KeyError, qmp.QMP_Error) as probe_err :
+		if dry_run :
+			cpu_props = None
+		else :
+			print("Hyper-V probe failed: %s" % probe_err)
+			cpu_props = {}
+	
+	return hyperv.plan(hyperv_opts, cpu_props)
+
+def network_plan(sys_root, network, nr_vcpus) :
+	
+	## {"backend", "queues"}, with the fallback when the tap can't be used.
+	if network.get("backend", "vde") != "tap" :
+		return {"backend" : network.get("backend", "vde"), "queues" : 0}
+	
+	tap_dir = os.path.join(sys_root, "class", "net", network.get("ifname", "tap0"))
+	
+	if not os.path.exists(os.path.join(tap_dir, "tun_flags")) :
+		net_err = "%s is not a tap" % network.get("ifname", "tap0")
+	elif not os.path.exists(vhost_dev) :
+		net_err = "%s is missing, modprobe vhost_net" % vhost_dev
+	else :
+		tun_flags = int(sysfs.read_attr(os.path.join(tap_dir, "tun_flags")), 16)
+		
+		if not tun_flags & iff_multi_queue and nr_vcpus > 1 :
+			print("%s was made without multi_queue, the guest gets 1 queue" % network.get("ifname", "tap0"))
+		
+		return {"backend" : "tap", "queues" : min(network.get("queues", nr_vcpus), nr_vcpus) if tun_flags & iff_multi_queue else 1}
+	
+	if not network.get("fallback") :
+		raise ValueError(net_err)
+	
+	print("No vhost-net, %s: the guest network goes through %s" % (net_err, network["fallback"]))
+	
+	return {"backend" : network["fallback"], "queues" : 0}
+
+def network_args(network, net_plan) :
+	if net_plan["backend"] != "tap" :
+		return ["-net", "nic," + opt_str(network["nic"]) if network.get("nic") else "nic", "-net", net_plan["backend"]]
+	
+	net_queues = net_plan["queues"]
+	net_dev    = "virtio-net-pci,netdev=net.0" + (",mq=on,vectors=%d" % (2 * net_queues + 2) if net_queues > 1 else "")
+	
+	if network.get("device") :
+		net_dev += "," + opt_str(network["device"])
+	
+	return ["-netdev", "tap,id=net.0,ifname=%s,script=no,downscript=no,vhost=on%s" % (network.get("ifname", "tap0"),
+			",queues=%d" % net_queues if net_queues > 1 else ""), "-device", net_dev]
+
+def build_args(profile, cpu_plan, romfile, qemu_bin, qmp_path, mem_plan, vars_path, net_plan) :
+	machine   = profile.get("machine", "type=q35,accel=kvm") + (",memory-backend=ram" if mem_plan is not None else "")
+	qemu_args = [qemu_bin, "-enable-kvm", "-name", profile["name"], "-machine", machine]
+	
+	if "cpu" in profile :
+		qemu_args += ["-cpu", profile["cpu"]]
+	
+	qemu_args += ["-smp", "%d,sockets=%d,cores=%d,threads=%d" % (len(cpu_plan["vcpu_cpus"]), cpu_plan["sockets"], cpu_plan["cores"], cpu_plan["threads"])]
+	qemu_args += ["-m", profile.get("memory", "2G")]
+	
+	if mem_plan is not None :
+		qemu_args += hugepages.backend_args(mem_plan, hugepages.mem_size(profile.get("memory", "2G")))
+	
+	qemu_args += ["-qmp", "unix:%s,server=on,wait=off" % qmp_path]
+	
+	if "rtc" in profile :
+		qemu_args += ["-rtc", profile["rtc"]]
+	
+	qemu_args += profile.get("args", [])
+	
+	if "ovmf" in profile :
+		qemu_args += ["-drive", "if=pflash,format=raw,readonly=on,file=%s" % file_path(profile["ovmf"]["code"])]
+		qemu_args += ["-drive", "if=pflash,format=raw,file=%s" % vars_path]
+	
+	for drive_nr, drive in enumerate(profile.get("drives", [])) :
+		qemu_args += drive_args(drive, drive_nr, len(cpu_plan["vcpu_cpus"]))
+	
+	for cdrom_idx, cdrom in enumerate(profile.get("cdroms", []), 1) :
+		if cdrom is not None :
+			qemu_args += ["-drive", "file=%s,index=%d,media=cdrom" % (cdrom, cdrom_idx)]
+	
+	qemu_args += profile.get("display", [])
+	
+	if "gpu" in profile :
+		gpu     = profile["gpu"]
+		gpu_dev = "vfio-pci,host=%s" % gpu["host"]
+		
+		if gpu.get("device") :
+			gpu_dev += "," + gpu["device"]
+		
+		if romfile is not None :
+			gpu_dev += ",romfile=%s" % romfile
+		
+		if gpu.get("root_port") :
+			qemu_args += ["-device", gpu["root_port"]]
+		
+		qemu_args += ["-device", gpu_dev]
+	
+	if net_plan is not None :
+		qemu_args += network_args(profile["network"], net_plan)
+	
+	return qemu_args
+
+def watch_vm(irq_steer, cpu_tuning, boot_timeline, watch_stop, interval=1.0) :
+	
+	## The guest driver enables MSI some time after boot, and again after a guest reboot.
+	while True :
+		if irq_steer is not None :
+			try :
+				irq_new = irq_steer.update()
+				
+				for irq_nr, irq_name, old_affinity in irq_new :
+					print("IRQ %d %s steered to CPUs %s (was %s)" % (irq_nr, irq_name, topology.cpu_list_str(irq_steer.cpus), old_affinity))
+				
+				if irq_new :
+					boot_timeline.mark("vfio_irq", " ".join(irq_name for irq_nr, irq_name, old_affinity in irq_new))
+			except OSError as irq_err :
+				print("vfio IRQs not steered: %s" % irq_err)
+				irq_steer = None
+		
+		cpu_tuning.sample()
+		
+		if watch_stop.wait(interval) :
+			return
+
+def run_vm(qemu_args, profile, cpu_plan, housekeeping, qmp_path, proc_root, irq_steer, cpu_tuning, boot_timeline) :
+	
+	## A socket left by an earlier run would be found before QEMU creates its own.
+	if os.path.exists(qmp_path) :
+		os.remove(qmp_path)
+	
+	## Paused until cont, the guest doesn't run before its threads are pinned.
+	qemu_proc = subprocess.Popen(qemu_args + ["-S"])
+	boot_timeline.mark("qemu_exec")
+	
+	## Ctrl+C reaches QEMU too, the launcher only waits for it. A service manager stopping the launcher stops QEMU.
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, lambda sig_nr, frame : qemu_proc.terminate())
+	
+	try :
+		qmp_client = boot_timeline.timed("qemu_start", qmp.QMP_Client, qmp_path, 30, lambda : qemu_proc.poll() is None)
+		qemu_ver   = qmp_client.greeting["QMP"].get("version", {}).get("qemu")
+		boot_timeline.qemu_ver = "%d.%d.%d" % (qemu_ver["major"], qemu_ver["minor"], qemu_ver["micro"]) if qemu_ver else None
+	
+	except (OSError, qmp.QMP_Error) as qmp_err :
+		print("No QMP, the paused QEMU is stopped: %s" % qmp_err)
+		qemu_proc.terminate()
+		
+		return qemu_proc.wait() or 1
+	
+	if profile.get("pin_threads", True) :
+		try :
+			pin_plan = boot_timeline.timed("pinning", pinning.pin_vm, qmp_client, proc_root, cpu_plan["vcpu_cpus"], housekeeping)
+			
+			print("QEMU threads pinned:")
+			pinning.print_plan(pin_plan)
+		
+		except (OSError, ValueError, qmp.QMP_Error) as pin_err :
+			print("Thread pinning failed, QEMU keeps the taskset mask: %s" % pin_err)
+	
+	try :
+		qmp_client.execute("cont")
+	except (OSError, qmp.QMP_Error) as cont_err :
+		print("The guest didn't start, QEMU is stopped: %s" % cont_err)
+		qemu_proc.terminate()
+	
+	event_thread = threading.Thread(target=boottime.watch_events, args=(qmp_client, boot_timeline), daemon=True)
+	watch_stop   = threading.Event()
+	watch_thread = threading.Thread(target=watch_vm, args=(irq_steer, cpu_tuning, boot_timeline, watch_stop), daemon=True)
+	event_thread.start()
+	watch_thread.start()
+	
+	try :
+		return qemu_proc.wait()
+	
+	finally :
+		watch_stop.set()
+		watch_thread.join()
+		
+		## QEMU closed the socket when it exited, the last events are read by now.
+		event_thread.join(1)
+		qmp_client.close()
+		
+		if irq_steer is not None and irq_steer.restore() :
+			print("vfio IRQ affinity restored")
+		
+		if cpu_tuning.freq_stats :
+			print("Frequency of the vCPU CPUs while QEMU ran:")
+			cpufreq.print_stats(cpu_tuning.stats())
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list   = Arg_List(sys.argv[1:])
+	dry_run    = arg_list.flag("-DRY-RUN")
+	over_sub   = arg_list.flag("-OVERSUBSCRIBE")
+	sys_root   = arg_list.value("-SYSFS", "/sys")
+	proc_root  = arg_list.value("-PROC", "/proc")
+	state_root = arg_list.value("-STATE", None) or cpuset.state_dir()
+	qemu_bin   = arg_list.value("-QEMU", "qemu-system-x86_64")
+	help_dir   = arg_list.value("-QEMU-HELP", None)
+	boot_log   = arg_list.value("-BOOT-LOG", boottime.log_path)
+	pos_args   = arg_list.positional()
+	
+	if len(pos_args) not in [1, 2] :
+		print("Usage: python3 -m passthrough.launcher <profile> [mode] [-DRY-RUN] [-OVERSUBSCRIBE] [-SYSFS dir] [-PROC dir] [-STATE dir] [-QEMU binary] [-QEMU-HELP dir] [-BOOT-LOG file]")
+		sys.exit(1)
+	
+	boot_timeline = boottime.Boot_Timeline()
+	
+	try :
+		profile      = load_profile(pos_args[0], pos_args[1] if len(pos_args) > 1 else None)
+		romfile      = boot_timeline.timed("romfile", gpu_romfile, sys_root, profile["gpu"]) if profile.get("gpu", {}).get("romfile") else None
+		core_list    = topology.host_cores(sys_root)
+		core_picks   = cpuset.allocate(state_root, profile["name"], core_list, topology.core_count(core_list, profile["vcpus"])[1],
+									profile.get("host_cores"), over_sub or profile.get("oversubscribe", False), dry_run=dry_run)
+	except (OSError, ValueError, KeyError) as launch_err :
+		print("%s: %s" % (pos_args[0], launch_err if not isinstance(launch_err, KeyError) else "%s is missing" % launch_err))
+		sys.exit(1)
+	
+	## Everything after the allocation gives the cores back on the way out, sys.exit included.
+	nr_added   = 0
+	cpu_tuning = None
+	vars_how   = None
+	fresh_vars = profile.get("nvram") == "fresh"
+	
+	try :
+		try :
+			cpu_plan     = topology.guest_topology(core_list, profile["vcpus"], core_picks)
+			housekeeping = topology.housekeeping(core_list, cpu_plan["host_cores"], profile.get("housekeeping"))
+			mem_plan     = memory_plan(proc_root, sys_root, profile)
+			irq_cpus     = {"vcpus" : cpu_plan["vcpu_cpus"], "housekeeping" : housekeeping}.get(profile.get("irq_affinity", "vcpus"))
+			irq_steer    = irq.IRQ_Steering(proc_root, irq.group_bdfs(sys_root, profile["gpu"]["host"]), irq_cpus) if "gpu" in profile and irq_cpus else None
+			net_plan     = network_plan(sys_root, profile["network"], profile["vcpus"]) if "network" in profile else None
+			hv_plan      = boot_timeline.timed("hyperv_probe", hyperv_plan, profile["hyperv"], qemu_bin, help_dir, state_root, dry_run) if "hyperv" in profile else None
+			cpu_tuning   = cpufreq.CPU_Tuning(sys_root, cpu_plan["vcpu_cpus"], profile.get("governor", "performance") or None, profile.get("cpuidle_latency"))
+			cdrom_list   = boot_timeline.timed("cdroms", cdrom_plan, profile.get("cdroms", []), dry_run)
+			vars_path, vars_how = boot_timeline.timed("nvram", nvram.vars_file, file_path(profile["ovmf"]["vars"]), profile["name"], file_path(profile["ovmf"].get("copies", nvram.nvram_dir)),
+										state_root if fresh_vars else None, dry_run, file_path(profile["ovmf"]["seed"]) if "seed" in profile["ovmf"] else None) \
+										if "ovmf" in profile else (None, None)
+		except (OSError, ValueError, KeyError) as launch_err :
+			print("%s: %s" % (pos_args[0], launch_err if not isinstance(launch_err, KeyError) else "%s is missing" % launch_err))
+			sys.exit(1)
+		
+		profile["cdroms"] = cdrom_list
+		
+		if vars_how not in [None, "reused"] and not fresh_vars and not dry_run :
+			print("NVRAM %s made (%s)" % (vars_path, vars_how))
+		
+		if hv_plan is not None :
+			profile["cpu"] = ",".join([profile.get("cpu", "host")] + hv_plan[0])
+			
+			if hv_plan[2] is not None and not dry_run :
+				print("Hyper-V features: %s" % hv_plan[2])
+		
+		if mem_plan is not None and not dry_run :
+			try :
+				## Under the allocation lock, two launches don't grow the pool at the same time.
+				with cpuset.locked_state(state_root) :
+					nr_added = boot_timeline.timed("hugepages", hugepages.reserve, proc_root, sys_root, mem_plan)
+			
+			except (OSError, ValueError) as mem_err :
+				print("Hugepages not reserved: %s" % mem_err)
+				
+				if profile["hugepages"] != "auto" :
+					sys.exit(1)
+				
+				mem_plan = None
+		
+		qmp_path  = os.path.join(state_root, "%s.qmp" % profile["name"].lower())
+		qemu_args = ["taskset", topology.cpu_mask(cpu_plan["vcpu_cpus"])] + build_args(profile, cpu_plan, romfile, qemu_bin, qmp_path, mem_plan, vars_path, net_plan)
+		
+		try :
+			qemu_help.check_args(qemu_args, qemu_help.QEMU_Help(qemu_bin, help_dir))
+			args_checked = True
+		
+		except (OSError, subprocess.CalledProcessError, ValueError) as check_err :
+			## Only a dry run goes on without a QEMU to ask.
+			if not dry_run or isinstance(check_err, ValueError) :
+				print("%s: %s" % (pos_args[0], check_err))
+				sys.exit(1)
+			
+			args_checked = False
+		
+		if dry_run :
+			print(shlex.join(qemu_args))
+			
+			if profile.get("pin_threads", True) :
+				print("# host cores %s" % ",".join("%d" % core_nr for core_nr in core_picks))
+				print("# vCPUs on CPUs %s, other QEMU threads on CPUs %s" % (",".join("%d" % cpu for cpu in cpu_plan["vcpu_cpus"]),
+					topology.cpu_list_str(housekeeping)))
+			
+			if mem_plan is not None :
+				print("# %d %s hugepages on %s, %d to reserve%s" % (mem_plan["pages"], hugepages.page_name(mem_plan["page_kb"]), mem_plan["mount"],
+					mem_plan["shortfall"], ", after compaction" if mem_plan["fragmented"] else ""))
+			
+			if hv_plan is not None :
+				for feature, why_not in hv_plan[1].items() :
+					print("# hv-%s left out, %s" % (feature, why_not))
+				
+				if hv_plan[2] is not None :
+					print("# Hyper-V features %s" % hv_plan[2])
+			
+			if irq_steer is not None :
+				print("# vfio IRQs of %s on CPUs %s" % (", ".join(irq_steer.bdf_list), topology.cpu_list_str(irq_steer.cpus)))
+			
+			for tune_path, old_value, new_value in cpu_tuning.tune_plan :
+				print("# %s %s -> %s while QEMU runs" % (os.path.relpath(tune_path, sys_root), old_value, new_value))
+			
+			if vars_path is not None :
+				print("# NVRAM %s (%s)" % (vars_path, vars_how))
+			
+			if not args_checked :
+				print("# device options not checked, no %s (-QEMU-HELP %s checks them against QEMU 8.2)" % (qemu_bin, os.path.relpath(qemu_help.help_dir)))
+			
+			sys.exit(0)
+		
+		if not os.path.exists("/dev/kvm") :
+			print("/dev/kvm is missing, is the kvm module loaded?")
+			sys.exit(1)
+		
+		try :
+			cpu_tuning.apply()
+		except OSError as tune_err :
+			print("Governor and C-states left as they are: %s" % tune_err)
+			cpu_tuning.restore()
+		
+		qemu_status = run_vm(qemu_args, profile, cpu_plan, housekeeping, qmp_path, proc_root, irq_steer, cpu_tuning, boot_timeline)
+		log_entry   = boot_timeline.entry(vm=profile["name"], mode=pos_args[1] if len(pos_args) > 1 else None, exit=qemu_status,
+						vfio_bind=boottime.last_bind(state_root, profile["gpu"]["host"]) if "gpu" in profile else None, **boottime.rom_info(romfile))
+		
+		print("Boot times:")
+		boottime.print_entry(log_entry)
+		
+		try :
+			boottime.append_log(log_entry, boot_log)
+		except OSError as log_err :
+			print("Boot times not saved: %s" % log_err)
+		
+		sys.exit(qemu_status)
+	
+	finally :
+		if nr_added :
+			with cpuset.locked_state(state_root) :
+				hugepages.release(sys_root, mem_plan, nr_added)
+		
+		if cpu_tuning is not None :
+			cpu_tuning.restore()
+		
+		if fresh_vars and vars_how is not None and not dry_run :
+			os.remove(vars_path)
+		
+		if not dry_run :
+			cpuset.release(state_root, profile["name"])
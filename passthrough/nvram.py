@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+## Gives every VM its own copy of an OVMF_VARS.fd template, so the template itself is never written.
+##
+## Usage: python3 -m passthrough.nvram <template> -NAME vm [-DIR dir] [-FRESH dir] [-SEED file] [-RESET]
+##
+##   <template>  pristine OVMF_VARS.fd, the one of the ovmf package for example
+##   -NAME       VM name
+##   -DIR        folder of the copies, resources/nvram by default
+##   -FRESH      make a new copy for one run in this folder instead of the one the VM keeps
+##   -SEED       vars file the VM booted from before it had copies, its first copy is made from it
+##   -RESET      drop the copy of the VM, the next launch starts from the template again
+##
+## The copies are keyed by the SHA-256 of the template:
+##
+##   resources/nvram/template-<sha256>.fd    the template as it was, read-only
+##   resources/nvram/<vm>-<sha256>.fd        NVRAM of the VM, kept from launch to launch
+##
+## A VM keeps its boot entries as long as the template doesn't change, an updated ovmf package gives new copies
+## and leaves the old ones alone. The first copy of a VM comes from its seed when it has one, the
+## resources/WIN_OVMF_VARS.fd or resources/OVMF_VARS.fd the VM used before, so its boot entries carry over.
+## Copies are reflinks (FICLONE) on Btrfs and XFS, so a fresh NVRAM for every run of the test mode costs no copy.
+## Elsewhere they are sparse copies, the zero blocks of the template are skipped.
+
+import errno
+import fcntl
+import hashlib
+import os
+import sys
+import tempfile
+
+from passthrough.cli import Arg_List
+
+base_dir  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+nvram_dir = os.path.join(base_dir, "resources", "nvram")
+ficlone   = 0x40049409 # _IOW(0x94, 9, int)
+copy_size = 1 << 16
+
+## Errors of FICLONE when the file system can't share the blocks, the copy is made the slow way then.
+clone_errors = [errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS]
+
+def file_hash(file_path) :
+	file_sha = hashlib.sha256()
+	
+	with open(file_path, 'rb') as hash_file :
+		for file_block in iter(lambda : hash_file.read(copy_size), b"") :
+			file_sha.update(file_block)
+	
+	return file_sha.hexdigest()
+
+def sparse_copy(src_file, dst_file) :
+	
+	## Blocks of zeros become holes, the size is set at the end for a file that ends with one.
+	zero_block = bytes(copy_size)
+	
+	for file_block in iter(lambda : src_file.read(copy_size), b"") :
+		if file_block == zero_block[:len(file_block)] :
+			dst_file.seek(len(file_block), os.SEEK_CUR)
+		else :
+			dst_file.write(file_block)
+	
+	dst_file.truncate()
+
+def clone_file(src_path, dst_path, file_mode=0o644) :
+	
+	## Returns "reflink" or "sparse copy". The copy is made next to the target and renamed, a launch never finds
+	## half a file.
+	dst_dir = os.path.dirname(os.path.abspath(dst_path))
+	
+	with open(src_path, 'rb') as src_file, tempfile.NamedTemporaryFile(dir=dst_dir, delete=False) as dst_file :
+		try :
+			try :
+				fcntl.ioctl(dst_file.fileno(), ficlone, src_file.fileno())
+				clone_how = "reflink"
+			
+			except OSError as clone_err :
+				if clone_err.errno not in clone_errors :
+					raise
+				
+				sparse_copy(src_file, dst_file)
+				clone_how = "sparse copy"
+		
+		except BaseException :
+			os.remove(dst_file.name)
+			raise
+	
+	os.chmod(dst_file.name, file_mode)
+	os.replace(dst_file.name, dst_path)
+	
+	return clone_how
+
+def template_copy(template_path, copy_dir, dry_run=False) :
+	
+	## Path and hash of the pristine copy of the template, made the first time this version of it is seen.
+	template_sha = file_hash(template_path)
+	pristine     = os.path.join(copy_dir, "template-%s.fd" % template_sha)
+	
+	if not os.path.exists(pristine) and not dry_run :
+		os.makedirs(copy_dir, exist_ok=True)
+		clone_file(template_path, pristine, 0o444)
+	
+	return pristine, template_sha
+
+def vm_copies(copy_dir, vm_name) :
+	
+	## The copies a VM has of any template version.
+	copy_prefix = "%s-" % vm_name.lower()
+	
+	try :
+		return [copy_name for copy_name in os.listdir(copy_dir) if copy_name.startswith(copy_prefix) and len(copy_name) == len(copy_prefix) + 67]
+	except FileNotFoundError :
+		return []
+
+def vars_file(template_path, vm_name, copy_dir=nvram_dir, fresh_dir=None, dry_run=False, seed_path=None) :
+	
+	## (path, how) of the NVRAM the VM boots with, how is "reused", "reflink" or "sparse copy", followed by the seed
+	## it came from. With fresh_dir the copy is made again on every call. A dry run only says where the copy would
+	## be, without a template to hash it says where it goes.
+	if dry_run and not os.path.isfile(template_path) :
+		vars_path = os.path.join(fresh_dir, "%s-vars.fd" % vm_name.lower()) if fresh_dir is not None else \
+					os.path.join(copy_dir, "%s-<sha256 of the template>.fd" % vm_name.lower())
+		
+		return vars_path, "new, %s is missing" % template_path
+	
+	pristine, template_sha = template_copy(template_path, copy_dir, dry_run)
+	copy_from = pristine
+	copy_note = ""
+	
+	if fresh_dir is not None :
+		vars_path = os.path.join(fresh_dir, "%s-vars.fd" % vm_name.lower())
+	else :
+		vars_path = os.path.join(copy_dir, "%s-%s.fd" % (vm_name.lower(), template_sha))
+		
+		if os.path.exists(vars_path) :
+			return vars_path, "reused"
+		
+		if seed_path is not None and os.path.isfile(seed_path) and not vm_copies(copy_dir, vm_name) :
+			if os.path.getsize(seed_path) == os.path.getsize(template_path) :
+				copy_from = seed_path
+				copy_note = ", from %s" % seed_path
+			else :
+				copy_note = ", %s left out, it isn't the size of the template" % seed_path
+	
+	if dry_run :
+		return vars_path, "new" + copy_note
+	
+	return vars_path, clone_file(copy_from, vars_path) + copy_note
+
+def reset(template_path, vm_name, copy_dir=nvram_dir) :
+	vars_path = os.path.join(copy_dir, "%s-%s.fd" % (vm_name.lower(), file_hash(template_path)))
+	
+	if not os.path.exists(vars_path) :
+		return None
+	
+	os.remove(vars_path)
+	
+	return vars_path
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = Arg_List(sys.argv[1:])
+	vm_name   = arg_list.value("-NAME", None)
+	copy_dir  = arg_list.value("-DIR", nvram_dir)
+	fresh_dir = arg_list.value("-FRESH", None)
+	seed_path = arg_list.value("-SEED", None)
+	vm_reset  = arg_list.flag("-RESET")
+	pos_args  = arg_list.positional()
+	
+	if len(pos_args) != 1 or vm_name is None :
+		print("Usage: python3 -m passthrough.nvram <template> -NAME vm [-DIR dir] [-FRESH dir] [-SEED file] [-RESET]")
+		sys.exit(1)
+	
+	try :
+		if vm_reset :
+			vars_path = reset(pos_args[0], vm_name, copy_dir)
+			print("%s removed" % vars_path if vars_path is not None else "%s has no NVRAM for this template" % vm_name)
+			sys.exit(0)
+		
+		vars_path, vars_how = vars_file(pos_args[0], vm_name, copy_dir, fresh_dir, seed_path=seed_path)
+	
+	except OSError as vars_err :
+		print("No NVRAM for %s: %s" % (vm_name, vars_err))
+		sys.exit(1)
+	
+	print("%s (%s)" % (vars_path, vars_how))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+## Pins the threads of a running QEMU: every vCPU thread to its own host CPU, everything else (iothreads, main
+## loop, workers) to the housekeeping CPUs.
+##
+## Usage: python3 -m passthrough.pinning <qmp socket> -CPUS list [-HOUSEKEEPING list] [-PROC dir] [-DRY-RUN]
+##
+##   <qmp socket>    QMP socket of the VM, the launcher opens $XDG_RUNTIME_DIR/passthrough/<name>.qmp
+##   -CPUS           host CPU of each vCPU in vCPU order, 1,5,2,6,3,7 for the Windows guest
+##   -HOUSEKEEPING   host CPUs of the other threads, the online CPUs not in -CPUS by default
+##   -PROC           root of the procfs tree, /proc by default
+##   -DRY-RUN        print the pinning without changing anything
+##
+## The launcher does this on its own once QEMU is up. The vCPU order of -CPUS is the one of
+## topology.guest_topology, so the threads of a guest core land on SMT siblings of one host core.
+
+import os
+import sys
+
+from passthrough import qmp
+from passthrough import sysfs
+from passthrough import topology
+from passthrough.cli import Arg_List
+
+def vcpu_threads(qmp_client) :
+	
+	## Thread ID of every vCPU by index, query-cpus-fast needs QEMU 2.12.
+	return {cpu_info["cpu-index"] : cpu_info["thread-id"] for cpu_info in qmp_client.execute("query-cpus-fast")}
+
+def iothread_threads(qmp_client) :
+	
+	## Thread ID of every -object iothread by ID.
+	return {io_info["id"] : io_info["thread-id"] for io_info in qmp_client.execute("query-iothreads")}
+
+def thread_tgid(proc_root, tid) :
+	for status_line in sysfs.read_attr(os.path.join(proc_root, str(tid), "status")).splitlines() :
+		if status_line.startswith("Tgid:") :
+			return int(status_line.split()[1])
+	
+	raise ValueError("No Tgid for thread %d" % tid)
+
+def thread_plan(proc_root, qemu_pid, vcpu_tids, vcpu_cpus, housekeeping, iothread_tids=None) :
+	
+	## (thread ID, thread name, CPUs) for every thread of QEMU, the vCPUs first and the iothreads next.
+	task_dir = os.path.join(proc_root, str(qemu_pid), "task")
+	pin_plan = []
+	
+	if not housekeeping :
+		raise ValueError("No housekeeping CPUs left for the QEMU threads")
+	
+	for vcpu, tid in sorted(vcpu_tids.items()) :
+		if vcpu >= len(vcpu_cpus) :
+			raise ValueError("QEMU has vCPU %d, there are host CPUs for %d" % (vcpu, len(vcpu_cpus)))
+		
+		pin_plan.append((tid, sysfs.read_attr(os.path.join(task_dir, str(tid), "comm"), "vCPU %d" % vcpu), [vcpu_cpus[vcpu]]))
+	
+	for io_id, tid in sorted((iothread_tids or {}).items()) :
+		pin_plan.append((tid, "iothread %s" % io_id, list(housekeeping)))
+	
+	for tid in sorted(int(task_name) for task_name in os.listdir(task_dir)) :
+		if tid not in vcpu_tids.values() and tid not in (iothread_tids or {}).values() :
+			pin_plan.append((tid, sysfs.read_attr(os.path.join(task_dir, str(tid), "comm"), "?"), list(housekeeping)))
+	
+	return pin_plan
+
+def apply_plan(pin_plan) :
+	for tid, thread_name, cpus in pin_plan :
+		try :
+			os.sched_setaffinity(tid, cpus)
+		except ProcessLookupError :
+			## Worker threads come and go, the new ones get the CPUs of the main thread.
+			pass
+
+def print_plan(pin_plan) :
+	for tid, thread_name, cpus in pin_plan :
+		print("  %-8d %-20s CPU %s" % (tid, thread_name, topology.cpu_list_str(cpus)))
+
+def pin_vm(qmp_client, proc_root, vcpu_cpus, housekeeping, dry_run=False) :
+	vcpu_tids = vcpu_threads(qmp_client)
+	qemu_pid  = thread_tgid(proc_root, vcpu_tids[min(vcpu_tids)])
+	pin_plan  = thread_plan(proc_root, qemu_pid, vcpu_tids, vcpu_cpus, housekeeping, iothread_threads(qmp_client))
+	
+	if not dry_run :
+		apply_plan(pin_plan)
+	
+	return pin_plan
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list     = Arg_List(sys.argv[1:])
+	vcpu_cpus    = topology.cpu_list(arg_list.value("-CPUS", ""))
+	housekeeping = arg_list.value("-HOUSEKEEPING", None)
+	proc_root    = arg_list.value("-PROC", "/proc")
+	dry_run      = arg_list.flag("-DRY-RUN")
+	pos_args     = arg_list.positional()
+	
+	if len(pos_args) != 1 or not vcpu_cpus :
+		print("Usage: python3 -m passthrough.pinning <qmp socket> -CPUS list [-HOUSEKEEPING list] [-PROC dir] [-DRY-RUN]")
+		sys.exit(1)
+	
+	if housekeeping is None :
+		housekeeping = [cpu for cpu in range(os.cpu_count()) if cpu not in vcpu_cpus]
+	else :
+		housekeeping = topology.cpu_list(housekeeping)
+	
+	try :
+		qmp_client = qmp.QMP_Client(pos_args[0])
+		pin_plan   = pin_vm(qmp_client, proc_root, vcpu_cpus, housekeeping, dry_run)
+		qmp_client.close()
+	except (OSError, ValueError, qmp.QMP_Error) as pin_err :
+		print("Pinning failed: %s" % pin_err)
+		sys.exit(1)
+	
+	print_plan(pin_plan)
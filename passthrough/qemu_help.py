@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+## What a QEMU binary supports, from its help output: the properties of the devices the launcher generates and
+## the netdev backends.
+##
+## Usage: python3 -m passthrough.qemu_help [-RECORD dir] [-HELP dir] [-QEMU binary]
+##
+##   -RECORD     save the help output of the QEMU binary in this folder, for checks on a host without it
+##   -HELP       read the help output from a folder made by -RECORD instead of running QEMU
+##   -QEMU       QEMU binary, qemu-system-x86_64 by default
+##
+## Without -RECORD, the properties of the devices the launcher generates and the backends are printed. passthrough/qemu-help
+## has the output of QEMU 8.2, launcher -QEMU-HELP passthrough/qemu-help checks a profile against it offline.
+
+import os
+import re
+import subprocess
+import sys
+
+from passthrough.cli import Arg_List
+
+help_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qemu-help")
+
+## "  num-queues=<uint16>  - (default: 65535)" since QEMU 2.12, "virtio-blk-pci.num-queues=uint16" before.
+prop_pat = re.compile(r'^\s*(?:[\w-]+\.)?([\w.-]+)=<?([^>\s]+)')
+
+## The devices the launcher builds, their options are checked before QEMU starts. bus and id are options of
+## every device and not in the help.
+checked_devices = ["virtio-blk-pci", "virtio-net-pci"]
+device_opts     = ["bus", "id"]
+
+def help_name(help_args) :
+	
+	## ["-device", "virtio-blk-pci,help"] as device-virtio-blk-pci.txt
+	return "-".join(help_arg.lstrip("-").replace(",help", "") for help_arg in help_args if help_arg != "help") + ".txt"
+
+class QEMU_Help :
+	
+	def __init__(self, qemu_bin="qemu-system-x86_64", help_dir=None) :
+		self.qemu_bin   = qemu_bin
+		self.help_dir   = help_dir
+		self.help_cache = {}
+	
+	def text(self, help_args) :
+		
+		## Lines starting with # are notes of the recording.
+		help_args = tuple(help_args)
+		
+		if help_args not in self.help_cache :
+			if self.help_dir is not None :
+				with open(os.path.join(self.help_dir, help_name(help_args)), 'r') as help_file :
+					help_text = help_file.read()
+			else :
+				help_text = subprocess.run([self.qemu_bin] + list(help_args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+									universal_newlines=True, check=True).stdout
+			
+			self.help_cache[help_args] = "\n".join(help_line for help_line in help_text.splitlines() if not help_line.startswith("#"))
+		
+		return self.help_cache[help_args]
+	
+	def device_props(self, device) :
+		
+		## {property : type}
+		dev_props = {}
+		
+		for help_line in self.text(["-device", device + ",help"]).splitlines() :
+			prop_match = prop_pat.match(help_line)
+			
+			if prop_match is not None :
+				dev_props[prop_match.group(1)] = prop_match.group(2)
+		
+		return dev_props
+	
+	def netdev_types(self) :
+		
+		## One backend per line after "Available netdev backend types:".
+		return [help_line.strip() for help_line in self.text(["-netdev", "help"]).splitlines()[1:] if help_line.strip()]
+
+def check_device(device_arg, qemu_help) :
+	
+	## The options of a -device argument that the QEMU of qemu_help doesn't know.
+	dev_parts = device_arg.split(",")
+	dev_props = qemu_help.device_props(dev_parts[0])
+	
+	return [dev_opt.split("=", 1)[0] for dev_opt in dev_parts[1:] if dev_opt.split("=", 1)[0] not in list(dev_props) + device_opts]
+
+def check_args(qemu_args, qemu_help) :
+	
+	## Raises ValueError for an option of a generated device, or a network backend, that QEMU would refuse.
+	for arg_idx, qemu_arg in enumerate(qemu_args[:-1]) :
+		net_type = qemu_args[arg_idx + 1].split(",")[0]
+		
+		if (qemu_arg == "-netdev" or qemu_arg == "-net" and net_type not in ["nic", "none"]) and net_type not in qemu_help.netdev_types() :
+			raise ValueError("This QEMU has no %s network backend" % net_type)
+		
+		if qemu_arg != "-device" or qemu_args[arg_idx + 1].split(",")[0] not in checked_devices :
+			continue
+		
+		bad_opts = check_device(qemu_args[arg_idx + 1], qemu_help)
+		
+		if bad_opts :
+			raise ValueError("%s doesn't know %s" % (qemu_args[arg_idx + 1].split(",")[0], ", ".join(bad_opts)))
+
+def record(qemu_bin, record_dir) :
+	qemu_help = QEMU_Help(qemu_bin)
+	qemu_ver  = subprocess.run([qemu_bin, "-version"], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout.splitlines()[0]
+	os.makedirs(record_dir, exist_ok=True)
+	
+	for help_args in [["-device", device + ",help"] for device in checked_devices] + [["-netdev", "help"]] :
+		with open(os.path.join(record_dir, help_name(help_args)), 'w') as help_file :
+			help_file.write("# %s\n# %s %s\n%s\n" % (qemu_ver, os.path.basename(qemu_bin), " ".join(help_args), qemu_help.text(help_args)))
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list   = Arg_List(sys.argv[1:])
+	record_dir = arg_list.value("-RECORD", None)
+	read_dir   = arg_list.value("-HELP", None)
+	qemu_bin   = arg_list.value("-QEMU", "qemu-system-x86_64")
+	
+	try :
+		if record_dir is not None :
+			record(qemu_bin, record_dir)
+			print("Help of %s saved in %s" % (qemu_bin, record_dir))
+			sys.exit(0)
+		
+		qemu_help = QEMU_Help(qemu_bin, read_dir)
+		
+		for device in checked_devices :
+			print("%s: %s" % (device, " ".join(sorted(qemu_help.device_props(device)))))
+		
+		print("netdev: %s" % " ".join(qemu_help.netdev_types()))
+	
+	except (OSError, subprocess.CalledProcessError) as help_err :
+		print("No QEMU help: %s" % help_err)
+		sys.exit(1)
@@ -0,0 +1,86 @@
+## Minimal QMP client for the launcher: commands, and the events that arrive while waiting for their answers.
+
+import json
+import socket
+import time
+
+class QMP_Error(Exception) :
+	pass
+
+class QMP_Client :
+	
+	def __init__(self, sock_path, timeout=10.0, qemu_alive=None) :
+		
+		## QEMU creates the socket a little after it starts, so the connection is retried until the timeout, or
+		## until qemu_alive() says that QEMU is gone.
+		end_time = time.monotonic() + timeout
+		
+		while True :
+			self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			
+			try :
+				self.sock.connect(sock_path)
+				break
+			
+			except (FileNotFoundError, ConnectionRefusedError) :
+				self.sock.close()
+				
+				if time.monotonic() > end_time or (qemu_alive is not None and not qemu_alive()) :
+					raise QMP_Error("No QMP on %s" % sock_path)
+				
+				time.sleep(0.05)
+		
+		self.sock.settimeout(timeout)
+		self.sock_file = self.sock.makefile('rb')
+		self.events    = []
+		self.greeting  = self.read_msg()
+		
+		if "QMP" not in self.greeting :
+			raise QMP_Error("%s is not a QMP socket" % sock_path)
+		
+		self.execute("qmp_capabilities")
+	
+	def read_msg(self) :
+		msg_line = self.sock_file.readline()
+		
+		if not msg_line :
+			raise QMP_Error("QMP connection closed")
+		
+		return json.loads(msg_line)
+	
+	def execute(self, command, arguments=None) :
+		qmp_cmd = {"execute" : command}
+		
+		if arguments :
+			qmp_cmd["arguments"] = arguments
+		
+		self.sock.sendall(json.dumps(qmp_cmd).encode('utf-8') + b"\n")
+		
+		while True :
+			qmp_msg = self.read_msg()
+			
+			if "event" in qmp_msg :
+				self.events.append(qmp_msg)
+			elif "error" in qmp_msg :
+				raise QMP_Error("%s: %s" % (command, qmp_msg["error"].get("desc", qmp_msg["error"])))
+			else :
+				return qmp_msg.get("return")
+	
+	def read_event(self) :
+		
+		## Waits without a timeout for the next event, QMP_Error once QEMU closes the socket. No command can be
+		## sent while another thread waits here.
+		if self.events :
+			return self.events.pop(0)
+		
+		self.sock.settimeout(None)
+		
+		while True :
+			qmp_msg = self.read_msg()
+			
+			if "event" in qmp_msg :
+				return qmp_msg
+	
+	def close(self) :
+		self.sock_file.close()
+		self.sock.close()
@@ -0,0 +1,52 @@
+## Small helpers for reading and writing sysfs attributes.
+##
+## The root of the tree is always passed in, "/sys" on a real host or the folder of a fake tree.
+
+import os
+import re
+
+pci_bdf_pat = re.compile(r'^(?:([0-9a-fA-F]{4}):)?([0-9a-fA-F]{2}):([0-9a-fA-F]{2})\.([0-7])$')
+
+def pci_bdf(bdf) :
+	
+	## 01:00.0 and 0000:01:00.0 both give 0000:01:00.0, the name of the device in sysfs.
+	bdf_match = pci_bdf_pat.match(bdf.strip())
+	
+	if bdf_match is None :
+		raise ValueError("%s is not a PCI address" % bdf)
+	
+	pci_domain, pci_bus, pci_slot, pci_func = bdf_match.groups()
+	
+	return ("%s:%s:%s.%s" % (pci_domain or "0000", pci_bus, pci_slot, pci_func)).lower()
+
+def pci_dev_dir(sys_root, bdf) :
+	return os.path.join(sys_root, "bus", "pci", "devices", pci_bdf(bdf))
+
+def read_attr(attr_path, default=None) :
+	
+	try :
+		with open(attr_path, 'r') as attr_file :
+			return attr_file.read().strip()
+	
+	except OSError :
+		if default is None :
+			raise
+		
+		return default
+
+def write_attr(attr_path, attr_value) :
+	
+	## Unbuffered, sysfs takes every write as one store.
+	with open(attr_path, 'wb', buffering=0) as attr_file :
+		attr_file.write(str(attr_value).encode('utf-8'))
+
+def pci_ids(sys_root, bdf) :
+	
+	## Vendor, device and subsystem IDs as 4 lowercase hex digits, the way lspci -nn prints them.
+	dev_dir = pci_dev_dir(sys_root, bdf)
+	dev_ids = {}
+	
+	for id_name in ["vendor", "device", "subsystem_vendor", "subsystem_device"] :
+		dev_ids[id_name] = "%04x" % int(read_attr(os.path.join(dev_dir, id_name)), 16)
+	
+	return dev_ids
@@ -0,0 +1,94 @@
+## Host CPU topology from /sys/devices/system/cpu, and the guest topology that matches it.
+
+import os
+
+from passthrough import sysfs
+
+def cpu_list(list_str) :
+	
+	## "0-2,4-6" as [0, 1, 2, 4, 5, 6], the format of the sysfs cpu lists and of taskset -c.
+	cpus = []
+	
+	for list_part in list_str.strip().split(",") :
+		if not list_part :
+			continue
+		
+		if "-" in list_part :
+			first_cpu, last_cpu = list_part.split("-")
+			cpus.extend(range(int(first_cpu), int(last_cpu) + 1))
+		else :
+			cpus.append(int(list_part))
+	
+	return cpus
+
+def cpu_list_str(cpus) :
+	
+	## [0, 1, 2, 4, 5, 6] as "0-2,4-6".
+	list_parts = []
+	
+	for cpu in sorted(set(cpus)) :
+		if list_parts and list_parts[-1][1] == cpu - 1 :
+			list_parts[-1][1] = cpu
+		else :
+			list_parts.append([cpu, cpu])
+	
+	return ",".join("%d" % first_cpu if first_cpu == last_cpu else "%d-%d" % (first_cpu, last_cpu) for first_cpu, last_cpu in list_parts)
+
+def cpu_mask(cpus) :
+	return "0x%X" % sum(1 << cpu for cpu in set(cpus))
+
+def host_cores(sys_root) :
+	
+	## Online CPUs grouped by physical core, every core as the sorted tuple of its SMT siblings. Cores are in
+	## package and CPU order, so core n is what core_id n is on a single package host.
+	cpu_dir   = os.path.join(sys_root, "devices", "system", "cpu")
+	cpus_on   = set(cpu_list(sysfs.read_attr(os.path.join(cpu_dir, "online"))))
+	core_list = {}
+	
+	for cpu in sorted(cpus_on) :
+		topo_dir  = os.path.join(cpu_dir, "cpu%d" % cpu, "topology")
+		siblings  = tuple(sibling for sibling in cpu_list(sysfs.read_attr(os.path.join(topo_dir, "thread_siblings_list"), str(cpu))) if sibling in cpus_on)
+		package   = int(sysfs.read_attr(os.path.join(topo_dir, "physical_package_id"), "0"))
+		core_list[siblings] = (package, siblings[0])
+	
+	return sorted(core_list, key=lambda core : core_list[core])
+
+def core_count(core_list, vcpus) :
+	
+	## Threads per guest core and host cores needed, the guest only gets SMT when its vCPUs fill whole host cores.
+	threads = min(len(core) for core in core_list)
+	
+	if vcpus % threads :
+		threads = 1
+	
+	return threads, vcpus // threads
+
+def guest_topology(core_list, vcpus, core_picks=None) :
+	
+	## Whole host cores for the guest, so that the two threads of a guest core are SMT siblings on the host.
+	## vCPU n is thread n % threads of guest core n // threads, the order QEMU numbers them in.
+	threads, nr_cores = core_count(core_list, vcpus)
+	
+	if core_picks is None :
+		## The last cores, the first one is where the host keeps its interrupts and housekeeping.
+		core_picks = list(range(len(core_list)))[-nr_cores:] if nr_cores <= len(core_list) else []
+	
+	if len(core_picks) != nr_cores or any(core_nr >= len(core_list) for core_nr in core_picks) :
+		raise ValueError("%d vCPUs need %d cores of %d threads, the host has %d cores" % (vcpus, nr_cores, threads, len(core_list)))
+	
+	guest_cores = [core_list[core_nr] for core_nr in core_picks]
+	vcpu_cpus   = [guest_cores[vcpu // threads][vcpu % threads] for vcpu in range(vcpus)]
+	
+	return {"sockets" : 1, "cores" : nr_cores, "threads" : threads, "host_cores" : guest_cores, "vcpu_cpus" : vcpu_cpus}
+
+def housekeeping(core_list, guest_cores, core_picks=None) :
+	
+	## CPUs for everything that is not a vCPU: the given cores, else the first core, the one the allocator keeps
+	## for the host, or the cores the guest doesn't have when it got the first core too.
+	if core_picks is None :
+		if core_list[0] not in guest_cores :
+			core_picks = [0]
+		else :
+			core_picks = [core_nr for core_nr, core in enumerate(core_list) if core not in guest_cores]
+	
+	return [cpu for core_nr in core_picks for cpu in core_list[core_nr]]
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+## Reads the VBIOS of a GPU through sysfs, updates its GOP with GOPupd.py and keeps the result in a cache.
+##
+## Usage: python3 -m passthrough.vbios <bdf> [-SYSFS dir] [-CACHE dir] [-ROM file] [-ANSWERS Y,Y] [-FORCE] [-OUT file]
+##
+##   <bdf>       PCI address of the GPU, 01:00.0 or 0000:01:00.0
+##   -SYSFS      root of the sysfs tree, /sys by default
+##   -CACHE      folder of the patched ROMs, roms/vbios-cache by default
+##   -ROM        take the VBIOS from this file (a GPU-Z dump) instead of the device
+##   -ANSWERS    answers to the GOPupd.py questions, Y to all of them by default
+##   -FORCE      run GOPupd.py again even when the ROM is in the cache
+##   -OUT        also copy the patched ROM to this file
+##
+## The cache is keyed by the vendor, device and subsystem IDs of the device and the SHA-1 of the source ROM:
+##
+##   roms/vbios-cache/10de-1c20-1558-65a1/<sha1>.rom     ROM to use as romfile
+##   roms/vbios-cache/10de-1c20-1558-65a1/<sha1>.json    source, GOPupd.py result and output
+##
+## A ROM that GOPupd.py leaves alone (GOP already the latest, or an N answer) is cached as it is, so it isn't
+## analysed again either. The launcher takes the newest entry of the device IDs.
+
+import contextlib
+import errno
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from passthrough import sysfs
+from passthrough.cli import Arg_List
+
+base_dir  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+gop_dir   = os.path.join(base_dir, "roms", "GOPUpd")
+cache_dir = os.path.join(base_dir, "roms", "vbios-cache")
+ansi_code = re.compile(r'\x1B\[[0-9;]*m')
+
+sys.path.insert(0, gop_dir)
+
+import GOPupd
+
+def read_rom(sys_root, bdf) :
+	
+	## Reading the rom attribute fails with EINVAL until it is enabled. A ROM that is already readable (enabled
+	## by someone else, or a fake tree) is read as it is and left the way it was found.
+	rom_path = os.path.join(sysfs.pci_dev_dir(sys_root, bdf), "rom")
+	
+	try :
+		with open(rom_path, 'rb') as rom_file :
+			return rom_file.read()
+	
+	except OSError as rom_err :
+		if rom_err.errno != errno.EINVAL :
+			raise
+	
+	sysfs.write_attr(rom_path, 1)
+	
+	try :
+		with open(rom_path, 'rb') as rom_file :
+			return rom_file.read()
+	
+	finally :
+		sysfs.write_attr(rom_path, 0)
+
+def check_rom(rom_data, dev_ids=None) :
+	
+	## The first image has to be a valid ROM of the same device, GOPupd.py finds everything else. Without the
+	## device IDs only the image is checked.
+	rom_found, rom_start, rom_pcir_off, rom_id_bin, rom_id_hex = GOPupd.rom_info_scan(rom_data, 0)[:5]
+	
+	if not rom_found :
+		raise ValueError("No ROM image found in the VBIOS")
+	
+	if dev_ids is None :
+		return
+	
+	if rom_id_hex not in ["00000000", (dev_ids["vendor"] + dev_ids["device"]).upper()] :
+		raise ValueError("The VBIOS is for %s:%s, the device is %s:%s" % (rom_id_hex[:4].lower(), rom_id_hex[4:].lower(),
+						dev_ids["vendor"], dev_ids["device"]))
+
+def cache_key(dev_ids) :
+	return "%(vendor)s-%(device)s-%(subsystem_vendor)s-%(subsystem_device)s" % dev_ids
+
+def cached_rom(cache_root, dev_ids, src_hash=None) :
+	
+	## Entry of a source ROM, or the newest entry of the device when no hash is given.
+	key_dir = os.path.join(cache_root, cache_key(dev_ids))
+	
+	if src_hash is not None :
+		rom_path = os.path.join(key_dir, "%s.rom" % src_hash)
+		
+		return rom_path if os.path.isfile(rom_path[:-4] + ".json") else None
+	
+	try :
+		rom_paths = [os.path.join(key_dir, rom_name) for rom_name in os.listdir(key_dir) if rom_name.endswith(".rom")]
+	except FileNotFoundError :
+		return None
+	
+	## The metadata is written last, an entry without it was interrupted.
+	rom_paths = [rom_path for rom_path in rom_paths if os.path.isfile(rom_path[:-4] + ".json")]
+	
+	return max(rom_paths, key=os.path.getmtime) if rom_paths else None
+
+def cache_meta(rom_path) :
+	with open(rom_path[:-4] + ".json", 'r') as meta_file :
+		return json.load(meta_file)
+
+def write_file(file_path, file_data) :
+	
+	## Under a unique name first, two launches may fill the same entry.
+	with tempfile.NamedTemporaryFile(dir=os.path.dirname(file_path), delete=False) as tmp_file :
+		tmp_file.write(file_data)
+	
+	## NamedTemporaryFile makes it 0600, the ROM and its metadata are read by QEMU and the other tools.
+	os.chmod(tmp_file.name, 0o644)
+	os.replace(tmp_file.name, file_path)
+
+def gop_update(rom_name, rom_data, answers) :
+	
+	## GOPupd.py works on relative paths, so it runs in a scratch folder with #GOP_Files linked in.
+	work_dir = tempfile.mkdtemp(prefix="vbios_")
+	file_name, file_ext = os.path.splitext(rom_name)
+	
+	try :
+		os.symlink(os.path.join(gop_dir, "#GOP_Files"), os.path.join(work_dir, "#GOP_Files"))
+		
+		with open(os.path.join(work_dir, rom_name), 'wb') as rom_file :
+			rom_file.write(rom_data)
+		
+		## gop_upd compares with <rom>_temp/<name>_dump.efi, without it every GOP looks missing and is replaced.
+		try :
+			with contextlib.redirect_stdout(io.StringIO()) :
+				GOPupd.write_ext_files(os.path.join(work_dir, rom_name), rom_data)
+		except SystemExit :
+			pass
+		
+		gop_run = subprocess.run([sys.executable, os.path.join(gop_dir, "GOPupd.py"), rom_name, "gop_upd"], cwd=work_dir,
+								input="".join(answer + "\n" for answer in answers).encode('utf-8'),
+								stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+		upd_path = os.path.join(work_dir, "%s_updGOP%s" % (file_name, file_ext))
+		upd_rom  = None
+		
+		if os.path.isfile(upd_path) :
+			with open(upd_path, 'rb') as rom_file :
+				upd_rom = rom_file.read()
+	
+	finally :
+		shutil.rmtree(work_dir, ignore_errors=True)
+	
+	return gop_run.returncode, ansi_code.sub("", gop_run.stdout.decode('utf-8', 'replace')), upd_rom
+
+def acquire(sys_root, bdf, cache_root, answers=("Y",) * 4, force_run=False, rom_file=None) :
+	
+	## Patched ROM of the device, from the cache when the same source ROM was seen before.
+	dev_ids = sysfs.pci_ids(sys_root, bdf)
+	
+	if rom_file is None :
+		src_data = read_rom(sys_root, bdf)
+		rom_name = "%s.rom" % cache_key(dev_ids)
+	else :
+		with open(rom_file, 'rb') as src_file :
+			src_data = src_file.read()
+		
+		rom_name = os.path.basename(rom_file)
+	
+	check_rom(src_data, dev_ids)
+	
+	src_hash = hashlib.sha1(src_data).hexdigest()
+	rom_path = cached_rom(cache_root, dev_ids, src_hash)
+	
+	if rom_path is not None and not force_run :
+		## Touched, so the newest entry of the device is the one in use.
+		os.utime(rom_path)
+		
+		return rom_path, cache_meta(rom_path), True
+	
+	start_time = time.perf_counter()
+	exit_code, gop_out, upd_rom = gop_update(rom_name, src_data, answers)
+	run_time   = time.perf_counter() - start_time
+	
+	## An update that is byte for byte the source isn't one.
+	if upd_rom == src_data :
+		upd_rom = None
+	
+	if upd_rom is None and exit_code != 0 :
+		raise RuntimeError("GOPupd.py failed with exit code %d:\n%s" % (exit_code, gop_out.rstrip()))
+	
+	rom_path = os.path.join(cache_root, cache_key(dev_ids), "%s.rom" % src_hash)
+	rom_meta = {"bdf" : sysfs.pci_bdf(bdf), "ids" : dev_ids, "source" : "sysfs" if rom_file is None else os.path.abspath(rom_file),
+				"source_sha1" : src_hash, "source_size" : len(src_data), "gop_updated" : upd_rom is not None,
+				"gop_exit_code" : exit_code, "gop_seconds" : run_time, "created" : time.time(), "output" : gop_out}
+	
+	os.makedirs(os.path.dirname(rom_path), exist_ok=True)
+	write_file(rom_path, upd_rom if upd_rom is not None else src_data)
+	write_file(rom_path[:-4] + ".json", json.dumps(rom_meta, indent=2).encode('utf-8') + b"\n")
+	
+	return rom_path, rom_meta, False
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list   = Arg_List(sys.argv[1:])
+	sys_root   = arg_list.value("-SYSFS", "/sys")
+	cache_root = os.path.abspath(arg_list.value("-CACHE", cache_dir))
+	rom_file   = arg_list.value("-ROM", None)
+	out_file   = arg_list.value("-OUT", None)
+	answers    = arg_list.value("-ANSWERS", "Y,Y,Y,Y").split(",")
+	force_run  = arg_list.flag("-FORCE")
+	bdf_list   = arg_list.positional()
+	
+	if len(bdf_list) != 1 :
+		print("Usage: python3 -m passthrough.vbios <bdf> [-SYSFS dir] [-CACHE dir] [-ROM file] [-ANSWERS Y,Y] [-FORCE] [-OUT file]")
+		sys.exit(1)
+	
+	try :
+		rom_path, rom_meta, from_cache = acquire(sys_root, bdf_list[0], cache_root, answers, force_run, rom_file)
+	except (OSError, ValueError, RuntimeError) as acq_err :
+		print("VBIOS of %s: %s" % (bdf_list[0], acq_err))
+		sys.exit(1)
+	
+	if from_cache :
+		print("Cached:  %s" % rom_path)
+	elif rom_meta["gop_updated"] :
+		print("Updated: %s (GOPupd.py %.2f s)" % (rom_path, rom_meta["gop_seconds"]))
+	else :
+		print("Kept:    %s (GOPupd.py wrote no update, see %s)" % (rom_path, os.path.basename(rom_path)[:-4] + ".json"))
+	
+	if out_file is not None :
+		shutil.copyfile(rom_path, out_file)
+		print("Copied to %s" % out_file)
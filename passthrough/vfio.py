@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+## Binds every function in the IOMMU group of a device to vfio-pci, or gives them back to the host.
+##
+## Usage: python3 -m passthrough.vfio <bdf> [-RESTORE] [-UNBIND-GPU] [-TIMEOUT seconds] [-JSON] [-SYSFS dir] [-STATE dir]
+##
+##   <bdf>         PCI address of the device, 01:00.0 for the GPU
+##   -RESTORE      clear driver_override and let the host drivers probe the functions again
+##   -UNBIND-GPU   take functions from nvidia or nouveau too, the binder refuses to by default
+##   -TIMEOUT      seconds to wait for vfio-pci to claim a function, 5 by default
+##   -JSON         print the timings as JSON
+##   -SYSFS        root of the sysfs tree, /sys by default
+##   -STATE        folder the timings of a bind are saved in for the launch log, $XDG_RUNTIME_DIR/passthrough by default
+##
+## Every function gets driver_override, is unbound from its driver and reprobed through drivers_probe, so only
+## the functions of this one device go to vfio-pci, the HDA audio of the GPU included, and not every card with
+## the same IDs like new_id did. Bridges stay on pcieport. The functions are done in parallel, and the time of
+## every step is printed, unbinding nvidia is usually most of it. The launcher adds the last bind to the boot times
+## of the VM (passthrough.boottime).
+
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+from passthrough import cpuset
+from passthrough import iommu
+from passthrough import sysfs
+from passthrough.cli import Arg_List
+
+vfio_driver = "vfio-pci"
+gpu_drivers = ["nvidia", "nouveau"]
+
+def bind_path(state_root, bdf) :
+	return os.path.join(state_root, "vfio-%s.json" % sysfs.pci_bdf(bdf).replace(":", "-"))
+
+def group_functions(sys_root, bdf) :
+	
+	## The devices of the group that can be assigned, bridges left out.
+	group_nr = iommu.device_group(sys_root, bdf)
+	
+	return group_nr, [dev_info for dev_info in (iommu.pci_device(sys_root, group_bdf) for group_bdf in iommu.iommu_groups(sys_root)[group_nr])
+						if not (dev_info["class"][:4] == "0604" and dev_info["driver"] in iommu.bridge_drivers + [None])]
+
+def dev_driver(dev_dir) :
+	drv_link = os.path.join(dev_dir, "driver")
+	
+	return os.path.basename(os.readlink(drv_link)) if os.path.islink(drv_link) else None
+
+def timed_step(step_times, step_name, step_func, *step_args) :
+	step_start = time.perf_counter()
+	step_func(*step_args)
+	step_times[step_name] = time.perf_counter() - step_start
+
+def wait_driver(dev_dir, driver, timeout) :
+	
+	## drivers_probe returns once the probe ran, unless the driver probes asynchronously.
+	end_time = time.monotonic() + timeout
+	
+	while dev_driver(dev_dir) != driver :
+		if time.monotonic() > end_time :
+			raise OSError("%s is on %s after %.1f s, not %s" % (os.path.basename(dev_dir), dev_driver(dev_dir) or "no driver", timeout, driver))
+		
+		time.sleep(0.01)
+
+def bind_function(sys_root, dev_info, timeout) :
+	dev_dir    = sysfs.pci_dev_dir(sys_root, dev_info["bdf"])
+	step_times = {}
+	func_start = time.perf_counter()
+	
+	timed_step(step_times, "override", sysfs.write_attr, os.path.join(dev_dir, "driver_override"), vfio_driver)
+	
+	if dev_info["driver"] is not None :
+		timed_step(step_times, "unbind", sysfs.write_attr, os.path.join(dev_dir, "driver", "unbind"), dev_info["bdf"])
+	
+	timed_step(step_times, "probe", sysfs.write_attr, os.path.join(sys_root, "bus", "pci", "drivers_probe"), dev_info["bdf"])
+	timed_step(step_times, "claim", wait_driver, dev_dir, vfio_driver, timeout)
+	
+	step_times["total"] = time.perf_counter() - func_start
+	
+	return step_times
+
+def restore_function(sys_root, dev_info, timeout) :
+	
+	## A newline clears driver_override, the host driver of the function, if there is one, claims it on the probe.
+	dev_dir    = sysfs.pci_dev_dir(sys_root, dev_info["bdf"])
+	step_times = {}
+	func_start = time.perf_counter()
+	
+	timed_step(step_times, "override", sysfs.write_attr, os.path.join(dev_dir, "driver_override"), "\n")
+	
+	if dev_info["driver"] is not None :
+		timed_step(step_times, "unbind", sysfs.write_attr, os.path.join(dev_dir, "driver", "unbind"), dev_info["bdf"])
+	
+	timed_step(step_times, "probe", sysfs.write_attr, os.path.join(sys_root, "bus", "pci", "drivers_probe"), dev_info["bdf"])
+	
+	step_times["total"] = time.perf_counter() - func_start
+	
+	return step_times
+
+def switch_group(sys_root, bdf, restore=False, unbind_gpu=False, timeout=5.0) :
+	
+	## {group, total, functions : [{bdf, from, to, steps, error}]}. Nothing is written when a function can't be
+	## taken from its driver, a failed function doesn't stop the others.
+	group_nr, group_devs = group_functions(sys_root, bdf)
+	
+	if not restore :
+		if not os.path.isdir(os.path.join(sys_root, "bus", "pci", "drivers", vfio_driver)) :
+			raise ValueError("%s is not loaded, modprobe vfio-pci first" % vfio_driver)
+		
+		gpu_funcs = [dev_info["bdf"] for dev_info in group_devs if dev_info["driver"] in gpu_drivers]
+		
+		if gpu_funcs and not unbind_gpu :
+			raise ValueError("%s on the host GPU driver, allow unbinding it to take it from the host" % ", ".join(gpu_funcs))
+		
+		group_devs  = [dev_info for dev_info in group_devs if dev_info["driver"] != vfio_driver]
+		switch_func = bind_function
+	else :
+		group_devs  = [dev_info for dev_info in group_devs if dev_info["driver"] == vfio_driver or
+						sysfs.read_attr(os.path.join(sysfs.pci_dev_dir(sys_root, dev_info["bdf"]), "driver_override"), "") not in ["", "(null)"]]
+		switch_func = restore_function
+	
+	group_start = time.perf_counter()
+	func_list   = []
+	
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(group_devs))) as func_pool :
+		func_runs = [(dev_info, func_pool.submit(switch_func, sys_root, dev_info, timeout)) for dev_info in group_devs]
+	
+	for dev_info, func_run in func_runs :
+		func_info = {"bdf" : dev_info["bdf"], "from" : dev_info["driver"], "steps" : None, "error" : None}
+		
+		try :
+			func_info["steps"] = func_run.result()
+		except OSError as func_err :
+			func_info["error"] = str(func_err)
+		
+		func_info["to"] = dev_driver(sysfs.pci_dev_dir(sys_root, dev_info["bdf"]))
+		func_list.append(func_info)
+	
+	return {"group" : group_nr, "total" : time.perf_counter() - group_start, "functions" : func_list}
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list   = Arg_List(sys.argv[1:])
+	restore    = arg_list.flag("-RESTORE")
+	unbind_gpu = arg_list.flag("-UNBIND-GPU")
+	timeout    = arg_list.number("-TIMEOUT", 5, 1)
+	json_out   = arg_list.flag("-JSON")
+	sys_root   = arg_list.value("-SYSFS", "/sys")
+	state_root = arg_list.value("-STATE", None) or cpuset.state_dir()
+	pos_args   = arg_list.positional()
+	
+	if len(pos_args) != 1 :
+		print("Usage: python3 -m passthrough.vfio <bdf> [-RESTORE] [-UNBIND-GPU] [-TIMEOUT seconds] [-JSON] [-SYSFS dir] [-STATE dir]")
+		sys.exit(1)
+	
+	try :
+		group_switch = switch_group(sys_root, pos_args[0], restore, unbind_gpu, timeout)
+	except (OSError, ValueError) as switch_err :
+		print("No %s: %s" % ("restore" if restore else "vfio binding", switch_err))
+		sys.exit(1)
+	
+	group_errors = [func_info for func_info in group_switch["functions"] if func_info["error"] is not None]
+	
+	if not restore and group_switch["functions"] and not group_errors :
+		try :
+			with open(bind_path(state_root, pos_args[0]), 'w') as bind_file :
+				json.dump(dict(group_switch, time=time.time()), bind_file)
+		except OSError as save_err :
+			print("Timings not saved: %s" % save_err)
+	
+	if json_out :
+		print(json.dumps(group_switch, indent=2))
+	else :
+		for func_info in group_switch["functions"] :
+			print("  %s  %-14s -> %-14s %s" % (func_info["bdf"], func_info["from"] or "no driver", func_info["to"] or "no driver",
+				func_info["error"] or "  ".join("%s %.1f ms" % (step_name, step_time * 1000) for step_name, step_time in func_info["steps"].items())))
+		
+		if not group_switch["functions"] :
+			print("  IOMMU Group %d has nothing to %s" % (group_switch["group"], "restore" if restore else "bind"))
+		
+		print("IOMMU Group %d %s in %.1f ms%s" % (group_switch["group"], "given back to the host" if restore else "bound to " + vfio_driver,
+			group_switch["total"] * 1000, ", %d functions failed%s" % (len(group_errors), "" if restore else ", --restore gives them back") if group_errors else ""))
+	
+	sys.exit(1 if group_errors else 0)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+## Benchmarks for GOPupd.py over the bundled VBIOS dumps and the GOP efiroms in #GOP_Files.
+##
+## Usage: GOPbench.py [file.rom ...] [-QUICK] [-JSON] [-MATCH text]
+##
+##   file.rom    ROMs to use instead of the ones in roms/clevo-p650hp6
+##   -QUICK      a single short round per case, to check that everything runs
+##   -JSON       also write the results to GOPbench.json in the current directory
+##   -MATCH      only run the cases whose name contains the text
+##
+## In-process cases are timed like timeit (best of several rounds, each round long enough to be
+## measured), the allocation peak comes from one extra call under tracemalloc. The isbn and gop_upd
+## cases run GOPupd.py as a new process, so they include the interpreter start and report the peak RSS.
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, bench_dir)
+
+import GOPupd
+
+def autorange(func, min_time) :
+	number = 1
+	
+	while True :
+		start = time.perf_counter()
+		
+		for _ in range(number) :
+			func()
+		
+		spent = time.perf_counter() - start
+		
+		if spent >= min_time :
+			return number
+		
+		number *= 10 if spent < min_time / 10 else 2
+
+def bench_func(name, func, data_size, rounds, min_time) :
+	
+	with open(os.devnull, 'w') as null_out :
+		std_out    = sys.stdout
+		sys.stdout = null_out
+		
+		try :
+			number = autorange(func, min_time)
+			times  = []
+			
+			for _ in range(rounds) :
+				start = time.perf_counter()
+				
+				for _ in range(number) :
+					func()
+				
+				times.append((time.perf_counter() - start) / number)
+			
+			tracemalloc.start()
+			func()
+			mem_net, mem_peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+		
+		finally :
+			sys.stdout = std_out
+	
+	return bench_result(name, times, data_size, number, {"peak_traced_bytes" : mem_peak, "net_traced_bytes" : mem_net})
+
+def bench_process(name, args, stdin_data, data_size, rounds, cleanup) :
+	times    = []
+	peak_rss = None
+	
+	for _ in range(rounds) :
+		cleanup()
+		start = time.perf_counter()
+		proc  = subprocess.Popen([sys.executable, os.path.join(bench_dir, "GOPupd.py")] + args,
+								stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+		
+		if hasattr(os, "wait4") :
+			proc.stdin.write(stdin_data)
+			proc.stdin.close()
+			err_data = proc.stderr.read()
+			proc_pid, status, usage = os.wait4(proc.pid, 0)
+			status   = os.waitstatus_to_exitcode(status)
+			## ru_maxrss is in KB on Linux and in bytes on macOS.
+			peak_rss = max(peak_rss or 0, usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024))
+		else :
+			err_data = proc.communicate(stdin_data)[1]
+			status   = proc.returncode
+		
+		times.append(time.perf_counter() - start)
+		
+		if status != 0 or err_data :
+			raise RuntimeError("GOPupd.py %s failed:\n%s" % (" ".join(args), err_data.decode('utf-8', 'replace')))
+	
+	return bench_result(name, times, data_size, 1, {"peak_rss_bytes" : peak_rss})
+
+def bench_result(name, times, data_size, number, mem_info) :
+	best   = min(times)
+	result = {"case" : name, "best_seconds" : best, "median_seconds" : sorted(times)[len(times) // 2],
+			"rounds" : len(times), "calls_per_round" : number, "bytes" : data_size,
+			"ops_per_sec" : 1 / best if best else 0.0, "mb_per_sec" : data_size / best / 1e6 if best else 0.0}
+	result.update(mem_info)
+	
+	return result
+
+def scan_all(rom_data) :
+	## Same loop as -ROMSCAN, every image from the start of the file.
+	position = 0
+	
+	while True :
+		rom_found, rom_start = GOPupd.rom_info_scan(rom_data, position)[:2]
+		
+		if not rom_found :
+			break
+		
+		position = rom_start + 2
+
+def efirom_dump(efirom_data) :
+	efi_off = int.from_bytes(efirom_data[0x16:0x18], 'little')
+	
+	return GOPupd.efi_decompress(efirom_data[efi_off:])
+
+def rom_cases(rom_path, run_case) :
+	rom_name = os.path.basename(rom_path)
+	
+	with open(rom_path, 'rb') as rom_file :
+		rom_data = rom_file.read()
+	
+	shutil.copyfile(rom_path, rom_name)
+	rom_base, rom_ext = os.path.splitext(rom_name)
+	
+	run_case("rom_info_scan/%s" % rom_name, lambda: scan_all(rom_data), len(rom_data))
+	run_case("rom_info/%s" % rom_name, lambda: GOPupd.rom_info(rom_data, 0, "all"), len(rom_data))
+	
+	def cleanup() :
+		if os.path.isfile("%s_updGOP%s" % (rom_base, rom_ext)) :
+			os.remove("%s_updGOP%s" % (rom_base, rom_ext))
+		
+		shutil.rmtree("%s_temp" % rom_name, ignore_errors=True)
+	
+	run_case("isbn/%s" % rom_name, None, len(rom_data), [rom_name, "isbn", "-ISBN"], b"", cleanup)
+	## Answer yes to every question, the GOP type comes from the device ID for the bundled ROMs.
+	run_case("gop_upd/%s" % rom_name, None, len(rom_data), [rom_name, "gop_upd"], b"Y\n" * 4, cleanup)
+
+def efirom_cases(efirom_path, run_case) :
+	efirom_name = os.path.basename(efirom_path)
+	
+	with open(efirom_path, 'rb') as efirom_file :
+		efirom_data = efirom_file.read()
+	
+	run_case("efi_decompress/%s" % efirom_name, lambda: efirom_dump(efirom_data), len(efirom_data))
+	efi_dump = efirom_dump(efirom_data)
+	
+	if efi_dump is None :
+		print("  %s could not be decompressed, skipping its EFI cases" % efirom_name)
+		return
+	
+	run_case("efi_version/%s" % efirom_name, lambda: GOPupd.efi_version(efi_dump), len(efi_dump))
+	run_case("pe_checksum/%s" % efirom_name, lambda: GOPupd.pe_checksum(efi_dump), len(efi_dump))
+	
+	## check_in_database reads the vendor and type left by efi_version in the main flow.
+	with open(os.devnull, 'w') as null_out :
+		std_out    = sys.stdout
+		sys.stdout = null_out
+		GOPupd.gop_type, GOPupd.nv_type, efi_ver_str, efi_info_string = GOPupd.efi_version(efi_dump)
+		sys.stdout = std_out
+	
+	run_case("check_in_database/%s" % efirom_name, lambda: GOPupd.check_in_database(efi_info_string), len(efi_info_string))
+
+def print_result(result) :
+	if "peak_traced_bytes" in result :
+		mem_str = "%10.1f" % (result["peak_traced_bytes"] / 1024)
+	elif result["peak_rss_bytes"] is not None :
+		mem_str = "%10.1f RSS" % (result["peak_rss_bytes"] / 1024)
+	else :
+		mem_str = "%10s" % "-"
+	
+	print(" %-48s %12.1f %10.2f %s" % (result["case"], result["ops_per_sec"], result["mb_per_sec"], mem_str))
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = sys.argv[1:]
+	upper_arg = [arg_val.upper() for arg_val in arg_list]
+	quick_run = "-QUICK" in upper_arg
+	json_out  = "-JSON" in upper_arg
+	match_str = ""
+	
+	if "-MATCH" in upper_arg :
+		match_idx = upper_arg.index("-MATCH")
+		match_str = arg_list[match_idx + 1] if match_idx + 1 < len(arg_list) else ""
+		del arg_list[match_idx:match_idx + 2]
+	
+	rom_list = [os.path.abspath(arg_val) for arg_val in arg_list if arg_val[:1] != "-"]
+	
+	if not rom_list :
+		rom_dir  = os.path.join(bench_dir, "..", "clevo-p650hp6")
+		rom_list = [os.path.abspath(os.path.join(rom_dir, rom_name)) for rom_name in sorted(os.listdir(rom_dir)) if rom_name.endswith(".rom")]
+	
+	gop_dir     = os.path.join(bench_dir, "#GOP_Files")
+	efirom_list = [os.path.join(gop_dir, gop_name) for gop_name in sorted(os.listdir(gop_dir)) if gop_name.endswith(".efirom")]
+	rounds      = 1 if quick_run else 5
+	min_time    = 0 if quick_run else 0.2
+	results     = []
+	start_dir   = os.getcwd()
+	
+	## GOPupd works on relative paths (#GOP_Files, <rom>_temp), so everything runs from a scratch directory.
+	work_dir = tempfile.mkdtemp(prefix="GOPbench_")
+	shutil.copytree(gop_dir, os.path.join(work_dir, "#GOP_Files"))
+	os.chdir(work_dir)
+	
+	GOPupd.file_rom      = "bench.rom"
+	GOPupd.file_dir      = os.path.join(work_dir, "bench.rom")
+	GOPupd.fileExtension = ".rom"
+	os.mkdir("bench.rom_temp")
+	
+	def run_case(name, func, data_size, proc_args=None, stdin_data=b"", cleanup=None) :
+		if match_str not in name :
+			return
+		
+		if func is None :
+			result = bench_process(name, proc_args, stdin_data, data_size, rounds if quick_run else 3, cleanup)
+		else :
+			result = bench_func(name, func, data_size, rounds, min_time)
+		
+		results.append(result)
+		print_result(result)
+	
+	print("\n---------------------------GOPbench---------------------------\n")
+	print(" Python %s on %s\n" % (platform.python_version(), platform.platform()))
+	print(" %-48s %12s %10s %10s\n" % ("Case", "ops/sec", "MB/s", "Peak (KB)"))
+	
+	try :
+		for rom_path in rom_list :
+			rom_cases(rom_path, run_case)
+		
+		for efirom_path in efirom_list :
+			efirom_cases(efirom_path, run_case)
+	
+	finally :
+		os.chdir(start_dir)
+		shutil.rmtree(work_dir, ignore_errors=True)
+	
+	print("\n Peak is the tracemalloc peak of one call, or the peak RSS of the process for isbn and gop_upd.")
+	print("\n--------------------------------------------------------------\n")
+	
+	if json_out :
+		with open("GOPbench.json", 'w') as json_file :
+			json.dump({"python" : platform.python_version(), "platform" : platform.platform(), "quick" : quick_run,
+					"results" : results}, json_file, indent=2)
+		
+		print("Results written to GOPbench.json\n")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+## Regenerates the AMD ID lists in #GOP_Files from the bundled AMD GOP efiroms.
+##
+## Usage: GOPids.py [-JOBS n] [-CHECK]
+##
+##   -JOBS       number of worker processes, one per efirom by default
+##   -CHECK      only report the lists that are out of date, write nothing
+##
+## Every efirom is decompressed and its ID table read in a separate process. The ranges of the efiroms
+## sharing a list (amd_gop and amd_gop_mod) are merged, so each ID and name pair is written once.
+
+import concurrent.futures
+import os
+import sys
+
+ids_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ids_dir)
+
+import GOPupd
+
+gop_dir = os.path.join(ids_dir, "#GOP_Files")
+
+## The lists gop_upd reads, with the efiroms they describe.
+id_lists = {
+	"amd_gop_IDs.txt"            : ["amd_gop.efirom", "amd_gop_mod.efirom"],
+	"amd_gop_IDs_1.57.0.0.0.txt" : ["amd_gop_1.57.0.0.0.efirom"],
+	"amd_gop_IDs_2.4.0.0.0.txt"  : ["amd_gop_vega.efirom"],
+}
+
+def efirom_ranges(efirom_name) :
+	
+	with open(os.path.join(gop_dir, efirom_name), 'rb') as efirom_file :
+		efirom_data = efirom_file.read()
+	
+	efi_off  = int.from_bytes(efirom_data[0x16:0x18], 'little')
+	efi_dump = GOPupd.efi_decompress(efirom_data[efi_off:])
+	
+	if efi_dump is None :
+		raise ValueError("%s could not be decompressed" % efirom_name)
+	
+	return GOPupd.amd_id_ranges(efi_dump)
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = sys.argv[1:]
+	upper_arg = [arg_val.upper() for arg_val in arg_list]
+	check_run = "-CHECK" in upper_arg
+	efiroms   = sorted(set(efirom_name for efirom_names in id_lists.values() for efirom_name in efirom_names))
+	jobs      = len(efiroms)
+	
+	if "-JOBS" in upper_arg :
+		jobs_idx = upper_arg.index("-JOBS")
+		
+		try :
+			jobs = max(1, int(arg_list[jobs_idx + 1]))
+		except (IndexError, ValueError) :
+			print("-JOBS needs a number of processes!")
+			sys.exit(1)
+	
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor :
+		gop_ranges = dict(zip(efiroms, executor.map(efirom_ranges, efiroms)))
+	
+	out_dated = 0
+	
+	for list_name, efirom_names in id_lists.items() :
+		id_ranges = [id_range for efirom_name in efirom_names for id_range in gop_ranges[efirom_name]]
+		
+		if not id_ranges :
+			print("No ID table found for %s, keeping it." % list_name)
+			continue
+		
+		## CRLF, like the rest of the text files in #GOP_Files.
+		list_data = GOPupd.expand_id_ranges(id_ranges).replace("\n", "\r\n").encode('utf-8')
+		list_path = os.path.join(gop_dir, list_name)
+		
+		if os.path.isfile(list_path) :
+			with open(list_path, 'rb') as list_file :
+				if list_file.read() == list_data :
+					print("%-28s up to date, %d ranges" % (list_name, len(id_ranges)))
+					continue
+		
+		out_dated += 1
+		
+		if check_run :
+			print("%-28s out of date" % list_name)
+		else :
+			with open(list_path, 'wb') as list_file :
+				list_file.write(list_data)
+			
+			print("%-28s written, %d ranges, %d IDs" % (list_name, len(id_ranges), list_data.count(b"\r\n")))
+	
+	if check_run and out_dated :
+		sys.exit(1)
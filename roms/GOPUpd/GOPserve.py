@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+
+## Resident GOPupd.py service, for checking or updating many VBIOS files without paying the start-up each time.
+##
+## Usage: GOPserve.py [-PORT n] [-SOCKET path] [-JOBS n] [-CACHE dir]
+##
+##   -PORT       localhost TCP port to listen on, 8642 by default
+##   -SOCKET     listen on a Unix socket instead of TCP, an old socket is replaced, any other file is refused
+##   -JOBS       maximum number of requests handled at the same time, 16 by default
+##   -CACHE      folder for the decompressed GOPs found in requests, GOPserve_cache next to this script by default
+##
+## Requests, with the ROM as the request body:
+##
+##   POST /report?name=file.rom              identification only, JSON with the gop_upd output
+##   POST /update?name=file.rom&answers=Y    updated ROM as the response body, or JSON with the output on failure
+##   GET  /status                            service and #GOP_Files state
+##
+## The name is a file name ending in .rom, vbios.rom without one, anything else is answered with a 400.
+##
+##   curl --unix-socket /run/gopupd.sock --data-binary @GP106.rom "http://localhost/report?name=GP106.rom"
+##
+## GOPupd.py, the GOP files, the database and the ID lists are loaded once. Every request is handled in a
+## forked child, so it starts warm and its globals, prompts and <rom>_temp folder don't touch the other requests.
+## The files in #GOP_Files are checked between requests and read again when they change.
+
+import ast
+import hashlib
+import http.server
+import io
+import json
+import os
+import re
+import shutil
+import signal
+import socketserver
+import stat
+import sys
+import tempfile
+import time
+import traceback
+import urllib.parse
+
+serve_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, serve_dir)
+
+import GOPupd
+
+gop_dir   = os.path.join(serve_dir, "#GOP_Files")
+cache_dir = os.path.join(serve_dir, "GOPserve_cache")
+efi_dumps = {} # SHA-1 of the efirom : decompressed image
+ansi_code = re.compile(r'\x1B\[[0-9;]*m')
+
+def main_code() :
+	
+	## The body of GOPupd's "if __name__ == '__main__'" block, compiled once and run in the module of every child.
+	with open(GOPupd.__file__, 'r', encoding='utf-8') as src_file :
+		src_tree = ast.parse(src_file.read(), GOPupd.__file__)
+	
+	for src_node in src_tree.body :
+		if isinstance(src_node, ast.If) and isinstance(src_node.test, ast.Compare) and \
+			isinstance(src_node.test.left, ast.Name) and src_node.test.left.id == "__name__" :
+			return compile(ast.Module(body=src_node.body, type_ignores=[]), GOPupd.__file__, 'exec')
+	
+	raise RuntimeError("No main block in %s" % GOPupd.__file__)
+
+def gop_preload() :
+	
+	## gop_file() only reads a file again when it changed, so this is also the hot reload.
+	start_dir = os.getcwd()
+	os.chdir(serve_dir)
+	
+	try :
+		for gop_name in sorted(os.listdir(gop_dir)) :
+			if gop_name.endswith(".txt") :
+				GOPupd.gop_lines(gop_name)
+			elif gop_name.endswith(".efirom") :
+				GOPupd.gop_file(gop_name)
+		
+		GOPupd.nv_arch_from_id("0000", False)
+		
+		for gop_name, (gop_key, gop_data) in list(GOPupd.gop_files.items()) :
+			if gop_name.endswith(".efirom") :
+				efi_dump(gop_data)
+	
+	finally :
+		os.chdir(start_dir)
+
+def efi_dump(efi_rom) :
+	
+	## Decompressed images by the SHA-1 of their efirom. The bundled GOPs are decompressed in the parent at
+	## start-up, the others once by the first child that meets them and then kept in the cache folder.
+	efi_hash = hashlib.sha1(efi_rom).hexdigest()
+	
+	if efi_hash in efi_dumps :
+		return efi_dumps[efi_hash]
+	
+	cache_file = os.path.join(cache_dir, "%s.efi" % efi_hash)
+	
+	if os.path.isfile(cache_file) :
+		with open(cache_file, 'rb') as dump_file :
+			dump_data = dump_file.read()
+	
+	else :
+		dump_data = GOPupd.efirom_dump(efi_rom)
+		
+		if dump_data is not None :
+			## Written under a unique name first, another child may be writing the same image.
+			with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as dump_file :
+				dump_file.write(dump_data)
+			
+			os.replace(dump_file.name, cache_file)
+	
+	efi_dumps[efi_hash] = dump_data
+	
+	return dump_data
+
+def run_gop_upd(code, rom_name, rom_data, answers) :
+	
+	## Runs in the forked child. GOPupd works on relative paths, so it gets a scratch folder of its own.
+	work_dir  = tempfile.mkdtemp(prefix="GOPserve_")
+	std_out   = sys.stdout
+	std_in    = sys.stdin
+	out_log   = io.StringIO()
+	exit_code = 0
+	file_name, file_ext = os.path.splitext(rom_name)
+	
+	try :
+		os.symlink(gop_dir, os.path.join(work_dir, "#GOP_Files"))
+		os.chdir(work_dir)
+		os.mkdir("%s_temp" % rom_name)
+		
+		with open(rom_name, 'wb') as rom_file :
+			rom_file.write(rom_data)
+		
+		GOPupd.file_dir      = os.path.join(work_dir, rom_name)
+		GOPupd.file_rom      = rom_name
+		GOPupd.fileExtension = file_ext
+		sys.argv   = [GOPupd.__file__, rom_name, "gop_upd"]
+		sys.stdin  = io.StringIO("".join(answer + "\n" for answer in answers))
+		sys.stdout = io.StringIO() # gop_upd prints the same ROM info again
+		
+		try :
+			## What the batch files do with ext_efirom and UEFIRomExtract, with the decompressed images cached.
+			GOPupd.write_ext_files(rom_name, rom_data, efi_dump)
+		except SystemExit :
+			pass
+		
+		sys.stdout = out_log
+		
+		try :
+			exec(code, vars(GOPupd))
+		except SystemExit as exit_err :
+			exit_code = exit_err.code if isinstance(exit_err.code, int) else 0
+		except EOFError :
+			print("\nGOPupd.py asked for more answers than were given.")
+			exit_code = 2
+		except Exception :
+			print(traceback.format_exc())
+			exit_code = 1
+		
+		upd_file = "%s_updGOP%s" % (file_name, file_ext)
+		upd_rom  = None
+		
+		if os.path.isfile(upd_file) :
+			with open(upd_file, 'rb') as rom_file :
+				upd_rom = rom_file.read()
+	
+	finally :
+		sys.stdout = std_out
+		sys.stdin  = std_in
+		os.chdir(serve_dir)
+		shutil.rmtree(work_dir, ignore_errors=True)
+	
+	return exit_code, ansi_code.sub("", out_log.getvalue()), upd_rom
+
+class GOP_Handler(http.server.BaseHTTPRequestHandler) :
+	
+	server_version = "GOPserve/1.0"
+	
+	def address_string(self) :
+		## Unix socket clients have no address.
+		return self.client_address[0] if self.client_address else "unix"
+	
+	def send_data(self, status, data, content_type, extra_headers=()) :
+		self.send_response(status)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(len(data)))
+		
+		for hdr_name, hdr_value in extra_headers :
+			self.send_header(hdr_name, hdr_value)
+		
+		self.end_headers()
+		self.wfile.write(data)
+	
+	def send_json(self, status, json_data) :
+		self.send_data(status, json.dumps(json_data, indent=2).encode('utf-8') + b"\n", "application/json")
+	
+	def do_GET(self) :
+		req_url = urllib.parse.urlsplit(self.path)
+		
+		if req_url.path != "/status" :
+			self.send_json(404, {"error" : "unknown path %s" % req_url.path})
+			return
+		
+		db_stat = os.stat(os.path.join(gop_dir, "#GOP_Database.txt"))
+		
+		self.send_json(200, {"pid" : os.getppid(), "uptime" : time.time() - self.server.start_time,
+							"requests" : self.server.nr_requests, "database_mtime" : db_stat.st_mtime,
+							"gop_files" : sorted(GOPupd.gop_files)})
+	
+	def do_POST(self) :
+		req_url   = urllib.parse.urlsplit(self.path)
+		req_query = urllib.parse.parse_qs(req_url.query)
+		rom_name  = os.path.basename(req_query.get("name", ["vbios.rom"])[0])
+		
+		if req_url.path not in ["/report", "/update"] :
+			self.send_json(404, {"error" : "unknown path %s" % req_url.path})
+			return
+		
+		## The name becomes a file and a <name>_temp folder in the scratch folder, "." and ".." are folders already.
+		if rom_name in [".", ".."] or os.path.splitext(rom_name)[1].lower() != ".rom" :
+			self.send_json(400, {"error" : "name must be a file name ending in .rom, not %r" % rom_name})
+			return
+		
+		try :
+			rom_size = int(self.headers.get("Content-Length", ""))
+		except ValueError :
+			self.send_json(411, {"error" : "Content-Length is needed"})
+			return
+		
+		## read(-1) would wait for the client to close the connection.
+		if rom_size < 0 :
+			self.send_json(400, {"error" : "Content-Length can't be negative, not %d" % rom_size})
+			return
+		
+		rom_data = self.rfile.read(rom_size)
+		
+		if req_url.path == "/report" :
+			## Identification stops at the first question.
+			answers = ["N"]
+		else :
+			answers = ",".join(req_query.get("answers", ["Y"])).split(",")
+		
+		start_time = time.perf_counter()
+		
+		try :
+			exit_code, out_log, upd_rom = run_gop_upd(self.server.main_code, rom_name, rom_data, answers)
+		except OSError as os_err :
+			self.send_json(500, {"name" : rom_name, "error" : str(os_err)})
+			return
+		
+		run_time = time.perf_counter() - start_time
+		
+		if req_url.path == "/update" and upd_rom is not None :
+			file_name, file_ext = os.path.splitext(rom_name)
+			self.send_data(200, upd_rom, "application/octet-stream",
+						[("Content-Disposition", "attachment; filename=\"%s_updGOP%s\"" % (file_name, file_ext)),
+						("X-GOPupd-Seconds", "%.4f" % run_time)])
+		else :
+			self.send_json(200 if req_url.path == "/report" else 422,
+						{"name" : rom_name, "exit_code" : exit_code, "seconds" : run_time, "output" : out_log})
+
+class GOP_Server(socketserver.ForkingMixIn, http.server.HTTPServer) :
+	
+	def __init__(self, server_address, max_children, address_family) :
+		self.address_family = address_family
+		self.max_children   = max_children
+		self.main_code      = main_code()
+		self.start_time     = time.time()
+		self.nr_requests    = 0
+		
+		gop_preload()
+		
+		http.server.HTTPServer.__init__(self, server_address, GOP_Handler)
+	
+	def server_bind(self) :
+		if self.address_family == socketserver.socket.AF_UNIX :
+			socketserver.TCPServer.server_bind(self)
+			self.server_name = "localhost"
+			self.server_port = 0
+		else :
+			http.server.HTTPServer.server_bind(self)
+	
+	def process_request(self, request, client_address) :
+		self.nr_requests += 1
+		socketserver.ForkingMixIn.process_request(self, request, client_address)
+	
+	def service_actions(self) :
+		## Called between requests, the children are forked from an up to date cache.
+		socketserver.ForkingMixIn.service_actions(self)
+		gop_preload()
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = sys.argv[1:]
+	upper_arg = [arg_val.upper() for arg_val in arg_list]
+	
+	def arg_value(arg_name, default) :
+		if arg_name not in upper_arg :
+			return default
+		
+		arg_idx = upper_arg.index(arg_name)
+		
+		if arg_idx + 1 >= len(arg_list) :
+			print("%s needs a value!" % arg_name)
+			sys.exit(1)
+		
+		return arg_list[arg_idx + 1]
+	
+	sock_path = arg_value("-SOCKET", None)
+	cache_dir = os.path.abspath(arg_value("-CACHE", cache_dir))
+	
+	os.makedirs(cache_dir, exist_ok=True)
+	
+	try :
+		tcp_port = int(arg_value("-PORT", 8642))
+		jobs     = max(1, int(arg_value("-JOBS", 16)))
+	except ValueError :
+		print("-PORT and -JOBS need a number!")
+		sys.exit(1)
+	
+	if not hasattr(os, "fork") :
+		print("GOPserve.py needs fork(), it doesn't run on Windows.")
+		sys.exit(1)
+	
+	if sock_path is not None :
+		## Only the socket of an earlier run is replaced, a mistyped -SOCKET must not delete a ROM.
+		if os.path.lexists(sock_path) :
+			if not stat.S_ISSOCK(os.lstat(sock_path).st_mode) :
+				print("%s is not a socket, it is left alone!" % sock_path)
+				sys.exit(1)
+			
+			os.remove(sock_path)
+		
+		server = GOP_Server(sock_path, jobs, socketserver.socket.AF_UNIX)
+		print("GOPserve listening on %s" % sock_path)
+	else :
+		server = GOP_Server(("127.0.0.1", tcp_port), jobs, socketserver.socket.AF_INET)
+		print("GOPserve listening on http://127.0.0.1:%d" % tcp_port)
+	
+	os.chdir(serve_dir)
+	
+	## Stopped by the service manager, still remove the socket.
+	signal.signal(signal.SIGTERM, lambda sig_nr, frame : sys.exit(0))
+	
+	try :
+		server.serve_forever()
+	except KeyboardInterrupt :
+		pass
+	finally :
+		server.server_close()
+		
+		if sock_path is not None and os.path.exists(sock_path) :
+			os.remove(sock_path)
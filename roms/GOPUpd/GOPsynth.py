@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+## Synthetic VBIOS generator for scaling tests of GOPupd.py.
+##
+## Usage: GOPsynth.py file.rom [-SIZE 16M] [-AMD] [-IFR] [-TURING] [-EFI] [-DECOYS n] [-SPECIAL n] [-FOREIGN] [-SEED n] [-DUMP]
+##        GOPsynth.py -CORPUS dir [-SIZE 16M] [-SEED n] [-DUMP]
+##
+##   -SIZE       total file size, 64K to 64M (default 1M), a layout that needs more is skipped with its smallest size
+##   -AMD        AMD layout: legacy ROM with MCuC microcode pointer, EFI, microcode and padding
+##   -IFR        add a Nvidia IFR header (NVGI with RFRD at 0x4000) before the ROM
+##   -TURING     Turing layout: IFR, TU1xx IDs and a backup copy of the whole image after a 4K boundary
+##   -EFI        use the GOP from #GOP_Files as EFI image, otherwise Nvidia gets a 77BB dummy EFI
+##   -DECOYS     55AA decoys per 64K of image data (default 16)
+##   -SPECIAL    number of filler NPDS special images after EFI (default depends on size)
+##   -FOREIGN    put foreign data after the end padding
+##   -SEED       seed for the image contents, the same seed gives the same file
+##   -CORPUS     write a set of layouts at the given size to the directory, at 64K only nv_dummy fits: the bundled
+##               GOPs are 58K to 74K and the AMD microcode starts at 0x1A000, 512K fits every layout
+##   -DUMP       also write <rom>_temp/<name>_compr.efirom and <name>_dump.efi like ext_efirom and UEFIRomExtract
+##               would, with a Nvidia GOP version one below the bundled one, so gop_upd goes through the whole
+##               image assembly (Turing backup check too)
+##
+## The images follow what GOPupd.py parses: a legacy ROM with PCIR and NPDE that contains the first
+## special image, then EFI, an ISBN special image, filler special images and padding. Every image
+## has a valid checksum, only image bodies get random data and decoys. The files can be given to
+## GOPbench.py in place of the bundled ROMs.
+
+import os
+import random
+import sys
+
+synth_dir = os.path.dirname(os.path.abspath(__file__))
+
+NV_VEN  = 0x10DE
+NV_DEV  = 0x1C20 # GP106
+TU_DEV  = 0x1F10 # TU106
+NPDS_ID = 0x1C00
+AMD_VEN = 0x1002
+AMD_DEV = 0x67DF # Polaris 10
+
+def parse_size(size_str) :
+	size_str = size_str.strip().upper()
+	size_mul = {"K" : 0x400, "M" : 0x100000}.get(size_str[-1:], 1)
+	
+	if size_mul != 1 :
+		size_str = size_str[:-1]
+	
+	return int(size_str, 0) * size_mul
+
+def align(value, step) :
+	return (value + step - 1) // step * step
+
+def fix_checksum(image) :
+	## The last byte of every image makes the sum of the image zero.
+	image[-1] = (256 - (sum(image[:-1]) & 0xFF)) & 0xFF
+
+def add_decoys(rng, image, body_start, body_end, decoys) :
+	## 55AA without a valid PCIR, so every scanner has to look at them and move on.
+	nr_decoys = (body_end - body_start) * decoys // 0x10000
+	
+	for _ in range(nr_decoys) :
+		decoy_off = rng.randrange(body_start, body_end - 0x20)
+		image[decoy_off:decoy_off + 2] = b'\x55\xAA'
+		image[decoy_off + 0x18:decoy_off + 0x1A] = rng.randrange(0x20, 0x200).to_bytes(2, 'little')
+
+def npde_struct(image_size, last_img) :
+	return b'NPDE' + (0x101).to_bytes(2, 'little') + (0x14).to_bytes(2, 'little') + (image_size // 0x200).to_bytes(2, 'little') + \
+		bytes([0x80 if last_img else 0]) + b'\x00' * 9
+
+def build_ifr(rng, ifr_size) :
+	ifr_data = bytearray(rng.randbytes(ifr_size))
+	ifr_data[0:4] = b'NVGI'
+	ifr_data[0x14:0x16] = (0x10).to_bytes(2, 'little') # Small size, the real one is in RFRD
+	ifr_data[0x4000:0x4004] = b'RFRD'
+	ifr_data[0x4008:0x400C] = ifr_size.to_bytes(4, 'little')
+	
+	return ifr_data
+
+def build_legacy(rng, vendor, device, legacy_size, container_size, decoys, mc_off) :
+	legacy = bytearray(rng.randbytes(legacy_size))
+	legacy[0:2] = b'\x55\xAA'
+	legacy[2] = container_size // 0x200
+	legacy[3:5] = b'\xEB\x4B'
+	legacy[0x18:0x1A] = (0x1A0).to_bytes(2, 'little')
+	legacy[0x1A:0x1C] = b'\x00\x00'
+	legacy[0x1E:0x21] = b'IBM'
+	
+	pcir = b'PCIR' + vendor.to_bytes(2, 'little') + device.to_bytes(2, 'little') + b'\x00\x00' + (0x1C).to_bytes(2, 'little') + \
+		b'\x03\x00\x00\x03' + (container_size // 0x200).to_bytes(2, 'little') + b'\x01\x00\x00\x00\x80\x00\x00\x00\x00\x00\x00\x00'
+	legacy[0x1A0:0x1A0 + len(pcir)] = pcir
+	
+	if vendor == NV_VEN :
+		legacy[0x1C0:0x1D4] = npde_struct(legacy_size, False)
+		body_start = 0x200
+	else :
+		legacy[0x1C0:0x200] = b'\x00' * 0x40
+		body_start = 0x200
+	
+	if mc_off :
+		## Microcode table entry: pointer, size and the signature that GOPupd searches for.
+		legacy[0x300:0x30C] = mc_off.to_bytes(4, 'little') + b'\x00' * 4 + b'MCuC'
+		body_start = 0x310
+	
+	add_decoys(rng, legacy, body_start, legacy_size, decoys)
+	
+	if vendor == AMD_VEN :
+		## AMD keeps the checksum after IBM.
+		legacy[0x21] = 0
+		legacy[0x21] = (256 - (sum(legacy) & 0xFF)) & 0xFF
+	else :
+		fix_checksum(legacy)
+	
+	return legacy
+
+def build_isbn(rng) :
+	lic_one  = rng.randbytes(rng.randrange(0x100, 0x200))
+	lic_two  = rng.randbytes(rng.randrange(0x100, 0x200))
+	map_nr   = rng.randrange(0x08, 0x20)
+	size_one = 0x1C + len(lic_one)
+	size_two = 0x1C + len(lic_two)
+	
+	## The size of the second certificate is stored as a running total.
+	records = (2).to_bytes(4, 'little') + (0x1C).to_bytes(4, 'little') + (0).to_bytes(4, 'little') + size_one.to_bytes(4, 'little') + \
+			(6).to_bytes(4, 'little') + (1).to_bytes(4, 'little') + (1).to_bytes(4, 'little') + lic_one + \
+			(2).to_bytes(4, 'little') + (0x1C).to_bytes(4, 'little') + (0).to_bytes(4, 'little') + (size_one + size_two).to_bytes(4, 'little') + \
+			(2).to_bytes(4, 'little') + (1).to_bytes(4, 'little') + (2).to_bytes(4, 'little') + lic_two + \
+			(1).to_bytes(4, 'little') + (0x10).to_bytes(4, 'little') + map_nr.to_bytes(4, 'little') + (0).to_bytes(4, 'little')
+	
+	for map_idx in range(map_nr) :
+		records += (map_idx * 0x1000).to_bytes(4, 'little') + (0x1000).to_bytes(4, 'little') + (map_idx & 3).to_bytes(4, 'little')
+	
+	return b'ISBN' + (0xC).to_bytes(4, 'little') + b'\x01\x01BV' + rng.randbytes(8) + b'BV' + \
+		(0x1C + len(records) - 0xC).to_bytes(2, 'little') + (0x1000000).to_bytes(4, 'little') + records
+
+def build_special(rng, image_size, npds_type, last_img, hdr_size, isbn_data, decoys) :
+	## Nvidia special image, 564E header with NPDS and NPDE. An ISBN follows NPDS when given.
+	special = bytearray(rng.randbytes(image_size))
+	special[0:0x18] = b'\x56\x4E' + ((image_size // 0x200) if hdr_size else 0).to_bytes(2, 'little') + b'\x00' * 0x14
+	special[0x18:0x1A] = (0x20).to_bytes(2, 'little')
+	npds_len = 0x40 if isbn_data else 0x18
+	
+	special[0x20:0x38] = b'NPDS' + NV_VEN.to_bytes(2, 'little') + NPDS_ID.to_bytes(2, 'little') + b'\x00\x00' + npds_len.to_bytes(2, 'little') + \
+		b'\x00' * 4 + (image_size // 0x200).to_bytes(2, 'little') + b'\x00\x00' + bytes([npds_type, 0x80 if last_img else 0]) + b'\x00\x00'
+	special[0x38:0x40] = b'\x00' * 8
+	special[0x40:0x54] = npde_struct(image_size, last_img)
+	body_start = 0x60
+	
+	if isbn_data :
+		special[0x60:0x60 + len(isbn_data)] = isbn_data
+		body_start = 0x60 + len(isbn_data)
+	
+	add_decoys(rng, special, body_start, image_size, decoys)
+	fix_checksum(special)
+	
+	return special
+
+def build_dummy_efi(rng, device) :
+	## 77BB dummy EFI, the size is in its NPDS.
+	dummy = bytearray(rng.randbytes(0x400))
+	dummy[0:0x18] = b'\x77\xBB' + b'\x00' * 0x16
+	dummy[0x18:0x1A] = (0x20).to_bytes(2, 'little')
+	dummy[0x20:0x38] = b'NPDS' + NV_VEN.to_bytes(2, 'little') + device.to_bytes(2, 'little') + b'\x00\x00' + (0x18).to_bytes(2, 'little') + \
+		b'\x00' * 4 + (len(dummy) // 0x200).to_bytes(2, 'little') + b'\x00\x00\x03\x00\x00\x00'
+	dummy[0x38:0x4C] = npde_struct(len(dummy), False)
+	fix_checksum(dummy)
+	
+	return dummy
+
+def load_efirom(efirom_name, device, has_checksum) :
+	with open(os.path.join(synth_dir, "#GOP_Files", efirom_name), 'rb') as efirom_file :
+		efirom = bytearray(efirom_file.read())
+	
+	pcir_off = int.from_bytes(efirom[0x18:0x1A], 'little')
+	efirom[pcir_off + 6:pcir_off + 8] = device.to_bytes(2, 'little')
+	
+	if efirom[pcir_off + 0x20:pcir_off + 0x24] == b'NPDE' :
+		efirom[pcir_off + 0x2A] &= 0x7F # Special images follow
+	
+	if has_checksum :
+		fix_checksum(efirom)
+	
+	return efirom
+
+def build_mcuc(rng) :
+	parm_size = 0x200
+	code_size = rng.randrange(0x4000, 0x8000) & ~0xF
+	
+	return b'MCuC' + b'\x00' * 4 + parm_size.to_bytes(2, 'little') + code_size.to_bytes(2, 'little') + b'\x00' * 4 + \
+		rng.randbytes(parm_size + code_size)
+
+def finish_image(rng, main_image, total_size, foreign) :
+	## End padding, and foreign data at the very end so the whole padding has to be walked.
+	if len(main_image) > total_size :
+		raise ValueError("The layout needs 0x%X bytes, more than the requested size 0x%X!" % (len(main_image), total_size))
+	
+	foreign_data = b''
+	
+	if foreign :
+		foreign_size = min(max(total_size // 64, 0x200), total_size - len(main_image))
+		foreign_data = b'FOREIGN DATA ' + rng.randbytes(max(foreign_size - 13, 0))
+		foreign_data = foreign_data[:foreign_size]
+	
+	return bytes(main_image) + b'\xFF' * (total_size - len(main_image) - len(foreign_data)) + foreign_data
+
+def synth_nvidia(rng, total_size, use_ifr, turing, use_efi, decoys, nr_special, foreign) :
+	device    = TU_DEV if turing else NV_DEV
+	use_ifr   = use_ifr or turing
+	## Turing has two copies of the image, everything else has a quarter of the file left as padding.
+	budget    = total_size // 2 - 0x1000 if turing else total_size - total_size // 4
+	ifr_size  = max(0x4200, min(0x10000, align(total_size // 16, 0x200))) if use_ifr else 0
+	leg_size  = max(0x1000, min(0xF200, align(total_size // 16, 0x200)))
+	pre_size  = max(0x400, min(0xAE00, align(total_size // 32, 0x200)))
+	efi_image = load_efirom("nv_gop_TU1xx.efirom" if turing else "nv_gop_GP1xx.efirom", device, True) if use_efi else build_dummy_efi(rng, device)
+	isbn_data = build_isbn(rng)
+	isbn_size = align(0x60 + len(isbn_data) + 0x400, 0x200)
+	head_size = ifr_size + leg_size + pre_size + len(efi_image) + isbn_size
+	
+	if head_size > budget :
+		raise ValueError("Size 0x%X is too small for this layout, the images take 0x%X of 0x%X!" % (total_size, head_size, budget))
+	
+	## Filler special images take what is left of the budget, each up to 0xFFFF blocks.
+	fill_size = (budget - head_size) // 0x200 * 0x200
+	
+	if nr_special is None :
+		nr_special = min(max(fill_size // 0x100000, 1), 64) if fill_size >= 0x400 else 0
+	
+	nr_special = min(nr_special, fill_size // 0x400)
+	fill_list  = []
+	
+	for fill_idx in range(nr_special) :
+		fill_list.append(min((fill_size // nr_special) // 0x200 * 0x200, 0xFFFF * 0x200))
+	
+	main_image = bytearray()
+	
+	if use_ifr :
+		main_image += build_ifr(rng, ifr_size)
+	
+	main_image += build_legacy(rng, NV_VEN, device, leg_size, leg_size + pre_size, decoys, 0)
+	main_image += build_special(rng, pre_size, 0xE0, False, True, b'', decoys)
+	main_image += efi_image
+	main_image += build_special(rng, isbn_size, 0xE0, not fill_list, False, isbn_data, decoys)
+	
+	for fill_idx, fill_len in enumerate(fill_list) :
+		main_image += build_special(rng, fill_len, 0xE0 + fill_idx % 0x10, fill_idx == len(fill_list) - 1, fill_idx % 2 == 0, b'', decoys)
+	
+	if turing :
+		turing_pad = align(len(main_image), 0x1000) - len(main_image)
+		main_image = main_image + b'\xFF' * turing_pad + main_image
+	
+	return finish_image(rng, main_image, total_size, foreign)
+
+def synth_amd(rng, total_size, use_efi, decoys, foreign) :
+	leg_size   = 0xC000
+	efi_image  = load_efirom("amd_gop.efirom", AMD_DEV, False) if use_efi else b''
+	mc_off     = 0x1C000 if use_efi else 0x1A000
+	main_image = build_legacy(rng, AMD_VEN, AMD_DEV, leg_size, leg_size, decoys, mc_off) + efi_image
+	
+	if len(main_image) > mc_off :
+		raise ValueError("AMD legacy ROM and EFI do not fit before the microcode!")
+	
+	mcuc_data = build_mcuc(rng)
+	
+	if mc_off + len(mcuc_data) > total_size :
+		raise ValueError("Size 0x%X is too small for this layout, the microcode ends at 0x%X!" % (total_size, mc_off + len(mcuc_data)))
+	
+	main_image += b'\xFF' * (mc_off - len(main_image)) + mcuc_data
+	
+	return finish_image(rng, main_image, total_size, foreign)
+
+def synth_rom(total_size, amd=False, use_ifr=False, turing=False, use_efi=False, decoys=16, nr_special=None, foreign=False, seed=0) :
+	if not 0x10000 <= total_size <= 0x4000000 :
+		raise ValueError("Size must be between 64K and 64M!")
+	
+	rng = random.Random(seed)
+	
+	if amd :
+		return synth_amd(rng, total_size, use_efi, decoys, foreign)
+	
+	return synth_nvidia(rng, total_size, use_ifr, turing, use_efi, decoys, nr_special, foreign)
+
+def layout_min(seed=0, **synth_opts) :
+	## Smallest size in 4K steps that the layout fits in, the image sizes grow with the file so it is searched for.
+	for total_size in range(0x10000, 0x4000001, 0x1000) :
+		try :
+			synth_rom(total_size, seed=seed, **synth_opts)
+		except ValueError :
+			continue
+		
+		return total_size
+	
+	return None
+
+def size_text(total_size) :
+	if total_size % 0x100000 == 0 :
+		return "%dM" % (total_size // 0x100000)
+	
+	return "%dK" % (total_size // 0x400) if total_size % 0x400 == 0 else "0x%X" % total_size
+
+def write_dump(out_file, rom_data) :
+	## Same files as ext_efirom and UEFIRomExtract write for gop_upd, <rom>_temp/<name>_compr.efirom and <name>_dump.efi.
+	sys.path.insert(0, synth_dir)
+	import GOPupd
+	
+	def older_dump(efi_rom) :
+		efi_dump = GOPupd.efirom_dump(efi_rom)
+		nv_info  = efi_dump.find(b'NV-UEFI-BLD-INFO') if efi_dump is not None else -1
+		
+		if nv_info != -1 :
+			ver_off  = nv_info + 0x10 + 0x18
+			efi_dump = efi_dump[:ver_off] + b'0x%05X' % (int(efi_dump[ver_off:ver_off + 7], 16) - 1) + efi_dump[ver_off + 7:]
+		
+		return efi_dump
+	
+	GOPupd.write_ext_files(out_file, rom_data, older_dump)
+
+corpus_list = [
+	("nv_dummy",       {}),
+	("nv_efi",         {"use_efi" : True}),
+	("nv_ifr_foreign", {"use_ifr" : True, "use_efi" : True, "foreign" : True}),
+	("nv_decoys",      {"use_efi" : True, "decoys" : 1024}),
+	("nv_turing",      {"turing" : True, "use_efi" : True}),
+	("amd_mcuc",       {"amd" : True, "use_efi" : True, "foreign" : True}),
+]
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	arg_list  = sys.argv[1:]
+	upper_arg = [arg_val.upper() for arg_val in arg_list]
+	
+	def arg_value(arg_name, default) :
+		if arg_name not in upper_arg :
+			return default
+		
+		arg_idx = upper_arg.index(arg_name)
+		
+		if arg_idx + 1 >= len(arg_list) :
+			print("Missing value for %s!" % arg_name)
+			sys.exit()
+		
+		return arg_list[arg_idx + 1]
+	
+	value_args = [arg_val.upper() for arg_val in ["-SIZE", "-DECOYS", "-SPECIAL", "-SEED", "-CORPUS"]]
+	file_list  = [arg_val for arg_idx, arg_val in enumerate(arg_list) if arg_val[:1] != "-" and (arg_idx == 0 or upper_arg[arg_idx - 1] not in value_args)]
+	total_size = parse_size(arg_value("-SIZE", "1M"))
+	seed       = int(arg_value("-SEED", "0"), 0)
+	corpus_dir = arg_value("-CORPUS", None)
+	
+	if corpus_dir is None and not file_list :
+		print("Not enough arguments! Usage: GOPsynth.py file.rom [-SIZE 16M] [-AMD] [-IFR] [-TURING] [-EFI] [-DECOYS n] [-SPECIAL n] [-FOREIGN] [-SEED n]")
+		print("                              GOPsynth.py -CORPUS dir [-SIZE 16M] [-SEED n]")
+		sys.exit()
+	
+	if corpus_dir is not None :
+		os.makedirs(corpus_dir, exist_ok=True)
+		out_list  = [(os.path.join(corpus_dir, "synth_%s_%s.rom" % (corpus_name, size_text(total_size))), corpus_opts) for corpus_name, corpus_opts in corpus_list]
+	else :
+		out_list  = [(file_list[0], {"amd" : "-AMD" in upper_arg, "use_ifr" : "-IFR" in upper_arg, "turing" : "-TURING" in upper_arg,
+					"use_efi" : "-EFI" in upper_arg, "decoys" : int(arg_value("-DECOYS", "16"), 0), "foreign" : "-FOREIGN" in upper_arg,
+					"nr_special" : int(arg_value("-SPECIAL", "0"), 0) if "-SPECIAL" in upper_arg else None})]
+	
+	for out_file, synth_opts in out_list :
+		try :
+			rom_data = synth_rom(total_size, seed=seed, **synth_opts)
+		except ValueError as error :
+			min_size = layout_min(seed, **synth_opts) if 0x10000 <= total_size <= 0x4000000 else None
+			print("%s: %s" % (out_file, error))
+			
+			if min_size is not None :
+				print("%s was skipped, this layout needs -SIZE %s or more." % (out_file, size_text(min_size)))
+			
+			continue
+		
+		with open(out_file, 'wb') as rom_file :
+			rom_file.write(rom_data)
+		
+		print("File %s was written, size 0x%X." % (out_file, len(rom_data)))
+		
+		if "-DUMP" in upper_arg and synth_opts.get("use_efi") :
+			write_dump(out_file, rom_data)
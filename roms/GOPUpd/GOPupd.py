@@ -1,13 +1,20 @@
 #!/usr/bin/env python3
 
 import binascii
+import bisect
+import concurrent.futures
 import ctypes
 import datetime
+import json
 import os
 import re
 import struct
 import subprocess
 import sys
+import time
+import tracemalloc
+
+from multiprocessing import shared_memory
 
 char     = ctypes.c_char
 uint8_t  = ctypes.c_ubyte
@@ -1065,137 +1072,222 @@ def mz_off (pe_data, offset) :
 	
 	return mz_found, mz_start
 
-def pe_machine (pe_data) :
-	
-	code_type = ""
-	
-	mz_found, mz_start = mz_off(pe_data, 0)
-	
-	if not mz_found :
-		mz_start   = 0xFFFFFFFF
-		code_type  = "notMZ"
-		print_type = " notMZ"
-		return mz_start, code_type, print_type
+class PE_Image :
+	
+	## Headers, Security directory and section table of one PE image, parsed once. The sections are kept
+	## sorted by raw offset and by RVA, so offset, RVA and VA translate with a bisect instead of a walk.
+	
+	def __init__ (self, image_data) :
+		self.data         = image_data
+		self.mz_found, self.mz_start = mz_off(image_data, 0)
+		self.is_pe        = False
+		self.opt_hdr      = None
+		self.opt_off      = 0
+		self.hdr_size     = 0
+		self.image_base   = 0x400000 # This is the usual base
+		self.data_dirs    = []
+		self.sig_off      = 0
+		self.sig_size     = 0
+		self.checksum_off = 0xFFFFFFFF
+		self.sections     = []
+		
+		if not self.mz_found :
+			return
+		
+		dos_hdr     = get_struct(image_data, self.mz_start, DOS_Header)
+		self.pe_off = self.mz_start + dos_hdr.e_lfanew
+		self.is_pe  = image_data[self.pe_off:self.pe_off + 4] == b'\x50\x45\x00\x00'
+		
+		if not self.is_pe : # LE images have no PE headers to parse
+			return
+		
+		coff_off      = self.pe_off + 4 # pe_off + ctypes.sizeof(PE_Header)
+		self.coff_hdr = get_struct(image_data, coff_off, COFF_Header)
+		
+		if self.coff_hdr.SizeOfOptionalHeader :
+			self.opt_off = coff_off + ctypes.sizeof(self.coff_hdr)
+			
+			if image_data[self.opt_off:self.opt_off + 2] == b'\x0B\x02' : # 0x010B - PE32, 0x020B - PE32+ (64 bit)
+				self.opt_hdr = get_struct(image_data, self.opt_off, Optional_Header64)
+			else :
+				self.opt_hdr = get_struct(image_data, self.opt_off, Optional_Header)
+			
+			self.hdr_size     = self.opt_hdr.SizeOfHeaders
+			self.image_base   = self.opt_hdr.ImageBase
+			self.checksum_off = self.opt_off - self.mz_start + 0x40 # Relative to the image, like the checksum itself
+			data_dir_off      = self.opt_off + ctypes.sizeof(self.opt_hdr)
+			
+			for ix in range(self.opt_hdr.NumberOfRvaAndSizes) :
+				datadir_hdr = get_struct(image_data, data_dir_off, Data_Directory)
+				self.data_dirs.append(datadir_hdr)
+				data_dir_off += 8 # ctypes.sizeof(datadir_hdr)
+			
+			if len(self.data_dirs) > 4 : # Security Directory is the 5th
+				self.sig_off  = self.data_dirs[4].VirtualAddress
+				self.sig_size = self.data_dirs[4].Size
+			
+			sect_off = self.opt_off + self.coff_hdr.SizeOfOptionalHeader
+		
+		else :
+			sect_off = coff_off + ctypes.sizeof(self.coff_hdr)
+		
+		for ix in range(self.coff_hdr.NumberOfSections) :
+			self.sections.append(get_struct(image_data, sect_off, Section_Header))
+			sect_off += 0x28 # ctypes.sizeof(Section_Header)
+		
+		self.raw_sects = sorted(self.sections, key=lambda sect_hdr: sect_hdr.PointerToRawData)
+		self.raw_start = [self.mz_start + sect_hdr.PointerToRawData for sect_hdr in self.raw_sects]
+		self.rva_sects = sorted(self.sections, key=lambda sect_hdr: sect_hdr.VirtualAddress)
+		self.rva_start = [sect_hdr.VirtualAddress for sect_hdr in self.rva_sects]
 	
-	pe_off = int.from_bytes(pe_data[mz_start + 0x3C:mz_start + 0x40], 'little') + int(mz_start)
+	def section_at (self, offset) :
 		
-	if pe_data[pe_off:pe_off + 4] == b'\x50\x45\x00\x00' :
+		## Section whose raw data holds the file offset, None for the headers and the overlay.
+		if not self.is_pe :
+			return None
 		
-		code_sig = pe_data[pe_off + 4:pe_off + 6][::-1]
+		idx = bisect.bisect_right(self.raw_start, offset) - 1
 		
-		if code_sig == b'\x86\x64' :
-			code_type = "x64"
+		if idx >= 0 and offset < self.raw_start[idx] + self.raw_sects[idx].SizeOfRawData :
+			return self.raw_sects[idx]
 		
-		elif code_sig == b'\x01\x4C' :
-			code_type = "x86" # IA32
+		return None
+	
+	def section_at_rva (self, rva) :
 		
-		elif code_sig == b'\x02\x00' :
-			code_type = "IA64"
+		if not self.is_pe :
+			return None
 		
-		elif code_sig == b'\x0E\xBC' :
-			code_type = "EBC" # EFI Byte Code
+		idx = bisect.bisect_right(self.rva_start, rva) - 1
 		
-		elif code_sig == b'\x01\xC0' :
-			code_type = "ARM"
+		if idx >= 0 :
+			sect_hdr = self.rva_sects[idx]
+			
+			if rva < sect_hdr.VirtualAddress + max(sect_hdr.VirtualSize, sect_hdr.SizeOfRawData) :
+				return sect_hdr
 		
-		elif code_sig == b'\x01\xC2' :
-			code_type = "THUMB" # ARM-THUMB-MIXED
+		return None
+	
+	def offset_to_rva (self, offset) :
+		sect_hdr = self.section_at(offset)
 		
-		elif code_sig == b'\x01\xC4' :
-			code_type = "ARMv7"
+		if sect_hdr is None :
+			return offset - self.mz_start # Headers are mapped as they are in the file
 		
-		elif code_sig == b'\xAA\x64' :
-			code_type = "ARMv8_x64"
+		return offset - self.mz_start - sect_hdr.PointerToRawData + sect_hdr.VirtualAddress
+	
+	def rva_to_offset (self, rva) :
+		sect_hdr = self.section_at_rva(rva)
 		
-		else : # There are many more in the specification, but use only the most common ones.
-			code_type = "unkSIG"
+		if sect_hdr is None :
+			return self.mz_start + rva
+		
+		return self.mz_start + rva - sect_hdr.VirtualAddress + sect_hdr.PointerToRawData
 	
-	else :
-		code_type = "LE"
+	def rva_to_va (self, rva) :
+		return self.image_base + rva
 	
-	if code_type == "x64" :
-		print_type = ""
-	else :
-		print_type = " " + code_type
+	def va_to_offset (self, va) :
+		return self.rva_to_offset(va - self.image_base)
 	
-	return mz_start, code_type, print_type
-
-def image_size (image_data, result_type) :
+	def base_at (self, offset) :
+		
+		## What base_in_image always returned: ImageBase plus the VA - raw delta of the section holding the offset.
+		sect_hdr = self.section_at(offset)
+		
+		if sect_hdr is None :
+			return self.image_base
+		
+		return self.image_base + sect_hdr.VirtualAddress - sect_hdr.PointerToRawData
 	
-	imag_size  = 0
-	sig_size   = 0
-	sig_off    = 0
-	all_content  = True
-	sig_included = True
+	def size (self, result_type) :
+		
+		if not self.is_pe :
+			return 2
+		
+		imag_size = self.hdr_size + sum(sect_hdr.SizeOfRawData for sect_hdr in self.sections)
+		
+		if result_type not in ["naked", "stub"] and self.sig_off :
+			imag_size = self.sig_off + self.sig_size
+		elif result_type != "naked" and self.sig_off and self.sig_off == imag_size : # Add signing block only when part of this image.
+			imag_size += self.sig_size
+		
+		if imag_size :
+			return imag_size
+		else :
+			return 2
+	
+	def machine (self) :
+		
+		if not self.is_pe :
+			return "LE"
+		
+		code_sig = self.coff_hdr.Machine
+		
+		if code_sig == 0x8664 :
+			return "x64"
+		elif code_sig == 0x014C :
+			return "x86" # IA32
+		elif code_sig == 0x0200 :
+			return "IA64"
+		elif code_sig == 0x0EBC :
+			return "EBC" # EFI Byte Code
+		elif code_sig == 0x01C0 :
+			return "ARM"
+		elif code_sig == 0x01C2 :
+			return "THUMB" # ARM-THUMB-MIXED
+		elif code_sig == 0x01C4 :
+			return "ARMv7"
+		elif code_sig == 0xAA64 :
+			return "ARMv8_x64"
+		else : # There are many more in the specification, but use only the most common ones.
+			return "unkSIG"
+
+pe_cache = [None, None] # Last parsed image data and its PE_Image
+
+def pe_image (image_data) :
 	
-	if result_type == "naked" :
-		all_content  = False
-		sig_included = False
-	elif result_type == "stub" :
-		all_content  = False
+	## The main flow asks for the size, machine, checksum and ID table of the same EFI dump, so keep the last one.
+	## Only immutable data is cached, a bytearray could change under the parsed headers.
+	if pe_cache[0] is image_data :
+		return pe_cache[1]
 	
-	mz_found, mz_start = mz_off(image_data, 0)
+	pe_img = PE_Image(image_data)
 	
-	if not mz_found :
-		#print("No MZ found!\n")
-		return 2
+	if isinstance(image_data, bytes) :
+		pe_cache[0] = image_data
+		pe_cache[1] = pe_img
 	
-	dos_hdr  = get_struct(image_data, mz_start, DOS_Header)
-	#dos_hdr.dos_print()
+	return pe_img
+
+def pe_machine (pe_data) :
 	
-	pe_off   = dos_hdr.e_lfanew
-	pe_hdr   = get_struct(image_data, pe_off, PE_Header)
-	#pe_hdr.pe_print()
+	pe_img = pe_image(pe_data)
 	
-	coff_off = pe_off + 4 # pe_off + ctypes.sizeof(pe_hdr)
-	coff_hdr = get_struct(image_data, coff_off, COFF_Header)
-	#coff_hdr.coff_print()
+	if not pe_img.mz_found :
+		mz_start   = 0xFFFFFFFF
+		code_type  = "notMZ"
+		print_type = " notMZ"
+		return mz_start, code_type, print_type
 	
-	if coff_hdr.SizeOfOptionalHeader :
-		opt_off = coff_off + ctypes.sizeof(coff_hdr)
-		
-		if image_data[opt_off:opt_off + 2] == b'\x0B\x02' : # 0x010B - PE32, 0x020B - PE32+ (64 bit)
-			opt_hdr = get_struct(image_data, opt_off, Optional_Header64)
-		else :
-			opt_hdr = get_struct(image_data, opt_off, Optional_Header)
-			
-		#opt_hdr.opt_print()
-		
-		imag_size   += opt_hdr.SizeOfHeaders
-		
-		data_dir_off = opt_off + ctypes.sizeof(opt_hdr)
-		
-		for ix in range(opt_hdr.NumberOfRvaAndSizes) :
-			datadir_hdr = get_struct(image_data, data_dir_off, Data_Directory)
-			#datadir_hdr.datadir_print(ix + 1)
-			
-			if ix == 4 : # Security Directory is the 5th
-				sig_off  = datadir_hdr.VirtualAddress
-				sig_size = datadir_hdr.Size
-			
-			data_dir_off += 8 # ctypes.sizeof(datadir_hdr)
-		
-		sect_off = opt_off + coff_hdr.SizeOfOptionalHeader
+	code_type = pe_img.machine()
 	
+	if code_type == "x64" :
+		print_type = ""
 	else :
-		sect_off = coff_off + ctypes.sizeof(coff_hdr)
+		print_type = " " + code_type
 	
-	for ix in range(coff_hdr.NumberOfSections) :
-		sect_hdr = get_struct(image_data, sect_off, Section_Header)
-		#sect_hdr.sec_print()
-		sect_off += 0x28 # ctypes.sizeof(sect_hdr)
-		
-		imag_size += sect_hdr.SizeOfRawData
+	return pe_img.mz_start, code_type, print_type
+
+def image_size (image_data, result_type) :
 	
-	if all_content and sig_off :
-		imag_size = sig_off + sig_size
-	elif sig_included and sig_off and sig_off == imag_size : # Add signing block only when part of this image.
-		imag_size += sig_size
+	pe_img = pe_image(image_data)
 	
-	if imag_size :
-		return imag_size
-	else :
+	if not pe_img.mz_found :
+		#print("No MZ found!\n")
 		return 2
+	
+	return pe_img.size(result_type)
 
 def pe_checksum (image_data) :
 	
@@ -1203,40 +1295,19 @@ def pe_checksum (image_data) :
 	
 	checksum = 0
 	top_val  = 2**32
-	old_checksum    = 0
-	checksum_offset = 0xFFFFFFFF
+	old_checksum = 0
 	
-	mz_found, mz_start = mz_off(image_data, 0)
+	pe_img = pe_image(image_data)
 	
-	if not mz_found :
+	if not pe_img.mz_found :
 		return "Not a PE file!\n"
 	
-	img_size = image_size(image_data, "full")
-	#img_data = image_data[mz_start:]
-	img_data = image_data[mz_start:mz_start + img_size]
-	
-	dos_hdr  = get_struct(image_data, mz_start, DOS_Header)
-	#dos_hdr.dos_print()
-	
-	pe_off   = dos_hdr.e_lfanew
-	pe_hdr   = get_struct(image_data, pe_off, PE_Header)
-	#pe_hdr.pe_print()
-	
-	coff_off = pe_off + 4 # pe_off + ctypes.sizeof(pe_hdr)
-	coff_hdr = get_struct(image_data, coff_off, COFF_Header)
-	#coff_hdr.coff_print()
+	img_size = pe_img.size("full")
+	img_data = image_data[pe_img.mz_start:pe_img.mz_start + img_size]
+	checksum_offset = pe_img.checksum_off
 	
-	if coff_hdr.SizeOfOptionalHeader :
-		opt_off = coff_off + ctypes.sizeof(coff_hdr)
-		
-		if image_data[opt_off:opt_off + 2] == b'\x0B\x02' : # 0x010B - PE32, 0x020B - PE32+ (64 bit)
-			opt_hdr = get_struct(image_data, opt_off, Optional_Header64)
-		else :
-			opt_hdr = get_struct(image_data, opt_off, Optional_Header)
-		
-		checksum_offset = opt_off + 0x40
-		#print("%0.2X" % checksum_offset)
-		old_checksum    = int.from_bytes(img_data[checksum_offset:checksum_offset + 4], 'little')
+	if pe_img.opt_hdr is not None :
+		old_checksum = int.from_bytes(img_data[checksum_offset:checksum_offset + 4], 'little')
 	
 	# Verify the data is dword-aligned. Add padding if needed
 	#
@@ -1272,65 +1343,46 @@ def pe_checksum (image_data) :
 
 def base_in_image (image_data, offset) :
 	
-	image_base = 0x400000 # This is the usual size
+	return pe_image(image_data).base_at(offset)
+
+def rom_sig_check (rom_data, rom_sig_start) :
 	
-	mz_found, mz_start = mz_off(image_data, 0)
+	## Offset of the PCI structure of a ROM signature, 0 for old ROMs with only PnP, None for a false match.
+	rom_pcir_start = int.from_bytes(rom_data[rom_sig_start + 0x18:rom_sig_start + 0x1A], 'little')
+	#print("0x%0.2X - 0x%0.2X" % (rom_sig_start, rom_pcir_start))
 	
-	if not mz_found :
-		return image_base
+	if rom_pcir_start == 0 :
 		
-	dos_hdr  = get_struct(image_data, mz_start, DOS_Header)
-	#dos_hdr.dos_print()
-	
-	pe_off   = dos_hdr.e_lfanew
-	pe_hdr   = get_struct(image_data, pe_off, PE_Header)
-	#pe_hdr.pe_print()
-	
-	coff_off = pe_off + 4 # pe_off + ctypes.sizeof(pe_hdr)
-	coff_hdr = get_struct(image_data, coff_off, COFF_Header)
-	#coff_hdr.coff_print()
-	
-	if coff_hdr.SizeOfOptionalHeader :
-		opt_off = coff_off + ctypes.sizeof(coff_hdr)
+		if rom_data[rom_sig_start + 0x20:rom_sig_start + 0x24] == b'PCIR' :
+			rom_pcir_start = 0x20
 		
-		if image_data[opt_off:opt_off + 2] == b'\x0B\x02' : # 0x010B - PE32, 0x020B - PE32+ (64 bit)
-			opt_hdr = get_struct(image_data, opt_off, Optional_Header64)
 		else :
-			opt_hdr = get_struct(image_data, opt_off, Optional_Header)
-		
-		#print("%0.2X" % opt_hdr.ImageBase)
-		image_base   = opt_hdr.ImageBase
-		data_dir_off = opt_off + ctypes.sizeof(opt_hdr)
-		
-		for ix in range(opt_hdr.NumberOfRvaAndSizes) :
-			datadir_hdr = get_struct(image_data, data_dir_off, Data_Directory)
-			#datadir_hdr.datadir_print(ix + 1)
-			data_dir_off += 8 # ctypes.sizeof(datadir_hdr)
-		
-		sect_off = opt_off + coff_hdr.SizeOfOptionalHeader
-	
-	else :
-		sect_off = coff_off + ctypes.sizeof(coff_hdr)
+			rom_pnp_start = int.from_bytes(rom_data[rom_sig_start + 0x1A:rom_sig_start + 0x1C], 'little')
+			rom_pnp_off   = rom_sig_start + rom_pnp_start
+			rom_pnp_str   = rom_data[rom_pnp_off:rom_pnp_off + 4]
+			
+			# Dont' add rom_pnp_start, it will produce false results
+			if rom_pnp_str != b'$PnP' :
+				#print("No PnP\n")
+				return None
 	
-	rsrc_off = 0 # Initialized for later use
+	rom_pcir_off = rom_sig_start + rom_pcir_start
+	rom_pcir_str = rom_data[rom_pcir_off:rom_pcir_off + 4]
+	#print (rom_pcir_str)
 	
-	for ix in range(coff_hdr.NumberOfSections) :
-		sect_hdr = get_struct(image_data, sect_off, Section_Header)
-		#sect_hdr.sec_print()
-		sect_off += 0x28 # ctypes.sizeof(sect_hdr)
-		
-		sect_raw_off  = sect_hdr.PointerToRawData
-		sect_raw_size = sect_hdr.SizeOfRawData
-		
-		if sect_raw_off <= offset < (sect_raw_off + sect_raw_size) :
-			image_base += sect_hdr.VirtualAddress - sect_hdr.PointerToRawData
+	if rom_pcir_start and rom_pcir_str not in [b'PCIR', b'NPDS', b'RGIS'] : # Last two for Nvidia
+		#print("No PCIR\n")
+		return None
 	
-	return image_base
+	return rom_pcir_start
+
+rom_sig_pat  = re.compile(br'((\x55\xAA|\x56\x4E)|\x77\xBB)') # 55AA for regular ROMs, 564E and 77BB for Nvidia special ROMs
+rom_hdr_span = 0x10000 + 0x30 # Farthest header byte read by rom_sig_check and rom_image_info, from the signature
 
 def rom_info_scan (rom_data, rom_offset) :
 	
 	rom_found  = False
-	t_rom_pat  = re.compile(br'((\x55\xAA|\x56\x4E)|\x77\xBB)') # 55AA for regular ROMs, 564E and 77BB for Nvidia special ROMs
+	t_rom_pat  = re.compile(rom_sig_pat.pattern) # From the re cache, but seen by -PROFILE
 	
 	while not rom_found :
 		t_rom_match = t_rom_pat.search(rom_data, rom_offset)
@@ -1341,31 +1393,9 @@ def rom_info_scan (rom_data, rom_offset) :
 			return (False, 0, 0, b'', "", 0, 0)
 		
 		(rom_sig_start, rom_sig_end) = t_rom_match.span()
-		rom_pcir_start = int.from_bytes(rom_data[rom_sig_start + 0x18:rom_sig_start + 0x1A], 'little')
-		#print("0x%0.2X - 0x%0.2X" % (rom_sig_start, rom_pcir_start))
-		
-		if rom_pcir_start == 0 :
-			
-			if rom_data[rom_sig_start + 0x20:rom_sig_start + 0x24] == b'PCIR' :
-				rom_pcir_start = 0x20
-			
-			else :
-				rom_pnp_start = int.from_bytes(rom_data[rom_sig_start + 0x1A:rom_sig_start + 0x1C], 'little')
-				rom_pnp_off   = rom_sig_start + rom_pnp_start
-				rom_pnp_str   = rom_data[rom_pnp_off:rom_pnp_off + 4]
-				
-				# Dont' add rom_pnp_start, it will produce false results
-				if rom_pnp_str != b'$PnP' :
-					#print("No PnP\n")
-					rom_offset = rom_sig_start + 2
-					continue
+		rom_pcir_start = rom_sig_check(rom_data, rom_sig_start)
 		
-		rom_pcir_off = rom_sig_start + rom_pcir_start
-		rom_pcir_str = rom_data[rom_pcir_off:rom_pcir_off + 4]
-		#print (rom_pcir_str)
-		
-		if rom_pcir_start and rom_pcir_str not in [b'PCIR', b'NPDS', b'RGIS'] : # Last two for Nvidia
-			#print("No PCIR\n")
+		if rom_pcir_start is None :
 			rom_offset = rom_sig_start + 2
 			continue
 		
@@ -1373,8 +1403,20 @@ def rom_info_scan (rom_data, rom_offset) :
 		rom_found = True
 	
 	#print("Found ROM at offset 0x%0.2X \n" % rom_sig_start)
+	return rom_image_info(rom_data, rom_sig_start, rom_pcir_start)
+
+def rom_image_info (rom_data, rom_sig_start, rom_pcir_start, rom_read=None) :
+	
+	## Everything after the header checks. The tests at the end of the image go through rom_read(offset, size)
+	## when given, so a windowed scan can read them from outside its window.
+	if rom_read is None :
+		rom_read = lambda read_off, read_size : rom_data[read_off:read_off + read_size]
+	
+	rom_found    = True
+	rom_pcir_off = rom_sig_start + rom_pcir_start
+	
 	if rom_pcir_start :
-		rom_id_bin   = rom_data[rom_pcir_off + 4:rom_pcir_off + 8]
+		rom_id_bin   = bytes(rom_data[rom_pcir_off + 4:rom_pcir_off + 8])
 		rom_id_hex   = id_from_bin(rom_id_bin, "hex")
 		rom_last_img = ord(rom_data[rom_pcir_off + 0x15:rom_pcir_off + 0x16]) & 0x80
 	
@@ -1420,8 +1462,8 @@ def rom_info_scan (rom_data, rom_offset) :
 	if rom_size_ds and rom_size != rom_size_ds :
 		#print("\nDifferent sizes in ROM header!\n")
 		size_test = rom_sig_start + rom_size_ds
-		rom_test  = rom_data[size_test:size_test + 2]
-		rom_probe = rom_data[size_test - 1:size_test]
+		rom_test  = rom_read(size_test, 2)
+		rom_probe = rom_read(size_test - 1, 1)
 		
 		if rom_size == 0 or rom_test in [b'\x55\xAA', b'\x56\x4E', b'\x77\xBB'] or (rom_test == b'' and rom_probe != b'') :
 			rom_size = rom_size_ds
@@ -1433,7 +1475,7 @@ def rom_info_scan (rom_data, rom_offset) :
 		#print("%0.2X\n" % npde_size)
 		
 		rom_end_npde  = rom_sig_start + npde_size
-		rom_test_npde = rom_data[rom_end_npde:rom_end_npde + 2]
+		rom_test_npde = rom_read(rom_end_npde, 2)
 		
 		## If NPDE size is the right one, there is one container for all ROMs.
 		if rom_test_npde in [b'\x55\AA', b'\x56\x4E', b'\x77\xBB'] :
@@ -1445,18 +1487,18 @@ def rom_info_scan (rom_data, rom_offset) :
 		rom_end_test = rom_sig_start + rom_size
 		rom_end_prob = rom_sig_start + rom_size - 0x200
 		
-		chk_test = sum(bytearray(rom_data[rom_sig_start:rom_end_test])) & 0xFF
+		chk_test = sum(bytearray(rom_read(rom_sig_start, rom_size))) & 0xFF
 		
 		#print(chk_test)
 		
-		if chk_test != 0 or rom_data[rom_end_test - 0x30:rom_end_test - 1] != b'\x00' * 0x2F :
+		if chk_test != 0 or rom_read(rom_end_test - 0x30, 0x2F) != b'\x00' * 0x2F :
 			#print("Marvell faulty?")
 			
-			chk_prob = sum(bytearray(rom_data[rom_sig_start:rom_end_prob])) & 0xFF
+			chk_prob = sum(bytearray(rom_read(rom_sig_start, rom_size - 0x200))) & 0xFF
 			
 			#print(chk_prob)
 			
-			if chk_prob == 0 and rom_data[rom_end_prob - 0x30:rom_end_prob - 1] == b'\x00' * 0x2F :
+			if chk_prob == 0 and rom_read(rom_end_prob - 0x30, 0x2F) == b'\x00' * 0x2F :
 				#print("\n Wrong size in header. Must be 0x200 smaller. Bad Marvell! \n")
 				rom_size -= 0x200
 	
@@ -1467,6 +1509,174 @@ def rom_info_scan (rom_data, rom_offset) :
 	
 	return (rom_found, rom_sig_start, rom_pcir_off, rom_id_bin, rom_id_hex, rom_last_img, rom_size)
 
+def rom_scan_chunk (shm_name, data_size, chunk_start, chunk_end) :
+	
+	## Worker of rom_scan_all: the images whose signature is in [chunk_start, chunk_end). The ROM stays in the shared
+	## block, only the chunk and its header overlap are copied out, the image end tests read the block directly.
+	rom_shm  = shared_memory.SharedMemory(name=shm_name)
+	shm_view = rom_shm.buf[:data_size]
+	
+	try :
+		rom_chunk = bytes(shm_view[chunk_start:min(chunk_end + rom_hdr_span, data_size)])
+		rom_read  = lambda read_off, read_size : bytes(shm_view[chunk_start + read_off:chunk_start + read_off + read_size])
+		rom_list  = []
+		
+		for sig_match in rom_sig_pat.finditer(rom_chunk, 0, chunk_end - chunk_start + 1) :
+			rom_sig_start = sig_match.start()
+			
+			if rom_sig_start >= chunk_end - chunk_start :
+				break
+			
+			rom_pcir_start = rom_sig_check(rom_chunk, rom_sig_start)
+			
+			if rom_pcir_start is None :
+				continue
+			
+			rom_found, rom_start, rom_pcir_off, rom_id_bin, rom_id_hex, rom_last_img, rom_size = \
+				rom_image_info(rom_chunk, rom_sig_start, rom_pcir_start, rom_read)
+			
+			rom_list.append((rom_found, rom_start + chunk_start, rom_pcir_off + chunk_start, rom_id_bin, rom_id_hex, rom_last_img, rom_size))
+		
+		return rom_list
+	
+	finally :
+		del rom_read
+		shm_view.release()
+		rom_shm.close()
+
+def rom_scan_all (rom_data, jobs) :
+	
+	## Every image of -ROMSCAN, in offset order. With more than one job the search is split in chunks handled by
+	## a process pool, the workers attach to one shared copy of the ROM instead of getting it pickled.
+	if jobs < 2 or len(rom_data) < 2 * rom_hdr_span :
+		position = 0
+		
+		while True :
+			rom_scan = rom_info_scan(rom_data, position)
+			
+			if not rom_scan[0] :
+				return
+			
+			position = rom_scan[1] + 2 # not using [position += rom_size] because of multi-images.
+			
+			yield rom_scan
+	
+	data_size  = len(rom_data)
+	chunk_size = max(-(-data_size // (jobs * 4)), rom_hdr_span) # A few chunks per job, for the dense parts
+	rom_shm    = shared_memory.SharedMemory(create=True, size=data_size)
+	
+	try :
+		rom_shm.buf[:data_size] = rom_data
+		
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor :
+			chunk_list = [executor.submit(rom_scan_chunk, rom_shm.name, data_size, chunk_start, min(chunk_start + chunk_size, data_size))
+						for chunk_start in range(0, data_size, chunk_size)]
+			rom_list   = [rom_scan for chunk_job in chunk_list for rom_scan in chunk_job.result()]
+	
+	finally :
+		rom_shm.close()
+		rom_shm.unlink()
+	
+	## The chunks don't overlap in signature offsets, this only guards the merge.
+	rom_seen = set()
+	
+	for rom_scan in sorted(rom_list, key=lambda rom_scan : rom_scan[1]) :
+		if rom_scan[1] not in rom_seen :
+			rom_seen.add(rom_scan[1])
+			yield rom_scan
+
+def rom_stream_scan (src_file, window_size) :
+	
+	## -ROMSCAN for sources that don't fit in memory or can't be read at once (firmware archives, /dev/mtd, pipes).
+	## The data is searched in windows that overlap by rom_hdr_span, so a header cut by the end of a window is
+	## checked again in the next one. The image end tests past the window are read with a seek when the source
+	## allows it, otherwise the header sizes are kept. Yields each image as it is found, with its chain.
+	rom_buf   = bytearray()
+	buf_base  = 0 # Offset of rom_buf[0] in the source
+	scan_pos  = 0
+	src_end   = False
+	chain_nr  = 0
+	chain_idx = 0
+	chain_end = -1 # Where the next image of an unfinished chain starts
+	
+	try :
+		src_seek = src_file.seekable()
+	except (AttributeError, OSError) :
+		src_seek = False
+	
+	def rom_read (read_off, read_size) :
+		if src_end or not src_seek or buf_base + read_off < 0 or (read_off >= 0 and read_off + read_size <= len(rom_buf)) :
+			return bytes(rom_buf[read_off:read_off + read_size])
+		
+		src_pos = src_file.tell()
+		src_file.seek(buf_base + read_off)
+		read_data = src_file.read(max(read_size, 0))
+		src_file.seek(src_pos)
+		
+		return read_data
+	
+	while True :
+		
+		if not src_end and len(rom_buf) - (scan_pos - buf_base) < window_size + rom_hdr_span :
+			
+			## Keep only what the next window still needs. A new buffer, del would keep the old allocation growing.
+			if scan_pos - buf_base >= window_size :
+				rom_buf  = rom_buf[scan_pos - buf_base:]
+				buf_base = scan_pos
+			
+			src_data = src_file.read(window_size)
+			
+			if not src_data :
+				src_end = True
+			
+			rom_buf += src_data
+			continue
+		
+		scan_end  = len(rom_buf) if src_end else len(rom_buf) - rom_hdr_span
+		sig_match = rom_sig_pat.search(rom_buf, scan_pos - buf_base)
+		
+		if sig_match is None or sig_match.start() >= scan_end :
+			
+			if src_end :
+				return
+			
+			scan_pos = buf_base + scan_end
+			continue
+		
+		rom_sig_start  = sig_match.start()
+		scan_pos       = buf_base + rom_sig_start + 2 # Not the image size, because of multi-images
+		rom_pcir_start = rom_sig_check(rom_buf, rom_sig_start)
+		
+		if rom_pcir_start is None :
+			continue
+		
+		rom_found, rom_start, rom_pcir_off, rom_id_bin, rom_id_hex, rom_last_img, rom_size = \
+			rom_image_info(rom_buf, rom_sig_start, rom_pcir_start, rom_read)
+		
+		rom_sig = rom_buf[rom_start:rom_start + 2]
+		
+		if rom_sig == b'\x56\x4E' :
+			rom_kind = "Nvidia special"
+		elif rom_sig == b'\x77\xBB' :
+			rom_kind = "Nvidia EFI"
+		elif rom_buf[rom_start + 4:rom_start + 8] == b'\xF1\x0E\x00\x00' :
+			rom_kind = "EFI"
+		else :
+			rom_kind = "Legacy"
+		
+		rom_start    += buf_base
+		rom_pcir_off += buf_base
+		
+		if rom_start == chain_end :
+			chain_idx += 1
+		else :
+			chain_nr  += 1
+			chain_idx = 1
+		
+		chain_end = -1 if rom_last_img else rom_start + rom_size
+		
+		yield (rom_start, rom_pcir_off, rom_id_hex, rom_last_img, rom_size, rom_kind, chain_nr, chain_idx)
+
 def rom_info(rom_data, offset, get_info) :
 	t_position = offset
 	ifr_header = False
@@ -1511,7 +1721,9 @@ def rom_info(rom_data, offset, get_info) :
 			
 			if not os.path.isfile(file_dec) and fileExtension not in ['.efi', '.ffs'] :
 				print(Fore.RED + "Trying direct decompression...\n" + Fore.RESET)
+				prof_begin("decompression")
 				decomp = subprocess.call(["UEFIRomExtract", file_dir, file_dec], shell=True)
+				prof_end("decompression")
 				print("")
 				
 				if os.path.isfile(file_dec) :
@@ -1710,6 +1922,120 @@ def rom_info(rom_data, offset, get_info) :
 				
 	return (t_old_type, t_start_match, t_pcir_off, t_pcir_id_bin, t_rom_size, t_efi_found, t_efi_begin, t_efi_size)
 
+def amd_id_ranges (t_efi_dump) :
+	
+	## The AMD GOP ID table as (first_id, last_id, name) ranges, in table order. Each name pointer is followed
+	## once per table entry, a range is only expanded into single IDs by expand_id_ranges.
+	id_ranges = []
+	
+	# Alternative for ID search
+	#pat_id_ptr   = re.compile(br'\x01\x01\x00{6}.{4}\x00{4}\x01\x02\x00{6}.{4}\x00{4}\x01\x03\x00{6}.{4}\x00{4}\x01\x04\x00{6}.{4}\x00{4}', re.DOTALL)
+	#match_id_ptr = pat_id_ptr.search(t_efi_dump)
+	#
+	#if match_id_ptr is not None :
+	#	(id_ptr_start_match, id_ptr_end_match) = match_id_ptr.span()
+	#	id_start_match = int.from_bytes(t_efi_dump[id_ptr_start_match + 8:id_ptr_start_match + 0xC], 'little')
+	
+	pat_id   = re.compile(br'\x00{8}\x88\x68\x00{6}')
+	match_id = pat_id.search(t_efi_dump)
+	
+	if match_id is not None :
+		(id_start_match, id_end_match) = match_id.span()
+		step      = id_start_match + 8
+		pe_img    = pe_image(t_efi_dump)
+		id_rebase = False
+		
+		while True :
+			
+			if id_rebase :
+				check_null = t_efi_dump[step:step + 8]
+				
+				if check_null == b'\x00' * 8 : # "00000000000000"
+					break
+			
+			else :
+				check_null = t_efi_dump[step + 2:step + 8]
+				
+				if check_null != b'\x00' * 6 : # "000000000000"
+					break
+			
+			id = int.from_bytes(t_efi_dump[step:step + 2], 'little')
+			
+			if id == 0 :
+				# step += 0x10 # You failed! It was actually last ID & 0xFFF0
+				# continue
+				
+				if t_efi_dump[step + 8:step + 12] == b'\x00' * 4 :
+					step += 0x10
+					continue
+				else :
+					id = int.from_bytes(t_efi_dump[step - 0x10:step - 0xE], 'little') & 0xFFF0
+			
+			if id_rebase or id == 0x0101 : # Range of IDs
+				#break # You were wrong!
+				id_rebase = True
+				first_id  = int.from_bytes(t_efi_dump[step + 2:step + 4], 'little')
+				
+				if first_id != 0 :
+					last_id   = int.from_bytes(t_efi_dump[step + 4:step + 6], 'little')
+					name_off1 = pe_img.va_to_offset(int.from_bytes(t_efi_dump[step + 8:step + 0xC], 'little'))
+					name_off2 = pe_img.va_to_offset(int.from_bytes(t_efi_dump[name_off1 + 8:name_off1 + 0xC], 'little'))
+					
+					id_ranges.append((first_id, last_id, get_name(t_efi_dump, name_off2, 'utf-8')))
+				
+				step += 0x10
+				continue
+			
+			name_off = pe_img.va_to_offset(int.from_bytes(t_efi_dump[step + 8:step + 0xC], 'little'))
+			
+			id_ranges.append((id, id, get_name(t_efi_dump, name_off, 'utf-8')))
+			step += 0x10
+	
+	# For Vega GOP
+	
+	pat_id   = re.compile(br'\xDD\x6B\xE0\xFF\x07\x61\xA6\x46\x7B\xB2\x5A\x9C\x7E\xC5\x27\x5C')
+	match_id = pat_id.search(t_efi_dump[:0x1000])
+	
+	if match_id is not None :
+		(id_start_match, id_end_match) = match_id.span()
+		step = id_start_match - 8
+		
+		for x_step in range(0, 0x50, 0x10) :
+			
+			if t_efi_dump[step - x_step:step - x_step + 2] == b'\x10\x01' :
+				#print("Eureka!")
+				
+				step = step - x_step
+				
+				while True :
+					
+					check_null = t_efi_dump[step:step + 4]
+					
+					if check_null == b'\x00' * 4 : # "00000000"
+						break
+					
+					name_str = "Vega " + t_efi_dump[step:step + 1].hex() + "-" + t_efi_dump[step + 1:step + 2].hex()
+					first_id = int.from_bytes(t_efi_dump[step + 2:step + 4], 'little')
+					last_id  = int.from_bytes(t_efi_dump[step + 4:step + 6], 'little')
+					
+					id_ranges.append((first_id, last_id, name_str))
+					step     += 6
+				
+				break
+	
+	return id_ranges
+
+def expand_id_ranges (id_ranges) :
+	
+	## One "1002-XXXX  =  Name" line per ID, like the amd_gop_IDs files. Repeated ID and name pairs are listed once.
+	id_lines = {}
+	
+	for first_id, last_id, name_str in id_ranges :
+		for idx in range(first_id, last_id + 1) :
+			id_lines.setdefault("1002-%0.4X  =  %s\n" % (idx, name_str))
+	
+	return "".join(id_lines)
+
 def efi_version(t_efi_dump) :
 	t_gop_type = ""
 	t_nv_type  = ""
@@ -1890,126 +2216,12 @@ def efi_version(t_efi_dump) :
 			t_efi_info_string += " - " + "%s" % build + " - " + "%s" % changelist + " - " + "0x%0.8X" % bios_idtf_gop
 		
 		## IDs in GOP. Works only with newer GOPs.
+		id_ranges = amd_id_ranges(t_efi_dump)
 		
-		# Alternative for ID search
-		#pat_id_ptr   = re.compile(br'\x01\x01\x00{6}.{4}\x00{4}\x01\x02\x00{6}.{4}\x00{4}\x01\x03\x00{6}.{4}\x00{4}\x01\x04\x00{6}.{4}\x00{4}', re.DOTALL)
-		#match_id_ptr = pat_id_ptr.search(t_efi_dump)
-		#
-		#if match_id_ptr is not None :
-		#	(id_ptr_start_match, id_ptr_end_match) = match_id_ptr.span()
-		#	id_start_match = int.from_bytes(t_efi_dump[id_ptr_start_match + 8:id_ptr_start_match + 0xC], 'little')
-		
-		pat_id   = re.compile(br'\x00{8}\x88\x68\x00{6}')
-		match_id = pat_id.search(t_efi_dump)
-		
-		if match_id is not None :
-			(id_start_match, id_end_match) = match_id.span()
-			ids_list  = ""
-			step      = id_start_match + 8
-			name_base = base_in_image(t_efi_dump, step)
-			id_rebase = False
-			
-			while True :
-				
-				if id_rebase :
-					check_null = t_efi_dump[step:step + 8]
-					
-					if check_null == b'\x00' * 8 : # "00000000000000"
-						break
-				
-				else :
-					check_null = t_efi_dump[step + 2:step + 8]
-					
-					if check_null != b'\x00' * 6 : # "000000000000"
-						break
-				
-				id = "1002-" + binascii.hexlify(t_efi_dump[step:step + 2][::-1]).decode('utf-8').upper()
-				
-				if id == "1002-0000" :
-					# step += 0x10 # You failed! It was actually last ID & 0xFFF0
-					# continue
-					
-					if t_efi_dump[step + 8:step + 12] == b'\x00' * 4 :
-						step += 0x10
-						continue
-					else :
-						id = "1002-" + binascii.hexlify(t_efi_dump[step - 0x10:step - 0xE][::-1]).decode('utf-8').upper()
-						id = id[:-1] + "0"
-				
-				if id_rebase or id == "1002-0101" : # Range of IDs
-					#break # You were wrong!
-					id_rebase = True
-					id = "1002-" + binascii.hexlify(t_efi_dump[step + 2:step + 4][::-1]).decode('utf-8').upper()
-					
-					if id == "1002-0000" :
-						step += 0x10
-						continue
-					
-					else :
-						
-						first_id = int.from_bytes(t_efi_dump[step + 2:step + 4], 'little')
-						last_id  = int.from_bytes(t_efi_dump[step + 4:step + 6], 'little')
-						
-						for idx in range(first_id, last_id + 1) :
-							id = "1002-%0.4X" % idx
-							name_off1  = int.from_bytes(t_efi_dump[step + 8:step + 0xC], 'little') + name_base
-							name_off2  = int.from_bytes(t_efi_dump[name_off1 + 8:name_off1 + 0xC], 'little') + name_base
-							name_str  = get_name(t_efi_dump, name_off2, 'utf-8')
-							
-							ids_list += id + "  =  " + name_str + "\n"
-						
-						step += 0x10
-						continue
-				
-				name_off  = int.from_bytes(t_efi_dump[step + 8:step + 0xC], 'little') + name_base
-				name_str  = get_name(t_efi_dump, name_off, 'utf-8')
-				
-				ids_list += id + "  =  " + name_str + "\n"
-				step     += 0x10
-			
-			with open("%s_temp/AMD_GOP_%s_IDs.txt" % (file_rom, t_version), "a") as myfile :
-				myfile.write(ids_list)
-		
-		# For Vega GOP
-		
-		pat_id   = re.compile(br'\xDD\x6B\xE0\xFF\x07\x61\xA6\x46\x7B\xB2\x5A\x9C\x7E\xC5\x27\x5C')
-		match_id = pat_id.search(t_efi_dump[:0x1000])
-		
-		if match_id is not None :
-			(id_start_match, id_end_match) = match_id.span()
-			ids_list  = ""
-			step      = id_start_match - 8
-			name_base = base_in_image(t_efi_dump, step)
-			id_rebase = False
-			
-			for x_step in range(0, 0x50, 0x10) :
-				
-				if t_efi_dump[step - x_step:step - x_step + 2] == b'\x10\x01' :
-					#print("Eureka!")
-					
-					step = step - x_step
-					
-					while True :
-						
-						check_null = t_efi_dump[step:step + 4]
-						
-						if check_null == b'\x00' * 4 : # "00000000"
-							break
-						
-						name_str = "Vega " + t_efi_dump[step:step + 1].hex() + "-" + t_efi_dump[step + 1:step + 2].hex()
-						first_id = int.from_bytes(t_efi_dump[step + 2:step + 4], 'little')
-						last_id  = int.from_bytes(t_efi_dump[step + 4:step + 6], 'little')
-						
-						for id in range(first_id, last_id + 1) :
-							id       = "1002-%0.4X" % id
-							ids_list += id + "  =  " + name_str + "\n"
-						
-						step     += 6
-			
-					with open("%s_temp/AMD_GOP_%s_IDs.txt" % (file_rom, t_version), "a") as myfile :
-						myfile.write(ids_list)
-					
-					break
+		if id_ranges :
+			## Written, not appended, so the same GOP met twice in one run doesn't list its IDs twice.
+			with open("%s_temp/AMD_GOP_%s_IDs.txt" % (file_rom, t_version), "w") as myfile :
+				myfile.write(expand_id_ranges(id_ranges))
 		
 		## Names in GOP. Only AMD with GOPs newer than 1.34.0.0.0.
 		#pat_name   = re.compile(br'\x41\x00\x6D\x00\x64\x00\x41\x00\x63\x00\x70\x00\x69\x00\x56\x00\x61\x00\x72\x00') ## A.m.d.A.c.p.i.V.a.r.
@@ -2060,7 +2272,7 @@ def efi_version(t_efi_dump) :
 		#			myfile.write(gpu_list)
 			
 		return (t_gop_type, "", t_version, t_efi_info_string)
-
+	
 	## Nvidia GOP
 	pat_nv = re.compile(br'\x4E\x56\x2D\x55\x45\x46\x49\x2D\x42\x4C\x44\x2D\x49\x4E\x46\x4F') ## NV-UEFI-BLD-INFO
 	match_nv = pat_nv.search(t_efi_dump)
@@ -2632,41 +2844,39 @@ def check_in_database(t_efi_info_string) :
 		unknown_type = False
 		index        = 0
 	
-	with open("#GOP_Files/#GOP_Database.txt", 'r+') as db_file:
+	for line in gop_lines("#GOP_Database.txt") :
+		
+		if len(line) < 2 :
+			continue
 		
-		for line in db_file:
+		elif line[:2] == "##" :
 			
-			if len(line) < 2 :
+			if line[3:13] == "BAD_NVIDIA" :
+				bad_nvd = True
+			elif line[3:10] == "BAD_AMD" :
+				bad_amd = True
+			elif line[3:14] == "Patched GOP" :
+				mod_amd = True
+				mod_str = line[3:-1].replace("Patched", "patched")
+			else :
 				continue
+		
+		if line[index:] == t_efi_info_string[index:] :
 			
-			elif line[:2] == "##" :
-				
-				if line[3:13] == "BAD_NVIDIA" :
-					bad_nvd = True
-				elif line[3:10] == "BAD_AMD" :
-					bad_amd = True
-				elif line[3:14] == "Patched GOP" :
-					mod_amd = True
-					mod_str = line[3:-1].replace("Patched", "patched")
-				else :
-					continue
+			efi_in_db = True
 			
-			if line[index:] == t_efi_info_string[index:] :
-				
-				efi_in_db = True
-				
-				if gop_type == "AMD" and bad_amd :
-					print(Style.BRIGHT + Fore.YELLOW + "You have a broken EFI image!\n" + Fore.RESET + Style.NORMAL)
-				elif gop_type == "AMD" and mod_amd :
-					print(Style.BRIGHT + Fore.YELLOW + "It appears you have a %s!\n" % mod_str + Fore.RESET + Style.NORMAL)
-				elif gop_type == "Nvidia" and bad_nvd :
-					print(Style.BRIGHT + Fore.YELLOW + "You have a broken EFI image!\n" + Fore.RESET + Style.NORMAL)
-				
-				if unknown_type :
-					new_type = line[:index - 3]
-				
-				#print("EFI %s is present in the database!\n" % t_efi_info_string)
-				break
+			if gop_type == "AMD" and bad_amd :
+				print(Style.BRIGHT + Fore.YELLOW + "You have a broken EFI image!\n" + Fore.RESET + Style.NORMAL)
+			elif gop_type == "AMD" and mod_amd :
+				print(Style.BRIGHT + Fore.YELLOW + "It appears you have a %s!\n" % mod_str + Fore.RESET + Style.NORMAL)
+			elif gop_type == "Nvidia" and bad_nvd :
+				print(Style.BRIGHT + Fore.YELLOW + "You have a broken EFI image!\n" + Fore.RESET + Style.NORMAL)
+			
+			if unknown_type :
+				new_type = line[:index - 3]
+			
+			#print("EFI %s is present in the database!\n" % t_efi_info_string)
+			break
 	
 	if efi_in_db :
 		
@@ -2674,1203 +2884,1896 @@ def check_in_database(t_efi_info_string) :
 			return new_type, True
 		else :
 			return None, True
-
+	
 	else :
 		print(Style.BRIGHT + Fore.YELLOW + "Note: The GOP file is not present in my database.\n\n      You can help me by reporting it.\n" + 
 		Fore.RESET + Style.NORMAL)
 		
 		return None, False
 
-####################################
-####################################
-####################################
-
-if len(sys.argv) < 3 :
-	print(Fore.RED + "Not enough arguments! Usage: GOPupd.py file.rom [ext_efirom | gop_upd | isbn]" + Fore.RESET)
-	sys.exit()
-else :
-	file_dir   = sys.argv[1]
-	file_rom   = os.path.basename(file_dir)
-	file_arg   = sys.argv[2]
-	extra_args = sys.argv[3:]
-
-if not os.path.isfile(file_dir) :
-	print(Fore.RED + "File %s was not found!" % file_dir + Fore.RESET)
-	sys.exit()
-
-try :
-	f = open(file_dir, 'rb')
-	reading = f.read()
-	f.close()
-except :
-	print(Fore.RED + "Unable to open file %s for reading!" % file_dir + Fore.RESET)
-	sys.exit()
-
-try :
-	os.mkdir(file_rom + "_temp/")
-except :
-	pass
-
-fileName, fileExtension = os.path.splitext(file_rom)
-position = 0
+nv_arch_ids  = {}
+nv_arch_src  = [None] # Lines nv_arch_ids was built from
+nv_mxm_archs = ['GF10x', 'GK1xx', 'GM1xx'] # Architectures with an _MXM GOP in #GOP_Files
+nv_any_archs = ['GP1xx', 'GV1xx', 'TU1xx'] # Pascal and newer use the same GOP for MXM
 
-if "-ROMSCAN" in (arg_val.upper() for arg_val in extra_args) :
+def nv_arch_from_id(t_pci_dev, t_is_mxm) :
 	
-	img_nr   = 0
-	position = 0
-	rom_data = reading
+	## Every ID of the ranges in nv_gop_IDs.txt is indexed once, so each lookup is a single dict access.
+	id_lines = gop_lines("nv_gop_IDs.txt")
 	
-	while True :
+	if nv_arch_src[0] is not id_lines :
+		nv_arch_ids.clear()
+		nv_arch_src[0] = id_lines
 		
-		rom_found, rom_start, rom_pcir_off, rom_id_bin, rom_id_hex, rom_last_img, rom_size = rom_info_scan(rom_data, position)
-		
-		if not rom_found :
-			break
-		
-		img_nr   += 1
-		position = rom_start + 2 # not using [position += rom_size] because of multi-images.
-		
-		print("Image %d -- Offset 0x%0.2X\n"  % (img_nr, rom_start))
-		
-		if rom_data[rom_start + 4:rom_start + 8] == b'\xF1\x0E\x00\x00' :
-			rom_hdr    = get_struct(rom_data, rom_start, EFI_ROM_Header)
-			rom_hdr.rom_print(rom_start)
-			pnp_ptr    = 0
-		elif rom_data[rom_start:rom_start + 2] == b'\x56\x4E' :
-			rom_hdr    = get_struct(rom_data, rom_start, ROM_Header) # Just in case will be needed
-			nv_rom_hdr = get_struct(rom_data, rom_start, NV_ROM_Header)
-			nv_rom_hdr.nv_rom_print(rom_start) # rom_hdr.nv_rom_print(rom_start)
-			pnp_ptr    = 0
-		elif rom_data[rom_start:rom_start + 2] == b'\x77\xBB' :
-			rom_hdr    = get_struct(rom_data, rom_start, ROM_Header) # Just in case will be needed
-			nv_rom_hdr = get_struct(rom_data, rom_start, NV_EFI_ROM_Header)
-			nv_rom_hdr.nv_rom_print(rom_start) # rom_hdr.nv_rom_print(rom_start)
-			pnp_ptr    = 0
-		else :
-			rom_hdr = get_struct(rom_data, rom_start, ROM_Header)
-			rom_hdr.rom_print(rom_start)
-			pnp_ptr = rom_hdr.PnpOffset
-		
-		if rom_hdr.PcirOffset :
-			pcir_off = rom_start + rom_hdr.PcirOffset
-			pcir_hdr = get_struct(rom_data, pcir_off, PCIR_Header)
-			
-			if pcir_hdr.Signature == b'RGIS' :
-				rgis_hdr = get_struct(rom_data, pcir_off, RGIS_Header)
-				rgis_hdr.rgis_print(pcir_off)
-				#pcir_hdr.rgis_print(pcir_off)
-			else :
-				pcir_hdr.pcir_print(pcir_off)
+		for line in id_lines :
 			
-			for idx in range(pcir_off + 0x20, pcir_off + 0x60) :
-				if rom_data[idx:idx + 4] == b'NPDE' :
-					npde_hdr = get_struct(rom_data, idx, NPDE_Header)
-					npde_hdr.npde_print(idx)
-					break
-		
-		# PnP sections
-		rom_pnp_off = rom_start + pnp_ptr
-		pnp_str     = rom_data[rom_pnp_off:rom_pnp_off + 4]
-		
-		if pnp_ptr != 0 and pnp_str == b'$PnP' :
-			pnp_step = rom_pnp_off
-			pnp_nr   = 0
+			if len(line) < 2 or line[:1] == "#" :
+				continue
 			
-			while True :
-				pnp_nr += 1
-				pnp_hdr  = get_struct(rom_data, pnp_step, PnP_Header)
-				pnp_next = pnp_hdr.OffsetOfNextHdr
-				pnp_len  = pnp_hdr.Length * 0x10
-				print("\nPnP %d:" % pnp_nr)
-				pnp_hdr.pnp_print(rom_start)
-				
+			id_range, arch = line.split("=")
+			first_id, last_id = id_range.split(" - ")
+			first_id = int(first_id.strip()[5:], 16)
+			last_id  = int(last_id.strip()[5:], 16)
 			
-				if pnp_next == 0 :
-					
-					test_pnp_off = pnp_step + pnp_len
-					
-					while rom_data[test_pnp_off:test_pnp_off + 1] == b'\x00' :
-						test_pnp_off += 1
-					
-					#if rom_data[pnp_step + pnp_len:pnp_step + pnp_len + 4] != b'$PnP' :
-					if rom_data[test_pnp_off:test_pnp_off + 4] != b'$PnP' :
-						break
-					
-					pnp_step = test_pnp_off
-				
-				else :
-					pnp_step = rom_start + pnp_next
-
-if "-ISBN" in (arg_val.upper() for arg_val in extra_args) :
-	rom_old_type, rom_start, rom_pcir_off, rom_id_bin, rom_size, efi_found, efi_begin, efi_size = rom_info(reading, 0, "all")
+			for idx in range(first_id, last_id + 1) :
+				nv_arch_ids[idx] = arch.strip()
 	
-	if "-DEBUG" in (arg_val.upper() for arg_val in extra_args) :
-		print_info = True
-	else :
-		print_info = False
+	try :
+		t_nv_type = nv_arch_ids.get(int(t_pci_dev, 16))
+	except ValueError :
+		t_nv_type = None
 	
-	isbn_found = False
-	nv_step    = rom_start + rom_size
+	## An MXM board of an architecture without an _MXM GOP must not get the desktop one.
+	if t_nv_type is not None and t_is_mxm and t_nv_type in nv_mxm_archs :
+		t_nv_type += "_MXM"
+	elif t_is_mxm and t_nv_type not in nv_any_archs :
+		t_nv_type = None
 	
-	if reading[rom_pcir_off + 0x20:rom_pcir_off + 0x24] == b'NPDE' :
-		npde_size = int.from_bytes(reading[rom_pcir_off + 0x28:rom_pcir_off + 0x2A], 'little') * 0x200
-		
-		if rom_size != npde_size :
-			print("  Different sizes in PCI structure and NPDE structure of Legacy ROM!\n")
-			
-			rom_end_npde  = rom_start + npde_size
-			rom_test_npde = reading[rom_end_npde:rom_end_npde + 2]
+	return t_nv_type
+
+class EFI_Decompressor :
+	
+	## Port of the EDK2 UEFI/Tiano decompressor (BaseUefiDecompressLib). Tiano images use 5 position bits.
+	NC    = 510
+	NT    = 19
+	NPT   = 0x1F
+	MAXNP = 0x1F
+	CBIT  = 9
+	TBIT  = 5
+	
+	def __init__(self, src_data, p_bit) :
+		self.src       = src_data
+		self.comp_size = int.from_bytes(src_data[0:4], 'little')
+		self.orig_size = int.from_bytes(src_data[4:8], 'little')
+		self.in_pos    = 8
+		self.p_bit     = p_bit
+		self.bit_buf   = 0
+		self.sub_buf   = 0
+		self.bit_count = 0
+		self.blk_size  = 0
+		self.left      = [0] * (2 * self.NC - 1)
+		self.right     = [0] * (2 * self.NC - 1)
+		self.c_len     = [0] * self.NC
+		self.pt_len    = [0] * self.NPT
+		self.c_table   = [0] * 4096
+		self.pt_table  = [0] * 256
+		
+		if self.comp_size + 8 > len(src_data) :
+			raise ValueError("compressed size 0x%X is past the end of the data" % self.comp_size)
+	
+	def fill_buf(self, nr_bits) :
+		self.bit_buf = (self.bit_buf << nr_bits) & 0xFFFFFFFF
+		
+		while nr_bits > self.bit_count :
+			nr_bits      -= self.bit_count
+			self.bit_buf |= (self.sub_buf << nr_bits) & 0xFFFFFFFF
 			
-			## If NPDE size is the right one, there is one container for all ROMs.
-			if rom_test_npde in [b'\x55\AA', b'\x56\x4E'] :
-				print("  The Legacy ROM appears to be a container for all images.\n")
-				nv_step      = rom_end_npde
+			if self.comp_size > 0 :
+				self.comp_size -= 1
+				self.sub_buf   = self.src[self.in_pos]
+				self.in_pos    += 1
+			else :
+				self.sub_buf = 0
 			
-	check_nv_ext = reading[nv_step:nv_step + 2]
-				
-	while check_nv_ext in [b'\x56\x4E', b'\x55\xAA', b'\x77\xBB'] :
+			self.bit_count = 8
 		
-		if check_nv_ext == b'\x77\xBB' :
-			npds_off    = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
-			npds_off    += nv_step
-			nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
+		self.bit_count -= nr_bits
+		self.bit_buf   |= self.sub_buf >> self.bit_count
+	
+	def get_bits(self, nr_bits) :
+		out_bits = self.bit_buf >> (32 - nr_bits)
+		self.fill_buf(nr_bits)
+		return out_bits
+	
+	def make_table(self, nr_char, bit_len, table_bits, table) :
+		count  = [0] * 17
+		weight = [0] * 17
+		start  = [0] * 18
 		
-		else :
-			nv_ext_size = int.from_bytes(reading[nv_step + 2:nv_step + 4], 'little') * 0x200
+		for idx in range(nr_char) :
+			if bit_len[idx] > 16 :
+				raise ValueError("bad Huffman table")
+			count[bit_len[idx]] += 1
 		
-		#print(nv_ext_size)
+		for idx in range(1, 17) :
+			start[idx + 1] = (start[idx] + (count[idx] << (16 - idx))) & 0xFFFF
 		
-		if nv_ext_size == 0 :
-			npds_off    = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
-			npds_off    += nv_step
-			nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
-			#print(nv_ext_size)
-			
-			npds_str_size = int.from_bytes(reading[npds_off + 0xA:npds_off + 0xC], 'little')
-			isbn_off      = npds_off + npds_str_size
-			isbn_check    = reading[isbn_off:isbn_off + 4]
-			
-			if isbn_check == b'ISBN' :
-				print(Style.BRIGHT + Fore.YELLOW + "Found ISBN at offset 0x%0.2X\n" % isbn_off + Fore.RESET + Style.NORMAL)
-				isbn_struct(reading[isbn_off:nv_step + nv_ext_size], print_info)
-				isbn_found = True
+		if start[17] != 0 :
+			raise ValueError("bad Huffman table")
 		
-		nv_step      += nv_ext_size
-		check_nv_ext = reading[nv_step:nv_step + 2]
-	
-	if not isbn_found :
-		print(Style.BRIGHT + Fore.YELLOW + "ISBN was not found!\n" + Fore.RESET + Style.NORMAL)
-
-if file_arg == "ext_efirom" :
-	## Get ROM info for EFI extraction
-	efi_nr = 1
-	
-	efi_found, efi_begin, efi_size = rom_info(reading, 0, "mini")
-	
-	if not efi_found :
-		print(Fore.RED + "No EFI ROM found!\n" + Fore.RESET)
-		sys.exit()
-	
-	efi_rom = reading[efi_begin:efi_begin + efi_size]
-	
-	with open("%s_temp/%s_compr.efirom" % (file_rom, fileName), 'wb') as efi_rom_file :
-		efi_rom_file.write(efi_rom)
-	
-	while True :
-		efi_found = False
+		ju_bits = 16 - table_bits
 		
-		if rom_info(reading, efi_begin + efi_size, "basic") :
-			efi_found, efi_begin, efi_size = rom_info(reading, efi_begin + efi_size, "mini")
+		for idx in range(1, table_bits + 1) :
+			start[idx]  >>= ju_bits
+			weight[idx] = 1 << (table_bits - idx)
 		
-		if not efi_found :
-			sys.exit()
+		for idx in range(table_bits + 1, 17) :
+			weight[idx] = 1 << (16 - idx)
 		
-		print(Fore.RED + "Extra EFI ROM found at offset 0x%0.2X!\n" % efi_begin + Fore.RESET)
-		efi_nr  += 1
-		efi_rom = reading[efi_begin:efi_begin + efi_size]
+		idx = start[table_bits + 1] >> ju_bits
 		
-		with open("%s_temp/%s_compr_nr%d.efirom" % (file_rom, fileName, efi_nr), 'wb') as efi_rom_file :
-			efi_rom_file.write(efi_rom)
-
-elif file_arg == "gop_upd" :
-	
-	gop_type  = ""
-	efi_in_db = False
-	efi_imag  = False
-	file_efi  = "%s_temp/%s_dump.efi" % (file_rom, fileName)
-	file_efr  = "%s_temp/%s_compr.efirom" % (file_rom, fileName)
-	#print(extra_args)
-	
-	if "-PATCHED" in (arg_val.upper() for arg_val in extra_args) :
-		amd_gop_efirom = "amd_gop_mod.efirom"
-	else :
-		amd_gop_efirom = "amd_gop.efirom"
-	
-	if os.path.isfile(file_efi) or fileExtension in ['.efi', '.ffs'] :
+		if idx != 0 :
+			for tbl_idx in range(idx, 1 << table_bits) :
+				table[tbl_idx] = 0
 		
-		if fileExtension in ['.efi', '.ffs'] :
-			efi_imag = True
-			mz_found, mz_start = mz_off(reading, 0)
+		avail = nr_char
+		mask  = 1 << (15 - table_bits)
+		
+		for char in range(nr_char) :
+			length = bit_len[char]
 			
-			if mz_found :
-				mz_size  = image_size(reading[mz_start:], 'full')
-				#print("%02X - %02X" % (mz_start, mz_start + mz_size))
-				efi_dump = reading[mz_start:mz_start + mz_size]
-			else :
-				with open(file_efi, 'rb') as myfile :
-					efi_dump = myfile.read()
-		else :
-			with open(file_efi, 'rb') as myfile :
-				efi_dump = myfile.read()
-		
-		## Get EFI info
-		gop_type, nv_type, version, efi_info_string = efi_version(efi_dump)
-		
-		## The machine code type, signer and CRC32 are processed outside efi_version because they are not bound to GOP.
-		
-		## Signer
-		## Needs a full X.509 parser. Since it is not that important, only get the first signer.
-		# pe_off     = int.from_bytes(efi_dump[0x3C:0x40], 'little')
-		# code_size  = int.from_bytes(efi_dump[pe_off + 0x50:pe_off + 0x54], 'little') ## only works for EFI files, not for every exe.
-		code_size  = image_size(efi_dump, 'naked')
-		pat_sign   = re.compile(br'\x06\x09\x2A\x86\x48\x86\xF7\x0D\x01\x07\x02')
-		match_sign = pat_sign.search(efi_dump, code_size)
-		
-		if match_sign is not None :
-			(sign_start_match, sign_end_match) = match_sign.span()
-			#print("\nEFI Image is signed!")
-			efi_is_signed = "Signed"
-			pat_signer    = re.compile(br'\x06\x03\x55\x04\x03\x13') ## 06 03 55 04 03 13
-			match_signer  = pat_signer.search(efi_dump, sign_end_match)
-			
-			if match_signer is not None :
-				(signer_start_match, signer_end_match) = match_signer.span()
-				mess_len = ord(efi_dump[signer_end_match:signer_end_match + 1])
-				signer   = efi_dump[signer_end_match + 1:signer_end_match + mess_len + 1].decode('utf-8', 'ignore')
-				print(Style.BRIGHT + Fore.CYAN + "\nMost likely signed by: %s\n" % signer + Fore.RESET + Style.NORMAL)
+			if length == 0 :
+				continue
+			
+			next_code = start[length] + weight[length]
+			
+			if length <= table_bits :
+				if next_code > len(table) :
+					raise ValueError("bad Huffman table")
+				
+				for tbl_idx in range(start[length], next_code) :
+					table[tbl_idx] = char
 			else :
-				print(Style.BRIGHT + Fore.CYAN + "\nEFI Image is signed!\n" + Fore.RESET + Style.NORMAL)
-		
-		else :
-			efi_is_signed = "Unsigned"
-			print(Style.BRIGHT + Fore.CYAN + "\nEFI image is NOT signed!\n" + Fore.RESET + Style.NORMAL)
-		
-		if gop_type == "AMD" :
-			efi_info_string += " - " + "%s" % efi_is_signed
+				code    = start[length]
+				ptr_arr = table
+				ptr_idx = code >> ju_bits
+				
+				for _ in range(length - table_bits) :
+					if ptr_arr[ptr_idx] == 0 :
+						if avail >= len(self.left) :
+							raise ValueError("bad Huffman table")
+						self.right[avail] = 0
+						self.left[avail]  = 0
+						ptr_arr[ptr_idx]  = avail
+						avail             += 1
+					
+					ptr_idx = ptr_arr[ptr_idx]
+					ptr_arr = self.right if code & mask else self.left
+					code    = (code << 1) & 0xFFFF
+				
+				ptr_arr[ptr_idx] = char
+			
+			start[length] = next_code
+	
+	def read_pt_len(self, nr_sym, nr_bit, special) :
+		number = self.get_bits(nr_bit)
 		
-		## Machine Code Type		
-		mz_start, code_type, print_type = pe_machine(efi_dump)
-		print(Style.BRIGHT + Fore.CYAN + "Machine Code   = %s\n" % code_type + Fore.RESET + Style.NORMAL)
+		if number == 0 :
+			char = self.get_bits(nr_bit)
+			self.pt_table[:] = [char] * 256
+			self.pt_len[:nr_sym] = [0] * nr_sym
+			return
 		
-		## CRC32
-		#efi_crc32 = get_crc32(efi_dump)
-		efi_crc32_int = binascii.crc32(efi_dump) & 0xFFFFFFFF
-		efi_crc32_hex = "%08X" % efi_crc32_int
-		print(Style.BRIGHT + Fore.CYAN + "Checksum CRC32 = %s\n" % efi_crc32_hex + Fore.RESET + Style.NORMAL)
+		idx = 0
 		
-		## Check in database
-		if efi_info_string != "" :
-						
-			efi_info_string += " - " + "%s\n" % efi_crc32_hex
+		while idx < number and idx < self.NPT :
+			char = self.bit_buf >> 29
 			
-			#print(efi_info_string)
-			#with open("#add_new_string.txt", "a") as myfile :
-			#	myfile.write(efi_info_string)
+			if char == 7 :
+				mask = 1 << 28
+				
+				while mask & self.bit_buf :
+					mask >>= 1
+					char += 1
 			
-			new_nv_type, efi_in_db = check_in_database(efi_info_string)
+			self.fill_buf(3 if char < 7 else char - 3)
+			self.pt_len[idx] = char
+			idx += 1
 			
-			if new_nv_type is not None :
-				nv_type = new_nv_type
-				#print("GOP identified as %s based on CRC\n" % nv_type)
-				print(Style.BRIGHT + Fore.WHITE + "GOP identified as" + Fore.GREEN + " %s " % nv_type + 
-				Fore.WHITE + "based on CRC \n" + Fore.RESET + Style.NORMAL)
+			if idx == special :
+				zeros = self.get_bits(2)
+				self.pt_len[idx:idx + zeros] = [0] * zeros
+				idx += zeros
 		
-		## Check integrity
+		while idx < nr_sym :
+			self.pt_len[idx] = 0
+			idx += 1
 		
-		old_checksum, new_checksum = pe_checksum(efi_dump)
-		
-		if old_checksum == new_checksum :
-			chk_msg = " (Same as in PE header)"
-		elif old_checksum == 0 :
-			chk_msg = " (Should be %0.2X)\n" % new_checksum
-		else :
-			chk_msg = " (Should be %0.2X). Image is most likely corrupted.\n" % new_checksum
+		self.make_table(nr_sym, self.pt_len, 8, self.pt_table)
+	
+	def read_c_len(self) :
+		number = self.get_bits(self.CBIT)
 		
-		checksum_str = "PE Checksum = %0.2X" % old_checksum + chk_msg
+		if number == 0 :
+			char = self.get_bits(self.CBIT)
+			self.c_len[:] = [0] * self.NC
+			self.c_table[:] = [char] * 4096
+			return
 		
-		if old_checksum == 0 :
-			print(Style.BRIGHT + Fore.YELLOW + checksum_str + Fore.RESET + Style.NORMAL)
+		idx = 0
 		
-		elif old_checksum and old_checksum != new_checksum :
+		while idx < number and idx < self.NC :
+			char = self.pt_table[self.bit_buf >> 24]
+			
+			if char >= self.NT :
+				mask = 1 << 23
+				
+				while char >= self.NT :
+					char = self.right[char] if self.bit_buf & mask else self.left[char]
+					mask >>= 1
 			
-			if not efi_in_db :
-				print(Style.BRIGHT + Fore.YELLOW + "You may have a broken EFI image!\n" + Fore.RESET + Style.NORMAL)
+			self.fill_buf(self.pt_len[char])
 			
-			print(Style.BRIGHT + Fore.YELLOW + checksum_str + Fore.RESET + Style.NORMAL)
+			if char <= 2 :
+				if char == 0 :
+					zeros = 1
+				elif char == 1 :
+					zeros = self.get_bits(4) + 3
+				else :
+					zeros = self.get_bits(self.CBIT) + 20
+				
+				self.c_len[idx:idx + zeros] = [0] * zeros
+				idx += zeros
+			else :
+				self.c_len[idx] = char - 2
+				idx += 1
 		
-		## Rename temp files
+		del self.c_len[self.NC:]
+		self.c_len[idx:] = [0] * (self.NC - idx)
+		self.make_table(self.NC, self.c_len, 12, self.c_table)
+	
+	def decode_c(self) :
+		if self.blk_size == 0 :
+			self.blk_size = self.get_bits(16)
+			self.read_pt_len(self.NT, self.TBIT, 3)
+			self.read_c_len()
+			self.read_pt_len(self.MAXNP, self.p_bit, -1)
 		
-		extra_ver = ""
-		pat_lg    = br'\x41(\x4D\x44|\x54\x49)\x20\x41\x54\x4F\x4D\x42\x49\x4F\x53\x00' ## AMD ATOMBIOS or ATI ATOMBIOS.
+		self.blk_size -= 1
+		char = self.c_table[self.bit_buf >> 20]
 		
-		if gop_type == "AMD" :
+		if char >= self.NC :
+			mask = 1 << 19
 			
-			# TODO Check for ROM, get CRC offset, compare to 0.
-			# Usually a ROM in EFI means legacy tables are present.
-			if (rom_info(efi_dump, 0, "basic") or re.search(pat_lg, efi_dump) is not None) :
-				extra_ver += "_custom_%s_%s" % (efi_is_signed.lower(), efi_crc32_hex)
-			else :
-				extra_ver += "_%s_%s" % (efi_is_signed.lower(), efi_crc32_hex)
+			while char >= self.NC :
+				char = self.right[char] if self.bit_buf & mask else self.left[char]
+				mask >>= 1
 		
-		version_xt = version + extra_ver
+		self.fill_buf(self.c_len[char])
+		return char
+	
+	def decode_p(self) :
+		val = self.pt_table[self.bit_buf >> 24]
 		
-		## For you
+		if val >= self.MAXNP :
+			mask = 1 << 23
+			
+			while val >= self.MAXNP :
+				val = self.right[val] if self.bit_buf & mask else self.left[val]
+				mask >>= 1
 		
-		gop_version  = "%s %s" % (nv_type, version_xt) if nv_type != "" else version_xt
-		file_new_bgn = "%s_temp/%s GOP %s" % (file_rom, gop_type, gop_version)
+		self.fill_buf(self.pt_len[val])
 		
-		## For me
+		if val > 1 :
+			return (1 << (val - 1)) + self.get_bits(val - 1)
 		
-		full_rename = False
+		return val
+	
+	def decompress(self) :
+		out_data = bytearray()
+		self.fill_buf(32)
 		
-		if full_rename and fileName[:8] == "AMD GOP " and fileName[8:10] in ['0.', '1.'] :
+		while len(out_data) < self.orig_size :
+			char = self.decode_c()
 			
-			if fileName.find("_signed_") > 0 or fileName.find("_unsigned_") > 0 :
-				needs_rename = False
+			if char < 256 :
+				out_data.append(char)
 			else :
-				needs_rename = True
-			
-			#print("Orig = " + fileName)
-			split_name = fileName.split()
-			#print(split_name)
-			fileName   = " ".join(split_name[3:])
-			fileName   = fileName.rstrip()
-			#print("Cut  = " + fileName)
-			
-			if needs_rename :
+				length   = char - 253
+				data_idx = len(out_data) - self.decode_p() - 1
 				
-				try :
-					fixed_name = os.path.dirname(file_dir) + "/" + "AMD GOP " + version_xt + " " + fileName.rstrip() + fileExtension
-					#print(fixed_name)
-					os.rename(file_dir, fixed_name)
-					
-					olf_efi_name = file_dir[:-13] + "_dump.efi"
-					
-					if os.path.isfile(olf_efi_name) :
-						fixed_name = os.path.dirname(file_dir) + "/" + "AMD GOP " + version_xt + " " + fileName.rstrip() + ".efi"
-						fixed_name = fixed_name.replace("_compr", "_dump")
-						os.rename(olf_efi_name, fixed_name)
+				if data_idx < 0 :
+					raise ValueError("match before the start of the data")
 				
-				except Exception as e:
-					
-					print("Error on renaming original files!\n")
-					print(e)
-					print()
-		
-		# version_me      = version_xt[2:] if version_xt[:2] == "0x" else version_xt
-		# gop_version_me  = "%s %s" % (nv_type, version_me) if nv_type != "" else version_me
-		# file_new_bgn    = "%s_temp/%s GOP %s %s" % (file_rom, gop_type, gop_version_me, fileName)
+				for idx in range(data_idx, data_idx + length) :
+					out_data.append(out_data[idx])
 		
-		## And nothing for the rest.
+		return bytes(out_data[:self.orig_size])
+
+def efi_decompress(t_comp_data) :
+	
+	## EFI ROMs use the UEFI algorithm (4 position bits), but some are Tiano compressed (5 bits).
+	for p_bit in [4, 5] :
+		try :
+			efi_data = EFI_Decompressor(t_comp_data, p_bit).decompress()
+		except (ValueError, IndexError) :
+			continue
 		
-		file_new_efr = "%s_compr.efirom" % file_new_bgn.rstrip()
-		file_new_efi = "%s_dump.efi" % file_new_bgn.rstrip()
+		if efi_data[:2] == b'MZ' :
+			return efi_data
+	
+	return None
+
+def efirom_dump(t_efi_rom) :
+	
+	## Image of an EFI ROM, as UEFIRomExtract writes it to <rom>_dump.efi. None when it doesn't decompress.
+	efi_off = int.from_bytes(t_efi_rom[0x16:0x18], 'little')
+	
+	if t_efi_rom[0x0C:0x0E] == b'\x00\x00' :
+		return t_efi_rom[efi_off:]
+	
+	return efi_decompress(t_efi_rom[efi_off:])
+
+def write_ext_files(t_rom_path, t_rom_data, t_dump_func=efirom_dump) :
+	
+	## What the batch files do with ext_efirom and UEFIRomExtract before gop_upd, for callers that run gop_upd
+	## on their own: <rom>_temp/<name>_compr.efirom and <name>_dump.efi of the first EFI image next to the ROM.
+	t_file_name, t_file_ext = os.path.splitext(os.path.basename(t_rom_path))
+	
+	if t_file_ext in ['.efi', '.ffs'] :
+		return False
+	
+	t_efi_found, t_efi_begin, t_efi_size = rom_info(t_rom_data, 0, "mini")
+	
+	if not t_efi_found :
+		return False
+	
+	t_efi_rom = t_rom_data[t_efi_begin:t_efi_begin + t_efi_size]
+	t_dump    = t_dump_func(t_efi_rom)
+	
+	os.makedirs("%s_temp" % t_rom_path, exist_ok=True)
+	
+	with open("%s_temp/%s_compr.efirom" % (t_rom_path, t_file_name), 'wb') as efi_rom_file :
+		efi_rom_file.write(t_efi_rom)
+	
+	if t_dump is not None :
+		with open("%s_temp/%s_dump.efi" % (t_rom_path, t_file_name), 'wb') as dump_file :
+			dump_file.write(t_dump)
+	
+	return t_dump is not None
+
+class Phase_Profiler :
+	
+	def __init__(self, file_rom, as_json, use_cprofile, use_memory) :
+		self.file_rom   = file_rom
+		self.as_json    = as_json
+		self.phases     = {} # name -> [calls, seconds, bytes scanned, regex searches, peak bytes, net bytes]
+		self.running    = [] # [name, start, bytes scanned, regex searches, traced at start, traced peak]
+		self.bytes_scan = 0
+		self.regex_nr   = 0
+		self.cprof      = None
+		self.memory     = use_memory
+		self.mem_sites  = {} # (file, line) -> [largest live size at a phase end, blocks, phase]
+		self.start      = time.perf_counter()
+		
+		if use_memory :
+			tracemalloc.start()
+		
+		if use_cprofile :
+			import cProfile
+			self.cprof = cProfile.Profile()
+			self.cprof.enable()
+	
+	def begin(self, name) :
+		mem_now = 0
+		
+		if self.memory :
+			mem_now, mem_peak = tracemalloc.get_traced_memory()
+			
+			## The peak is global, so hand it to the outer phase before resetting it for this one.
+			if self.running :
+				self.running[-1][5] = max(self.running[-1][5], mem_peak)
+			
+			tracemalloc.reset_peak()
+		
+		self.running.append([name, time.perf_counter(), self.bytes_scan, self.regex_nr, mem_now, mem_now])
+	
+	def end(self, name) :
+		## Close inner phases left open by an early return, the times are inclusive anyway.
+		while self.running :
+			run_name, run_start, run_bytes, run_regex, run_mem, run_peak = self.running.pop()
+			phase = self.phases.setdefault(run_name, [0, 0.0, 0, 0, 0, 0])
+			phase[0] += 1
+			phase[1] += time.perf_counter() - run_start
+			phase[2] += self.bytes_scan - run_bytes
+			phase[3] += self.regex_nr - run_regex
+			
+			if self.memory :
+				mem_now, mem_peak = tracemalloc.get_traced_memory()
+				run_peak = max(run_peak, mem_peak)
+				phase[4] = max(phase[4], run_peak - run_mem)
+				phase[5] += mem_now - run_mem
+				
+				if self.running :
+					self.running[-1][5] = max(self.running[-1][5], run_peak)
+				
+				self.mem_snapshot(run_name)
+			
+			if run_name == name :
+				break
+	
+	def mem_snapshot(self, name) :
+		## Keep the largest live size of every GOPupd line seen at a phase end. Return values are still
+		## alive here (wrap calls end before handing them back), so the slices and concatenations show up.
+		snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(True, __file__),))
 		
-		if file_efi != file_new_efi and os.path.exists(file_new_efi) :
-			os.remove(file_new_efi)
-		if file_efr != file_new_efr and os.path.exists(file_new_efr) :
-			os.remove(file_new_efr)
+		for stat in snapshot.statistics("lineno") :
+			site = (stat.traceback[0].filename, stat.traceback[0].lineno)
+			
+			if site not in self.mem_sites or stat.size > self.mem_sites[site][0] :
+				self.mem_sites[site] = [stat.size, stat.count, name]
+	
+	def wrap(self, name, func) :
 		
-		if not efi_imag :
+		def timed(*args, **kwargs) :
 			
-			try :
-				os.rename(file_efi, file_new_efi)
-			except Exception as e:
-				print("Error on renaming temp files!\n")
-				print(e)
-				print()
+			## A phase that is already running, a function wrapped twice or calling itself, is counted once.
+			if any(run_phase[0] == name for run_phase in self.running) :
+				return func(*args, **kwargs)
+			
+			self.begin(name)
 			
 			try :
-				os.rename(file_efr, file_new_efr)
-			except Exception as e:
-				print("Error on renaming temp files!\n")
-				print(e)
-				print()
-		
-		if gop_type not in ['AMD', 'Nvidia'] or not efi_in_db :
-			
-			# if efi_info_string != "" :
-				# with open("#add_new_string.txt", "a") as myfile :
-					# myfile.write(efi_info_string)
-			
-			src_dir = "%s_temp" % file_rom
-			dst_dir = "%s_newGOP" % file_rom
-			os.rename(src_dir, dst_dir)
-		
-	print(Fore.RED + "---------------------------------------------------------------\n" + Fore.RESET)
-	
-	print(Fore.GREEN + "***************************************************************")
-	print("***                Processing with Python...                ***")
-	print("*************************************************************** \n" + Fore.RESET)
-	#print("---------------------------------------------------------------\n\n")
-	
-	is_vega_gop   = False
-	last_amd_vega = "2.4.0.0.0"
-	last_amd_new  = "1.67.0.15.50"
-	last_amd_old  = "1.57.0.0.0"
-	last_nv_GT21x = "0x10031"
-	last_nv_GF10x = "0x1002D"
-	last_nv_GF119 = "0x10030"
-	last_nv_GK1xx = "0x10038"
-	last_nv_GM1xx = "0x10036"
-	last_nv_GM2xx = "0x20011"
-	last_nv_GP1xx = "0x3000E"
-	last_nv_GV1xx = "0x40006"
-	last_nv_TU1xx = "0x50009"
-	
-	last_nv_GF10x_MXM = "0x10005"
-	last_nv_GF119_MXM = "0"
-	last_nv_GK1xx_MXM = "0x10033"
-	last_nv_GM1xx_MXM = "0x10035"
-	
-	last_nv_GK1xx_MDP = "0x10030"
-	
-	## GOP Test
-	if gop_type == "AMD" :
-		
-		if version[:2] == "2." :
-			last_gop    = last_amd_vega
-			is_vega_gop = True
-		else : 
-			last_gop    = last_amd_new
-		
-		is_version_upd(last_gop, version, gop_type)
-	
-	elif gop_type == "Nvidia" :
-		if len(nv_type) > 12 and nv_type[6:13] == "Strange" : # GXxyz_Strange or GXxyz_Strange_[MXM|Multi-Display|Custom]
-			print(Style.BRIGHT + Fore.YELLOW + "You have a strange GOP! Please report it!\n" + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		elif len(nv_type) > 6 and nv_type[-6:] == "Custom" : # GXxyz[_Strange]_Custom
-			print(Style.BRIGHT + Fore.YELLOW + "You have a custom GOP! Currently not supported. Please report it!\n" + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		elif nv_type == "GT21x" :
-			last_gop = last_nv_GT21x
-			nv_file  = "nv_gop_GT21x.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GF10x" :
-			last_gop = last_nv_GF10x
-			nv_file  = "nv_gop_GF10x.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GF119" :
-			last_gop = last_nv_GF119
-			nv_file  = "nv_gop_GF119.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GK1xx" :
-			last_gop = last_nv_GK1xx
-			nv_file  = "nv_gop_GK1xx.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GM1xx" :
-			last_gop = last_nv_GM1xx
-			nv_file  = "nv_gop_GM1xx.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GM2xx" :
-			last_gop = last_nv_GM2xx
-			nv_file  = "nv_gop_GM2xx.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GP1xx" :
-			last_gop = last_nv_GP1xx
-			nv_file  = "nv_gop_GP1xx.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GV1xx" :
-			last_gop = last_nv_GV1xx
-			nv_file  = "nv_gop_GV1xx.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "TU1xx" :
-			last_gop = last_nv_TU1xx
-			nv_file  = "nv_gop_TU1xx.efirom"
-			is_version_upd(last_gop, version, gop_type)
-			print(Style.BRIGHT + Fore.YELLOW + "Work in progress! Be careful!\n" + Fore.RESET + Style.NORMAL)
-			#sys.exit()
-		elif nv_type == "GK1xx_MXM" :
-			last_gop = last_nv_GK1xx_MXM
-			nv_file  = "nv_gop_GK1xx_MXM.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GM1xx_MXM" :
-			last_gop = last_nv_GM1xx_MXM
-			nv_file  = "nv_gop_GM1xx_MXM.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif nv_type == "GK1xx_Multi-Display" :
-			last_gop = last_nv_GK1xx_MDP
-			nv_file  = "nv_gop_GK1xx_multi.efirom"
-			is_version_upd(last_gop, version, gop_type)
-		elif len(nv_type) > 3 and nv_type[-3:] == "MXM" : # GXxyz_MXM or GXxxx_MXM
-			print(Style.BRIGHT + Fore.YELLOW + "You have an unsupported MXM GPU! Please report it! \n" + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		elif len(nv_type) > 13 and nv_type[-13:] == "Multi-Display" : # GXxyz_Multi-Display
-			print(Style.BRIGHT + Fore.YELLOW + "You have an unsupported Multi-Display GPU! Please report it!\n" + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		elif nv_type != "GXxxx" : # GXnew
-			print(Style.BRIGHT + Fore.YELLOW + "You have a new GOP type! Please report it!\n" + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		else : # == GXxxx i.e. no variant ID.
-			last_gop = "latest available"
-			print(Style.BRIGHT + Fore.YELLOW + "Unable to determine GOP type!\n" + Fore.RESET + Style.NORMAL)
+				return func(*args, **kwargs)
+			finally :
+				self.end(name)
+		
+		return timed
+	
+	def scanned(self, data, pos, match) :
+		self.regex_nr   += 1
+		self.bytes_scan += (match.end() if match is not None else len(data)) - pos
+	
+	def report(self) :
+		
+		## Most of the paths end with sys.exit(), so this runs from atexit.
+		if self.running :
+			self.end(self.running[0][0])
+		
+		total     = time.perf_counter() - self.start
+		file_name = os.path.splitext(self.file_rom)[0]
+		mem_peak  = 0
+		top_sites = []
+		
+		if self.memory :
+			mem_peak  = max(tracemalloc.get_traced_memory()[1], max((val[4] for val in self.phases.values()), default=0))
+			top_sites = sorted(self.mem_sites.items(), key=lambda site: site[1][0], reverse=True)[:10]
+			tracemalloc.stop()
+		
+		if self.cprof is not None :
+			self.cprof.disable()
+			import pstats
+			self.cprof.dump_stats("%s_profile.pstats" % file_name)
+		
+		if self.as_json :
+			phase_list = [{"phase" : name, "calls" : val[0], "seconds" : val[1], "bytes_scanned" : val[2], "regex_searches" : val[3]}
+						for name, val in self.phases.items()]
+			json_data  = {"file" : self.file_rom, "total_seconds" : total, "bytes_scanned" : self.bytes_scan,
+						"regex_searches" : self.regex_nr, "phases" : phase_list}
+			
+			if self.memory :
+				for phase_dict, val in zip(phase_list, self.phases.values()) :
+					phase_dict["peak_bytes"] = val[4]
+					phase_dict["net_bytes"]  = val[5]
+				
+				json_data["peak_bytes"]       = mem_peak
+				json_data["allocation_sites"] = [{"file" : os.path.basename(site[0]), "line" : site[1], "bytes" : val[0],
+												"blocks" : val[1], "phase" : val[2]} for site, val in top_sites]
+			
+			with open("%s_profile.json" % file_name, 'w') as json_file :
+				json.dump(json_data, json_file, indent=2)
+			
+			print(Style.BRIGHT + Fore.CYAN + "\nProfile written to %s_profile.json\n" % file_name + Fore.RESET + Style.NORMAL)
+		
+		else :
+			print("\n---------------------------PROFILE---------------------------\n")
+			print(" Phase                 Calls   Time (ms)     Scanned    Regex \n")
+			
+			for name, val in self.phases.items() :
+				print(" %-20s  %5d  %10.3f  %10d  %7d" % (name, val[0], val[1] * 1000, val[2], val[3]))
+			
+			print("\n Total                        %10.3f  %10d  %7d" % (total * 1000, self.bytes_scan, self.regex_nr))
+			print("\n Phase times are inclusive, user input is counted as its own phase.")
+			
+			if self.memory :
+				print("\n Phase                 Peak (KB)    Net (KB) \n")
+				
+				for name, val in self.phases.items() :
+					print(" %-20s  %9.1f  %10.1f" % (name, val[4] / 1024, val[5] / 1024))
+				
+				print("\n Peak traced memory    %9.1f" % (mem_peak / 1024))
+				print("\n Top allocation sites (live bytes at a phase end):\n")
+				
+				for site, val in top_sites :
+					print(" %9.1f KB  %5d blocks  line %-5d %-16s %s" % (val[0] / 1024, val[1], site[1], val[2],
+						linecache.getline(site[0], site[1]).strip()[:60]))
+				
+				print("\n Peak is the highest traced memory above the phase start, net is what the phase kept.")
+				print(" Times are inflated by tracemalloc in this mode.")
+			print("\n-------------------------------------------------------------\n")
+		
+		if self.cprof is not None :
+			print("cProfile stats written to %s_profile.pstats\n" % file_name)
+			pstats.Stats(self.cprof).sort_stats("cumulative").print_stats(20)
+
+class Counted_Pattern :
 	
-	elif gop_type[:4] == "Mac_" :
-		print(Style.BRIGHT + Fore.RED + "Mac GOP support is limited! Drop your compressed GOP as mac_gop.efirom in #GOP_Files\n" + 
-		Fore.RESET + Style.NORMAL)
-		last_gop = "your file"
-		mac_file  = "mac_gop.efirom"
-		#sys.exit()
-	elif gop_type[:3] == "LSI" :
-		print(Style.BRIGHT + Fore.RED + "LSI SASx MPT UEFI not supported!\n" + Fore.RESET + Style.NORMAL)
-		sys.exit()
-	elif gop_type == "Unknown" :
-		print(Style.BRIGHT + Fore.RED + "Not GOP or GOP is not common type! Please report it!\n" + Fore.RESET + Style.NORMAL)
-		sys.exit()
-	else :
-		last_gop = "latest available"
-		print(Style.BRIGHT + Fore.RED + "GOP is not present!!!\n" + Fore.RESET + Style.NORMAL)
+	def __init__(self, pattern, t_profiler) :
+		self.pattern  = pattern
+		self.profiler = t_profiler
 	
-	if efi_imag :
-		print(Style.BRIGHT + Fore.CYAN + "It appears you used an EFI image! Only version display is possible." + Fore.RESET + Style.NORMAL)
-		sys.exit()
+	def search(self, data, pos=0, *endpos) :
+		match = self.pattern.search(data, pos, *endpos)
+		self.profiler.scanned(data, pos, match)
+		return match
 	
-	## Get ROM Info
-	orom_old_type, orom_start, orom_pcir_off, orom_id_bin, orom_size, efi_found, efi_begin, efi_size = rom_info(reading, 0, "all")
-	#ven_dev = "%s-%s" % (orom_id_hex[4:], orom_id_hex[:4])
-	#pci_ven = ven_dev[:4]
-	#pci_dev = ven_dev[-4:]
-	ven_dev, pci_ven, pci_dev = id_from_bin(orom_id_bin, "all_list")
-	efi_class_bin = reading[orom_pcir_off + 0xD:orom_pcir_off + 0x10] # Initialize for when GOP ROM missing
-	#print(ven_dev)
-	#print("%0.2X = %s-%s = %0.2X" % (orom_start, pci_ven, ven_dev[-4:], orom_last_img))
-	#print(Style.BRIGHT + Fore.CYAN + "%s = ID of ROM file\n" % ven_dev + Fore.RESET + Style.NORMAL)
+	def finditer(self, data, pos=0, *endpos) :
+		self.profiler.scanned(data, pos, None)
+		return self.pattern.finditer(data, pos, *endpos)
 	
+	def __getattr__(self, name) :
+		return getattr(self.pattern, name)
+
+class Counted_Regex :
 	
-	## Check that EFI ROM header is a good match
+	## Stands in for the re module, so every search in every function is counted without touching it.
+	def __init__(self, re_module, t_profiler) :
+		self.re_module = re_module
+		self.profiler  = t_profiler
 	
-	if orom_start == efi_begin :
-		print(Style.BRIGHT + Fore.CYAN + "It appears you used an EFI ROM! Only extraction is possible." + Fore.RESET + Style.NORMAL)
-		sys.exit()
-	elif pci_ven not in ['1002', '10DE'] :
-		print(Style.BRIGHT + Fore.YELLOW + "Only AMD and Nvidia GOP supported!" + Fore.RESET + Style.NORMAL)
+	def compile(self, pattern, flags=0) :
+		return Counted_Pattern(self.re_module.compile(pattern, flags), self.profiler)
+	
+	def search(self, pattern, data, flags=0) :
+		return self.compile(pattern, flags).search(data)
+	
+	def finditer(self, pattern, data, flags=0) :
+		return self.compile(pattern, flags).finditer(data)
+	
+	def __getattr__(self, name) :
+		return getattr(self.re_module, name)
+
+profiler = None
+
+def prof_begin(name) :
+	if profiler is not None :
+		profiler.begin(name)
+
+def prof_end(name) :
+	if profiler is not None :
+		profiler.end(name)
+
+gop_files = {} # Name : ((mtime, size), data)
+gop_texts = {} # Name : (data, lines)
+
+def gop_file(t_gop_name) :
+	
+	## Kept in memory and read again only when the file changes, so a resident GOPserve.py sees a new database
+	## or efirom without a restart.
+	gop_path  = "#GOP_Files/%s" % t_gop_name
+	gop_stat  = os.stat(gop_path)
+	gop_key   = (gop_stat.st_mtime_ns, gop_stat.st_size)
+	gop_entry = gop_files.get(t_gop_name)
+	
+	if gop_entry is None or gop_entry[0] != gop_key :
+		with open(gop_path, 'rb') as gop_rom_file :
+			gop_entry = gop_files[t_gop_name] = (gop_key, gop_rom_file.read())
+	
+	return gop_entry[1]
+
+def gop_lines(t_gop_name) :
+	
+	## Lines of a text file in #GOP_Files, with "\n" endings like a file opened in text mode.
+	gop_data  = gop_file(t_gop_name)
+	gop_entry = gop_texts.get(t_gop_name)
+	
+	if gop_entry is None or gop_entry[0] is not gop_data :
+		gop_text  = gop_data.decode('utf-8').replace("\r\n", "\n").replace("\r", "\n")
+		gop_entry = gop_texts[t_gop_name] = (gop_data, gop_text.splitlines(True))
+	
+	return gop_entry[1]
+
+####################################
+####################################
+####################################
+
+if __name__ == "__main__" :
+	
+	if len(sys.argv) < 3 :
+		print(Fore.RED + "Not enough arguments! Usage: GOPupd.py file.rom [ext_efirom | gop_upd | isbn]" + Fore.RESET)
 		sys.exit()
-	elif efi_found :
-		if os.path.isfile(file_efi) and code_type != "x64" and gop_type[:4] != "Mac_" :
-			print(Style.BRIGHT + Fore.YELLOW + "Code type %s is not supported!" % code_type + Fore.RESET + Style.NORMAL)
+	else :
+		file_dir   = sys.argv[1]
+		file_rom   = os.path.basename(file_dir)
+		file_arg   = sys.argv[2]
+		extra_args = sys.argv[3:]
+	
+	if "-PROFILE" in (arg_val.upper() for arg_val in extra_args) or "-CPROFILE" in (arg_val.upper() for arg_val in extra_args) or \
+		"-MEMPROFILE" in (arg_val.upper() for arg_val in extra_args) :
+		import atexit
+		import linecache
+		
+		profiler = Phase_Profiler(file_rom, "-JSON" in (arg_val.upper() for arg_val in extra_args),
+								"-CPROFILE" in (arg_val.upper() for arg_val in extra_args),
+								"-MEMPROFILE" in (arg_val.upper() for arg_val in extra_args))
+		re       = Counted_Regex(re, profiler)
+		input    = profiler.wrap("user input", input)
+		
+		rom_info_scan     = profiler.wrap("rom scan", rom_info_scan)
+		rom_info          = profiler.wrap("rom discovery", rom_info)
+		efi_version       = profiler.wrap("efi_version", efi_version)
+		pe_checksum       = profiler.wrap("pe_checksum", pe_checksum)
+		check_in_database = profiler.wrap("database lookup", check_in_database)
+		nv_arch_from_id   = profiler.wrap("database lookup", nv_arch_from_id)
+		gop_file          = profiler.wrap("gop load", gop_file)
+		remove_padding    = profiler.wrap("padding removal", remove_padding)
+		
+		atexit.register(profiler.report)
+	
+	if "-ROMSTREAM" in (arg_val.upper() for arg_val in extra_args) :
+		
+		## Like -ROMSCAN, but the file is never loaded whole. "-" reads from stdin.
+		upper_args  = [arg_val.upper() for arg_val in extra_args]
+		window_size = 0x400000
+		
+		if "-WINDOW" in upper_args and upper_args.index("-WINDOW") + 1 < len(extra_args) :
+			try :
+				window_size = max(int(extra_args[upper_args.index("-WINDOW") + 1], 0), 0x1000)
+			except ValueError :
+				print(Fore.RED + "-WINDOW needs a size, like 0x100000!" + Fore.RESET)
+				sys.exit()
+		
+		if file_dir != "-" and not os.path.exists(file_dir) :
+			print(Fore.RED + "File %s was not found!" % file_dir + Fore.RESET)
 			sys.exit()
 		
-		efi_pcir_ds    = int.from_bytes(reading[efi_begin + 0x18:efi_begin + 0x1A], 'little')
-		efi_pcir_off   = efi_begin + efi_pcir_ds
-		efi_class_bin  = reading[efi_pcir_off + 0xD:efi_pcir_off + 0x10]
-		efi_class_code = binascii.hexlify(efi_class_bin).decode('utf-8')
-		efi_code_type  = reading[efi_pcir_off + 0x14:efi_pcir_off + 0x15]
-		efi_last_img   = ord(reading[efi_pcir_off + 0x15:efi_pcir_off + 0x16]) & 0x80
+		img_nr = 0
 		
-		if efi_class_code not in ['030000', '000003', '030200', '000203'] and gop_type[:4] != "Mac_" :
-			print(Style.BRIGHT + Fore.YELLOW + "Class-code %s is not supported!" % efi_class_code + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		if efi_code_type != b'\x03' :
-			print(Style.BRIGHT + Fore.RED + "Code mismatch in EFI ROM header!" + Fore.RESET + Style.NORMAL)
-			sys.exit()
-		if not efi_last_img :
-			# Report not needed, found example in GP104_NotLast.rom
-			#print(Style.BRIGHT + Fore.RED + "EFI ROM is not last image! Please report it!" + Fore.RESET + Style.NORMAL)
-			print(Style.BRIGHT + Fore.YELLOW + "EFI ROM is not last image!" + Fore.RESET + Style.NORMAL)
-			#sys.exit()
+		with (sys.stdin.buffer if file_dir == "-" else open(file_dir, 'rb')) as src_file :
+			
+			for rom_start, rom_pcir_off, rom_id_hex, rom_last_img, rom_size, rom_kind, chain_nr, chain_idx in rom_stream_scan(src_file, window_size) :
+				img_nr += 1
+				
+				print("Image %d -- Offset 0x%0.2X -- Chain %d, image %d\n" % (img_nr, rom_start, chain_nr, chain_idx))
+				print("Type:                          %s"      % rom_kind)
+				print("ID:                            %s-%s"   % (rom_id_hex[:4], rom_id_hex[4:]))
+				print("PCI structure:                 0x%0.2X" % rom_pcir_off)
+				print("Size:                          0x%0.2X" % rom_size)
+				print("Last image:                    %s\n"    % ("Yes" if rom_last_img else "No"))
+		
+		if not img_nr :
+			print(Fore.RED + "No ROM found!\n" + Fore.RESET)
+		
+		sys.exit()
 	
-	## Pretty please
-	ask = input("\nDo you want to update GOP to %s? Y for yes or N for no: " % last_gop)
+	if not os.path.isfile(file_dir) :
+		print(Fore.RED + "File %s was not found!" % file_dir + Fore.RESET)
+		sys.exit()
 	
-	if ask.upper() not in ["Y", "YP", "YPAT"] :
+	try :
+		prof_begin("file read")
+		f = open(file_dir, 'rb')
+		reading = f.read()
+		f.close()
+		prof_end("file read")
+	except :
+		print(Fore.RED + "Unable to open file %s for reading!" % file_dir + Fore.RESET)
 		sys.exit()
 	
-	if ask.upper() in ["YP", "YPAT"] :
-		amd_gop_efirom = "amd_gop_mod.efirom"
-	
-	print("")
-	
-	## GRID K1/K2 check
-	if pci_ven == "10DE" and pci_dev in ['0FF2', '11BF'] :
-		gop_type = "Nvidia"
-		nv_type  = "GK1xx_Multi-Display"
-		nv_file  = "nv_gop_GK1xx_multi.efirom"
-		last_gop = last_nv_GK1xx_MDP
-		print(Style.BRIGHT + Fore.YELLOW + "  Using Multi-Display GOP %s for GRID K1/K2.\n" % last_nv_GK1xx_MDP + Fore.RESET + Style.NORMAL)
-	
-	## Get the right GOP
-	if gop_type == "AMD" or (pci_ven == "1002" and gop_type == "") :
-		## The next two lines are needed for the case of missing GOP.
-		gop_type   = "AMD"
-		last_gop   = last_amd_new
-		efi_id_off = 0x20 ## might change it future versions
-		id_in_gop  = False
-		
-		if is_vega_gop :
-			gop_ids_file   = "#GOP_Files/amd_gop_IDs_2.4.0.0.0.txt"
-			amd_gop_efirom = "amd_gop_vega.efirom"
-			last_gop       = last_amd_vega
-		else :
-			gop_ids_file = "#GOP_Files/amd_gop_IDs.txt"
+	try :
+		os.mkdir(file_rom + "_temp/")
+	except :
+		pass
+	
+	fileName, fileExtension = os.path.splitext(file_rom)
+	position = 0
+	
+	if "-ROMSCAN" in (arg_val.upper() for arg_val in extra_args) :
 		
-		## GOP 1.59.0.0.0 (and newer) has less IDs than 1.57.0.0.0, a double check is needed.
-		with open(gop_ids_file, 'r+') as id_file:
-			for line in id_file:
-				if line[:9] == ven_dev :
-					id_in_gop = True
-					#print("The ID %s is present in the GOP!\n" % ven_dev)
-					break
+		img_nr   = 0
+		rom_data = reading
+		jobs     = 1
 		
-		if id_in_gop :
-			amd_file = amd_gop_efirom
-		else :
-			print(Style.BRIGHT + Fore.YELLOW + "  Warning! Your VBIOS ID %s doesn't exist in latest available GOP!\n" % ven_dev + 
-			Fore.RESET + Style.NORMAL)
-			ask = input("\nDo you still want to update GOP? Y for yes or any key for checking the ID in older 1.57.0.0.0 GOP: ")
+		for arg_idx, arg_val in enumerate(extra_args[:-1]) :
+			if arg_val.upper() in ["-JOBS", "--JOBS"] :
+				try :
+					jobs = max(int(extra_args[arg_idx + 1]), 1)
+				except ValueError :
+					print(Fore.RED + "-JOBS needs a number of processes!" + Fore.RESET)
+					sys.exit()
+		
+		for rom_found, rom_start, rom_pcir_off, rom_id_bin, rom_id_hex, rom_last_img, rom_size in rom_scan_all(rom_data, jobs) :
 			
-			if ask.strip().upper() == "Y" :
-				amd_file = amd_gop_efirom
-				print("")
+			img_nr   += 1
+			
+			print("Image %d -- Offset 0x%0.2X\n"  % (img_nr, rom_start))
+			
+			if rom_data[rom_start + 4:rom_start + 8] == b'\xF1\x0E\x00\x00' :
+				rom_hdr    = get_struct(rom_data, rom_start, EFI_ROM_Header)
+				rom_hdr.rom_print(rom_start)
+				pnp_ptr    = 0
+			elif rom_data[rom_start:rom_start + 2] == b'\x56\x4E' :
+				rom_hdr    = get_struct(rom_data, rom_start, ROM_Header) # Just in case will be needed
+				nv_rom_hdr = get_struct(rom_data, rom_start, NV_ROM_Header)
+				nv_rom_hdr.nv_rom_print(rom_start) # rom_hdr.nv_rom_print(rom_start)
+				pnp_ptr    = 0
+			elif rom_data[rom_start:rom_start + 2] == b'\x77\xBB' :
+				rom_hdr    = get_struct(rom_data, rom_start, ROM_Header) # Just in case will be needed
+				nv_rom_hdr = get_struct(rom_data, rom_start, NV_EFI_ROM_Header)
+				nv_rom_hdr.nv_rom_print(rom_start) # rom_hdr.nv_rom_print(rom_start)
+				pnp_ptr    = 0
 			else :
-				with open("#GOP_Files/amd_gop_IDs_1.57.0.0.0.txt", 'r+') as id_file:
-					for line in id_file:
-						if line[:9] == ven_dev :
-							id_in_gop = True
-							#print("The ID %s is present in the GOP!\n" % ven_dev)
-							break
-				print("")
+				rom_hdr = get_struct(rom_data, rom_start, ROM_Header)
+				rom_hdr.rom_print(rom_start)
+				pnp_ptr = rom_hdr.PnpOffset
+			
+			if rom_hdr.PcirOffset :
+				pcir_off = rom_start + rom_hdr.PcirOffset
+				pcir_hdr = get_struct(rom_data, pcir_off, PCIR_Header)
 				
-				if id_in_gop :
-					last_gop = last_amd_old ## This is only to have the proper updated version displayed.
-					amd_file = "amd_gop_1.57.0.0.0.efirom"
+				if pcir_hdr.Signature == b'RGIS' :
+					rgis_hdr = get_struct(rom_data, pcir_off, RGIS_Header)
+					rgis_hdr.rgis_print(pcir_off)
+					#pcir_hdr.rgis_print(pcir_off)
 				else :
-					print(Style.BRIGHT + Fore.YELLOW + "  Warning! Your VBIOS ID %s doesn't exist in older GOP!\n" % ven_dev + 
-					Fore.RESET + Style.NORMAL)
-					ask = input("\nDo you still want to update GOP? A for %s, B for 1.57.0.0.0 or any key for exit: " % last_amd_new)
-					ask = ask.strip().upper()
-					
-					if ask == "A" :
-						amd_file = amd_gop_efirom
-					elif ask == "B" :
-						last_gop = last_amd_old ## This is only to have the proper updated version displayed.
-						amd_file = "amd_gop_1.57.0.0.0.efirom"
-					else :
-						sys.exit()
-					
-					print("")
-		
-		## Relocate the microcode.
-		## Struct of microcode - https://github.com/torvalds/linux/blob/master/drivers/gpu/drm/radeon/atombios.h
-		mc_reloc = False
-		mc_found = False
-		if pci_ven == '1002' and re.search(b'MCuC', reading) is not None :
-			mcuc_list = re.finditer(b'MCuC', reading)
-			
-			for mcuc_match in mcuc_list :
-				(mcuc_bgn, end_mcuc_match) = mcuc_match.span()
+					pcir_hdr.pcir_print(pcir_off)
 				
-				mc_off = int.from_bytes(reading[mcuc_bgn - 8:mcuc_bgn - 4], 'little')
+				for idx in range(pcir_off + 0x20, pcir_off + 0x60) :
+					if rom_data[idx:idx + 4] == b'NPDE' :
+						npde_hdr = get_struct(rom_data, idx, NPDE_Header)
+						npde_hdr.npde_print(idx)
+						break
+			
+			# PnP sections
+			rom_pnp_off = rom_start + pnp_ptr
+			pnp_str     = rom_data[rom_pnp_off:rom_pnp_off + 4]
+			
+			if pnp_ptr != 0 and pnp_str == b'$PnP' :
+				pnp_step = rom_pnp_off
+				pnp_nr   = 0
 				
-				if reading[mc_off:mc_off + 4] == b'MCuC' :
-					mc_found = True
+				while True :
+					pnp_nr += 1
+					pnp_hdr  = get_struct(rom_data, pnp_step, PnP_Header)
+					pnp_next = pnp_hdr.OffsetOfNextHdr
+					pnp_len  = pnp_hdr.Length * 0x10
+					print("\nPnP %d:" % pnp_nr)
+					pnp_hdr.pnp_print(rom_start)
 					
-					with open("#GOP_Files/%s" % amd_file, 'rb') as amd_gop :
-						gop_rom = amd_gop.read()
-					
-					end_img_new = orom_start + orom_size + len(gop_rom)
-					
-					## Nothing to do if microcode doesn't move.
-					if end_img_new <= mc_off :
-						print(Style.BRIGHT + Fore.YELLOW + "  AMD microcode will remain at the same offset.\n" + Fore.RESET + Style.NORMAL)
-					else :
-						mc_reloc  = True
+				
+					if pnp_next == 0 :
 						
-						# TODO Relocation doesn't work, use old GOP
-						if mc_reloc : #False :
-							print(Style.BRIGHT + Fore.YELLOW + "  Warning! Your VBIOS doesn't have enough space for latest GOP and microcode!\n  If your card needs the microcode, an older and smaller GOP will be used\n" + Fore.RESET + Style.NORMAL)
-							ask = input("\nDo you want the latest GOP or the microcode? A for latest GOP, B for microcode or any key for exit: ")
-							ask = ask.strip().upper()
-							
-							if ask == "A" :
-								amd_file = amd_gop_efirom
-							elif ask == "B" :
-								last_gop = last_amd_old ## This is only to have the proper updated version displayed.
-								amd_file = "amd_gop_mcu.efirom"
-								
-								with open("#GOP_Files/%s" % amd_file, 'rb') as amd_gop :
-									gop_rom = amd_gop.read()
-								
-								end_img_new = orom_start + orom_size + len(gop_rom)
-							else :
-								sys.exit()
-							
-							print("")
+						test_pnp_off = pnp_step + pnp_len
 						
-						parm_size = int.from_bytes(reading[mc_off + 8:mc_off + 0x0A], 'little')
-						code_size = int.from_bytes(reading[mc_off + 0x0A:mc_off + 0x0C], 'little')
-						mc_size   = 0x10 + parm_size + code_size
-						#print("%0.2X" % mc_size)
-						mc_round  = mc_size + ((0x10 - mc_size % 0x10) & 0x0F)
-						#print("%0.2X" % mc_round)
-						mc_end    = mc_off + mc_round
-						#new_mc_off = end_img_new + mc_off - end_img_old
-						mc_pad     = 0x1000 - (end_img_new % 0x1000) if (end_img_new % 0x1000) > 0 else 0
-						new_mc_off = end_img_new + mc_pad
-						new_mc_end = new_mc_off + mc_round
-						new_mc_bin = new_mc_off.to_bytes(4, 'little')
+						while rom_data[test_pnp_off:test_pnp_off + 1] == b'\x00' :
+							test_pnp_off += 1
 						
-						if new_mc_off != mc_off :
-							print(Style.BRIGHT + Fore.YELLOW + "  AMD microcode will be relocated to offset 0x%0.2X.\n" % new_mc_off + Fore.RESET + Style.NORMAL)
-							reading  = reading[:mcuc_bgn - 8] + new_mc_bin + reading[mcuc_bgn - 4:]#end_img_old] + reading[mc_off:mc_end]
-							#reading  = reading[:mcuc_bgn - 8] + new_mc_bin + reading[mcuc_bgn - 4:mc_off] + b'\xFF' * mc_pad + reading[mc_off:]
+						#if rom_data[pnp_step + pnp_len:pnp_step + pnp_len + 4] != b'$PnP' :
+						if rom_data[test_pnp_off:test_pnp_off + 4] != b'$PnP' :
+							break
+						
+						pnp_step = test_pnp_off
 					
-					break
+					else :
+						pnp_step = rom_start + pnp_next
+	
+	if "-ISBN" in (arg_val.upper() for arg_val in extra_args) :
+		prof_begin("isbn walk")
+		rom_old_type, rom_start, rom_pcir_off, rom_id_bin, rom_size, efi_found, efi_begin, efi_size = rom_info(reading, 0, "all")
+		
+		if "-DEBUG" in (arg_val.upper() for arg_val in extra_args) :
+			print_info = True
+		else :
+			print_info = False
+		
+		isbn_found = False
+		nv_step    = rom_start + rom_size
+		
+		if reading[rom_pcir_off + 0x20:rom_pcir_off + 0x24] == b'NPDE' :
+			npde_size = int.from_bytes(reading[rom_pcir_off + 0x28:rom_pcir_off + 0x2A], 'little') * 0x200
+			
+			if rom_size != npde_size :
+				print("  Different sizes in PCI structure and NPDE structure of Legacy ROM!\n")
+				
+				rom_end_npde  = rom_start + npde_size
+				rom_test_npde = reading[rom_end_npde:rom_end_npde + 2]
+				
+				## If NPDE size is the right one, there is one container for all ROMs.
+				if rom_test_npde in [b'\x55\AA', b'\x56\x4E'] :
+					print("  The Legacy ROM appears to be a container for all images.\n")
+					nv_step      = rom_end_npde
+				
+		check_nv_ext = reading[nv_step:nv_step + 2]
+					
+		while check_nv_ext in [b'\x56\x4E', b'\x55\xAA', b'\x77\xBB'] :
+			
+			if check_nv_ext == b'\x77\xBB' :
+				npds_off    = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
+				npds_off    += nv_step
+				nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
 			
 			else :
-				print(Style.BRIGHT + Fore.YELLOW + "  AMD microcode pointer was found, but not its target!\n" + Fore.RESET + Style.NORMAL)
+				nv_ext_size = int.from_bytes(reading[nv_step + 2:nv_step + 4], 'little') * 0x200
+			
+			#print(nv_ext_size)
+			
+			if nv_ext_size == 0 :
+				npds_off    = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
+				npds_off    += nv_step
+				nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
+				#print(nv_ext_size)
+				
+				npds_str_size = int.from_bytes(reading[npds_off + 0xA:npds_off + 0xC], 'little')
+				isbn_off      = npds_off + npds_str_size
+				isbn_check    = reading[isbn_off:isbn_off + 4]
+				
+				if isbn_check == b'ISBN' :
+					print(Style.BRIGHT + Fore.YELLOW + "Found ISBN at offset 0x%0.2X\n" % isbn_off + Fore.RESET + Style.NORMAL)
+					isbn_struct(reading[isbn_off:nv_step + nv_ext_size], print_info)
+					isbn_found = True
+			
+			nv_step      += nv_ext_size
+			check_nv_ext = reading[nv_step:nv_step + 2]
 		
-		with open("#GOP_Files/%s" % amd_file, 'rb') as amd_gop :
-			gop_rom = amd_gop.read()
+		if not isbn_found :
+			print(Style.BRIGHT + Fore.YELLOW + "ISBN was not found!\n" + Fore.RESET + Style.NORMAL)
 		
-	elif gop_type == "Nvidia" and nv_type != "GXxxx" :
+		prof_end("isbn walk")
+	
+	if file_arg == "ext_efirom" :
+		## Get ROM info for EFI extraction
+		efi_nr = 1
 		
-		#gop_type = "Nvidia"
-		efi_id_off  = 0x20 ## might change it future versions
-		efr_lst_off = 0x31 ## might change it future versions
-		efi_lst_off = 0x4A ## might change it future versions
+		efi_found, efi_begin, efi_size = rom_info(reading, 0, "mini")
 		
-		## Make sure the Nvidia GOP is not customized. Only the last digit of variant ID should be non-zero.
-		try :
-			with open("#GOP_Files/%s" % nv_file, 'rb') as nv_gop :
-				gop_rom = nv_gop.read()
-		except :
-			print(Style.BRIGHT + Fore.RED + "  Unable to find a matching GOP! Please report it!\n" + 
-			Fore.RESET + Style.NORMAL)
+		if not efi_found :
+			print(Fore.RED + "No EFI ROM found!\n" + Fore.RESET)
 			sys.exit()
-	
-	elif pci_ven == "10DE" and (gop_type == "" or gop_type == "Nvidia") :
 		
-		gop_type = "Nvidia"
-		efi_id_off  = 0x20 ## might change it future versions
-		efr_lst_off = 0x31 ## might change it future versions
-		efi_lst_off = 0x4A ## might change it future versions
+		efi_rom = reading[efi_begin:efi_begin + efi_size]
 		
-		print(Style.BRIGHT + Fore.YELLOW + "  Warning! GOP type missing! Continue only if you know what you are doing!\n" + 
-		Fore.RESET + Style.NORMAL)
+		with open("%s_temp/%s_compr.efirom" % (file_rom, fileName), 'wb') as efi_rom_file :
+			efi_rom_file.write(efi_rom)
 		
-		gpu_hint = nvidia_board()
+		while True :
+			efi_found = False
+			
+			if rom_info(reading, efi_begin + efi_size, "basic") :
+				efi_found, efi_begin, efi_size = rom_info(reading, efi_begin + efi_size, "mini")
+			
+			if not efi_found :
+				sys.exit()
+			
+			print(Fore.RED + "Extra EFI ROM found at offset 0x%0.2X!\n" % efi_begin + Fore.RESET)
+			efi_nr  += 1
+			efi_rom = reading[efi_begin:efi_begin + efi_size]
+			
+			with open("%s_temp/%s_compr_nr%d.efirom" % (file_rom, fileName, efi_nr), 'wb') as efi_rom_file :
+				efi_rom_file.write(efi_rom)
+	
+	elif file_arg == "gop_upd" :
 		
-		print(Style.BRIGHT + Fore.YELLOW + "  Product name = %s. This might (!!) be used to determine your GPU architecture.\n" % gpu_hint + 
-		Fore.RESET + Style.NORMAL)
+		gop_type  = ""
+		nv_type   = ""
+		efi_in_db = False
+		efi_imag  = False
+		file_efi  = "%s_temp/%s_dump.efi" % (file_rom, fileName)
+		file_efr  = "%s_temp/%s_compr.efirom" % (file_rom, fileName)
+		#print(extra_args)
 		
-		print("\nDo you still want to update GOP? Select the number of your GPU architecture: \n\n")
-		print("  1 = GT21x")
-		print("  2 = GF10x")
-		print("  3 = GF119")
-		print("  4 = GK1xx")
-		print("  5 = GM1xx")
-		print("  6 = GM2xx")
-		print("  7 = GP1xx")
-		print("  8 = GV1xx")
-		print("  9 = TU1xx")
-		print("  10 = GK1xx_MXM")
-		print("  11 = GM1xx_MXM")
+		if "-PATCHED" in (arg_val.upper() for arg_val in extra_args) :
+			amd_gop_efirom = "amd_gop_mod.efirom"
+		else :
+			amd_gop_efirom = "amd_gop.efirom"
 		
-		while True :
-			ask = input("\n\nEnter choice: ")
-			ask = ask.strip()
+		if os.path.isfile(file_efi) or fileExtension in ['.efi', '.ffs'] :
+			
+			if fileExtension in ['.efi', '.ffs'] :
+				efi_imag = True
+				mz_found, mz_start = mz_off(reading, 0)
+				
+				if mz_found :
+					mz_size  = image_size(reading[mz_start:], 'full')
+					#print("%02X - %02X" % (mz_start, mz_start + mz_size))
+					efi_dump = reading[mz_start:mz_start + mz_size]
+				else :
+					with open(file_efi, 'rb') as myfile :
+						efi_dump = myfile.read()
+			else :
+				with open(file_efi, 'rb') as myfile :
+					efi_dump = myfile.read()
+			
+			## Get EFI info
+			gop_type, nv_type, version, efi_info_string = efi_version(efi_dump)
+			
+			## The machine code type, signer and CRC32 are processed outside efi_version because they are not bound to GOP.
+			
+			## Signer
+			## Needs a full X.509 parser. Since it is not that important, only get the first signer.
+			# pe_off     = int.from_bytes(efi_dump[0x3C:0x40], 'little')
+			# code_size  = int.from_bytes(efi_dump[pe_off + 0x50:pe_off + 0x54], 'little') ## only works for EFI files, not for every exe.
+			prof_begin("signer search")
+			code_size  = image_size(efi_dump, 'naked')
+			pat_sign   = re.compile(br'\x06\x09\x2A\x86\x48\x86\xF7\x0D\x01\x07\x02')
+			match_sign = pat_sign.search(efi_dump, code_size)
+			
+			if match_sign is not None :
+				(sign_start_match, sign_end_match) = match_sign.span()
+				#print("\nEFI Image is signed!")
+				efi_is_signed = "Signed"
+				pat_signer    = re.compile(br'\x06\x03\x55\x04\x03\x13') ## 06 03 55 04 03 13
+				match_signer  = pat_signer.search(efi_dump, sign_end_match)
+				
+				if match_signer is not None :
+					(signer_start_match, signer_end_match) = match_signer.span()
+					mess_len = ord(efi_dump[signer_end_match:signer_end_match + 1])
+					signer   = efi_dump[signer_end_match + 1:signer_end_match + mess_len + 1].decode('utf-8', 'ignore')
+					print(Style.BRIGHT + Fore.CYAN + "\nMost likely signed by: %s\n" % signer + Fore.RESET + Style.NORMAL)
+				else :
+					print(Style.BRIGHT + Fore.CYAN + "\nEFI Image is signed!\n" + Fore.RESET + Style.NORMAL)
+			
+			else :
+				efi_is_signed = "Unsigned"
+				print(Style.BRIGHT + Fore.CYAN + "\nEFI image is NOT signed!\n" + Fore.RESET + Style.NORMAL)
+			
+			prof_end("signer search")
+			
+			if gop_type == "AMD" :
+				efi_info_string += " - " + "%s" % efi_is_signed
+			
+			## Machine Code Type		
+			mz_start, code_type, print_type = pe_machine(efi_dump)
+			print(Style.BRIGHT + Fore.CYAN + "Machine Code   = %s\n" % code_type + Fore.RESET + Style.NORMAL)
+			
+			## CRC32
+			#efi_crc32 = get_crc32(efi_dump)
+			prof_begin("crc32")
+			efi_crc32_int = binascii.crc32(efi_dump) & 0xFFFFFFFF
+			prof_end("crc32")
+			efi_crc32_hex = "%08X" % efi_crc32_int
+			print(Style.BRIGHT + Fore.CYAN + "Checksum CRC32 = %s\n" % efi_crc32_hex + Fore.RESET + Style.NORMAL)
+			
+			## Check in database
+			if efi_info_string != "" :
+							
+				efi_info_string += " - " + "%s\n" % efi_crc32_hex
+				
+				#print(efi_info_string)
+				#with open("#add_new_string.txt", "a") as myfile :
+				#	myfile.write(efi_info_string)
+				
+				new_nv_type, efi_in_db = check_in_database(efi_info_string)
+				
+				if new_nv_type is not None :
+					nv_type = new_nv_type
+					#print("GOP identified as %s based on CRC\n" % nv_type)
+					print(Style.BRIGHT + Fore.WHITE + "GOP identified as" + Fore.GREEN + " %s " % nv_type + 
+					Fore.WHITE + "based on CRC \n" + Fore.RESET + Style.NORMAL)
+				
+				## GOPs older than 0x1001B have no variant ID. Use the device ID of the Legacy ROM.
+				elif nv_type in ['GXxxx', 'GXxxx_MXM'] and not efi_imag and version != "unknown" :
+					rom_found, rom_start, rom_pcir_off, rom_id_bin, rom_id_hex, rom_last_img, rom_size = rom_info_scan(reading, 0)
+					new_nv_type = nv_arch_from_id(rom_id_hex[4:], nv_type == "GXxxx_MXM") if rom_id_hex[:4] == "10DE" else None
+					
+					if new_nv_type is not None :
+						nv_type = new_nv_type
+						print(Style.BRIGHT + Fore.WHITE + "GOP identified as" + Fore.GREEN + " %s " % nv_type +
+						Fore.WHITE + "based on device ID %s \n" % rom_id_hex[4:] + Fore.RESET + Style.NORMAL)
+			
+			## Check integrity
+			
+			old_checksum, new_checksum = pe_checksum(efi_dump)
+			
+			if old_checksum == new_checksum :
+				chk_msg = " (Same as in PE header)"
+			elif old_checksum == 0 :
+				chk_msg = " (Should be %0.2X)\n" % new_checksum
+			else :
+				chk_msg = " (Should be %0.2X). Image is most likely corrupted.\n" % new_checksum
+			
+			checksum_str = "PE Checksum = %0.2X" % old_checksum + chk_msg
+			
+			if old_checksum == 0 :
+				print(Style.BRIGHT + Fore.YELLOW + checksum_str + Fore.RESET + Style.NORMAL)
 			
-			if ask == "1" :
+			elif old_checksum and old_checksum != new_checksum :
+				
+				if not efi_in_db :
+					print(Style.BRIGHT + Fore.YELLOW + "You may have a broken EFI image!\n" + Fore.RESET + Style.NORMAL)
+				
+				print(Style.BRIGHT + Fore.YELLOW + checksum_str + Fore.RESET + Style.NORMAL)
+			
+			## Rename temp files
+			
+			extra_ver = ""
+			pat_lg    = br'\x41(\x4D\x44|\x54\x49)\x20\x41\x54\x4F\x4D\x42\x49\x4F\x53\x00' ## AMD ATOMBIOS or ATI ATOMBIOS.
+			
+			if gop_type == "AMD" :
+				
+				# TODO Check for ROM, get CRC offset, compare to 0.
+				# Usually a ROM in EFI means legacy tables are present.
+				if (rom_info(efi_dump, 0, "basic") or re.search(pat_lg, efi_dump) is not None) :
+					extra_ver += "_custom_%s_%s" % (efi_is_signed.lower(), efi_crc32_hex)
+				else :
+					extra_ver += "_%s_%s" % (efi_is_signed.lower(), efi_crc32_hex)
+			
+			version_xt = version + extra_ver
+			
+			## For you
+			
+			gop_version  = "%s %s" % (nv_type, version_xt) if nv_type != "" else version_xt
+			file_new_bgn = "%s_temp/%s GOP %s" % (file_rom, gop_type, gop_version)
+			
+			## For me
+			
+			full_rename = False
+			
+			if full_rename and fileName[:8] == "AMD GOP " and fileName[8:10] in ['0.', '1.'] :
+				
+				if fileName.find("_signed_") > 0 or fileName.find("_unsigned_") > 0 :
+					needs_rename = False
+				else :
+					needs_rename = True
+				
+				#print("Orig = " + fileName)
+				split_name = fileName.split()
+				#print(split_name)
+				fileName   = " ".join(split_name[3:])
+				fileName   = fileName.rstrip()
+				#print("Cut  = " + fileName)
+				
+				if needs_rename :
+					
+					try :
+						fixed_name = os.path.dirname(file_dir) + "/" + "AMD GOP " + version_xt + " " + fileName.rstrip() + fileExtension
+						#print(fixed_name)
+						os.rename(file_dir, fixed_name)
+						
+						olf_efi_name = file_dir[:-13] + "_dump.efi"
+						
+						if os.path.isfile(olf_efi_name) :
+							fixed_name = os.path.dirname(file_dir) + "/" + "AMD GOP " + version_xt + " " + fileName.rstrip() + ".efi"
+							fixed_name = fixed_name.replace("_compr", "_dump")
+							os.rename(olf_efi_name, fixed_name)
+					
+					except Exception as e:
+						
+						print("Error on renaming original files!\n")
+						print(e)
+						print()
+			
+			# version_me      = version_xt[2:] if version_xt[:2] == "0x" else version_xt
+			# gop_version_me  = "%s %s" % (nv_type, version_me) if nv_type != "" else version_me
+			# file_new_bgn    = "%s_temp/%s GOP %s %s" % (file_rom, gop_type, gop_version_me, fileName)
+			
+			## And nothing for the rest.
+			
+			file_new_efr = "%s_compr.efirom" % file_new_bgn.rstrip()
+			file_new_efi = "%s_dump.efi" % file_new_bgn.rstrip()
+			
+			if file_efi != file_new_efi and os.path.exists(file_new_efi) :
+				os.remove(file_new_efi)
+			if file_efr != file_new_efr and os.path.exists(file_new_efr) :
+				os.remove(file_new_efr)
+			
+			if not efi_imag :
+				
+				try :
+					os.rename(file_efi, file_new_efi)
+				except Exception as e:
+					print("Error on renaming temp files!\n")
+					print(e)
+					print()
+				
+				try :
+					os.rename(file_efr, file_new_efr)
+				except Exception as e:
+					print("Error on renaming temp files!\n")
+					print(e)
+					print()
+			
+			if gop_type not in ['AMD', 'Nvidia'] or not efi_in_db :
+				
+				# if efi_info_string != "" :
+					# with open("#add_new_string.txt", "a") as myfile :
+						# myfile.write(efi_info_string)
+				
+				src_dir = "%s_temp" % file_rom
+				dst_dir = "%s_newGOP" % file_rom
+				os.rename(src_dir, dst_dir)
+			
+		print(Fore.RED + "---------------------------------------------------------------\n" + Fore.RESET)
+		
+		print(Fore.GREEN + "***************************************************************")
+		print("***                Processing with Python...                ***")
+		print("*************************************************************** \n" + Fore.RESET)
+		#print("---------------------------------------------------------------\n\n")
+		
+		is_vega_gop   = False
+		last_amd_vega = "2.4.0.0.0"
+		last_amd_new  = "1.67.0.15.50"
+		last_amd_old  = "1.57.0.0.0"
+		last_nv_GT21x = "0x10031"
+		last_nv_GF10x = "0x1002D"
+		last_nv_GF119 = "0x10030"
+		last_nv_GK1xx = "0x10038"
+		last_nv_GM1xx = "0x10036"
+		last_nv_GM2xx = "0x20011"
+		last_nv_GP1xx = "0x3000E"
+		last_nv_GV1xx = "0x40006"
+		last_nv_TU1xx = "0x50009"
+		
+		last_nv_GF10x_MXM = "0x10005"
+		last_nv_GF119_MXM = "0"
+		last_nv_GK1xx_MXM = "0x10033"
+		last_nv_GM1xx_MXM = "0x10035"
+		
+		last_nv_GK1xx_MDP = "0x10030"
+		
+		last_nv_gop = {"GT21x" : last_nv_GT21x, "GF10x" : last_nv_GF10x, "GF119" : last_nv_GF119, "GK1xx" : last_nv_GK1xx,
+					"GM1xx" : last_nv_GM1xx, "GM2xx" : last_nv_GM2xx, "GP1xx" : last_nv_GP1xx, "GV1xx" : last_nv_GV1xx,
+					"TU1xx" : last_nv_TU1xx, "GF10x_MXM" : last_nv_GF10x_MXM, "GK1xx_MXM" : last_nv_GK1xx_MXM,
+					"GM1xx_MXM" : last_nv_GM1xx_MXM}
+		
+		## GOP Test
+		if gop_type == "AMD" :
+			
+			if version[:2] == "2." :
+				last_gop    = last_amd_vega
+				is_vega_gop = True
+			else : 
+				last_gop    = last_amd_new
+			
+			is_version_upd(last_gop, version, gop_type)
+		
+		elif gop_type == "Nvidia" :
+			if len(nv_type) > 12 and nv_type[6:13] == "Strange" : # GXxyz_Strange or GXxyz_Strange_[MXM|Multi-Display|Custom]
+				print(Style.BRIGHT + Fore.YELLOW + "You have a strange GOP! Please report it!\n" + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			elif len(nv_type) > 6 and nv_type[-6:] == "Custom" : # GXxyz[_Strange]_Custom
+				print(Style.BRIGHT + Fore.YELLOW + "You have a custom GOP! Currently not supported. Please report it!\n" + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			elif nv_type == "GT21x" :
 				last_gop = last_nv_GT21x
-				nv_file = "nv_gop_GT21x.efirom"
-				break
-			elif ask == "2" :
+				nv_file  = "nv_gop_GT21x.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GF10x" :
 				last_gop = last_nv_GF10x
-				nv_file = "nv_gop_GF10x.efirom"
-				break
-			elif ask == "3" :
+				nv_file  = "nv_gop_GF10x.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GF119" :
 				last_gop = last_nv_GF119
-				nv_file = "nv_gop_GF119.efirom"
-				break
-			elif ask == "4" :
+				nv_file  = "nv_gop_GF119.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GK1xx" :
 				last_gop = last_nv_GK1xx
-				nv_file = "nv_gop_GK1xx.efirom"
-				break
-			elif ask == "5" :
+				nv_file  = "nv_gop_GK1xx.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GM1xx" :
 				last_gop = last_nv_GM1xx
-				nv_file = "nv_gop_GM1xx.efirom"
-				break
-			elif ask == "6" :
+				nv_file  = "nv_gop_GM1xx.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GM2xx" :
 				last_gop = last_nv_GM2xx
-				nv_file = "nv_gop_GM2xx.efirom"
-				break
-			elif ask == "7" :
+				nv_file  = "nv_gop_GM2xx.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GP1xx" :
 				last_gop = last_nv_GP1xx
-				nv_file = "nv_gop_GP1xx.efirom"
-				break
-			elif ask == "8" :
+				nv_file  = "nv_gop_GP1xx.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GV1xx" :
 				last_gop = last_nv_GV1xx
-				nv_file = "nv_gop_GV1xx.efirom"
-				break
-			elif ask == "9" :
+				nv_file  = "nv_gop_GV1xx.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "TU1xx" :
 				last_gop = last_nv_TU1xx
-				nv_file = "nv_gop_TU1xx.efirom"
-				break
-			elif ask == "10" :
+				nv_file  = "nv_gop_TU1xx.efirom"
+				is_version_upd(last_gop, version, gop_type)
+				print(Style.BRIGHT + Fore.YELLOW + "Work in progress! Be careful!\n" + Fore.RESET + Style.NORMAL)
+				#sys.exit()
+			elif nv_type == "GF10x_MXM" :
+				last_gop = last_nv_GF10x_MXM
+				nv_file  = "nv_gop_GF10x_MXM.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GK1xx_MXM" :
 				last_gop = last_nv_GK1xx_MXM
 				nv_file  = "nv_gop_GK1xx_MXM.efirom"
-				break
-			elif ask == "11" :
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GM1xx_MXM" :
 				last_gop = last_nv_GM1xx_MXM
 				nv_file  = "nv_gop_GM1xx_MXM.efirom"
-				break
-			else :
-				print("\nWrong choice! Self destruct in 10, 9, 8, ...")
-				#sys.exit()
+				is_version_upd(last_gop, version, gop_type)
+			elif nv_type == "GK1xx_Multi-Display" :
+				last_gop = last_nv_GK1xx_MDP
+				nv_file  = "nv_gop_GK1xx_multi.efirom"
+				is_version_upd(last_gop, version, gop_type)
+			elif len(nv_type) > 3 and nv_type[-3:] == "MXM" : # GXxyz_MXM or GXxxx_MXM
+				print(Style.BRIGHT + Fore.YELLOW + "You have an unsupported MXM GPU! Please report it! \n" + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			elif len(nv_type) > 13 and nv_type[-13:] == "Multi-Display" : # GXxyz_Multi-Display
+				print(Style.BRIGHT + Fore.YELLOW + "You have an unsupported Multi-Display GPU! Please report it!\n" + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			elif nv_type != "GXxxx" : # GXnew
+				print(Style.BRIGHT + Fore.YELLOW + "You have a new GOP type! Please report it!\n" + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			else : # == GXxxx i.e. no variant ID.
+				last_gop = "latest available"
+				print(Style.BRIGHT + Fore.YELLOW + "Unable to determine GOP type!\n" + Fore.RESET + Style.NORMAL)
+		
+		elif gop_type[:4] == "Mac_" :
+			print(Style.BRIGHT + Fore.RED + "Mac GOP support is limited! Drop your compressed GOP as mac_gop.efirom in #GOP_Files\n" + 
+			Fore.RESET + Style.NORMAL)
+			last_gop = "your file"
+			mac_file  = "mac_gop.efirom"
+			#sys.exit()
+		elif gop_type[:3] == "LSI" :
+			print(Style.BRIGHT + Fore.RED + "LSI SASx MPT UEFI not supported!\n" + Fore.RESET + Style.NORMAL)
+			sys.exit()
+		elif gop_type == "Unknown" :
+			print(Style.BRIGHT + Fore.RED + "Not GOP or GOP is not common type! Please report it!\n" + Fore.RESET + Style.NORMAL)
+			sys.exit()
+		else :
+			last_gop = "latest available"
+			print(Style.BRIGHT + Fore.RED + "GOP is not present!!!\n" + Fore.RESET + Style.NORMAL)
 		
-		print("")
+		if efi_imag :
+			print(Style.BRIGHT + Fore.CYAN + "It appears you used an EFI image! Only version display is possible." + Fore.RESET + Style.NORMAL)
+			sys.exit()
 		
-		with open("#GOP_Files/%s" % nv_file, 'rb') as nv_gop :
-			gop_rom = nv_gop.read()
-	
-	elif gop_type[:4] == "Mac_" :
-		efi_id_off  = 0x20 ## Might not always be true
-		efr_lst_off = 0x31 ## Might not always be true
-		efi_lst_off = 0x4A ## Might not always be true
+		## Get ROM Info
+		orom_old_type, orom_start, orom_pcir_off, orom_id_bin, orom_size, efi_found, efi_begin, efi_size = rom_info(reading, 0, "all")
+		#ven_dev = "%s-%s" % (orom_id_hex[4:], orom_id_hex[:4])
+		#pci_ven = ven_dev[:4]
+		#pci_dev = ven_dev[-4:]
+		ven_dev, pci_ven, pci_dev = id_from_bin(orom_id_bin, "all_list")
+		efi_class_bin = reading[orom_pcir_off + 0xD:orom_pcir_off + 0x10] # Initialize for when GOP ROM missing
+		#print(ven_dev)
+		#print("%0.2X = %s-%s = %0.2X" % (orom_start, pci_ven, ven_dev[-4:], orom_last_img))
+		#print(Style.BRIGHT + Fore.CYAN + "%s = ID of ROM file\n" % ven_dev + Fore.RESET + Style.NORMAL)
+		
+		
+		## Check that EFI ROM header is a good match
 		
-		if not os.path.isfile("#GOP_Files/%s" % mac_file) :
-			print(Fore.RED + "File %s was not found!" % mac_file + Fore.RESET)
+		if orom_start == efi_begin :
+			print(Style.BRIGHT + Fore.CYAN + "It appears you used an EFI ROM! Only extraction is possible." + Fore.RESET + Style.NORMAL)
 			sys.exit()
+		elif pci_ven not in ['1002', '10DE'] :
+			print(Style.BRIGHT + Fore.YELLOW + "Only AMD and Nvidia GOP supported!" + Fore.RESET + Style.NORMAL)
+			sys.exit()
+		elif efi_found :
+			if os.path.isfile(file_efi) and code_type != "x64" and gop_type[:4] != "Mac_" :
+				print(Style.BRIGHT + Fore.YELLOW + "Code type %s is not supported!" % code_type + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			
+			efi_pcir_ds    = int.from_bytes(reading[efi_begin + 0x18:efi_begin + 0x1A], 'little')
+			efi_pcir_off   = efi_begin + efi_pcir_ds
+			efi_class_bin  = reading[efi_pcir_off + 0xD:efi_pcir_off + 0x10]
+			efi_class_code = binascii.hexlify(efi_class_bin).decode('utf-8')
+			efi_code_type  = reading[efi_pcir_off + 0x14:efi_pcir_off + 0x15]
+			efi_last_img   = ord(reading[efi_pcir_off + 0x15:efi_pcir_off + 0x16]) & 0x80
+			
+			if efi_class_code not in ['030000', '000003', '030200', '000203'] and gop_type[:4] != "Mac_" :
+				print(Style.BRIGHT + Fore.YELLOW + "Class-code %s is not supported!" % efi_class_code + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			if efi_code_type != b'\x03' :
+				print(Style.BRIGHT + Fore.RED + "Code mismatch in EFI ROM header!" + Fore.RESET + Style.NORMAL)
+				sys.exit()
+			if not efi_last_img :
+				# Report not needed, found example in GP104_NotLast.rom
+				#print(Style.BRIGHT + Fore.RED + "EFI ROM is not last image! Please report it!" + Fore.RESET + Style.NORMAL)
+				print(Style.BRIGHT + Fore.YELLOW + "EFI ROM is not last image!" + Fore.RESET + Style.NORMAL)
+				#sys.exit()
 		
-		with open("#GOP_Files/%s" % mac_file, 'rb') as mac_gop :
-			gop_rom = mac_gop.read()
-	else :
-		print(Style.BRIGHT + Fore.YELLOW + "Only AMD and Nvidia GOP supported!" + Fore.RESET + Style.NORMAL)
-		sys.exit()
-	
-	orom_end      = orom_start + orom_size
-	orom_pci_last = orom_pcir_off + 0x15
-	orom_last_img = ord(reading[orom_pcir_off + 0x15:orom_pcir_off + 0x16]) & 0x80
-	end_img_old   = orom_end + efi_size ## This is only [IFR + ] ROM + EFI, not all sections.
-	end_img_new   = orom_end + len(gop_rom)
-	all_size      = len(reading)
-	orom_cl_code  = reading[orom_pcir_off + 0xD:orom_pcir_off + 0x10]
-	weird_npds_ps = False
-	
-	## Check for special images between ROM and EFI, but not in first container. Don't know why Nvidia is doing this.
-	if efi_found and efi_begin != orom_end : # Already checked for weird data in rom_info, must be special images in between
-		end_img_old   = efi_begin + efi_size
-		end_img_new   = efi_begin + len(gop_rom)
-		weird_npds_ps = True
-	
-	## TODO Special case for old type with EFI between ROM and special images with 55AA. Check after last image.
-	## Check for other ROM images after ROM + EFI.
-	if rom_info(reading, end_img_old, "basic") :
-		print(Style.BRIGHT + Fore.RED + "  There are other ROM images in this binary! Please report it!\n" + 
-			Fore.RESET + Style.NORMAL)
-	
-	## Fix first image for EFI pointing.
-	if orom_last_img :
+		## Pretty please
+		ask = input("\nDo you want to update GOP to %s? Y for yes or N for no: " % last_gop)
 		
-		print(Style.BRIGHT + Fore.YELLOW + "  Fixing last-image-bit in PCI Structure of Legacy ROM! \n" + Fore.RESET + Style.NORMAL)
+		if ask.upper() not in ["Y", "YP", "YPAT"] :
+			sys.exit()
 		
-		## Determine checksum byte
-		if gop_type == "AMD" :
-			imb_test = reading[orom_start + 0x1E:orom_start + 0x21]
+		if ask.upper() in ["YP", "YPAT"] :
+			amd_gop_efirom = "amd_gop_mod.efirom"
+		
+		print("")
+		
+		## GRID K1/K2 check
+		if pci_ven == "10DE" and pci_dev in ['0FF2', '11BF'] :
+			gop_type = "Nvidia"
+			nv_type  = "GK1xx_Multi-Display"
+			nv_file  = "nv_gop_GK1xx_multi.efirom"
+			last_gop = last_nv_GK1xx_MDP
+			print(Style.BRIGHT + Fore.YELLOW + "  Using Multi-Display GOP %s for GRID K1/K2.\n" % last_nv_GK1xx_MDP + Fore.RESET + Style.NORMAL)
+		
+		## Get the right GOP
+		if gop_type == "AMD" or (pci_ven == "1002" and gop_type == "") :
+			## The next two lines are needed for the case of missing GOP.
+			gop_type   = "AMD"
+			last_gop   = last_amd_new
+			efi_id_off = 0x20 ## might change it future versions
+			id_in_gop  = False
 			
-			if imb_test == b'IBM' :
-				ibm_end = orom_start + 0x21
-				chk_is_last = False
+			if is_vega_gop :
+				gop_ids_file   = "amd_gop_IDs_2.4.0.0.0.txt"
+				amd_gop_efirom = "amd_gop_vega.efirom"
+				last_gop       = last_amd_vega
 			else :
-				ibm_sig = re.search(br'\x49\x42\x4D', reading[:0xD0])
+				gop_ids_file = "amd_gop_IDs.txt"
+			
+			## GOP 1.59.0.0.0 (and newer) has less IDs than 1.57.0.0.0, a double check is needed.
+			for line in gop_lines(gop_ids_file) :
+				if line[:9] == ven_dev :
+					id_in_gop = True
+					#print("The ID %s is present in the GOP!\n" % ven_dev)
+					break
+			
+			if id_in_gop :
+				amd_file = amd_gop_efirom
+			else :
+				print(Style.BRIGHT + Fore.YELLOW + "  Warning! Your VBIOS ID %s doesn't exist in latest available GOP!\n" % ven_dev + 
+				Fore.RESET + Style.NORMAL)
+				ask = input("\nDo you still want to update GOP? Y for yes or any key for checking the ID in older 1.57.0.0.0 GOP: ")
+				
+				if ask.strip().upper() == "Y" :
+					amd_file = amd_gop_efirom
+					print("")
+				else :
+					for line in gop_lines("amd_gop_IDs_1.57.0.0.0.txt") :
+						if line[:9] == ven_dev :
+							id_in_gop = True
+							#print("The ID %s is present in the GOP!\n" % ven_dev)
+							break
+					print("")
+					
+					if id_in_gop :
+						last_gop = last_amd_old ## This is only to have the proper updated version displayed.
+						amd_file = "amd_gop_1.57.0.0.0.efirom"
+					else :
+						print(Style.BRIGHT + Fore.YELLOW + "  Warning! Your VBIOS ID %s doesn't exist in older GOP!\n" % ven_dev + 
+						Fore.RESET + Style.NORMAL)
+						ask = input("\nDo you still want to update GOP? A for %s, B for 1.57.0.0.0 or any key for exit: " % last_amd_new)
+						ask = ask.strip().upper()
+						
+						if ask == "A" :
+							amd_file = amd_gop_efirom
+						elif ask == "B" :
+							last_gop = last_amd_old ## This is only to have the proper updated version displayed.
+							amd_file = "amd_gop_1.57.0.0.0.efirom"
+						else :
+							sys.exit()
+						
+						print("")
+			
+			## Relocate the microcode.
+			## Struct of microcode - https://github.com/torvalds/linux/blob/master/drivers/gpu/drm/radeon/atombios.h
+			mc_reloc = False
+			mc_found = False
+			if pci_ven == '1002' and re.search(b'MCuC', reading) is not None :
+				mcuc_list = re.finditer(b'MCuC', reading)
+				
+				for mcuc_match in mcuc_list :
+					(mcuc_bgn, end_mcuc_match) = mcuc_match.span()
+					
+					mc_off = int.from_bytes(reading[mcuc_bgn - 8:mcuc_bgn - 4], 'little')
+					
+					if reading[mc_off:mc_off + 4] == b'MCuC' :
+						mc_found = True
+						
+						gop_rom = gop_file(amd_file)
+						
+						end_img_new = orom_start + orom_size + len(gop_rom)
+						
+						## Nothing to do if microcode doesn't move.
+						if end_img_new <= mc_off :
+							print(Style.BRIGHT + Fore.YELLOW + "  AMD microcode will remain at the same offset.\n" + Fore.RESET + Style.NORMAL)
+						else :
+							mc_reloc  = True
+							
+							# TODO Relocation doesn't work, use old GOP
+							if mc_reloc : #False :
+								print(Style.BRIGHT + Fore.YELLOW + "  Warning! Your VBIOS doesn't have enough space for latest GOP and microcode!\n  If your card needs the microcode, an older and smaller GOP will be used\n" + Fore.RESET + Style.NORMAL)
+								ask = input("\nDo you want the latest GOP or the microcode? A for latest GOP, B for microcode or any key for exit: ")
+								ask = ask.strip().upper()
+								
+								if ask == "A" :
+									amd_file = amd_gop_efirom
+								elif ask == "B" :
+									last_gop = last_amd_old ## This is only to have the proper updated version displayed.
+									amd_file = "amd_gop_mcu.efirom"
+									
+									gop_rom = gop_file(amd_file)
+									
+									end_img_new = orom_start + orom_size + len(gop_rom)
+								else :
+									sys.exit()
+								
+								print("")
+							
+							parm_size = int.from_bytes(reading[mc_off + 8:mc_off + 0x0A], 'little')
+							code_size = int.from_bytes(reading[mc_off + 0x0A:mc_off + 0x0C], 'little')
+							mc_size   = 0x10 + parm_size + code_size
+							#print("%0.2X" % mc_size)
+							mc_round  = mc_size + ((0x10 - mc_size % 0x10) & 0x0F)
+							#print("%0.2X" % mc_round)
+							mc_end    = mc_off + mc_round
+							#new_mc_off = end_img_new + mc_off - end_img_old
+							mc_pad     = 0x1000 - (end_img_new % 0x1000) if (end_img_new % 0x1000) > 0 else 0
+							new_mc_off = end_img_new + mc_pad
+							new_mc_end = new_mc_off + mc_round
+							new_mc_bin = new_mc_off.to_bytes(4, 'little')
+							
+							if new_mc_off != mc_off :
+								print(Style.BRIGHT + Fore.YELLOW + "  AMD microcode will be relocated to offset 0x%0.2X.\n" % new_mc_off + Fore.RESET + Style.NORMAL)
+								reading  = reading[:mcuc_bgn - 8] + new_mc_bin + reading[mcuc_bgn - 4:]#end_img_old] + reading[mc_off:mc_end]
+								#reading  = reading[:mcuc_bgn - 8] + new_mc_bin + reading[mcuc_bgn - 4:mc_off] + b'\xFF' * mc_pad + reading[mc_off:]
+						
+						break
 				
-				if ibm_sig is not None :
-					(start_ibm, ibm_end) = ibm_sig.span()
-					chk_is_last = False
-					print(Style.BRIGHT + Fore.YELLOW + "  Checksum byte of Legacy OROM at offset 0x%0.2X! \n" % ibm_end + 
-					Fore.RESET + Style.NORMAL)
 				else :
-					ibm_end = orom_end - 1
-					chk_is_last = True
+					print(Style.BRIGHT + Fore.YELLOW + "  AMD microcode pointer was found, but not its target!\n" + Fore.RESET + Style.NORMAL)
 			
-			chk_int_old = ord(reading[ibm_end:ibm_end + 1])
-			chk_off     = ibm_end
-		
-		elif gop_type == "Nvidia" :
-			chk_int_old = ord(reading[orom_end - 1:orom_end])
-			chk_off     = orom_end - 1
-			chk_is_last = True
+			gop_rom = gop_file(amd_file)
+			
+		elif gop_type == "Nvidia" and nv_type != "GXxxx" :
+			
+			#gop_type = "Nvidia"
+			efi_id_off  = 0x20 ## might change it future versions
+			efr_lst_off = 0x31 ## might change it future versions
+			efi_lst_off = 0x4A ## might change it future versions
+			
+			## Make sure the Nvidia GOP is not customized. Only the last digit of variant ID should be non-zero.
+			try :
+				gop_rom = gop_file(nv_file)
+			except :
+				print(Style.BRIGHT + Fore.RED + "  Unable to find a matching GOP! Please report it!\n" + 
+				Fore.RESET + Style.NORMAL)
+				sys.exit()
 		
-		## Determine if there is one container for all ROMs. EFI is most likely missing.
-		## Are there images where PCIR size == NPDE size?
-		orom_container = False
+		elif pci_ven == "10DE" and (gop_type == "" or gop_type == "Nvidia") :
+			
+			gop_type = "Nvidia"
+			efi_id_off  = 0x20 ## might change it future versions
+			efr_lst_off = 0x31 ## might change it future versions
+			efi_lst_off = 0x4A ## might change it future versions
+			
+			## The Legacy ROM of an MXM board carries the MXM_ structure, it picks the _MXM GOP.
+			orom_mxm = re.search(br'\x4D\x58\x4D\x5F', reading[orom_start:orom_start + orom_size]) is not None ## MXM_
+			gpu_arch = nv_arch_from_id(pci_dev, orom_mxm)
+			
+			if gpu_arch in last_nv_gop :
+				last_gop = last_nv_gop[gpu_arch]
+				nv_file  = "nv_gop_%s.efirom" % gpu_arch
+				print(Style.BRIGHT + Fore.YELLOW + "  GOP type missing! Using %s based on device ID %s.\n" % (gpu_arch, pci_dev) + 
+				Fore.RESET + Style.NORMAL)
+			
+			else :
+				print(Style.BRIGHT + Fore.YELLOW + "  Warning! GOP type missing! Continue only if you know what you are doing!\n" + 
+				Fore.RESET + Style.NORMAL)
+				
+				gpu_hint = nvidia_board()
+				
+				print(Style.BRIGHT + Fore.YELLOW + "  Product name = %s. This might (!!) be used to determine your GPU architecture.\n" % gpu_hint + 
+				Fore.RESET + Style.NORMAL)
+				
+				print("\nDo you still want to update GOP? Select the number of your GPU architecture: \n\n")
+				print("  1 = GT21x")
+				print("  2 = GF10x")
+				print("  3 = GF119")
+				print("  4 = GK1xx")
+				print("  5 = GM1xx")
+				print("  6 = GM2xx")
+				print("  7 = GP1xx")
+				print("  8 = GV1xx")
+				print("  9 = TU1xx")
+				print("  10 = GK1xx_MXM")
+				print("  11 = GM1xx_MXM")
+				
+				while True :
+					ask = input("\n\nEnter choice: ")
+					ask = ask.strip()
+					
+					if ask == "1" :
+						last_gop = last_nv_GT21x
+						nv_file = "nv_gop_GT21x.efirom"
+						break
+					elif ask == "2" :
+						last_gop = last_nv_GF10x
+						nv_file = "nv_gop_GF10x.efirom"
+						break
+					elif ask == "3" :
+						last_gop = last_nv_GF119
+						nv_file = "nv_gop_GF119.efirom"
+						break
+					elif ask == "4" :
+						last_gop = last_nv_GK1xx
+						nv_file = "nv_gop_GK1xx.efirom"
+						break
+					elif ask == "5" :
+						last_gop = last_nv_GM1xx
+						nv_file = "nv_gop_GM1xx.efirom"
+						break
+					elif ask == "6" :
+						last_gop = last_nv_GM2xx
+						nv_file = "nv_gop_GM2xx.efirom"
+						break
+					elif ask == "7" :
+						last_gop = last_nv_GP1xx
+						nv_file = "nv_gop_GP1xx.efirom"
+						break
+					elif ask == "8" :
+						last_gop = last_nv_GV1xx
+						nv_file = "nv_gop_GV1xx.efirom"
+						break
+					elif ask == "9" :
+						last_gop = last_nv_TU1xx
+						nv_file = "nv_gop_TU1xx.efirom"
+						break
+					elif ask == "10" :
+						last_gop = last_nv_GK1xx_MXM
+						nv_file  = "nv_gop_GK1xx_MXM.efirom"
+						break
+					elif ask == "11" :
+						last_gop = last_nv_GM1xx_MXM
+						nv_file  = "nv_gop_GM1xx_MXM.efirom"
+						break
+					else :
+						print("\nWrong choice! Self destruct in 10, 9, 8, ...")
+						#sys.exit()
+				
+				
+				print("")
+			
+			gop_rom = gop_file(nv_file)
 		
-		if reading[orom_pcir_off + 0x20:orom_pcir_off + 0x24] == b'NPDE' :
-			npde_size = int.from_bytes(reading[orom_pcir_off + 0x28:orom_pcir_off + 0x2A], 'little') * 0x200
+		elif gop_type[:4] == "Mac_" :
+			efi_id_off  = 0x20 ## Might not always be true
+			efr_lst_off = 0x31 ## Might not always be true
+			efi_lst_off = 0x4A ## Might not always be true
+			
+			if not os.path.isfile("#GOP_Files/%s" % mac_file) :
+				print(Fore.RED + "File %s was not found!" % mac_file + Fore.RESET)
+				sys.exit()
 			
-			if orom_size != npde_size :
-				print(Style.BRIGHT + Fore.RED + "  Different sizes in PCI structure and NPDE structure of Legacy ROM!\n" + 
+			gop_rom = gop_file(mac_file)
+		else :
+			print(Style.BRIGHT + Fore.YELLOW + "Only AMD and Nvidia GOP supported!" + Fore.RESET + Style.NORMAL)
+			sys.exit()
+		
+		prof_begin("image assembly")
+		orom_end      = orom_start + orom_size
+		orom_pci_last = orom_pcir_off + 0x15
+		orom_last_img = ord(reading[orom_pcir_off + 0x15:orom_pcir_off + 0x16]) & 0x80
+		end_img_old   = orom_end + efi_size ## This is only [IFR + ] ROM + EFI, not all sections.
+		end_img_new   = orom_end + len(gop_rom)
+		all_size      = len(reading)
+		orom_cl_code  = reading[orom_pcir_off + 0xD:orom_pcir_off + 0x10]
+		weird_npds_ps = False
+		
+		## Check for special images between ROM and EFI, but not in first container. Don't know why Nvidia is doing this.
+		if efi_found and efi_begin != orom_end : # Already checked for weird data in rom_info, must be special images in between
+			end_img_old   = efi_begin + efi_size
+			end_img_new   = efi_begin + len(gop_rom)
+			weird_npds_ps = True
+		
+		## TODO Special case for old type with EFI between ROM and special images with 55AA. Check after last image.
+		## Check for other ROM images after ROM + EFI.
+		if rom_info(reading, end_img_old, "basic") :
+			print(Style.BRIGHT + Fore.RED + "  There are other ROM images in this binary! Please report it!\n" + 
 				Fore.RESET + Style.NORMAL)
+		
+		## Fix first image for EFI pointing.
+		if orom_last_img :
+			
+			print(Style.BRIGHT + Fore.YELLOW + "  Fixing last-image-bit in PCI Structure of Legacy ROM! \n" + Fore.RESET + Style.NORMAL)
+			
+			## Determine checksum byte
+			if gop_type == "AMD" :
+				imb_test = reading[orom_start + 0x1E:orom_start + 0x21]
 				
-				orom_end_npde = orom_start + npde_size
-				rom_test_npde = reading[orom_end_npde:orom_end_npde + 2]
+				if imb_test == b'IBM' :
+					ibm_end = orom_start + 0x21
+					chk_is_last = False
+				else :
+					ibm_sig = re.search(br'\x49\x42\x4D', reading[:0xD0])
+					
+					if ibm_sig is not None :
+						(start_ibm, ibm_end) = ibm_sig.span()
+						chk_is_last = False
+						print(Style.BRIGHT + Fore.YELLOW + "  Checksum byte of Legacy OROM at offset 0x%0.2X! \n" % ibm_end + 
+						Fore.RESET + Style.NORMAL)
+					else :
+						ibm_end = orom_end - 1
+						chk_is_last = True
 				
-				## If NPDE size is the right one, there is one container for all ROMs.
-				if rom_test_npde in [b'\x55\xAA', b'\x56\x4E'] :
-					orom_container = True
-					print(Style.BRIGHT + Fore.YELLOW + "  The Legacy ROM appears to be a container for all images.\n" + 
+				chk_int_old = ord(reading[ibm_end:ibm_end + 1])
+				chk_off     = ibm_end
+			
+			elif gop_type == "Nvidia" :
+				chk_int_old = ord(reading[orom_end - 1:orom_end])
+				chk_off     = orom_end - 1
+				chk_is_last = True
+			
+			## Determine if there is one container for all ROMs. EFI is most likely missing.
+			## Are there images where PCIR size == NPDE size?
+			orom_container = False
+			
+			if reading[orom_pcir_off + 0x20:orom_pcir_off + 0x24] == b'NPDE' :
+				npde_size = int.from_bytes(reading[orom_pcir_off + 0x28:orom_pcir_off + 0x2A], 'little') * 0x200
+				
+				if orom_size != npde_size :
+					print(Style.BRIGHT + Fore.RED + "  Different sizes in PCI structure and NPDE structure of Legacy ROM!\n" + 
 					Fore.RESET + Style.NORMAL)
-					print(Style.BRIGHT + Fore.YELLOW + "  Fixing last-image-bit in last special image of container.\n" + Fore.RESET + Style.NORMAL)
-					nv_step      = orom_end_npde
-					check_nv_ext = reading[nv_step:nv_step + 2]
 					
-					while check_nv_ext == b'\x56\x4E' or check_nv_ext == b'\x55\xAA' :
-						
-						nv_ext_size = int.from_bytes(reading[nv_step + 2:nv_step + 4], 'little') * 0x200
-						#print(nv_ext_size)
-						
-						# Need this here for cases with container + other special images.
-						npds_off = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
-						npds_off += nv_step
+					orom_end_npde = orom_start + npde_size
+					rom_test_npde = reading[orom_end_npde:orom_end_npde + 2]
+					
+					## If NPDE size is the right one, there is one container for all ROMs.
+					if rom_test_npde in [b'\x55\xAA', b'\x56\x4E'] :
+						orom_container = True
+						print(Style.BRIGHT + Fore.YELLOW + "  The Legacy ROM appears to be a container for all images.\n" + 
+						Fore.RESET + Style.NORMAL)
+						print(Style.BRIGHT + Fore.YELLOW + "  Fixing last-image-bit in last special image of container.\n" + Fore.RESET + Style.NORMAL)
+						nv_step      = orom_end_npde
+						check_nv_ext = reading[nv_step:nv_step + 2]
 						
-						if nv_ext_size == 0 :
+						while check_nv_ext == b'\x56\x4E' or check_nv_ext == b'\x55\xAA' :
 							
-							nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
+							nv_ext_size = int.from_bytes(reading[nv_step + 2:nv_step + 4], 'little') * 0x200
 							#print(nv_ext_size)
+							
+							# Need this here for cases with container + other special images.
+							npds_off = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
+							npds_off += nv_step
+							
+							if nv_ext_size == 0 :
+								
+								nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
+								#print(nv_ext_size)
+							
+							npde_start = nv_step
+							npde_end   = npde_start + nv_ext_size
+							#print("Current = 0x%0.2X" % nv_step)
+							nv_step += nv_ext_size
+							#print("Next    = 0x%0.2X" % nv_step)
+							
+							# Don't go above container, leave the other special images as is.						
+							if nv_step >= orom_start + orom_size :
+								#print("End of container!")
+								break
+							
+							check_nv_ext = reading[nv_step:nv_step + 2]
 						
-						npde_start = nv_step
-						npde_end   = npde_start + nv_ext_size
-						#print("Current = 0x%0.2X" % nv_step)
-						nv_step += nv_ext_size
-						#print("Next    = 0x%0.2X" % nv_step)
+						lst_img_npds_off = npds_off + 0x15
+						lst_npds_int_old = ord(reading[lst_img_npds_off:lst_img_npds_off + 1])
+						lst_npds_int_new = int(lst_npds_int_old & 0x7F)
+						lst_npds_bin_new = bytes([lst_npds_int_new])
 						
-						# Don't go above container, leave the other special images as is.						
-						if nv_step >= orom_start + orom_size :
-							#print("End of container!")
-							break
+						# Fix checksum for last image only
+						#checksum_old = sum(bytearray(reading[orom_start:orom_end_npde - 1]))
+						checksum_old = sum(bytearray(reading[npde_start:npde_end - 1]))
+						checksum_new = (checksum_old - lst_npds_int_old + lst_npds_int_new) & 0xFF
+						chk_int_new  = 256 - checksum_new if checksum_new else 0
+						chk_bin_new  = bytes([chk_int_new])
+						#print(chk_bin_new)
 						
-						check_nv_ext = reading[nv_step:nv_step + 2]
-					
-					lst_img_npds_off = npds_off + 0x15
-					lst_npds_int_old = ord(reading[lst_img_npds_off:lst_img_npds_off + 1])
-					lst_npds_int_new = int(lst_npds_int_old & 0x7F)
-					lst_npds_bin_new = bytes([lst_npds_int_new])
-					
-					# Fix checksum for last image only
-					#checksum_old = sum(bytearray(reading[orom_start:orom_end_npde - 1]))
-					checksum_old = sum(bytearray(reading[npde_start:npde_end - 1]))
-					checksum_new = (checksum_old - lst_npds_int_old + lst_npds_int_new) & 0xFF
-					chk_int_new  = 256 - checksum_new if checksum_new else 0
-					chk_bin_new  = bytes([chk_int_new])
-					#print(chk_bin_new)
-					
-					# reading = reading[:orom_end_npde - 1] + chk_bin_new + reading[orom_end_npde:lst_img_npds_off] + \
-							# lst_npds_bin_new + reading[lst_img_npds_off + 1:]
-					
-					reading = reading[:lst_img_npds_off] + lst_npds_bin_new + reading[lst_img_npds_off + 1:npde_end - 1] + chk_bin_new + reading[npde_end:]
-					
-					npde_off_test    = npds_off + 0x20
-					lst_img_npde_off = npds_off + 0x2A
-					
-					if reading[npde_off_test:npde_off_test + 4] == b'NPDE' :
-						lst_npde_int_old = ord(reading[lst_img_npde_off:lst_img_npde_off + 1])
-						lst_npde_int_new = int(lst_npde_int_old & 0x7F)		
-						lst_npde_bin_new = bytes([lst_npde_int_new])
+						# reading = reading[:orom_end_npde - 1] + chk_bin_new + reading[orom_end_npde:lst_img_npds_off] + \
+								# lst_npds_bin_new + reading[lst_img_npds_off + 1:]
 						
-						reading = reading[:lst_img_npde_off] + lst_npde_bin_new + reading[lst_img_npde_off + 1:]
-		
-		if orom_container :
-			checksum_old = sum(bytearray(reading[orom_start:orom_end_npde]))
-			chk_int_old = ord(reading[orom_end_npde - 1:orom_end_npde])
-		else :
-			checksum_old = sum(bytearray(reading[orom_start:orom_end])) ## sumbytes(reading[orom_start:orom_end])
-		
-		lst_int_old  = ord(reading[orom_pci_last:orom_pci_last + 1])
-		lst_int_new  = int(lst_int_old & 0x7F)
-		lst_bin_new  = bytes([lst_int_new])
-		
-		checksum_new = (checksum_old - chk_int_old - lst_int_old + lst_int_new) & 0xFF
-		
-		chk_int_new  = 256 - checksum_new if checksum_new else 0
-		chk_bin_new  = bytes([chk_int_new])
-		
-		if chk_is_last :
-			print(Style.BRIGHT + Fore.YELLOW + "  Using last byte for checksum! \n" + Fore.RESET + Style.NORMAL)
+						reading = reading[:lst_img_npds_off] + lst_npds_bin_new + reading[lst_img_npds_off + 1:npde_end - 1] + chk_bin_new + reading[npde_end:]
+						
+						npde_off_test    = npds_off + 0x20
+						lst_img_npde_off = npds_off + 0x2A
+						
+						if reading[npde_off_test:npde_off_test + 4] == b'NPDE' :
+							lst_npde_int_old = ord(reading[lst_img_npde_off:lst_img_npde_off + 1])
+							lst_npde_int_new = int(lst_npde_int_old & 0x7F)		
+							lst_npde_bin_new = bytes([lst_npde_int_new])
+							
+							reading = reading[:lst_img_npde_off] + lst_npde_bin_new + reading[lst_img_npde_off + 1:]
 			
 			if orom_container :
-				new_gop = reading[:orom_pci_last] + lst_bin_new + reading[orom_pci_last + 1:orom_end_npde - 1] + chk_bin_new + reading[orom_end_npde:orom_end]
+				checksum_old = sum(bytearray(reading[orom_start:orom_end_npde]))
+				chk_int_old = ord(reading[orom_end_npde - 1:orom_end_npde])
 			else :
-				new_gop = reading[:orom_pci_last] + lst_bin_new + reading[orom_pci_last + 1:orom_end - 1] + chk_bin_new
-		else :
-			print(Style.BRIGHT + Fore.YELLOW + "  Using AMD byte for checksum! \n" + Fore.RESET + Style.NORMAL)
-			new_gop = reading[:chk_off] + chk_bin_new + reading[chk_off + 1:orom_pci_last] + lst_bin_new + reading[orom_pci_last + 1:orom_end]
-	else :
-		new_gop = reading[:orom_end]
-	
-	## Add special images between ROM and EFI. If they are present and not part of main container, nothing else to do.
-	## The last-bit is already set in ROM and special images.
-	if weird_npds_ps :
-		new_gop += reading[orom_end:efi_begin]
-	
-	## Assembly a new image
-	if gop_type == "Nvidia" or gop_type == "Mac_Nvidia" :
-		## Nvidia has special images and special structures, needs more care.
-		efi_id_old   = sum(bytearray(gop_rom[efi_id_off:efi_id_off + 4]))
-		efi_lst_old  = ord(gop_rom[efi_lst_off:efi_lst_off + 1]) #sum(bytearray(gop_rom[efi_lst_off:efi_lst_off + 1]))
-		efr_lst_old  = ord(gop_rom[efr_lst_off:efr_lst_off + 1]) #sum(bytearray(gop_rom[efr_lst_off:efr_lst_off + 1]))
-		checksum_old = sum(bytearray(gop_rom[:-1]))
-		nvsp_data    = b''
-		
-		## Check if EFI is last image in Nvidia VBIOS. Change the bit in NPDE.
-		check_nv_ext = reading[end_img_old:end_img_old + 2]
-		if check_nv_ext == b'\x56\x4E' or check_nv_ext == b'\x55\xAA' :
-			print(Style.BRIGHT + Fore.YELLOW + "  EFI is NOT last image!\n" + Fore.RESET + Style.NORMAL)
-			efi_lst_new = int(efi_lst_old & 0x7F)
-			efr_lst_new = int(efr_lst_old & 0x7F)
-			## Remove end padding from dumped images.
-			nv_step  = end_img_old
+				checksum_old = sum(bytearray(reading[orom_start:orom_end])) ## sumbytes(reading[orom_start:orom_end])
 			
-			while check_nv_ext == b'\x56\x4E' or check_nv_ext == b'\x55\xAA' :
-				nv_ext_size = int.from_bytes(reading[nv_step + 2:nv_step + 4], 'little') * 0x200
-				#print("Size = 0x%0.2X" % nv_ext_size)
+			lst_int_old  = ord(reading[orom_pci_last:orom_pci_last + 1])
+			lst_int_new  = int(lst_int_old & 0x7F)
+			lst_bin_new  = bytes([lst_int_new])
+			
+			checksum_new = (checksum_old - chk_int_old - lst_int_old + lst_int_new) & 0xFF
+			
+			chk_int_new  = 256 - checksum_new if checksum_new else 0
+			chk_bin_new  = bytes([chk_int_new])
+			
+			if chk_is_last :
+				print(Style.BRIGHT + Fore.YELLOW + "  Using last byte for checksum! \n" + Fore.RESET + Style.NORMAL)
 				
-				# Need this here for cases with container + other special images.
-				npds_off = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
-				npds_off += nv_step
+				if orom_container :
+					new_gop = reading[:orom_pci_last] + lst_bin_new + reading[orom_pci_last + 1:orom_end_npde - 1] + chk_bin_new + reading[orom_end_npde:orom_end]
+				else :
+					new_gop = reading[:orom_pci_last] + lst_bin_new + reading[orom_pci_last + 1:orom_end - 1] + chk_bin_new
+			else :
+				print(Style.BRIGHT + Fore.YELLOW + "  Using AMD byte for checksum! \n" + Fore.RESET + Style.NORMAL)
+				new_gop = reading[:chk_off] + chk_bin_new + reading[chk_off + 1:orom_pci_last] + lst_bin_new + reading[orom_pci_last + 1:orom_end]
+		else :
+			new_gop = reading[:orom_end]
+		
+		## Add special images between ROM and EFI. If they are present and not part of main container, nothing else to do.
+		## The last-bit is already set in ROM and special images.
+		if weird_npds_ps :
+			new_gop += reading[orom_end:efi_begin]
+		
+		## Assembly a new image
+		if gop_type == "Nvidia" or gop_type == "Mac_Nvidia" :
+			## Nvidia has special images and special structures, needs more care.
+			efi_id_old   = sum(bytearray(gop_rom[efi_id_off:efi_id_off + 4]))
+			efi_lst_old  = ord(gop_rom[efi_lst_off:efi_lst_off + 1]) #sum(bytearray(gop_rom[efi_lst_off:efi_lst_off + 1]))
+			efr_lst_old  = ord(gop_rom[efr_lst_off:efr_lst_off + 1]) #sum(bytearray(gop_rom[efr_lst_off:efr_lst_off + 1]))
+			checksum_old = sum(bytearray(gop_rom[:-1]))
+			nvsp_data    = b''
+			
+			## Check if EFI is last image in Nvidia VBIOS. Change the bit in NPDE.
+			check_nv_ext = reading[end_img_old:end_img_old + 2]
+			if check_nv_ext == b'\x56\x4E' or check_nv_ext == b'\x55\xAA' :
+				print(Style.BRIGHT + Fore.YELLOW + "  EFI is NOT last image!\n" + Fore.RESET + Style.NORMAL)
+				efi_lst_new = int(efi_lst_old & 0x7F)
+				efr_lst_new = int(efr_lst_old & 0x7F)
+				## Remove end padding from dumped images.
+				nv_step  = end_img_old
 				
-				if nv_ext_size == 0 :
-					nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
+				while check_nv_ext == b'\x56\x4E' or check_nv_ext == b'\x55\xAA' :
+					nv_ext_size = int.from_bytes(reading[nv_step + 2:nv_step + 4], 'little') * 0x200
 					#print("Size = 0x%0.2X" % nv_ext_size)
-				
-				#print("Current = 0x%0.2X" % nv_step)
-				nv_step += nv_ext_size
-				#print("Next    = 0x%0.2X\n" % nv_step)
-				check_nv_ext = reading[nv_step:nv_step + 2]
-			else :
-				#print("end_img_old = 0x%0.2X" % end_img_old)
-				#print("Final step  = 0x%0.2X\n" % nv_step)
-				turing_one = 0
-				
-				if efi_found and nv_type == "TU1xx" : # Turing has a backup image
-					turing_pad  = 0x1000 - (nv_step % 0x1000) if (nv_step % 0x1000) > 0 else 0
-					turing_one  = turing_pad + nv_step
-					end_img_old += turing_one
-					nv_step     += turing_one
+					
+					# Need this here for cases with container + other special images.
+					npds_off = int.from_bytes(reading[nv_step + 0x18:nv_step + 0x1A], 'little')
+					npds_off += nv_step
+					
+					if nv_ext_size == 0 :
+						nv_ext_size = int.from_bytes(reading[npds_off + 0x10:npds_off + 0x12], 'little') * 0x200
+						#print("Size = 0x%0.2X" % nv_ext_size)
+					
+					#print("Current = 0x%0.2X" % nv_step)
+					nv_step += nv_ext_size
+					#print("Next    = 0x%0.2X\n" % nv_step)
+					check_nv_ext = reading[nv_step:nv_step + 2]
+				else :
 					#print("end_img_old = 0x%0.2X" % end_img_old)
 					#print("Final step  = 0x%0.2X\n" % nv_step)
-					check_nv_ext = reading[nv_step:nv_step + 2]
-					
-					if reading[turing_one:turing_one + 4] != b'NVGI' :
-						print(Style.BRIGHT + Fore.RED + "  Backup image not in expected place! Aborting...\n" + Fore.RESET + Style.NORMAL)
-						sys.exit()
+					turing_one = 0
 					
-					if reading[efi_begin + turing_one + 4:efi_begin + turing_one + 8] != b'\xF1\x0E\x00\x00' :
-						print(Style.BRIGHT + Fore.RED + "  Backup EFI image not in expected place! Aborting...\n" + Fore.RESET + Style.NORMAL)
-						sys.exit()
+					if efi_found and nv_type == "TU1xx" : # Turing has a backup image
+						turing_pad  = 0x1000 - (nv_step % 0x1000) if (nv_step % 0x1000) > 0 else 0
+						turing_one  = turing_pad + nv_step
+						end_img_old += turing_one
+						nv_step     += turing_one
+						#print("end_img_old = 0x%0.2X" % end_img_old)
+						#print("Final step  = 0x%0.2X\n" % nv_step)
+						check_nv_ext = reading[nv_step:nv_step + 2]
+						
+						if reading[turing_one:turing_one + 4] != b'NVGI' :
+							print(Style.BRIGHT + Fore.RED + "  Backup image not in expected place! Aborting...\n" + Fore.RESET + Style.NORMAL)
+							sys.exit()
+						
+						if reading[efi_begin + turing_one + 4:efi_begin + turing_one + 8] != b'\xF1\x0E\x00\x00' :
+							print(Style.BRIGHT + Fore.RED + "  Backup EFI image not in expected place! Aborting...\n" + Fore.RESET + Style.NORMAL)
+							sys.exit()
+						
+						for idx in range(0, turing_one) :
+							if reading[idx:idx + 1] != reading[turing_one + idx:turing_one + idx + 1] :
+								print(Style.BRIGHT + Fore.RED + "  Backup image not identical to main image! Be careful...\n" + Fore.RESET + Style.NORMAL)
+								break
 					
-					for idx in range(0, turing_one) :
-						if reading[idx:idx + 1] != reading[turing_one + idx:turing_one + idx + 1] :
-							print(Style.BRIGHT + Fore.RED + "  Backup image not identical to main image! Be careful...\n" + Fore.RESET + Style.NORMAL)
-							break
+					if check_nv_ext == b'' :
+						## No extra data and no padding, so we can re-add special images as end data.
+						nvsp_data = reading[end_img_old:]
+						end_data  = b''
+					else :
+						print(Style.BRIGHT + Fore.YELLOW + "  Removing unnecessary end padding.\n" + Fore.RESET + Style.NORMAL)
+						nvsp_data = reading[end_img_old:nv_step] ## This is the normal situation, where only padding follows last special image.
+						end_data  = b''
+						#print(end_data[:0x10])
+						#print("len end_data = 0x%0.2X\n" % len(end_data))
+						str_err  = "  Data after Nvidia special images! Please report it!\n"
+						end_img_new += nv_step - end_img_old + turing_one # adding size of special images
+						end_img_old = nv_step
+						#print("end_img_old = 0x%0.2X" % end_img_old)
+						#print("end_img_new = 0x%0.2X\n" % end_img_new)
+						#end_data = remove_padding(end_data, nv_step, end_img_new, all_size, str_err)
+						end_data = remove_padding(end_img_old, end_img_new, all_size, str_err)
+						#print(end_data[:0x10])
+						#print("len end_data = 0x%0.2X\n" % len(end_data))
+			
+			else :
+				print(Style.BRIGHT + Fore.YELLOW + "  EFI is last image.\n" + Fore.RESET + Style.NORMAL)
+				efi_lst_new = int(efi_lst_old | 0x80)
+				efr_lst_new = int(efr_lst_old | 0x80)
+				## Remove end padding from dumped images.
+				end_data = b''
 				
-				if check_nv_ext == b'' :
-					## No extra data and no padding, so we can re-add special images as end data.
-					nvsp_data = reading[end_img_old:]
-					end_data  = b''
-				else :
+				if end_img_old < all_size :
 					print(Style.BRIGHT + Fore.YELLOW + "  Removing unnecessary end padding.\n" + Fore.RESET + Style.NORMAL)
-					nvsp_data = reading[end_img_old:nv_step] ## This is the normal situation, where only padding follows last special image.
-					end_data  = b''
-					#print(end_data[:0x10])
-					#print("len end_data = 0x%0.2X\n" % len(end_data))
-					str_err  = "  Data after Nvidia special images! Please report it!\n"
-					end_img_new += nv_step - end_img_old + turing_one # adding size of special images
-					end_img_old = nv_step
-					#print("end_img_old = 0x%0.2X" % end_img_old)
-					#print("end_img_new = 0x%0.2X\n" % end_img_new)
-					#end_data = remove_padding(end_data, nv_step, end_img_new, all_size, str_err)
+					str_err  = "  Data after ROM and not part of Nvidia special images! Please report it!\n"
 					end_data = remove_padding(end_img_old, end_img_new, all_size, str_err)
-					#print(end_data[:0x10])
-					#print("len end_data = 0x%0.2X\n" % len(end_data))
+			
+			efi_id_new      = sum(bytearray(orom_id_bin))
+			efi_lst_bin_new = bytes([efi_lst_new])
+			efr_lst_bin_new = bytes([efr_lst_new])
+			
+			print(Style.BRIGHT + Fore.YELLOW + "  Fixing ID, last-image-bit and checksum for EFI image.\n" + Fore.RESET + Style.NORMAL)
+			
+			if orom_old_type : # The special images after legacy ROM have AA55 header. Fix PCIR and NPDE.
+				print(Style.BRIGHT + Fore.YELLOW + "  Fixing last-image-bit in PCIR and NPDE for EFI image.\n" + Fore.RESET + Style.NORMAL)
+			else : # The special images after legacy ROM have NV header. Fix only NPDE.
+				
+				if not efi_found or (efi_found and efi_last_img) : # There are no other AA55 ROM images after EFI. Fix only NPDE.
+					efr_lst_new     = efr_lst_old
+					efr_lst_bin_new = bytes([efr_lst_new])
+				#else : GP104_NotLast.rom -> Say hello to one weird image. Both AA55 and NV headers.
+					
+			checksum_new    = (checksum_old - efi_id_old - efr_lst_old - efi_lst_old + efi_id_new + efr_lst_new + efi_lst_new) & 0xFF
+			efi_chk_int_new = 256 - checksum_new if checksum_new else 0
+			efi_chk_bin_new = bytes([efi_chk_int_new])
+			
+			if efi_found and nv_type == "TU1xx" : # Turing has a backup image
+				new_gop += gop_rom[:efi_id_off] + orom_id_bin + gop_rom[efi_id_off + 4:efi_id_off + 9] + efi_class_bin + \
+						gop_rom[efi_id_off + 0xC:efr_lst_off] + efr_lst_bin_new + gop_rom[efr_lst_off + 1:efi_lst_off] + \
+						efi_lst_bin_new + gop_rom[efi_lst_off + 1:-1] + efi_chk_bin_new + nvsp_data
+				new_gop = new_gop + (b'\xFF' * turing_pad) + new_gop + end_data
+			else :
+				new_gop += gop_rom[:efi_id_off] + orom_id_bin + gop_rom[efi_id_off + 4:efi_id_off + 9] + efi_class_bin + \
+						gop_rom[efi_id_off + 0xC:efr_lst_off] + efr_lst_bin_new + gop_rom[efr_lst_off + 1:efi_lst_off] + \
+						efi_lst_bin_new + gop_rom[efi_lst_off + 1:-1] + efi_chk_bin_new + nvsp_data + end_data
 		
 		else :
-			print(Style.BRIGHT + Fore.YELLOW + "  EFI is last image.\n" + Fore.RESET + Style.NORMAL)
-			efi_lst_new = int(efi_lst_old | 0x80)
-			efr_lst_new = int(efr_lst_old | 0x80)
+			## gop_type is "AMD"
+			## AMD has no special images, from limited testing.
+			print(Style.BRIGHT + Fore.YELLOW + "  Fixing ID for EFI image. No checksum correction is needed.\n" + Fore.RESET + Style.NORMAL)
+			
 			## Remove end padding from dumped images.
 			end_data = b''
 			
+			## Standard error message for extra data
+			str_err  = "  Data after ROM and not part of EFI! Please report it!\n"
+			
+			## If AMD microcode is present, check for extra data after it. Assume none before.
+			if mc_reloc :
+				str_err  = "  Data after microcode! Please report it!\n"
+				end_img_old = mc_end
+				end_img_new = new_mc_end
+			
 			if end_img_old < all_size :
 				print(Style.BRIGHT + Fore.YELLOW + "  Removing unnecessary end padding.\n" + Fore.RESET + Style.NORMAL)
-				str_err  = "  Data after ROM and not part of Nvidia special images! Please report it!\n"
+				#str_err  = "  Data after ROM and not part of EFI! Please report it!\n"
 				end_data = remove_padding(end_img_old, end_img_new, all_size, str_err)
-		
-		efi_id_new      = sum(bytearray(orom_id_bin))
-		efi_lst_bin_new = bytes([efi_lst_new])
-		efr_lst_bin_new = bytes([efr_lst_new])
-		
-		print(Style.BRIGHT + Fore.YELLOW + "  Fixing ID, last-image-bit and checksum for EFI image.\n" + Fore.RESET + Style.NORMAL)
-		
-		if orom_old_type : # The special images after legacy ROM have AA55 header. Fix PCIR and NPDE.
-			print(Style.BRIGHT + Fore.YELLOW + "  Fixing last-image-bit in PCIR and NPDE for EFI image.\n" + Fore.RESET + Style.NORMAL)
-		else : # The special images after legacy ROM have NV header. Fix only NPDE.
 			
-			if not efi_found or (efi_found and efi_last_img) : # There are no other AA55 ROM images after EFI. Fix only NPDE.
-				efr_lst_new     = efr_lst_old
-				efr_lst_bin_new = bytes([efr_lst_new])
-			#else : GP104_NotLast.rom -> Say hello to one weird image. Both AA55 and NV headers.
-				
-		checksum_new    = (checksum_old - efi_id_old - efr_lst_old - efi_lst_old + efi_id_new + efr_lst_new + efi_lst_new) & 0xFF
-		efi_chk_int_new = 256 - checksum_new if checksum_new else 0
-		efi_chk_bin_new = bytes([efi_chk_int_new])
-		
-		if efi_found and nv_type == "TU1xx" : # Turing has a backup image
-			new_gop += gop_rom[:efi_id_off] + orom_id_bin + gop_rom[efi_id_off + 4:efi_id_off + 9] + efi_class_bin + \
-					gop_rom[efi_id_off + 0xC:efr_lst_off] + efr_lst_bin_new + gop_rom[efr_lst_off + 1:efi_lst_off] + \
-					efi_lst_bin_new + gop_rom[efi_lst_off + 1:-1] + efi_chk_bin_new + nvsp_data
-			new_gop = new_gop + (b'\xFF' * turing_pad) + new_gop + end_data
-		else :
+			## Add the microcode and any extra data.
+			if mc_reloc :
+				end_data = b'\xFF' * mc_pad + reading[mc_off:mc_end] + end_data
+					
 			new_gop += gop_rom[:efi_id_off] + orom_id_bin + gop_rom[efi_id_off + 4:efi_id_off + 9] + efi_class_bin + \
-					gop_rom[efi_id_off + 0xC:efr_lst_off] + efr_lst_bin_new + gop_rom[efr_lst_off + 1:efi_lst_off] + \
-					efi_lst_bin_new + gop_rom[efi_lst_off + 1:-1] + efi_chk_bin_new + nvsp_data + end_data
-	
-	else :
-		## gop_type is "AMD"
-		## AMD has no special images, from limited testing.
-		print(Style.BRIGHT + Fore.YELLOW + "  Fixing ID for EFI image. No checksum correction is needed.\n" + Fore.RESET + Style.NORMAL)
-		
-		## Remove end padding from dumped images.
-		end_data = b''
+						gop_rom[efi_id_off + 0xC:] + end_data
 		
-		## Standard error message for extra data
-		str_err  = "  Data after ROM and not part of EFI! Please report it!\n"
+		prof_end("image assembly")
 		
-		## If AMD microcode is present, check for extra data after it. Assume none before.
-		if mc_reloc :
-			str_err  = "  Data after microcode! Please report it!\n"
-			end_img_old = mc_end
-			end_img_new = new_mc_end
+		prof_begin("write")
+		with open("%s_updGOP%s" % (fileName, fileExtension), 'wb') as my_gop :
+			my_gop.write(new_gop)
+		prof_end("write")
 		
-		if end_img_old < all_size :
-			print(Style.BRIGHT + Fore.YELLOW + "  Removing unnecessary end padding.\n" + Fore.RESET + Style.NORMAL)
-			#str_err  = "  Data after ROM and not part of EFI! Please report it!\n"
-			end_data = remove_padding(end_img_old, end_img_new, all_size, str_err)
+		print(Style.BRIGHT + Fore.CYAN + "\nFile \"%s_updGOP%s\" with updated GOP %s was written!\n" % (fileName, fileExtension, last_gop) + 
+		Fore.RESET + Style.NORMAL)
 		
-		## Add the microcode and any extra data.
-		if mc_reloc :
-			end_data = b'\xFF' * mc_pad + reading[mc_off:mc_end] + end_data
-				
-		new_gop += gop_rom[:efi_id_off] + orom_id_bin + gop_rom[efi_id_off + 4:efi_id_off + 9] + efi_class_bin + \
-					gop_rom[efi_id_off + 0xC:] + end_data
-	
-	with open("%s_updGOP%s" % (fileName, fileExtension), 'wb') as my_gop :
-		my_gop.write(new_gop)
+		if gop_type == "AMD" and amd_gop_efirom == "amd_gop_mod.efirom" :
+			print(Style.BRIGHT + Fore.CYAN + "\nPatched GOP was used!\n" + Fore.RESET + Style.NORMAL)
 	
-	print(Style.BRIGHT + Fore.CYAN + "\nFile \"%s_updGOP%s\" with updated GOP %s was written!\n" % (fileName, fileExtension, last_gop) + 
-	Fore.RESET + Style.NORMAL)
-	
-	if gop_type == "AMD" and amd_gop_efirom == "amd_gop_mod.efirom" :
-		print(Style.BRIGHT + Fore.CYAN + "\nPatched GOP was used!\n" + Fore.RESET + Style.NORMAL)
-
-###########################################################
+	###########################################################
@@ -0,0 +1,151 @@
+## Fake sysfs and procfs trees for the passthrough modules, which all take the root of the tree they work on.
+
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## bdf, IOMMU group, vendor, device, class, revision, driver
+pci_devices = [
+	("0000:00:00.0", 0,  "8086", "5910", "060000", "05", None),
+	("0000:00:01.0", 1,  "8086", "1901", "060400", "05", "pcieport"),
+	("0000:01:00.0", 1,  "10de", "1c20", "030000", "a1", "nvidia"),
+	("0000:01:00.1", 1,  "10de", "10f1", "040300", "a1", "snd_hda_intel"),
+	("0000:00:1f.3", 8,  "8086", "a171", "040300", "31", "snd_hda_intel"),
+	("0000:6e:00.0", 10, "8086", "24fd", "028000", "78", "iwlwifi"),
+]
+
+def write_file(file_path, file_data) :
+	os.makedirs(os.path.dirname(file_path), exist_ok=True)
+	
+	with open(file_path, 'w') as out_file :
+		out_file.write(file_data)
+
+def add_driver(sys_root, drv_name) :
+	drv_dir = os.path.join(sys_root, "bus", "pci", "drivers", drv_name)
+	
+	for attr_name in ["bind", "unbind", "new_id", "remove_id"] :
+		write_file(os.path.join(drv_dir, attr_name), "")
+	
+	return drv_dir
+
+def link_driver(sys_root, bdf, drv_name) :
+	
+	## What the kernel does on a bind: device/driver and drivers/<name>/<bdf>.
+	dev_dir = os.path.join(sys_root, "bus", "pci", "devices", bdf)
+	drv_dir = os.path.join(sys_root, "bus", "pci", "drivers", drv_name)
+	
+	os.symlink(drv_dir, os.path.join(dev_dir, "driver"))
+	os.symlink(dev_dir, os.path.join(drv_dir, bdf))
+
+def unlink_driver(sys_root, bdf) :
+	dev_dir = os.path.join(sys_root, "bus", "pci", "devices", bdf)
+	drv_dir = os.path.realpath(os.path.join(dev_dir, "driver"))
+	
+	os.unlink(os.path.join(drv_dir, bdf))
+	os.unlink(os.path.join(dev_dir, "driver"))
+
+def add_cpus(sys_root) :
+	
+	## 4 cores of 2 threads, core n is CPUs n and n + 4 like on the i7-7700HQ, with cpufreq and cpuidle.
+	cpu_root = os.path.join(sys_root, "devices", "system", "cpu")
+	write_file(os.path.join(cpu_root, "online"), "0-7\n")
+	
+	for cpu in range(8) :
+		cpu_dir = os.path.join(cpu_root, "cpu%d" % cpu)
+		write_file(os.path.join(cpu_dir, "topology", "thread_siblings_list"), "%d,%d\n" % (cpu % 4, cpu % 4 + 4))
+		write_file(os.path.join(cpu_dir, "topology", "physical_package_id"), "0\n")
+		write_file(os.path.join(cpu_dir, "cpufreq", "scaling_governor"), "powersave\n")
+		write_file(os.path.join(cpu_dir, "cpufreq", "scaling_available_governors"), "performance powersave\n")
+		write_file(os.path.join(cpu_dir, "cpufreq", "scaling_cur_freq"), "%d\n" % (800000 + cpu * 100000))
+		
+		for state_nr, (state_name, state_latency) in enumerate([("POLL", 0), ("C1", 2), ("C3", 33), ("C6", 133)]) :
+			state_dir = os.path.join(cpu_dir, "cpuidle", "state%d" % state_nr)
+			write_file(os.path.join(state_dir, "name"), state_name + "\n")
+			write_file(os.path.join(state_dir, "latency"), "%d\n" % state_latency)
+			write_file(os.path.join(state_dir, "disable"), "0\n")
+
+@pytest.fixture
+def fake_sys(tmp_path) :
+	
+	## A Clevo P650HP6: the GTX 1060 and its audio function share IOMMU group 1 with the root port.
+	sys_root = str(tmp_path / "sys")
+	
+	for bdf, iommu_group, vendor, device, dev_class, revision, drv_name in pci_devices :
+		dev_dir   = os.path.join(sys_root, "bus", "pci", "devices", bdf)
+		group_dir = os.path.join(sys_root, "kernel", "iommu_groups", str(iommu_group))
+		
+		for attr_name, attr_value in [("vendor", vendor), ("device", device), ("class", dev_class), ("revision", revision),
+									("subsystem_vendor", "1558"), ("subsystem_device", "65a1")] :
+			write_file(os.path.join(dev_dir, attr_name), "0x%s\n" % attr_value)
+		
+		write_file(os.path.join(dev_dir, "driver_override"), "(null)\n")
+		write_file(os.path.join(dev_dir, "reset_method"), "flr bus\n" if iommu_group == 1 else "\n")
+		os.makedirs(os.path.join(group_dir, "devices"), exist_ok=True)
+		os.symlink(dev_dir, os.path.join(group_dir, "devices", bdf))
+		os.symlink(group_dir, os.path.join(dev_dir, "iommu_group"))
+		
+		if drv_name is not None :
+			add_driver(sys_root, drv_name)
+			
+			if not os.path.islink(os.path.join(dev_dir, "driver")) :
+				link_driver(sys_root, bdf, drv_name)
+	
+	add_driver(sys_root, "vfio-pci")
+	write_file(os.path.join(sys_root, "bus", "pci", "drivers_probe"), "")
+	add_cpus(sys_root)
+	
+	return sys_root
+
+class Fake_QMP :
+	
+	## QMP server on a Unix socket for one client: the greeting, {command : return} answers, and the events sent
+	## after qmp_capabilities. With hang_up it closes the socket after the events, the way QEMU does on exit.
+	def __init__(self, sock_path, replies=None, events=(), hang_up=False) :
+		self.replies  = dict(replies or {})
+		self.events   = list(events)
+		self.hang_up  = hang_up
+		self.commands = []
+		self.sock     = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.bind(sock_path)
+		self.sock.listen(1)
+		self.thread   = threading.Thread(target=self.serve, daemon=True)
+		self.thread.start()
+	
+	def serve(self) :
+		conn, conn_addr = self.sock.accept()
+		conn_file = conn.makefile('rwb')
+		
+		def send(qmp_msg) :
+			conn_file.write(json.dumps(qmp_msg).encode('utf-8') + b"\n")
+			conn_file.flush()
+		
+		send({"QMP" : {"version" : {"qemu" : {"major" : 8, "minor" : 2, "micro" : 0}}, "capabilities" : []}})
+		
+		for cmd_line in conn_file :
+			command = json.loads(cmd_line)["execute"]
+			self.commands.append(command)
+			
+			if command == "qmp_capabilities" :
+				send({"return" : {}})
+				
+				for qmp_event in self.events :
+					send(qmp_event)
+				
+				if self.hang_up :
+					break
+			
+			elif command in self.replies :
+				send({"return" : self.replies[command]})
+			else :
+				send({"error" : {"class" : "CommandNotFound", "desc" : "The command %s has not been found" % command}})
+		
+		conn_file.close()
+		conn.close()
+	
+	def close(self) :
+		self.sock.close()
@@ -0,0 +1,67 @@
+import json
+
+from passthrough import boottime
+from passthrough import qmp
+
+from conftest import Fake_QMP
+
+wall_start = 1700000000.0
+
+def qmp_event(event, ev_time, ev_data=None) :
+	
+	## A QMP event with the timestamp QEMU puts on it, ev_time seconds after wall_start.
+	ev_stamp = wall_start + ev_time
+	qmp_msg  = {"event" : event, "timestamp" : {"seconds" : int(ev_stamp), "microseconds" : round((ev_stamp - int(ev_stamp)) * 1e6)}}
+	
+	if ev_data is not None :
+		qmp_msg["data"] = ev_data
+	
+	return qmp_msg
+
+def test_events_of_a_launch(tmp_path) :
+	boot_timeline = boottime.Boot_Timeline()
+	boot_timeline.wall_start = wall_start
+	boot_timeline.qemu_ver   = "8.2.0"
+	
+	fake_qmp = Fake_QMP(str(tmp_path / "qmp.sock"), events=[
+		qmp_event("RESUME", 2.5),
+		qmp_event("NIC_RX_FILTER_CHANGED", 14.25, {"name" : "net0", "path" : "/machine/peripheral/net0/virtio-backend"}),
+		qmp_event("STOP", 29.5),
+		qmp_event("SHUTDOWN", 30.0, {"guest" : True, "reason" : "guest-shutdown"}),
+	], hang_up=True)
+	
+	## watch_events returns once the stand-in closes the socket, like QEMU on exit.
+	qmp_client = qmp.QMP_Client(str(tmp_path / "qmp.sock"))
+	boottime.watch_events(qmp_client, boot_timeline)
+	qmp_client.close()
+	fake_qmp.close()
+	
+	## The /proc/interrupts watcher marks after the QMP events it comes before.
+	boot_timeline.mark("vfio_irq", "vfio-msi[0](0000:01:00.0)", 9.0)
+	boot_timeline.timed("romfile", sum, [1, 2])
+	
+	log_entry = boot_timeline.entry(vm="Windows", romfile=None)
+	
+	assert (log_entry["vm"], log_entry["qemu"], log_entry["romfile"]) == ("Windows", "8.2.0", None)
+	assert log_entry["host"] == {"romfile" : round(boot_timeline.host_steps["romfile"], 3)}
+	assert log_entry["events"] == [[2.5, "resume", None], [9.0, "vfio_irq", "vfio-msi[0](0000:01:00.0)"], [14.25, "net_driver", "net0"],
+									[30.0, "shutdown", "guest-shutdown"]]
+	assert boot_timeline.first("net_driver") == 14.25
+	assert boottime.guest_times(log_entry) == {"resume" : 0.0, "vfio_irq" : 6.5, "net_driver" : 11.75, "shutdown" : 27.5}
+
+def test_no_guest_times_without_resume() :
+	assert boottime.guest_times({"events" : [[1.0, "shutdown", "host-qmp-quit"]]}) == {}
+
+def test_log_line_cut_short_is_skipped(tmp_path) :
+	log_file_path = str(tmp_path / "logs" / "boot-times.jsonl")
+	log_entries   = [{"vm" : "Windows", "host" : {"qemu" : 1.5}, "events" : [[2.5, "resume", None]]},
+					{"vm" : "Linux", "host" : {"qemu" : 1.25}, "events" : []}]
+	
+	for log_entry in log_entries :
+		boottime.append_log(log_entry, log_file_path)
+	
+	## A launcher killed in the middle of the write of the third line.
+	with open(log_file_path, 'a') as log_file :
+		log_file.write(json.dumps(log_entries[0])[:20])
+	
+	assert boottime.read_log(log_file_path) == log_entries
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from passthrough import cpufreq
+from passthrough import sysfs
+
+## The vCPU CPUs of the Windows guest, core 0 (CPUs 0 and 4) stays with the host.
+vcpu_cpus = [1, 5, 2, 6, 3, 7]
+
+def test_governor_and_c_states_are_set_and_restored(fake_sys) :
+	cpu_tuning = cpufreq.CPU_Tuning(fake_sys, vcpu_cpus, "performance", 50)
+	
+	## The governor of every CPU, and C6 (133 µs) of every CPU, C3 (33 µs) stays on.
+	assert len(cpu_tuning.tune_plan) == 12
+	assert all(tune_path.endswith(("scaling_governor", "state3/disable")) for tune_path, old_value, new_value in cpu_tuning.tune_plan)
+	
+	cpu_tuning.apply()
+	
+	for cpu in vcpu_cpus :
+		cpu_dir = cpufreq.cpu_dir(fake_sys, cpu)
+		
+		assert sysfs.read_attr(os.path.join(cpu_dir, "cpufreq", "scaling_governor")) == "performance"
+		assert [sysfs.read_attr(os.path.join(cpu_dir, "cpuidle", "state%d" % state_nr, "disable")) for state_nr in range(4)] == ["0", "0", "0", "1"]
+	
+	assert sysfs.read_attr(os.path.join(cpufreq.cpu_dir(fake_sys, 0), "cpufreq", "scaling_governor")) == "powersave"
+	
+	cpu_tuning.restore()
+	
+	for cpu in vcpu_cpus :
+		cpu_dir = cpufreq.cpu_dir(fake_sys, cpu)
+		
+		assert sysfs.read_attr(os.path.join(cpu_dir, "cpufreq", "scaling_governor")) == "powersave"
+		assert sysfs.read_attr(os.path.join(cpu_dir, "cpuidle", "state3", "disable")) == "0"
+
+def test_polling_state_stays_on(fake_sys) :
+	cpu_tuning = cpufreq.CPU_Tuning(fake_sys, [1], None, 0)
+	
+	assert [os.path.basename(os.path.dirname(tune_path)) for tune_path, old_value, new_value in cpu_tuning.tune_plan] == ["state1", "state2", "state3"]
+
+def test_missing_governor(fake_sys) :
+	with pytest.raises(ValueError, match="CPU 1 has no schedutil governor, only performance, powersave") :
+		cpufreq.CPU_Tuning(fake_sys, vcpu_cpus, "schedutil")
+
+def test_frequency_samples(fake_sys) :
+	cpu_tuning = cpufreq.CPU_Tuning(fake_sys, [1, 5], None)
+	cpu_tuning.sample()
+	
+	sysfs.write_attr(os.path.join(cpufreq.cpu_dir(fake_sys, 1), "cpufreq", "scaling_cur_freq"), 3500000)
+	cpu_tuning.sample()
+	
+	assert cpu_tuning.stats() == {1 : {"min" : 900, "avg" : 2200, "max" : 3500, "samples" : 2},
+								5 : {"min" : 1300, "avg" : 1300, "max" : 1300, "samples" : 2}}
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from passthrough import cpuset
+from passthrough import topology
+
+def test_state_folder_is_made(fake_sys, tmp_path) :
+	state_root = str(tmp_path / "run" / "passthrough")
+	core_list  = topology.host_cores(fake_sys)
+	
+	assert cpuset.allocate(state_root, "Windows", core_list, 3) == [1, 2, 3]
+	assert os.path.isfile(os.path.join(state_root, "cpusets.json"))
+	
+	with pytest.raises(ValueError) :
+		cpuset.allocate(state_root, "Linux", core_list, 1)
+	
+	assert cpuset.release(state_root, "Windows")
+	assert cpuset.allocate(state_root, "Linux", core_list, 1) == [3]
+
+def test_dead_launcher_loses_its_cores(fake_sys, tmp_path) :
+	state_root = str(tmp_path / "state")
+	core_list  = topology.host_cores(fake_sys)
+	
+	cpuset.allocate(state_root, "Windows", core_list, 3)
+	
+	with cpuset.locked_state(state_root) as cpu_sets :
+		cpu_sets["Windows"]["pid"] = 0x7FFFFFFF
+	
+	assert cpuset.allocate(state_root, "Linux", core_list, 2) == [2, 3]
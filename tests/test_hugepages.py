@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from passthrough import hugepages
+from passthrough import sysfs
+
+from conftest import write_file
+
+def fake_memory(proc_root, sys_root, free_2m=0, free_1g=0, normal_blocks=(5000, 3000, 1000, 500, 200, 100, 50, 20, 10, 400, 3000)) :
+	
+	## 12 GB of RAM, a 2M pool and a 1G pool, and one hugetlbfs mount for each.
+	write_file(os.path.join(proc_root, "meminfo"), "MemTotal: 12000000 kB\nMemFree: 9000000 kB\nMemAvailable: 10000000 kB\nHugepagesize: 2048 kB\n")
+	write_file(os.path.join(proc_root, "buddyinfo"), "Node 0, zone      DMA      1      1      1      0      2      1      1      0      1      1      3\n"
+				"Node 0, zone   Normal %s\n" % " ".join("%6d" % free_count for free_count in normal_blocks))
+	write_file(os.path.join(proc_root, "mounts"), "proc /proc proc rw 0 0\nhugetlbfs /dev/hugepages hugetlbfs rw,relatime,pagesize=2M 0 0\n"
+				"hugetlbfs /dev/hugepages1G hugetlbfs rw,relatime,pagesize=1024M 0 0\n")
+	write_file(os.path.join(proc_root, "sys", "vm", "compact_memory"), "")
+	
+	for page_kb, nr_free in [(2048, free_2m), (1 << 20, free_1g)] :
+		for stat_name, stat_value in [("nr", nr_free), ("free", nr_free), ("resv", 0), ("surplus", 0)] :
+			write_file(hugepages.pool_path(sys_root, page_kb, stat_name), "%d\n" % stat_value)
+
+def test_2m_pages_are_reserved_and_released(tmp_path) :
+	proc_root, sys_root = str(tmp_path / "proc"), str(tmp_path / "sys")
+	fake_memory(proc_root, sys_root, free_2m=1024)
+	
+	mem_plan = hugepages.plan(proc_root, sys_root, hugepages.mem_size("8G"))
+	
+	assert (mem_plan["page_kb"], mem_plan["pages"], mem_plan["shortfall"], mem_plan["mount"]) == (2048, 4096, 3072, "/dev/hugepages")
+	assert not mem_plan["fragmented"]
+	
+	nr_path = hugepages.pool_path(sys_root, 2048, "nr")
+	
+	assert hugepages.reserve(proc_root, sys_root, mem_plan) == 3072
+	assert sysfs.read_attr(nr_path) == "4096"
+	
+	hugepages.release(sys_root, mem_plan, 3072)
+	
+	assert sysfs.read_attr(nr_path) == "1024"
+	assert hugepages.backend_args(mem_plan, 8 << 30)[1] == "memory-backend-file,id=ram,size=8192M,mem-path=/dev/hugepages,prealloc=on,share=off"
+
+def test_1g_pool_is_used_when_it_has_room(tmp_path) :
+	proc_root, sys_root = str(tmp_path / "proc"), str(tmp_path / "sys")
+	fake_memory(proc_root, sys_root, free_1g=8)
+	
+	mem_plan = hugepages.plan(proc_root, sys_root, hugepages.mem_size("8G"))
+	
+	assert (mem_plan["page_kb"], mem_plan["shortfall"], mem_plan["mount"]) == (1 << 20, 0, "/dev/hugepages1G")
+	assert hugepages.reserve(proc_root, sys_root, mem_plan) == 0
+	assert hugepages.plan(proc_root, sys_root, hugepages.mem_size("9G"))["page_kb"] == 2048
+
+def test_fragmented_memory_is_compacted(tmp_path) :
+	proc_root, sys_root = str(tmp_path / "proc"), str(tmp_path / "sys")
+	
+	## Only order 0 to 8 blocks, not a single free 2M block.
+	fake_memory(proc_root, sys_root, normal_blocks=(500000, 300000, 100000, 5000, 2000, 1000, 500, 200, 100, 0, 0))
+	
+	mem_plan = hugepages.plan(proc_root, sys_root, hugepages.mem_size(2048))
+	
+	assert mem_plan["fragmented"]
+	assert hugepages.reserve(proc_root, sys_root, mem_plan) == 1024
+	assert sysfs.read_attr(os.path.join(proc_root, "sys", "vm", "compact_memory")) == "1"
+
+def test_bad_sizes_are_refused(tmp_path) :
+	proc_root, sys_root = str(tmp_path / "proc"), str(tmp_path / "sys")
+	fake_memory(proc_root, sys_root)
+	
+	with pytest.raises(ValueError, match="not a multiple of 1G") :
+		hugepages.plan(proc_root, sys_root, hugepages.mem_size("1536M"), "1G")
+	
+	with pytest.raises(ValueError, match="don't fit") :
+		hugepages.plan(proc_root, sys_root, hugepages.mem_size("16G"))
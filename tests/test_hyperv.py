@@ -0,0 +1,59 @@
+import os
+import stat
+
+import pytest
+
+from passthrough import hyperv
+from passthrough import qemu_help
+
+from conftest import Fake_QMP
+from conftest import write_file
+
+## The expansion QEMU 8.2 gave with hv-passthrough=on on the i7-7700HQ.
+props_path = os.path.join(qemu_help.help_dir, hyperv.props_file)
+
+def test_recorded_expansion_gives_every_feature() :
+	hv_flags, hv_left, hv_note = hyperv.plan({"features" : "auto", "vendor_id" : "1234567890ab"}, hyperv.load_props(props_path))
+	
+	assert hv_flags == ["hv-relaxed", "hv-vapic", "hv-spinlocks=0x1fff", "hv-vpindex", "hv-runtime", "hv-crash", "hv-time", "hv-synic",
+						"hv-stimer", "hv-stimer-direct", "hv-tlbflush", "hv-ipi", "hv-frequencies", "hv-reset", "hv-vendor-id=1234567890ab"]
+	assert (hv_left, hv_note) == ({}, None)
+
+def test_old_qemu_gives_the_base_set() :
+	assert hyperv.plan({}, {}) == (["hv-relaxed", "hv-vapic", "hv-spinlocks=0x1fff", "hv-time"],
+									{feature : "not supported" for feature in ["vpindex", "runtime", "crash", "synic", "stimer", "stimer-direct",
+																				"tlbflush", "ipi", "frequencies", "reset"]},
+									"not found in QEMU (6.2 and newer expand hv-passthrough), the base set")
+
+def test_unchecked_without_qemu() :
+	hv_flags, hv_left, hv_note = hyperv.plan({"spinlocks" : "0xfff"}, None)
+	
+	assert hv_flags[:3] == ["hv-relaxed", "hv-vapic", "hv-spinlocks=0xfff"]
+	assert len(hv_flags) == len(hyperv.hv_features)
+	assert (hv_left, hv_note) == ({}, "not checked against KVM")
+
+def test_feature_without_its_dependencies_is_left_out() :
+	assert hyperv.plan({"features" : ["stimer"]}, hyperv.load_props(props_path)) == ([], {"stimer" : "needs synic, time"}, None)
+	assert hyperv.plan({"features" : ["time", "stimer"]}, hyperv.load_props(props_path))[1] == {"stimer" : "needs synic"}
+
+def test_unknown_feature() :
+	with pytest.raises(ValueError, match="Unknown Hyper-V features: evmcs") :
+		hyperv.plan({"features" : ["relaxed", "evmcs"]}, None)
+
+def test_probe_asks_qemu_over_qmp(tmp_path) :
+	
+	## A QEMU that only waits to be killed, the stand-in answers on the socket probe() gives it.
+	qemu_bin = str(tmp_path / "qemu-system-x86_64")
+	write_file(qemu_bin, "#!/bin/sh\nexec sleep 30\n")
+	os.chmod(qemu_bin, stat.S_IRWXU)
+	
+	qmp_path = str(tmp_path / ("hv-probe-%d.qmp" % os.getpid()))
+	fake_qmp = Fake_QMP(qmp_path, {"query-cpu-model-expansion" : {"model" : {"name" : "host", "props" : hyperv.load_props(props_path)}},
+									"quit" : {}})
+	
+	cpu_props = hyperv.probe(qemu_bin, str(tmp_path))
+	fake_qmp.close()
+	
+	assert cpu_props == hyperv.load_props(props_path)
+	assert fake_qmp.commands == ["qmp_capabilities", "query-cpu-model-expansion", "quit"]
+	assert not os.path.exists(qmp_path)
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from passthrough import iommu
+
+from conftest import base_dir
+from conftest import link_driver
+from conftest import unlink_driver
+from conftest import write_file
+
+pci_ids = """# pci.ids excerpt
+8086  Intel Corporation
+	1901  Xeon E3-1200 v5/E3-1500 v5/6th Gen Core Processor PCIe Controller (x16)
+	5910  Xeon E3-1200 v6/7th Gen Core Processor Host Bridge/DRAM Registers
+	a171  CM238 HD Audio Controller
+10de  NVIDIA Corporation
+	10f1  GP106 High Definition Audio Controller
+	1c20  GP106M [GeForce GTX 1060 Mobile]
+C 03  Display controller
+	00  VGA compatible controller
+C 04  Multimedia controller
+	03  Audio device
+C 06  Bridge
+	00  Host bridge
+	04  PCI bridge
+"""
+
+def run_iommu(fake_sys, ids_path, *iommu_args) :
+	return subprocess.run([sys.executable, "-m", "passthrough.iommu", "-SYSFS", fake_sys, "-IDS", ids_path] + list(iommu_args), cwd=base_dir,
+						stdout=subprocess.PIPE, universal_newlines=True)
+
+def test_groups_are_listed_like_lspci(fake_sys, tmp_path) :
+	ids_path = str(tmp_path / "pci.ids")
+	write_file(ids_path, pci_ids)
+	
+	iommu_run = run_iommu(fake_sys, ids_path)
+	
+	assert iommu_run.returncode == 0
+	assert iommu_run.stdout.splitlines() == [
+		"IOMMU Group 0 00:00.0 Host bridge [0600]: Intel Corporation Xeon E3-1200 v6/7th Gen Core Processor Host Bridge/DRAM Registers [8086:5910] (rev 05)",
+		"IOMMU Group 1 00:01.0 PCI bridge [0604]: Intel Corporation Xeon E3-1200 v5/E3-1500 v5/6th Gen Core Processor PCIe Controller (x16) [8086:1901] (rev 05)",
+		"IOMMU Group 1 01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GP106M [GeForce GTX 1060 Mobile] [10de:1c20] (rev a1)",
+		"IOMMU Group 1 01:00.1 Audio device [0403]: NVIDIA Corporation GP106 High Definition Audio Controller [10de:10f1] (rev a1)",
+		"IOMMU Group 8 00:1f.3 Audio device [0403]: Intel Corporation CM238 HD Audio Controller [8086:a171] (rev 31)",
+		"IOMMU Group 10 6e:00.0 Class 0280 [0280]: Intel Corporation Device 24fd [8086:24fd] (rev 78)",
+	]
+
+def test_group_of_the_gpu_is_checked(fake_sys, tmp_path) :
+	group_check = iommu.passthrough_check(fake_sys, "01:00.0")
+	
+	assert (group_check["group"], group_check["ready"]) == (1, False)
+	assert [dev_info["action"] for dev_info in group_check["devices"]] == ["bridge, stays with the host", "unbind from nvidia first",
+																		"unbind from snd_hda_intel first"]
+	
+	for bdf in ["0000:01:00.0", "0000:01:00.1"] :
+		unlink_driver(fake_sys, bdf)
+		link_driver(fake_sys, bdf, "vfio-pci")
+	
+	assert iommu.passthrough_check(fake_sys, "01:00.0")["ready"]
+	
+	ids_path = str(tmp_path / "pci.ids")
+	write_file(ids_path, pci_ids)
+	
+	assert run_iommu(fake_sys, ids_path, "-PASSTHROUGH-CHECK", "01:00.0").returncode == 0
+
+def test_device_without_group(fake_sys) :
+	os.unlink(os.path.join(fake_sys, "bus", "pci", "devices", "0000:6e:00.0", "iommu_group"))
+	
+	with pytest.raises(ValueError, match="no IOMMU group") :
+		iommu.device_group(fake_sys, "6e:00.0")
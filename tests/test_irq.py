@@ -0,0 +1,73 @@
+import os
+
+from passthrough import irq
+from passthrough import sysfs
+
+from conftest import write_file
+
+interrupts = """            CPU0       CPU1       CPU2       CPU3       CPU4       CPU5       CPU6       CPU7
+   0:         11          0          0          0          0          0          0          0  IR-IO-APIC    2-edge      timer
+  16:          0          0          0          0          0          0          0          0  IR-IO-APIC   16-fasteoi   vfio-intx(0000:01:00.0)
+ 130:       1234          0          0          0          0          0          0          0  IR-PCI-MSI 524288-edge      vfio-msi[0](0000:01:00.0)
+ 131:         12          0          0          0          0          0          0          0  IR-PCI-MSI 524289-edge      vfio-msix[0](0000:01:00.1)
+ 132:          1          0          0          0          0          0          0          0  IR-PCI-MSI 1048576-edge      vfio-msi[0](0000:02:00.0)
+ 140:        999          0          0          0          0          0          0          0  IR-PCI-MSI 327680-edge      xhci_hcd
+NMI:          0          0          0          0          0          0          0          0   Non-maskable interrupts
+ERR:          0
+"""
+
+def fake_irqs(proc_root, irq_list=(0, 16, 130, 131, 132, 140)) :
+	write_file(os.path.join(proc_root, "interrupts"), interrupts)
+	
+	for irq_nr in irq_list :
+		write_file(irq.affinity_path(proc_root, irq_nr), "0-7\n")
+
+def test_vfio_irqs_of_the_group(fake_sys, tmp_path) :
+	proc_root = str(tmp_path / "proc")
+	fake_irqs(proc_root)
+	
+	bdf_list = irq.group_bdfs(fake_sys, "01:00.0")
+	
+	assert bdf_list == ["0000:00:01.0", "0000:01:00.0", "0000:01:00.1"]
+	assert irq.vfio_irqs(proc_root, bdf_list) == {16 : "vfio-intx(0000:01:00.0)", 130 : "vfio-msi[0](0000:01:00.0)",
+												131 : "vfio-msix[0](0000:01:00.1)"}
+
+def test_irqs_are_steered_again_after_a_reset(fake_sys, tmp_path) :
+	proc_root = str(tmp_path / "proc")
+	fake_irqs(proc_root)
+	
+	irq_steer = irq.IRQ_Steering(proc_root, irq.group_bdfs(fake_sys, "01:00.0"), [1, 5, 2, 6, 3, 7])
+	
+	assert irq_steer.update() == [(16, "vfio-intx(0000:01:00.0)", "0-7"), (130, "vfio-msi[0](0000:01:00.0)", "0-7"),
+								(131, "vfio-msix[0](0000:01:00.1)", "0-7")]
+	assert sysfs.read_attr(irq.affinity_path(proc_root, 130)) == "1-3,5-7"
+	assert sysfs.read_attr(irq.affinity_path(proc_root, 132)) == "0-7"
+	assert irq_steer.update() == []
+	
+	## A guest reboot requests the IRQ again with the default affinity, it is steered again but keeps the list
+	## it had before the VM.
+	write_file(irq.affinity_path(proc_root, 130), "0-7\n")
+	
+	assert irq_steer.update() == [(130, "vfio-msi[0](0000:01:00.0)", "0-7")]
+	assert sysfs.read_attr(irq.affinity_path(proc_root, 130)) == "1-3,5-7"
+	
+	assert irq_steer.restore() == {16 : "0-7", 130 : "0-7", 131 : "0-7"}
+	assert [sysfs.read_attr(irq.affinity_path(proc_root, irq_nr)) for irq_nr in [16, 130, 131]] == ["0-7", "0-7", "0-7"]
+	assert irq_steer.restore() == {}
+
+def test_missing_irq_directory_is_left_alone(fake_sys, tmp_path) :
+	proc_root = str(tmp_path / "proc")
+	
+	## IRQ 131 was freed between the read of /proc/interrupts and the write of its affinity.
+	fake_irqs(proc_root, [0, 16, 130, 132, 140])
+	
+	irq_steer = irq.IRQ_Steering(proc_root, irq.group_bdfs(fake_sys, "01:00.0"), [0, 4])
+	
+	assert [irq_nr for irq_nr, irq_name, old_affinity in irq_steer.update()] == [16, 130]
+	assert list(irq_steer.failed) == [131]
+	
+	## A failed IRQ is not tried again.
+	write_file(irq.affinity_path(proc_root, 131), "0-7\n")
+	
+	assert irq_steer.update() == []
+	assert irq_steer.restore() == {16 : "0-7", 130 : "0-7"}
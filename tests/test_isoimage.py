@@ -0,0 +1,126 @@
+import json
+import os
+import struct
+
+import pytest
+
+from passthrough import isoimage
+
+from conftest import write_file
+
+def read_data(file_path) :
+	with open(file_path, 'rb') as in_file :
+		return in_file.read()
+
+def touch(file_path, mtime_add=10) :
+	file_stat = os.stat(file_path)
+	os.utime(file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + mtime_add * 10 ** 9))
+
+@pytest.fixture
+def drivers(tmp_path) :
+	
+	## A driver folder like drivers/windows, with the .gitkeep of the repo.
+	src_dir = str(tmp_path / "windows")
+	write_file(os.path.join(src_dir, ".gitkeep"), "")
+	write_file(os.path.join(src_dir, "viostor", "w10", "amd64", "viostor.inf"), "[Version]\nSignature=\"$WINDOWS NT$\"\n")
+	write_file(os.path.join(src_dir, "viostor", "w10", "amd64", "viostor.sys"), "MZ" + "x" * 5000)
+	write_file(os.path.join(src_dir, "NetKVM", "w10", "amd64", "netkvm.inf"), "[Version]\n")
+	
+	return src_dir
+
+def test_forced_builds_are_identical(drivers, tmp_path) :
+	first_how, first_info = isoimage.build(drivers, str(tmp_path / "first.iso"), force=True)
+	
+	## Other mtimes and another build, the bytes only depend on names and contents.
+	touch(os.path.join(drivers, "NetKVM", "w10", "amd64", "netkvm.inf"))
+	second_how, second_info = isoimage.build(drivers, str(tmp_path / "second.iso"), force=True)
+	
+	assert (first_how, second_how) == ("built", "built")
+	assert first_info == second_info
+	assert first_info["files"] == 3
+	assert read_data(str(tmp_path / "first.iso")) == read_data(str(tmp_path / "second.iso"))
+	
+	## The volume space size of the primary volume descriptor is the whole image.
+	iso_data = read_data(str(tmp_path / "first.iso"))
+	
+	assert iso_data[16 * 2048 + 1:16 * 2048 + 6] == b"CD001"
+	assert struct.unpack("<I", iso_data[16 * 2048 + 80:16 * 2048 + 84])[0] * 2048 == len(iso_data) == first_info["size"]
+
+def test_unchanged_tree_is_not_built_again(drivers, tmp_path) :
+	iso_path = str(tmp_path / "win-drivers.iso")
+	iso_info = isoimage.build(drivers, iso_path)[1]
+	iso_stat = os.stat(iso_path)
+	
+	assert isoimage.build(drivers, iso_path) == ("unchanged", iso_info)
+	assert isoimage.build(drivers, iso_path, check_only=True) == ("unchanged", iso_info)
+	assert os.stat(iso_path).st_mtime_ns == iso_stat.st_mtime_ns
+
+def test_touched_file_refreshes_the_manifest(drivers, tmp_path) :
+	iso_path = str(tmp_path / "win-drivers.iso")
+	inf_path = os.path.join(drivers, "viostor", "w10", "amd64", "viostor.inf")
+	isoimage.build(drivers, iso_path)
+	
+	touch(inf_path)
+	
+	assert isoimage.build(drivers, iso_path, check_only=True)[0] == "unchanged"
+	assert isoimage.load_manifest(iso_path + ".json")["files"]["viostor/w10/amd64/viostor.inf"][1] != os.stat(inf_path).st_mtime_ns
+	
+	assert isoimage.build(drivers, iso_path)[0] == "unchanged"
+	assert isoimage.load_manifest(iso_path + ".json")["files"]["viostor/w10/amd64/viostor.inf"][1] == os.stat(inf_path).st_mtime_ns
+
+def test_changed_content_is_built_again(drivers, tmp_path) :
+	iso_path = str(tmp_path / "win-drivers.iso")
+	old_info = isoimage.build(drivers, iso_path)[1]
+	
+	## The same size, only the hash tells.
+	write_file(os.path.join(drivers, "NetKVM", "w10", "amd64", "netkvm.inf"), "[VERSION]\n")
+	
+	assert isoimage.build(drivers, iso_path, check_only=True)[0] == "outdated"
+	
+	new_how, new_info = isoimage.build(drivers, iso_path)
+	
+	assert new_how == "built"
+	assert new_info["sha256"] != old_info["sha256"]
+	assert json.loads(read_data(iso_path + ".json"))["iso"]["sha256"] == new_info["sha256"]
+
+def test_names_that_collide_get_a_number(tmp_path) :
+	src_dir = str(tmp_path / "drivers")
+	write_file(os.path.join(src_dir, "A.INF"), "upper")
+	write_file(os.path.join(src_dir, "a.inf"), "lower")
+	
+	root_node = isoimage.scan_tree(src_dir)
+	isoimage.layout(root_node, 0)
+	
+	assert [file_info["ident"]["iso"] for file_info in root_node["files"]] == [b"A.INF;1", b"A_1.INF;1"]
+	assert [file_info["ident"]["joliet"] for file_info in root_node["files"]] == ["A.INF".encode("utf-16-be"), "a.inf".encode("utf-16-be")]
+	
+	isoimage.build(src_dir, str(tmp_path / "drivers.iso"))
+	
+	assert b"A_1.INF;1" in read_data(str(tmp_path / "drivers.iso"))
+
+def test_hidden_files_are_left_out(drivers, tmp_path) :
+	write_file(os.path.join(drivers, "viostor", ".DS_Store"), "finder")
+	
+	assert [file_info["rel"] for file_info in isoimage.all_files(isoimage.scan_tree(drivers))] == [
+		"NetKVM/w10/amd64/netkvm.inf", "viostor/w10/amd64/viostor.inf", "viostor/w10/amd64/viostor.sys"]
+	
+	isoimage.build(drivers, str(tmp_path / "win-drivers.iso"))
+	iso_data = read_data(str(tmp_path / "win-drivers.iso"))
+	
+	assert ".gitkeep".encode("utf-16-be") not in iso_data
+	assert b"finder" not in iso_data
+
+@pytest.mark.parametrize("file_size", [0, 2048])
+def test_layout_size_of_edge_files(tmp_path, file_size) :
+	
+	## An empty file has no sector, one of exactly a sector no padding.
+	src_dir = str(tmp_path / "drivers")
+	write_file(os.path.join(src_dir, "edge.bin"), "e" * file_size)
+	write_file(os.path.join(src_dir, "next.bin"), "next")
+	
+	build_how, iso_info = isoimage.build(src_dir, str(tmp_path / "drivers.iso"))
+	vol_sectors = isoimage.layout(isoimage.scan_tree(src_dir), 0)[2]
+	
+	assert build_how == "built"
+	assert iso_info["size"] == vol_sectors * 2048
+	assert read_data(str(tmp_path / "drivers.iso"))[-2048:-2044] == b"next"
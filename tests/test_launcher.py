@@ -0,0 +1,194 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from passthrough import launcher
+from passthrough import qemu_help
+from passthrough import topology
+
+from conftest import base_dir
+from conftest import write_file
+
+## The help output of QEMU 8.2 that launcher -QEMU-HELP checks against.
+recorded_help = qemu_help.QEMU_Help(help_dir=qemu_help.help_dir)
+
+## IFF_TAP | IFF_NO_PI | IFF_VNET_HDR, what ip tuntap add gives, with and without multi_queue.
+tap_flags    = 0x5002
+tap_mq_flags = tap_flags | launcher.iff_multi_queue
+
+vm_network = {"backend" : "tap", "ifname" : "vmtap0", "device" : {"addr" : "0xa", "mac" : "52:54:00:00:EE:03"}, "fallback" : "vde",
+			"nic" : {"addr" : "0xa", "model" : "virtio", "macaddr" : "52:54:00:00:EE:03"}}
+
+windows_profile = os.path.join(base_dir, "profiles", "windows.json")
+
+vm_disk = {"file" : "/dev/mapper/LINUX-VM", "format" : "raw", "cache" : "none", "if" : "virtio"}
+
+def test_virtio_drive_gets_an_iothread_and_a_queue_per_vcpu() :
+	drive_args = launcher.drive_args(vm_disk, 0, 6)
+	
+	assert drive_args == ["-object", "iothread,id=io.disk.0", "-drive", "file=/dev/mapper/LINUX-VM,format=raw,cache=none,aio=native,if=none,id=disk.0",
+						"-device", "virtio-blk-pci,drive=disk.0,iothread=io.disk.0,num-queues=6"]
+	
+	qemu_help.check_args(drive_args, recorded_help)
+
+def test_aio_follows_the_cache_mode() :
+	
+	## native needs O_DIRECT, the page cache gets the thread pool, an aio the drive sets is kept.
+	assert "aio=threads" in launcher.drive_args(dict(vm_disk, cache="writeback"), 1, 6)[3]
+	assert "aio=native" in launcher.drive_args(dict(vm_disk, cache="directsync"), 1, 6)[3]
+	assert "aio=io_uring" in launcher.drive_args(dict(vm_disk, aio="io_uring"), 1, 6)[3]
+	assert launcher.drive_args(dict(vm_disk, queues=2), 1, 6)[-1] == "virtio-blk-pci,drive=disk.1,iothread=io.disk.1,num-queues=2"
+
+def test_plain_drive_without_iothread() :
+	assert launcher.drive_args(dict(vm_disk, iothread=False), 0, 6) == ["-drive", "file=/dev/mapper/LINUX-VM,format=raw,cache=none,if=virtio"]
+	assert launcher.drive_args({"file" : "disk.img", "if" : "ide"}, 0, 6) == ["-drive", "file=disk.img,if=ide"]
+
+def test_unknown_device_option() :
+	drive_args = launcher.drive_args(vm_disk, 0, 6)
+	drive_args[-1] = drive_args[-1].replace("num-queues", "num-queue")
+	
+	with pytest.raises(ValueError, match="virtio-blk-pci doesn't know num-queue") :
+		qemu_help.check_args(drive_args, recorded_help)
+
+@pytest.fixture
+def vhost_net(tmp_path, monkeypatch) :
+	vhost_dev = str(tmp_path / "vhost-net")
+	write_file(vhost_dev, "")
+	monkeypatch.setattr(launcher, "vhost_dev", vhost_dev)
+	
+	return vhost_dev
+
+def add_tap(sys_root, tun_flags, ifname="vmtap0") :
+	write_file(os.path.join(sys_root, "class", "net", ifname, "tun_flags"), "0x%x\n" % tun_flags)
+
+def test_multiqueue_tap_gets_a_queue_pair_per_vcpu(fake_sys, vhost_net) :
+	add_tap(fake_sys, tap_mq_flags)
+	
+	net_plan = launcher.network_plan(fake_sys, vm_network, 6)
+	net_args = launcher.network_args(vm_network, net_plan)
+	
+	assert net_plan == {"backend" : "tap", "queues" : 6}
+	assert net_args == ["-netdev", "tap,id=net.0,ifname=vmtap0,script=no,downscript=no,vhost=on,queues=6",
+						"-device", "virtio-net-pci,netdev=net.0,mq=on,vectors=14,addr=0xa,mac=52:54:00:00:EE:03"]
+	
+	qemu_help.check_args(net_args, recorded_help)
+	
+	## No more queues than vCPUs.
+	assert launcher.network_plan(fake_sys, dict(vm_network, queues=2), 6) == {"backend" : "tap", "queues" : 2}
+	assert launcher.network_plan(fake_sys, dict(vm_network, queues=8), 6) == {"backend" : "tap", "queues" : 6}
+
+def test_tap_without_multi_queue_gets_one_queue(fake_sys, vhost_net, capsys) :
+	add_tap(fake_sys, tap_flags)
+	
+	net_plan = launcher.network_plan(fake_sys, vm_network, 6)
+	
+	assert net_plan == {"backend" : "tap", "queues" : 1}
+	assert capsys.readouterr().out == "vmtap0 was made without multi_queue, the guest gets 1 queue\n"
+	assert launcher.network_args(vm_network, net_plan) == ["-netdev", "tap,id=net.0,ifname=vmtap0,script=no,downscript=no,vhost=on",
+														"-device", "virtio-net-pci,netdev=net.0,addr=0xa,mac=52:54:00:00:EE:03"]
+
+def test_missing_tap_falls_back_to_vde(fake_sys, vhost_net, capsys) :
+	net_plan = launcher.network_plan(fake_sys, vm_network, 6)
+	net_args = launcher.network_args(vm_network, net_plan)
+	
+	assert net_plan == {"backend" : "vde", "queues" : 0}
+	assert capsys.readouterr().out == "No vhost-net, vmtap0 is not a tap: the guest network goes through vde\n"
+	assert net_args == ["-net", "nic,addr=0xa,model=virtio,macaddr=52:54:00:00:EE:03", "-net", "vde"]
+	
+	qemu_help.check_args(net_args, recorded_help)
+	
+	with pytest.raises(ValueError, match="vmtap0 is not a tap") :
+		launcher.network_plan(fake_sys, dict(vm_network, fallback=None), 6)
+
+def test_missing_vhost_net_falls_back_to_vde(fake_sys, tmp_path, monkeypatch) :
+	add_tap(fake_sys, tap_mq_flags)
+	monkeypatch.setattr(launcher, "vhost_dev", str(tmp_path / "vhost-net"))
+	
+	assert launcher.network_plan(fake_sys, vm_network, 6) == {"backend" : "vde", "queues" : 0}
+
+def test_unknown_network_backend() :
+	with pytest.raises(ValueError, match="This QEMU has no vmnet-host network backend") :
+		qemu_help.check_args(["-netdev", "vmnet-host,id=net.0"], recorded_help)
+	
+	with pytest.raises(ValueError, match="This QEMU has no slirp network backend") :
+		qemu_help.check_args(["-net", "nic", "-net", "slirp"], recorded_help)
+	
+	with pytest.raises(ValueError, match="virtio-net-pci doesn't know vector") :
+		qemu_help.check_args(["-device", "virtio-net-pci,netdev=net.0,mq=on,vector=14"], recorded_help)
+
+def write_profile(profile_path, profile) :
+	write_file(profile_path, json.dumps(profile))
+	
+	return profile_path
+
+def test_modes_replace_extend_and_remove_keys(tmp_path) :
+	profile_path = write_profile(str(tmp_path / "vm.json"), {
+		"name" : "VM", "rtc" : "base=utc", "args" : ["-usb"], "governor" : "performance", "hugepages" : "2M",
+		"modes" : {"test" : {"args+" : ["-snapshot"], "display+" : ["-vga", "none"], "rtc" : None, "governor" : False, "hugepages" : False,
+							"memory" : "4G"}},
+	})
+	
+	profile = launcher.load_profile(profile_path, "test")
+	
+	assert profile == {"name" : "VM", "args" : ["-usb", "-snapshot"], "display" : ["-vga", "none"], "governor" : False, "memory" : "4G"}
+	assert launcher.load_profile(profile_path) == {"name" : "VM", "rtc" : "base=utc", "args" : ["-usb"], "governor" : "performance",
+													"hugepages" : "2M"}
+	
+	with pytest.raises(ValueError, match="No mode install, the modes are: test") :
+		launcher.load_profile(profile_path, "install")
+
+def windows_args(fake_sys, mode=None) :
+	
+	## The command line of the Windows guest with ordinary memory and a tap of 6 queues, on the free cores.
+	profile  = launcher.load_profile(windows_profile, mode)
+	cpu_plan = topology.guest_topology(topology.host_cores(fake_sys), profile["vcpus"])
+	
+	profile["cdroms"] = ["Windows10_x64.iso", "virtio-win.iso"]
+	
+	return cpu_plan, launcher.build_args(profile, cpu_plan, "GP106.rom", "qemu-system-x86_64", "/run/windows.qmp", None, "windows-vars.fd",
+										{"backend" : "tap", "queues" : 6})
+
+def test_windows_guest_gets_whole_cores(fake_sys) :
+	cpu_plan, qemu_args = windows_args(fake_sys)
+	
+	## 3 cores of 2 threads, the first core stays with the host.
+	assert qemu_args[qemu_args.index("-smp") + 1] == "6,sockets=1,cores=3,threads=2"
+	assert topology.cpu_mask(cpu_plan["vcpu_cpus"]) == "0xEE"
+	assert qemu_args[qemu_args.index("-cpu") + 1] == "host,kvm=off"
+	assert "vfio-pci,host=01:00.0,bus=root.1,addr=00.0,multifunction=on,x-pci-sub-device-id=0x65a1,x-pci-sub-vendor-id=0x1558,romfile=GP106.rom" in qemu_args
+	assert qemu_args[-4:] == ["-netdev", "tap,id=net.0,ifname=vmtap0,script=no,downscript=no,vhost=on,queues=6",
+							"-device", "virtio-net-pci,netdev=net.0,mq=on,vectors=14,addr=0xa,mac=52:54:00:00:EE:03"]
+	assert "-snapshot" not in qemu_args
+	
+	qemu_help.check_args(qemu_args, recorded_help)
+
+def test_install_mode_has_no_gpu(fake_sys) :
+	qemu_args = windows_args(fake_sys, "install")[1]
+	
+	assert not [qemu_arg for qemu_arg in qemu_args if qemu_arg.startswith(("vfio-pci", "ioh3420"))]
+	assert qemu_args[qemu_args.index("-boot") + 1] == "once=d,menu=on"
+	assert qemu_args[qemu_args.index("-vga") + 1] == "qxl"
+
+def test_dry_run_needs_no_kvm(fake_sys, tmp_path) :
+	
+	## No QEMU, no OVMF and no /proc/meminfo: the recorded help, the vars template missing and ordinary memory.
+	state_dir = str(tmp_path / "state")
+	dry_run   = subprocess.run([sys.executable, "-m", "passthrough.launcher", windows_profile, "test", "-DRY-RUN", "-SYSFS", fake_sys, "-PROC",
+							str(tmp_path / "proc"), "-STATE", state_dir, "-QEMU-HELP", qemu_help.help_dir], cwd=base_dir, stdout=subprocess.PIPE,
+							universal_newlines=True)
+	run_lines = dry_run.stdout.splitlines()
+	
+	assert dry_run.returncode == 0
+	assert "No vhost-net, vmtap0 is not a tap: the guest network goes through vde" in run_lines
+	assert " -snapshot " in [run_line for run_line in run_lines if run_line.startswith("taskset 0xEE qemu-system-x86_64 ")][0]
+	assert "# vCPUs on CPUs 1,5,2,6,3,7, other QEMU threads on CPUs 0,4" in run_lines
+	
+	## The fresh vars copy of the test mode is only named, nothing is written or allocated.
+	assert [run_line for run_line in run_lines if run_line.startswith("# NVRAM %s (" % os.path.join(state_dir, "windows-vars.fd"))]
+	assert not os.path.exists(os.path.join(state_dir, "windows-vars.fd"))
+	
+	with open(os.path.join(state_dir, "cpusets.json"), 'r') as state_file :
+		assert json.load(state_file) == {}
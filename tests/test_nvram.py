@@ -0,0 +1,68 @@
+import os
+
+from passthrough import nvram
+
+def write_data(file_path, file_data) :
+	with open(file_path, 'wb') as out_file :
+		out_file.write(file_data)
+
+def read_data(file_path) :
+	with open(file_path, 'rb') as in_file :
+		return in_file.read()
+
+def test_copy_is_made_once_per_template(tmp_path) :
+	template = str(tmp_path / "OVMF_VARS.fd")
+	copy_dir = str(tmp_path / "nvram")
+	write_data(template, b'VARS' + bytes(0x20000))
+	
+	vars_path, vars_how = nvram.vars_file(template, "Windows", copy_dir)
+	
+	assert vars_how in ["reflink", "sparse copy"]
+	assert os.path.basename(vars_path) == "windows-%s.fd" % nvram.file_hash(template)
+	assert read_data(vars_path) == read_data(template)
+	assert nvram.vars_file(template, "Windows", copy_dir) == (vars_path, "reused")
+	
+	## A new template version gives a new copy, the old one stays.
+	write_data(template, b'VARS2' + bytes(0x20000 - 1))
+	
+	assert nvram.vars_file(template, "Windows", copy_dir)[0] != vars_path
+	assert os.path.isfile(vars_path)
+
+def test_first_copy_comes_from_the_seed(tmp_path) :
+	template = str(tmp_path / "OVMF_VARS.fd")
+	seed     = str(tmp_path / "WIN_OVMF_VARS.fd")
+	copy_dir = str(tmp_path / "nvram")
+	write_data(template, b'VARS' + bytes(0x20000))
+	write_data(seed, b'BOOT' + bytes(0x20000))
+	
+	assert nvram.vars_file(template, "Windows", copy_dir, dry_run=True, seed_path=seed)[1] == "new, from %s" % seed
+	
+	vars_path, vars_how = nvram.vars_file(template, "Windows", copy_dir, seed_path=seed)
+	
+	assert vars_how.endswith(", from %s" % seed)
+	assert read_data(vars_path) == read_data(seed)
+	
+	## Only the first copy, the copy of the next template comes from the template.
+	write_data(template, b'VARS2' + bytes(0x20000 - 1))
+	
+	assert read_data(nvram.vars_file(template, "Windows", copy_dir, seed_path=seed)[0]) == read_data(template)
+
+def test_seed_of_another_size_is_left_out(tmp_path) :
+	template = str(tmp_path / "OVMF_VARS.fd")
+	seed     = str(tmp_path / "OVMF_VARS_old.fd")
+	write_data(template, bytes(0x20000))
+	write_data(seed, bytes(0x40000))
+	
+	vars_path, vars_how = nvram.vars_file(template, "Linux", str(tmp_path / "nvram"), seed_path=seed)
+	
+	assert vars_how.endswith(", %s left out, it isn't the size of the template" % seed)
+	assert os.path.getsize(vars_path) == 0x20000
+
+def test_dry_run_without_template(tmp_path) :
+	template = str(tmp_path / "missing" / "OVMF_VARS.fd")
+	copy_dir = str(tmp_path / "nvram")
+	
+	assert nvram.vars_file(template, "Windows", copy_dir, dry_run=True) == (os.path.join(copy_dir, "windows-<sha256 of the template>.fd"),
+																			"new, %s is missing" % template)
+	assert nvram.vars_file(template, "Windows", copy_dir, str(tmp_path), dry_run=True)[0] == str(tmp_path / "windows-vars.fd")
+	assert not os.path.exists(copy_dir)
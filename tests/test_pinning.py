@@ -0,0 +1,74 @@
+import os
+
+from passthrough import pinning
+from passthrough import qmp
+from passthrough import sysfs
+from passthrough import topology
+
+from conftest import Fake_QMP
+from conftest import write_file
+
+qemu_pid   = 4000
+vcpu_tids  = [4010, 4011, 4012, 4013, 4014, 4015]
+io_tid     = 4020
+other_tids = [qemu_pid, 4001, 4030] # main loop, RCU, worker
+
+def fake_proc(proc_root) :
+	
+	## /proc/<tid>/status for the Tgid, /proc/<pid>/task/<tid>/comm for the names.
+	for tid in [qemu_pid, io_tid] + vcpu_tids + other_tids[1:] :
+		write_file(os.path.join(proc_root, str(tid), "status"), "Name:\tqemu\nTgid:\t%d\nPid:\t%d\n" % (qemu_pid, tid))
+		write_file(os.path.join(proc_root, str(qemu_pid), "task", str(tid), "comm"), "CPU %d/KVM\n" % vcpu_tids.index(tid) if tid in vcpu_tids else "qemu\n")
+
+def no_affinity(tid, cpus) :
+	raise AssertionError("thread %d was pinned in a dry run" % tid)
+
+def test_vcpus_get_smt_siblings(fake_sys, tmp_path, monkeypatch) :
+	proc_root = str(tmp_path / "proc")
+	fake_proc(proc_root)
+	
+	core_list    = topology.host_cores(fake_sys)
+	guest_topo   = topology.guest_topology(core_list, 6)
+	housekeeping = topology.housekeeping(core_list, guest_topo["host_cores"])
+	fake_qmp     = Fake_QMP(str(tmp_path / "qmp.sock"), {
+		"query-cpus-fast" : [{"cpu-index" : vcpu, "thread-id" : tid} for vcpu, tid in enumerate(vcpu_tids)],
+		"query-iothreads" : [{"id" : "io.disk.0", "thread-id" : io_tid}],
+	})
+	set_calls    = {}
+	
+	monkeypatch.setattr(os, "sched_setaffinity", lambda tid, cpus : set_calls.__setitem__(tid, sorted(cpus)))
+	
+	qmp_client = qmp.QMP_Client(str(tmp_path / "qmp.sock"))
+	pinning.pin_vm(qmp_client, proc_root, guest_topo["vcpu_cpus"], housekeeping)
+	qmp_client.close()
+	fake_qmp.close()
+	
+	## Guest core n is vCPUs 2n and 2n + 1, on host core n + 1 and its SMT sibling, core 0 keeps the rest.
+	assert guest_topo["vcpu_cpus"] == [1, 5, 2, 6, 3, 7]
+	assert [set_calls[tid] for tid in vcpu_tids] == [[1], [5], [2], [6], [3], [7]]
+	
+	for vcpu in range(0, 6, 2) :
+		topo_dir = os.path.join(fake_sys, "devices", "system", "cpu", "cpu%d" % set_calls[vcpu_tids[vcpu]][0], "topology")
+		assert topology.cpu_list(sysfs.read_attr(os.path.join(topo_dir, "thread_siblings_list"))) == set_calls[vcpu_tids[vcpu]] + set_calls[vcpu_tids[vcpu + 1]]
+	
+	assert {tid : set_calls[tid] for tid in [io_tid] + other_tids} == {tid : [0, 4] for tid in [io_tid] + other_tids}
+	assert fake_qmp.commands == ["qmp_capabilities", "query-cpus-fast", "query-iothreads"]
+
+def test_dry_run_changes_nothing(fake_sys, tmp_path, monkeypatch) :
+	proc_root = str(tmp_path / "proc")
+	fake_proc(proc_root)
+	
+	fake_qmp = Fake_QMP(str(tmp_path / "qmp.sock"), {
+		"query-cpus-fast" : [{"cpu-index" : vcpu, "thread-id" : tid} for vcpu, tid in enumerate(vcpu_tids)],
+		"query-iothreads" : [],
+	})
+	
+	monkeypatch.setattr(os, "sched_setaffinity", no_affinity)
+	
+	qmp_client = qmp.QMP_Client(str(tmp_path / "qmp.sock"))
+	pin_plan   = pinning.pin_vm(qmp_client, proc_root, [1, 5, 2, 6, 3, 7], [0, 4], dry_run=True)
+	qmp_client.close()
+	fake_qmp.close()
+	
+	assert [(tid, thread_name) for tid, thread_name, cpus in pin_plan[:2]] == [(4010, "CPU 0/KVM"), (4011, "CPU 1/KVM")]
+	assert len(pin_plan) == len(vcpu_tids) + len(other_tids) + 1
@@ -0,0 +1,45 @@
+import os
+import shutil
+import stat
+
+from passthrough import vbios
+
+from conftest import base_dir
+
+old_rom = os.path.join(base_dir, "roms", "clevo-p650hp6", "GP106-discrete.rom")
+upd_rom = os.path.join(base_dir, "roms", "clevo-p650hp6", "GP106-mshybrid_updGOP.rom")
+
+def read_data(file_path) :
+	with open(file_path, 'rb') as in_file :
+		return in_file.read()
+
+def test_old_gop_is_updated(fake_sys, tmp_path) :
+	
+	## From the rom attribute of the device, which a fake tree has readable already.
+	shutil.copyfile(old_rom, os.path.join(fake_sys, "bus", "pci", "devices", "0000:01:00.0", "rom"))
+	
+	rom_path, rom_meta, from_cache = vbios.acquire(fake_sys, "01:00.0", str(tmp_path / "cache"))
+	
+	assert not from_cache
+	assert rom_meta["gop_updated"]
+	assert rom_meta["source"] == "sysfs"
+	assert read_data(rom_path) != read_data(old_rom)
+	assert stat.S_IMODE(os.stat(rom_path).st_mode) == 0o644
+	assert stat.S_IMODE(os.stat(rom_path[:-4] + ".json").st_mode) == 0o644
+	assert "not present" not in rom_meta["output"]
+	
+	assert vbios.acquire(fake_sys, "01:00.0", str(tmp_path / "cache"))[::2] == (rom_path, True)
+
+def test_latest_gop_is_kept(fake_sys, tmp_path) :
+	rom_path, rom_meta, from_cache = vbios.acquire(fake_sys, "01:00.0", str(tmp_path / "cache"), rom_file=upd_rom)
+	
+	assert not rom_meta["gop_updated"]
+	assert "You already have the latest available GOP!" in rom_meta["output"]
+	assert read_data(rom_path) == read_data(upd_rom)
+
+def test_ext_files_are_written(tmp_path) :
+	rom_path = str(tmp_path / "GP106.rom")
+	
+	assert vbios.GOPupd.write_ext_files(rom_path, read_data(old_rom))
+	assert read_data(str(tmp_path / "GP106.rom_temp" / "GP106_dump.efi"))[:2] == b'MZ'
+	assert os.path.isfile(str(tmp_path / "GP106.rom_temp" / "GP106_compr.efirom"))
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+import pytest
+
+from passthrough import sysfs
+from passthrough import vfio
+
+from conftest import link_driver
+from conftest import unlink_driver
+
+host_drivers = {"0000:01:00.0" : "nvidia", "0000:01:00.1" : "snd_hda_intel"}
+
+class Fake_Kernel :
+	
+	## Does what the PCI core does with the files the binder writes. A bdf written to drivers/<name>/unbind takes
+	## the device from the driver right away, the functions share the unbind file of vfio-pci on a restore, so the
+	## write is caught instead of left in the file. A device without a driver is claimed a little later by a
+	## poller, by its driver_override or else by its host driver, like an asynchronous probe. With vfio_claims
+	## off, vfio-pci never claims anything, like a probe that fails.
+	def __init__(self, sys_root, monkeypatch, vfio_claims=True) :
+		self.sys_root    = sys_root
+		self.vfio_claims = vfio_claims
+		self.write_attr  = sysfs.write_attr
+		self.running     = True
+		self.thread      = threading.Thread(target=self.poll, daemon=True)
+		
+		monkeypatch.setattr(sysfs, "write_attr", self.store)
+		self.thread.start()
+	
+	def store(self, attr_path, attr_value) :
+		if os.path.basename(attr_path) == "unbind" :
+			unlink_driver(self.sys_root, str(attr_value))
+		else :
+			self.write_attr(attr_path, attr_value)
+	
+	def poll(self) :
+		while self.running :
+			for bdf, host_driver in host_drivers.items() :
+				dev_dir = sysfs.pci_dev_dir(self.sys_root, bdf)
+				
+				if os.path.islink(os.path.join(dev_dir, "driver")) :
+					continue
+				
+				if sysfs.read_attr(os.path.join(dev_dir, "driver_override")) == vfio.vfio_driver :
+					if self.vfio_claims :
+						link_driver(self.sys_root, bdf, vfio.vfio_driver)
+				else :
+					link_driver(self.sys_root, bdf, host_driver)
+			
+			time.sleep(0.005)
+	
+	def stop(self) :
+		self.running = False
+		self.thread.join()
+
+@pytest.fixture
+def fake_kernel(fake_sys, monkeypatch) :
+	kernel = Fake_Kernel(fake_sys, monkeypatch)
+	
+	yield kernel
+	
+	kernel.stop()
+
+def test_group_is_bound_and_restored(fake_sys, fake_kernel) :
+	group_switch = vfio.switch_group(fake_sys, "01:00.0", unbind_gpu=True)
+	
+	assert group_switch["group"] == 1
+	assert [(func_info["bdf"], func_info["from"], func_info["to"], func_info["error"]) for func_info in group_switch["functions"]] == [
+		("0000:01:00.0", "nvidia", "vfio-pci", None), ("0000:01:00.1", "snd_hda_intel", "vfio-pci", None)]
+	assert list(group_switch["functions"][0]["steps"]) == ["override", "unbind", "probe", "claim", "total"]
+	
+	## The bridge of the group stays on pcieport.
+	assert vfio.dev_driver(sysfs.pci_dev_dir(fake_sys, "00:01.0")) == "pcieport"
+	assert vfio.switch_group(fake_sys, "01:00.0", unbind_gpu=True)["functions"] == []
+	
+	group_switch = vfio.switch_group(fake_sys, "01:00.0", restore=True)
+	
+	assert [func_info["bdf"] for func_info in group_switch["functions"]] == ["0000:01:00.0", "0000:01:00.1"]
+	
+	for bdf, host_driver in host_drivers.items() :
+		dev_dir = sysfs.pci_dev_dir(fake_sys, bdf)
+		end_time = time.monotonic() + 5
+		
+		while vfio.dev_driver(dev_dir) != host_driver and time.monotonic() < end_time :
+			time.sleep(0.01)
+		
+		assert vfio.dev_driver(dev_dir) == host_driver
+		assert sysfs.read_attr(os.path.join(dev_dir, "driver_override")) == ""
+
+def test_gpu_driver_is_not_unbound_by_default(fake_sys, fake_kernel) :
+	with pytest.raises(ValueError, match="0000:01:00.0 on the host GPU driver") :
+		vfio.switch_group(fake_sys, "01:00.0")
+	
+	assert sysfs.read_attr(os.path.join(sysfs.pci_dev_dir(fake_sys, "01:00.0"), "driver_override")) == "(null)"
+	assert vfio.dev_driver(sysfs.pci_dev_dir(fake_sys, "01:00.0")) == "nvidia"
+
+def test_claim_times_out(fake_sys, monkeypatch) :
+	kernel = Fake_Kernel(fake_sys, monkeypatch, vfio_claims=False)
+	
+	try :
+		group_switch = vfio.switch_group(fake_sys, "01:00.0", unbind_gpu=True, timeout=0.2)
+	finally :
+		kernel.stop()
+	
+	assert [func_info["error"] for func_info in group_switch["functions"]] == ["0000:01:00.0 is on no driver after 0.2 s, not vfio-pci",
+																			"0000:01:00.1 is on no driver after 0.2 s, not vfio-pci"]
+	assert [func_info["steps"] for func_info in group_switch["functions"]] == [None, None]
+
+def test_vfio_pci_must_be_loaded(fake_sys) :
+	os.rename(os.path.join(fake_sys, "bus", "pci", "drivers", "vfio-pci"), os.path.join(fake_sys, "vfio-pci"))
+	
+	with pytest.raises(ValueError, match="modprobe vfio-pci") :
+		vfio.switch_group(fake_sys, "01:00.0", unbind_gpu=True)